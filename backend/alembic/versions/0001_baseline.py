@@ -0,0 +1,465 @@
+"""baseline
+
+Schema as created by Base.metadata.create_all before migrations were
+introduced. Databases that already have the tables are brought to the same
+point with the upgrades formerly run at startup (upgrade_database,
+add_manager_id_column, add_employee_id_column in main.py).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 03:38:14.573120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade_legacy_schema() -> None:
+    """Former startup upgrades, idempotent (PostgreSQL)"""
+    # employees.employee_id
+    op.execute("ALTER TABLE employees ADD COLUMN IF NOT EXISTS employee_id VARCHAR(10)")
+    op.execute("UPDATE employees SET employee_id = LPAD(id::text, 5, '0') WHERE employee_id IS NULL")
+    op.execute("ALTER TABLE employees ALTER COLUMN employee_id SET NOT NULL")
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_employee_id ON employees(employee_id)")
+
+    # managers.manager_id - 3-digit: 001, 002, 003
+    op.execute("ALTER TABLE managers ADD COLUMN IF NOT EXISTS manager_id VARCHAR(10) UNIQUE")
+    op.execute("UPDATE managers SET manager_id = LPAD(id::text, 3, '0') WHERE manager_id IS NULL")
+
+    # comp-off tracking enhancement
+    op.execute("""
+        ALTER TABLE comp_off_tracking
+        ADD COLUMN IF NOT EXISTS earned_date TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS expired_days INTEGER DEFAULT 0
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS comp_off_details (
+            id SERIAL PRIMARY KEY,
+            employee_id INTEGER NOT NULL,
+            tracking_id INTEGER NOT NULL,
+            type VARCHAR(50) DEFAULT 'earned',
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            earned_month VARCHAR(7),
+            expired_at TIMESTAMP,
+            notes VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT fk_compoff_detail_employee FOREIGN KEY (employee_id)
+                REFERENCES employees(id) ON DELETE CASCADE,
+            CONSTRAINT fk_compoff_detail_tracking FOREIGN KEY (tracking_id)
+                REFERENCES comp_off_tracking(id) ON DELETE CASCADE
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_compoff_details_employee ON comp_off_details(employee_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_compoff_details_earned_month ON comp_off_details(earned_month)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_compoff_details_type ON comp_off_details(type)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table('users'):
+        # Tables created before migrations (init_db.py / create_all)
+        upgrade_legacy_schema()
+        return
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('departments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('dept_id', sa.String(length=3), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_departments_dept_id'), 'departments', ['dept_id'], unique=True)
+    op.create_index(op.f('ix_departments_id'), 'departments', ['id'], unique=False)
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('full_name', sa.String(length=100), nullable=True),
+    sa.Column('user_type', sa.Enum('ADMIN', 'MANAGER', 'EMPLOYEE', name='usertype'), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('last_login', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_table('managers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('manager_id', sa.String(length=10), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], name='fk_manager_department'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_manager_user'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_managers_department_id'), 'managers', ['department_id'], unique=False)
+    op.create_index(op.f('ix_managers_id'), 'managers', ['id'], unique=False)
+    op.create_index(op.f('ix_managers_manager_id'), 'managers', ['manager_id'], unique=True)
+    op.create_index(op.f('ix_managers_user_id'), 'managers', ['user_id'], unique=True)
+    op.create_table('messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('recipient_id', sa.Integer(), nullable=True),
+    sa.Column('department_id', sa.Integer(), nullable=True),
+    sa.Column('subject', sa.String(length=200), nullable=True),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=True),
+    sa.Column('is_deleted_by_sender', sa.Boolean(), nullable=True),
+    sa.Column('is_deleted_by_recipient', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('read_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], name='fk_message_department'),
+    sa.ForeignKeyConstraint(['recipient_id'], ['users.id'], name='fk_message_recipient'),
+    sa.ForeignKeyConstraint(['sender_id'], ['users.id'], name='fk_message_sender'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_messages_created_at'), 'messages', ['created_at'], unique=False)
+    op.create_index(op.f('ix_messages_id'), 'messages', ['id'], unique=False)
+    op.create_table('notifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('notification_type', sa.String(length=50), nullable=True),
+    sa.Column('related_id', sa.Integer(), nullable=True),
+    sa.Column('is_read', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_notification_user'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_notifications_created_at'), 'notifications', ['created_at'], unique=False)
+    op.create_index(op.f('ix_notifications_id'), 'notifications', ['id'], unique=False)
+    op.create_table('roles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=True),
+    sa.Column('priority_percentage', sa.Integer(), nullable=True),
+    sa.Column('required_skills', sa.JSON(), nullable=True),
+    sa.Column('break_minutes', sa.Integer(), nullable=True),
+    sa.Column('weekend_required', sa.Boolean(), nullable=True),
+    sa.Column('schedule_config', sa.JSON(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], name='fk_role_department'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_roles_id'), 'roles', ['id'], unique=False)
+    op.create_table('employees',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.String(length=10), nullable=False),
+    sa.Column('first_name', sa.String(length=50), nullable=False),
+    sa.Column('last_name', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('phone', sa.String(length=20), nullable=True),
+    sa.Column('address', sa.Text(), nullable=True),
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('role_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('employment_type', sa.String(length=20), nullable=True),
+    sa.Column('weekly_hours', sa.Float(), nullable=True),
+    sa.Column('daily_max_hours', sa.Float(), nullable=True),
+    sa.Column('shifts_per_week', sa.Integer(), nullable=True),
+    sa.Column('paid_leave_per_year', sa.Integer(), nullable=True),
+    sa.Column('skills', sa.JSON(), nullable=True),
+    sa.Column('hire_date', sa.Date(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], name='fk_emp_department'),
+    sa.ForeignKeyConstraint(['role_id'], ['roles.id'], name='fk_emp_role'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_emp_user'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_employees_email'), 'employees', ['email'], unique=True)
+    op.create_index(op.f('ix_employees_employee_id'), 'employees', ['employee_id'], unique=True)
+    op.create_index(op.f('ix_employees_id'), 'employees', ['id'], unique=False)
+    op.create_table('shifts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('role_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('start_time', sa.String(length=5), nullable=False),
+    sa.Column('end_time', sa.String(length=5), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=True),
+    sa.Column('min_emp', sa.Integer(), nullable=True),
+    sa.Column('max_emp', sa.Integer(), nullable=True),
+    sa.Column('schedule_config', sa.JSON(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['role_id'], ['roles.id'], name='fk_shift_role'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_shifts_id'), 'shifts', ['id'], unique=False)
+    op.create_table('comp_off_tracking',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('earned_days', sa.Integer(), nullable=True),
+    sa.Column('used_days', sa.Integer(), nullable=True),
+    sa.Column('available_days', sa.Integer(), nullable=True),
+    sa.Column('earned_date', sa.DateTime(), nullable=True),
+    sa.Column('expired_days', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_compoff_tracking_employee'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('employee_id')
+    )
+    op.create_index(op.f('ix_comp_off_tracking_id'), 'comp_off_tracking', ['id'], unique=False)
+    op.create_table('leave_requests',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('leave_type', sa.String(length=20), nullable=False),
+    sa.Column('duration_type', sa.String(length=20), nullable=True),
+    sa.Column('reason', sa.Text(), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='leavestatus'), nullable=True),
+    sa.Column('manager_id', sa.Integer(), nullable=True),
+    sa.Column('reviewed_at', sa.DateTime(), nullable=True),
+    sa.Column('review_notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_leave_employee'),
+    sa.ForeignKeyConstraint(['manager_id'], ['managers.id'], name='fk_leave_manager'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_leave_requests_id'), 'leave_requests', ['id'], unique=False)
+    op.create_table('overtime_requests',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('request_date', sa.Date(), nullable=False),
+    sa.Column('from_time', sa.String(length=5), nullable=True),
+    sa.Column('to_time', sa.String(length=5), nullable=True),
+    sa.Column('request_hours', sa.Float(), nullable=False),
+    sa.Column('reason', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='overtimestatus'), nullable=True),
+    sa.Column('manager_id', sa.Integer(), nullable=True),
+    sa.Column('manager_notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('approved_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_ot_request_employee'),
+    sa.ForeignKeyConstraint(['manager_id'], ['users.id'], name='fk_ot_request_manager'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_overtime_requests_id'), 'overtime_requests', ['id'], unique=False)
+    op.create_table('overtime_tracking',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('allocated_hours', sa.Float(), nullable=True),
+    sa.Column('used_hours', sa.Float(), nullable=True),
+    sa.Column('remaining_hours', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_overtime_employee'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_overtime_tracking_id'), 'overtime_tracking', ['id'], unique=False)
+    op.create_table('overtime_worked',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('work_date', sa.Date(), nullable=False),
+    sa.Column('overtime_hours', sa.Float(), nullable=False),
+    sa.Column('approval_status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='overtimestatus'), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_ot_worked_employee'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_overtime_worked_id'), 'overtime_worked', ['id'], unique=False)
+    op.create_index(op.f('ix_overtime_worked_work_date'), 'overtime_worked', ['work_date'], unique=False)
+    op.create_table('schedules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('role_id', sa.Integer(), nullable=False),
+    sa.Column('shift_id', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('start_time', sa.String(length=5), nullable=True),
+    sa.Column('end_time', sa.String(length=5), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('day_priority', sa.Integer(), nullable=True),
+    sa.Column('is_overtime', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], name='fk_schedule_department'),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_schedule_employee'),
+    sa.ForeignKeyConstraint(['role_id'], ['roles.id'], name='fk_schedule_role'),
+    sa.ForeignKeyConstraint(['shift_id'], ['shifts.id'], name='fk_schedule_shift'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_schedules_date'), 'schedules', ['date'], unique=False)
+    op.create_index(op.f('ix_schedules_id'), 'schedules', ['id'], unique=False)
+    op.create_table('unavailability',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('reason', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_unavail_employee'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_unavailability_date'), 'unavailability', ['date'], unique=False)
+    op.create_index(op.f('ix_unavailability_id'), 'unavailability', ['id'], unique=False)
+    op.create_table('attendance',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('schedule_id', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('in_time', sa.String(length=5), nullable=True),
+    sa.Column('out_time', sa.String(length=5), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('out_status', sa.String(length=20), nullable=True),
+    sa.Column('worked_hours', sa.Float(), nullable=True),
+    sa.Column('night_hours', sa.Float(), nullable=True),
+    sa.Column('overtime_hours', sa.Float(), nullable=True),
+    sa.Column('break_minutes', sa.Integer(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_attendance_employee'),
+    sa.ForeignKeyConstraint(['schedule_id'], ['schedules.id'], name='fk_attendance_schedule'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_attendance_date'), 'attendance', ['date'], unique=False)
+    op.create_index(op.f('ix_attendance_id'), 'attendance', ['id'], unique=False)
+    op.create_table('check_ins',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('schedule_id', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('check_in_time', sa.DateTime(), nullable=True),
+    sa.Column('check_out_time', sa.DateTime(), nullable=True),
+    sa.Column('check_in_status', sa.String(length=20), nullable=True),
+    sa.Column('check_out_status', sa.String(length=20), nullable=True),
+    sa.Column('location', sa.String(length=100), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_checkin_employee'),
+    sa.ForeignKeyConstraint(['schedule_id'], ['schedules.id'], name='fk_checkin_schedule'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_check_ins_date'), 'check_ins', ['date'], unique=False)
+    op.create_index(op.f('ix_check_ins_id'), 'check_ins', ['id'], unique=False)
+    op.create_table('comp_off_details',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('tracking_id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('earned_month', sa.String(length=7), nullable=True),
+    sa.Column('expired_at', sa.DateTime(), nullable=True),
+    sa.Column('notes', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_compoff_detail_employee'),
+    sa.ForeignKeyConstraint(['tracking_id'], ['comp_off_tracking.id'], name='fk_compoff_detail_tracking'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_comp_off_details_id'), 'comp_off_details', ['id'], unique=False)
+    op.create_table('comp_off_requests',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('comp_off_date', sa.Date(), nullable=False),
+    sa.Column('reason', sa.Text(), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='leavestatus'), nullable=True),
+    sa.Column('manager_id', sa.Integer(), nullable=True),
+    sa.Column('reviewed_at', sa.DateTime(), nullable=True),
+    sa.Column('review_notes', sa.Text(), nullable=True),
+    sa.Column('schedule_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_compoff_employee'),
+    sa.ForeignKeyConstraint(['manager_id'], ['managers.id'], name='fk_compoff_manager'),
+    sa.ForeignKeyConstraint(['schedule_id'], ['schedules.id'], name='fk_compoff_schedule'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_comp_off_requests_id'), 'comp_off_requests', ['id'], unique=False)
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index(op.f('ix_comp_off_requests_id'), table_name='comp_off_requests')
+    op.drop_table('comp_off_requests')
+    op.drop_index(op.f('ix_comp_off_details_id'), table_name='comp_off_details')
+    op.drop_table('comp_off_details')
+    op.drop_index(op.f('ix_check_ins_id'), table_name='check_ins')
+    op.drop_index(op.f('ix_check_ins_date'), table_name='check_ins')
+    op.drop_table('check_ins')
+    op.drop_index(op.f('ix_attendance_id'), table_name='attendance')
+    op.drop_index(op.f('ix_attendance_date'), table_name='attendance')
+    op.drop_table('attendance')
+    op.drop_index(op.f('ix_unavailability_id'), table_name='unavailability')
+    op.drop_index(op.f('ix_unavailability_date'), table_name='unavailability')
+    op.drop_table('unavailability')
+    op.drop_index(op.f('ix_schedules_id'), table_name='schedules')
+    op.drop_index(op.f('ix_schedules_date'), table_name='schedules')
+    op.drop_table('schedules')
+    op.drop_index(op.f('ix_overtime_worked_work_date'), table_name='overtime_worked')
+    op.drop_index(op.f('ix_overtime_worked_id'), table_name='overtime_worked')
+    op.drop_table('overtime_worked')
+    op.drop_index(op.f('ix_overtime_tracking_id'), table_name='overtime_tracking')
+    op.drop_table('overtime_tracking')
+    op.drop_index(op.f('ix_overtime_requests_id'), table_name='overtime_requests')
+    op.drop_table('overtime_requests')
+    op.drop_index(op.f('ix_leave_requests_id'), table_name='leave_requests')
+    op.drop_table('leave_requests')
+    op.drop_index(op.f('ix_comp_off_tracking_id'), table_name='comp_off_tracking')
+    op.drop_table('comp_off_tracking')
+    op.drop_index(op.f('ix_shifts_id'), table_name='shifts')
+    op.drop_table('shifts')
+    op.drop_index(op.f('ix_employees_id'), table_name='employees')
+    op.drop_index(op.f('ix_employees_employee_id'), table_name='employees')
+    op.drop_index(op.f('ix_employees_email'), table_name='employees')
+    op.drop_table('employees')
+    op.drop_index(op.f('ix_roles_id'), table_name='roles')
+    op.drop_table('roles')
+    op.drop_index(op.f('ix_notifications_id'), table_name='notifications')
+    op.drop_index(op.f('ix_notifications_created_at'), table_name='notifications')
+    op.drop_table('notifications')
+    op.drop_index(op.f('ix_messages_id'), table_name='messages')
+    op.drop_index(op.f('ix_messages_created_at'), table_name='messages')
+    op.drop_table('messages')
+    op.drop_index(op.f('ix_managers_user_id'), table_name='managers')
+    op.drop_index(op.f('ix_managers_manager_id'), table_name='managers')
+    op.drop_index(op.f('ix_managers_id'), table_name='managers')
+    op.drop_index(op.f('ix_managers_department_id'), table_name='managers')
+    op.drop_table('managers')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_departments_id'), table_name='departments')
+    op.drop_index(op.f('ix_departments_dept_id'), table_name='departments')
+    op.drop_table('departments')
+    # ### end Alembic commands ###
+    for enum_name in ('usertype', 'leavestatus', 'overtimestatus'):
+        sa.Enum(name=enum_name).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,100 @@
+"""hot path indexes
+
+Composite indexes for the (employee_id, date) and (department_id, date,
+status) predicates used by schedules, attendance, check-ins, leave and
+comp-off lookups, partial indexes on the nullable schedule_id references,
+and one attendance record per employee per day.
+
+Indexes are built CONCURRENTLY so existing tables stay writable. An
+interrupted concurrent build leaves an INVALID index behind; a rerun drops
+it and builds the index again.
+
+The upgrade refuses to run while attendance holds more than one row for an
+(employee_id, date). Those are payroll records: it lists the pairs, and
+they have to be merged by hand before upgrading again.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 04:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, columns, partial predicate)
+INDEXES = [
+    ('ix_schedules_employee_date', 'schedules', ['employee_id', 'date'], None),
+    ('ix_schedules_department_date_status', 'schedules', ['department_id', 'date', 'status'], None),
+    ('ix_leave_requests_employee_status_dates', 'leave_requests', ['employee_id', 'status', 'start_date', 'end_date'], None),
+    ('ix_check_ins_employee_date', 'check_ins', ['employee_id', 'date'], None),
+    ('ix_check_ins_schedule_id', 'check_ins', ['schedule_id'], 'schedule_id IS NOT NULL'),
+    ('ix_attendance_schedule_id', 'attendance', ['schedule_id'], 'schedule_id IS NOT NULL'),
+    ('ix_unavailability_employee_date', 'unavailability', ['employee_id', 'date'], None),
+    ('ix_comp_off_requests_employee_date', 'comp_off_requests', ['employee_id', 'comp_off_date'], None),
+]
+
+
+def drop_invalid_index(name: str, table: str) -> None:
+    """Drop the index called name if an interrupted CONCURRENTLY build left it INVALID"""
+    invalid = op.get_bind().execute(sa.text("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace AND NOT i.indisvalid
+    """), {'name': name}).scalar()
+    if invalid:
+        op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    duplicates = op.get_bind().execute(sa.text("""
+        SELECT employee_id, date, count(*)
+        FROM attendance
+        GROUP BY employee_id, date
+        HAVING count(*) > 1
+        ORDER BY employee_id, date
+    """)).fetchall()
+    if duplicates:
+        pairs = "\n".join(f"  employee_id={employee_id} date={day} ({rows} rows)" for employee_id, day, rows in duplicates)
+        raise RuntimeError(
+            f"attendance has {len(duplicates)} duplicated (employee_id, date) pairs; merge them into one row "
+            f"each before adding uq_attendance_employee_date:\n{pairs}"
+        )
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            drop_invalid_index(name, table)
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+        drop_invalid_index('uq_attendance_employee_date', 'attendance')
+        op.create_index(
+            'uq_attendance_employee_date', 'attendance', ['employee_id', 'date'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+    op.execute(
+        "ALTER TABLE attendance ADD CONSTRAINT uq_attendance_employee_date "
+        "UNIQUE USING INDEX uq_attendance_employee_date"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_attendance_employee_date', 'attendance', type_='unique')
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,314 @@
+"""export data versions
+
+Per department and month change counter for the attendance exports, bumped
+by statement-level triggers on attendance, check_ins, schedules,
+leave_requests, comp_off_requests and comp_off_details. The export cache
+keys generated files on it.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 06:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Trigger DDL as of this revision, kept verbatim: the app.models helpers may change later
+UPGRADE_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION bump_export_versions_attendance() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSE
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id UNION SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_export_versions_attendance_insert ON attendance",
+    ("CREATE TRIGGER trg_export_versions_attendance_insert AFTER INSERT ON attendance "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_attendance()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_attendance_update ON attendance",
+    ("CREATE TRIGGER trg_export_versions_attendance_update AFTER UPDATE ON attendance "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_attendance()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_attendance_delete ON attendance",
+    ("CREATE TRIGGER trg_export_versions_attendance_delete AFTER DELETE ON attendance "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_attendance()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_export_versions_check_ins() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSE
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id UNION SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_export_versions_check_ins_insert ON check_ins",
+    ("CREATE TRIGGER trg_export_versions_check_ins_insert AFTER INSERT ON check_ins "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_check_ins()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_check_ins_update ON check_ins",
+    ("CREATE TRIGGER trg_export_versions_check_ins_update AFTER UPDATE ON check_ins "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_check_ins()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_check_ins_delete ON check_ins",
+    ("CREATE TRIGGER trg_export_versions_check_ins_delete AFTER DELETE ON check_ins "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_check_ins()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_export_versions_schedules() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT r.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT r.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSE
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT r.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r UNION SELECT r.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_export_versions_schedules_insert ON schedules",
+    ("CREATE TRIGGER trg_export_versions_schedules_insert AFTER INSERT ON schedules "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_schedules()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_schedules_update ON schedules",
+    ("CREATE TRIGGER trg_export_versions_schedules_update AFTER UPDATE ON schedules "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_schedules()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_schedules_delete ON schedules",
+    ("CREATE TRIGGER trg_export_versions_schedules_delete AFTER DELETE ON schedules "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_schedules()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_export_versions_leave_requests() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, m::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id CROSS JOIN generate_series(date_trunc('month', r.start_date), r.end_date, interval '1 month') m) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, m::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id CROSS JOIN generate_series(date_trunc('month', r.start_date), r.end_date, interval '1 month') m) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSE
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, m::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id CROSS JOIN generate_series(date_trunc('month', r.start_date), r.end_date, interval '1 month') m UNION SELECT e.department_id, m::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id CROSS JOIN generate_series(date_trunc('month', r.start_date), r.end_date, interval '1 month') m) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_export_versions_leave_requests_insert ON leave_requests",
+    ("CREATE TRIGGER trg_export_versions_leave_requests_insert AFTER INSERT ON leave_requests "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_leave_requests()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_leave_requests_update ON leave_requests",
+    ("CREATE TRIGGER trg_export_versions_leave_requests_update AFTER UPDATE ON leave_requests "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_leave_requests()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_leave_requests_delete ON leave_requests",
+    ("CREATE TRIGGER trg_export_versions_leave_requests_delete AFTER DELETE ON leave_requests "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_leave_requests()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_export_versions_comp_off_requests() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.comp_off_date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.comp_off_date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSE
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.comp_off_date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id UNION SELECT e.department_id, date_trunc('month', r.comp_off_date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_export_versions_comp_off_requests_insert ON comp_off_requests",
+    ("CREATE TRIGGER trg_export_versions_comp_off_requests_insert AFTER INSERT ON comp_off_requests "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_comp_off_requests()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_comp_off_requests_update ON comp_off_requests",
+    ("CREATE TRIGGER trg_export_versions_comp_off_requests_update AFTER UPDATE ON comp_off_requests "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_comp_off_requests()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_comp_off_requests_delete ON comp_off_requests",
+    ("CREATE TRIGGER trg_export_versions_comp_off_requests_delete AFTER DELETE ON comp_off_requests "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_comp_off_requests()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_export_versions_comp_off_details() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSE
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM new_rows r JOIN employees e ON e.id = r.employee_id UNION SELECT e.department_id, date_trunc('month', r.date)::date AS period FROM old_rows r JOIN employees e ON e.id = r.employee_id) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_export_versions_comp_off_details_insert ON comp_off_details",
+    ("CREATE TRIGGER trg_export_versions_comp_off_details_insert AFTER INSERT ON comp_off_details "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_comp_off_details()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_comp_off_details_update ON comp_off_details",
+    ("CREATE TRIGGER trg_export_versions_comp_off_details_update AFTER UPDATE ON comp_off_details "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_comp_off_details()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_comp_off_details_delete ON comp_off_details",
+    ("CREATE TRIGGER trg_export_versions_comp_off_details_delete AFTER DELETE ON comp_off_details "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_comp_off_details()"),
+]
+
+DOWNGRADE_DDL = [
+    "DROP FUNCTION IF EXISTS bump_export_versions_attendance() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_export_versions_check_ins() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_export_versions_schedules() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_export_versions_leave_requests() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_export_versions_comp_off_requests() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_export_versions_comp_off_details() CASCADE",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('export_data_versions',
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.Date(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('department_id', 'period')
+    )
+    for statement in UPGRADE_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for statement in DOWNGRADE_DDL:
+        op.execute(statement)
+    op.drop_table('export_data_versions')
@@ -0,0 +1,87 @@
+"""attendance month snapshots
+
+Closed attendance months: attendance_period_closes records which department
+months are closed and at which export data version, employee_ and
+department_month_snapshots hold their aggregates.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _aggregate_columns() -> list:
+    return [
+        sa.Column('records', sa.Integer(), nullable=False),
+        sa.Column('days_worked', sa.Integer(), nullable=False),
+        sa.Column('worked_hours', sa.Float(), nullable=False),
+        sa.Column('night_hours', sa.Float(), nullable=False),
+        sa.Column('overtime_hours', sa.Float(), nullable=False),
+        sa.Column('break_minutes', sa.Integer(), nullable=False),
+        sa.Column('on_time_count', sa.Integer(), nullable=False),
+        sa.Column('late_count', sa.Integer(), nullable=False),
+        sa.Column('paid_leave_days', sa.Float(), nullable=False),
+        sa.Column('unpaid_leave_days', sa.Float(), nullable=False),
+        sa.Column('comp_off_earned', sa.Integer(), nullable=False),
+        sa.Column('comp_off_used', sa.Integer(), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('attendance_period_closes',
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.Date(), nullable=False),
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.Column('closed_at', sa.DateTime(), nullable=False),
+    sa.Column('closed_by', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], name='fk_period_close_department', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['closed_by'], ['users.id'], name='fk_period_close_user', ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('department_id', 'period')
+    )
+    op.create_table('employee_month_snapshots',
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.Date(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    *_aggregate_columns(),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], name='fk_month_snapshot_employee', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(
+        ['department_id', 'period'],
+        ['attendance_period_closes.department_id', 'attendance_period_closes.period'],
+        name='fk_month_snapshot_close', ondelete='CASCADE'
+    ),
+    sa.PrimaryKeyConstraint('department_id', 'period', 'employee_id')
+    )
+    op.create_index('idx_month_snapshot_employee_period', 'employee_month_snapshots', ['employee_id', 'period'], unique=False)
+    op.create_table('department_month_snapshots',
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.Date(), nullable=False),
+    sa.Column('employees', sa.Integer(), nullable=False),
+    *_aggregate_columns(),
+    sa.ForeignKeyConstraint(
+        ['department_id', 'period'],
+        ['attendance_period_closes.department_id', 'attendance_period_closes.period'],
+        name='fk_department_snapshot_close', ondelete='CASCADE'
+    ),
+    sa.PrimaryKeyConstraint('department_id', 'period')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('department_month_snapshots')
+    op.drop_index('idx_month_snapshot_employee_period', table_name='employee_month_snapshots')
+    op.drop_table('employee_month_snapshots')
+    op.drop_table('attendance_period_closes')
@@ -0,0 +1,80 @@
+"""time columns as minutes
+
+Shift, schedule, attendance and overtime-request times move from
+'HH:MM' VARCHAR(5) to integer minutes since midnight (app.time_columns);
+the application still reads and writes 'HH:MM'. Empty strings become
+NULL.
+
+The upgrade refuses to run while a column holds anything other than a
+time of day ('H:MM' / 'HH:MM', 00:00-23:59, and 24:00 for end times): it
+lists the rows, and they have to be corrected by hand before upgrading
+again.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 11:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, column, end of a span: may be 24:00)
+TIME_COLUMNS = [
+    ('shifts', 'start_time', False),
+    ('shifts', 'end_time', True),
+    ('schedules', 'start_time', False),
+    ('schedules', 'end_time', True),
+    ('attendance', 'in_time', False),
+    ('attendance', 'out_time', True),
+    ('overtime_requests', 'from_time', False),
+    ('overtime_requests', 'to_time', True),
+]
+
+TIME_PATTERN = '^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
+END_TIME_PATTERN = '^(([01]?[0-9]|2[0-3]):[0-5][0-9]|24:00)$'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    invalid = []
+    for table, column, is_end in TIME_COLUMNS:
+        pattern = END_TIME_PATTERN if is_end else TIME_PATTERN
+        invalid += [
+            (table, column, row_id, value) for row_id, value in bind.execute(sa.text(
+                f"SELECT id, {column} FROM {table} "
+                f"WHERE {column} <> '' AND {column} !~ '{pattern}' ORDER BY id"
+            )).fetchall()
+        ]
+    if invalid:
+        rows = "\n".join(f"  {table}.{column} id={row_id}: {value!r}" for table, column, row_id, value in invalid)
+        raise RuntimeError(
+            f"{len(invalid)} time values are not HH:MM times of day; correct them before "
+            f"converting the columns to minutes:\n{rows}"
+        )
+
+    for table, column, _ in TIME_COLUMNS:
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE integer USING "
+            f"CASE WHEN {column} <> '' "
+            f"THEN split_part({column}, ':', 1)::integer * 60 + split_part({column}, ':', 2)::integer END"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column, _ in TIME_COLUMNS:
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE varchar(5) USING "
+            f"lpad(({column} / 60)::text, 2, '0') || ':' || lpad(({column} % 60)::text, 2, '0')"
+        )
@@ -0,0 +1,99 @@
+"""calendar holidays
+
+Holiday calendar table: the Japanese public holidays of 2000-2050 are
+seeded from the holidays library, company holidays are added by admins.
+Changes bump every department's export data version for the month.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.holidays_jp import public_holiday_rows
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Trigger DDL as of this revision, kept verbatim: the app.models helpers may change later
+UPGRADE_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION bump_export_versions_calendar_holidays() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT d.id AS department_id, date_trunc('month', r.date)::date AS period FROM new_rows r CROSS JOIN departments d) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT d.id AS department_id, date_trunc('month', r.date)::date AS period FROM old_rows r CROSS JOIN departments d) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        ELSE
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM (SELECT d.id AS department_id, date_trunc('month', r.date)::date AS period FROM new_rows r CROSS JOIN departments d UNION SELECT d.id AS department_id, date_trunc('month', r.date)::date AS period FROM old_rows r CROSS JOIN departments d) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_export_versions_calendar_holidays_insert ON calendar_holidays",
+    ("CREATE TRIGGER trg_export_versions_calendar_holidays_insert AFTER INSERT ON calendar_holidays "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_calendar_holidays()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_calendar_holidays_update ON calendar_holidays",
+    ("CREATE TRIGGER trg_export_versions_calendar_holidays_update AFTER UPDATE ON calendar_holidays "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_calendar_holidays()"),
+    "DROP TRIGGER IF EXISTS trg_export_versions_calendar_holidays_delete ON calendar_holidays",
+    ("CREATE TRIGGER trg_export_versions_calendar_holidays_delete AFTER DELETE ON calendar_holidays "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_export_versions_calendar_holidays()"),
+]
+
+DOWNGRADE_DDL = [
+    "DROP FUNCTION IF EXISTS bump_export_versions_calendar_holidays() CASCADE",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    calendar_holidays = op.create_table('calendar_holidays',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('is_company', sa.Boolean(), nullable=False),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], name='fk_calendar_holiday_user', ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('date')
+    )
+    # Seed before the trigger exists: public holidays change no export
+    op.bulk_insert(calendar_holidays, public_holiday_rows(2000, 2050))
+    for statement in UPGRADE_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for statement in DOWNGRADE_DDL:
+        op.execute(statement)
+    op.drop_table('calendar_holidays')
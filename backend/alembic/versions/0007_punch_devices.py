@@ -0,0 +1,61 @@
+"""punch devices
+
+Kiosk / badge reader devices (hashed API keys) and the receipts of the
+punches they post, unique per device and idempotency key.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('punch_devices',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('department_id', sa.Integer(), nullable=True),
+    sa.Column('api_key_hash', sa.String(length=64), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_seen_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], name='fk_punch_device_department', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('api_key_hash')
+    )
+    op.create_index(op.f('ix_punch_devices_id'), 'punch_devices', ['id'], unique=False)
+    op.create_table('device_punches',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=64), nullable=False),
+    sa.Column('employee_code', sa.String(length=50), nullable=False),
+    sa.Column('punch_type', sa.String(length=10), nullable=False),
+    sa.Column('punched_at', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('reason', sa.String(length=50), nullable=True),
+    sa.Column('check_in_id', sa.Integer(), nullable=True),
+    sa.Column('received_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['check_in_id'], ['check_ins.id'], name='fk_device_punch_check_in', ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['device_id'], ['punch_devices.id'], name='fk_device_punch_device', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('device_id', 'idempotency_key', name='uq_device_punch_key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('device_punches')
+    op.drop_index(op.f('ix_punch_devices_id'), table_name='punch_devices')
+    op.drop_table('punch_devices')
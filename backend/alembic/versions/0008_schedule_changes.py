@@ -0,0 +1,84 @@
+"""schedule changes
+
+Change log of schedules for delta sync: statement-level triggers record
+the (employee, date) groups touched by every insert/update/delete, with
+the writing transaction id as the sync position.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Trigger DDL as of this revision, kept verbatim: the app.models helpers may change later
+UPGRADE_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION log_schedule_changes() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO schedule_changes (department_id, employee_id, date)
+        SELECT DISTINCT department_id, employee_id, date FROM (SELECT department_id, employee_id, date FROM new_rows) changed;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO schedule_changes (department_id, employee_id, date)
+        SELECT DISTINCT department_id, employee_id, date FROM (SELECT department_id, employee_id, date FROM old_rows) changed;
+        ELSE
+        INSERT INTO schedule_changes (department_id, employee_id, date)
+        SELECT DISTINCT department_id, employee_id, date FROM (SELECT department_id, employee_id, date FROM new_rows UNION SELECT department_id, employee_id, date FROM old_rows) changed;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_schedule_changes_insert ON schedules",
+    ("CREATE TRIGGER trg_schedule_changes_insert AFTER INSERT ON schedules "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION log_schedule_changes()"),
+    "DROP TRIGGER IF EXISTS trg_schedule_changes_update ON schedules",
+    ("CREATE TRIGGER trg_schedule_changes_update AFTER UPDATE ON schedules "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION log_schedule_changes()"),
+    "DROP TRIGGER IF EXISTS trg_schedule_changes_delete ON schedules",
+    ("CREATE TRIGGER trg_schedule_changes_delete AFTER DELETE ON schedules "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION log_schedule_changes()"),
+]
+
+DOWNGRADE_DDL = [
+    "DROP FUNCTION IF EXISTS log_schedule_changes() CASCADE",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('schedule_changes',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('change_xid', sa.BigInteger(), server_default=sa.text('txid_current()'), nullable=False),
+    sa.Column('department_id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_schedule_changes_change_xid'), 'schedule_changes', ['change_xid'], unique=False)
+    op.create_index(op.f('ix_schedule_changes_changed_at'), 'schedule_changes', ['changed_at'], unique=False)
+    for statement in UPGRADE_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for statement in DOWNGRADE_DDL:
+        op.execute(statement)
+    op.drop_index(op.f('ix_schedule_changes_changed_at'), table_name='schedule_changes')
+    op.drop_index(op.f('ix_schedule_changes_change_xid'), table_name='schedule_changes')
+    op.drop_table('schedule_changes')
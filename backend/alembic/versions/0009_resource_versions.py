@@ -0,0 +1,399 @@
+"""resource versions
+
+Change counters per resource and scope behind the ETags of the polled
+list endpoints, bumped by statement-level triggers.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 18:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Trigger DDL as of this revision, kept verbatim: the app.models helpers may change later
+UPGRADE_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_departments() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'departments' AS resource, 'all' AS scope FROM new_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'departments' AS resource, 'all' AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'departments' AS resource, 'all' AS scope FROM new_rows UNION SELECT 'departments' AS resource, 'all' AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_departments_insert ON departments",
+    ("CREATE TRIGGER trg_resource_versions_departments_insert AFTER INSERT ON departments "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_departments()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_departments_update ON departments",
+    ("CREATE TRIGGER trg_resource_versions_departments_update AFTER UPDATE ON departments "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_departments()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_departments_delete ON departments",
+    ("CREATE TRIGGER trg_resource_versions_departments_delete AFTER DELETE ON departments "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_departments()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_users() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'principal' AS resource, 'u:' || id AS scope FROM new_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'principal' AS resource, 'u:' || id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'principal' AS resource, 'u:' || id AS scope FROM new_rows UNION SELECT 'principal' AS resource, 'u:' || id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_users_insert ON users",
+    ("CREATE TRIGGER trg_resource_versions_users_insert AFTER INSERT ON users "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_users()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_users_update ON users",
+    ("CREATE TRIGGER trg_resource_versions_users_update AFTER UPDATE ON users "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_users()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_users_delete ON users",
+    ("CREATE TRIGGER trg_resource_versions_users_delete AFTER DELETE ON users "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_users()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_managers() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'principal' AS resource, 'u:' || user_id AS scope FROM new_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'principal' AS resource, 'u:' || user_id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'principal' AS resource, 'u:' || user_id AS scope FROM new_rows UNION SELECT 'principal' AS resource, 'u:' || user_id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_managers_insert ON managers",
+    ("CREATE TRIGGER trg_resource_versions_managers_insert AFTER INSERT ON managers "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_managers()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_managers_update ON managers",
+    ("CREATE TRIGGER trg_resource_versions_managers_update AFTER UPDATE ON managers "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_managers()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_managers_delete ON managers",
+    ("CREATE TRIGGER trg_resource_versions_managers_delete AFTER DELETE ON managers "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_managers()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_employees() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'employees' AS resource, 'd:' || department_id AS scope FROM new_rows UNION ALL SELECT 'principal', 'u:' || user_id FROM new_rows WHERE user_id IS NOT NULL) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'employees' AS resource, 'd:' || department_id AS scope FROM old_rows UNION ALL SELECT 'principal', 'u:' || user_id FROM old_rows WHERE user_id IS NOT NULL) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'employees' AS resource, 'd:' || department_id AS scope FROM new_rows UNION ALL SELECT 'principal', 'u:' || user_id FROM new_rows WHERE user_id IS NOT NULL UNION SELECT 'employees' AS resource, 'd:' || department_id AS scope FROM old_rows UNION ALL SELECT 'principal', 'u:' || user_id FROM old_rows WHERE user_id IS NOT NULL) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_employees_insert ON employees",
+    ("CREATE TRIGGER trg_resource_versions_employees_insert AFTER INSERT ON employees "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_employees()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_employees_update ON employees",
+    ("CREATE TRIGGER trg_resource_versions_employees_update AFTER UPDATE ON employees "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_employees()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_employees_delete ON employees",
+    ("CREATE TRIGGER trg_resource_versions_employees_delete AFTER DELETE ON employees "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_employees()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_roles() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'roles' AS resource, 'd:' || department_id AS scope FROM new_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'roles' AS resource, 'd:' || department_id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'roles' AS resource, 'd:' || department_id AS scope FROM new_rows UNION SELECT 'roles' AS resource, 'd:' || department_id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_roles_insert ON roles",
+    ("CREATE TRIGGER trg_resource_versions_roles_insert AFTER INSERT ON roles "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_roles()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_roles_update ON roles",
+    ("CREATE TRIGGER trg_resource_versions_roles_update AFTER UPDATE ON roles "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_roles()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_roles_delete ON roles",
+    ("CREATE TRIGGER trg_resource_versions_roles_delete AFTER DELETE ON roles "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_roles()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_shifts() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'shifts' AS resource, 'd:' || ro.department_id AS scope FROM new_rows r JOIN roles ro ON ro.id = r.role_id) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'shifts' AS resource, 'd:' || ro.department_id AS scope FROM old_rows r JOIN roles ro ON ro.id = r.role_id) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'shifts' AS resource, 'd:' || ro.department_id AS scope FROM new_rows r JOIN roles ro ON ro.id = r.role_id UNION SELECT 'shifts' AS resource, 'd:' || ro.department_id AS scope FROM old_rows r JOIN roles ro ON ro.id = r.role_id) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_shifts_insert ON shifts",
+    ("CREATE TRIGGER trg_resource_versions_shifts_insert AFTER INSERT ON shifts "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_shifts()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_shifts_update ON shifts",
+    ("CREATE TRIGGER trg_resource_versions_shifts_update AFTER UPDATE ON shifts "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_shifts()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_shifts_delete ON shifts",
+    ("CREATE TRIGGER trg_resource_versions_shifts_delete AFTER DELETE ON shifts "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_shifts()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_schedules() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'schedules' AS resource, 'd:' || department_id AS scope FROM new_rows UNION ALL SELECT 'schedules', 'e:' || employee_id FROM new_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'schedules' AS resource, 'd:' || department_id AS scope FROM old_rows UNION ALL SELECT 'schedules', 'e:' || employee_id FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'schedules' AS resource, 'd:' || department_id AS scope FROM new_rows UNION ALL SELECT 'schedules', 'e:' || employee_id FROM new_rows UNION SELECT 'schedules' AS resource, 'd:' || department_id AS scope FROM old_rows UNION ALL SELECT 'schedules', 'e:' || employee_id FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_schedules_insert ON schedules",
+    ("CREATE TRIGGER trg_resource_versions_schedules_insert AFTER INSERT ON schedules "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_schedules()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_schedules_update ON schedules",
+    ("CREATE TRIGGER trg_resource_versions_schedules_update AFTER UPDATE ON schedules "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_schedules()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_schedules_delete ON schedules",
+    ("CREATE TRIGGER trg_resource_versions_schedules_delete AFTER DELETE ON schedules "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_schedules()"),
+    """
+    CREATE OR REPLACE FUNCTION bump_resource_versions_notifications() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'notifications' AS resource, 'u:' || user_id AS scope FROM new_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'notifications' AS resource, 'u:' || user_id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        ELSE
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM (SELECT 'notifications' AS resource, 'u:' || user_id AS scope FROM new_rows UNION SELECT 'notifications' AS resource, 'u:' || user_id AS scope FROM old_rows) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_resource_versions_notifications_insert ON notifications",
+    ("CREATE TRIGGER trg_resource_versions_notifications_insert AFTER INSERT ON notifications "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_notifications()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_notifications_update ON notifications",
+    ("CREATE TRIGGER trg_resource_versions_notifications_update AFTER UPDATE ON notifications "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_notifications()"),
+    "DROP TRIGGER IF EXISTS trg_resource_versions_notifications_delete ON notifications",
+    ("CREATE TRIGGER trg_resource_versions_notifications_delete AFTER DELETE ON notifications "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION bump_resource_versions_notifications()"),
+]
+
+DOWNGRADE_DDL = [
+    "DROP FUNCTION IF EXISTS bump_resource_versions_departments() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_resource_versions_users() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_resource_versions_managers() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_resource_versions_employees() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_resource_versions_roles() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_resource_versions_shifts() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_resource_versions_schedules() CASCADE",
+    "DROP FUNCTION IF EXISTS bump_resource_versions_notifications() CASCADE",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('resource_versions',
+    sa.Column('resource', sa.String(length=30), nullable=False),
+    sa.Column('scope', sa.String(length=30), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('resource', 'scope')
+    )
+    for statement in UPGRADE_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for statement in DOWNGRADE_DDL:
+        op.execute(statement)
+    op.drop_table('resource_versions')
@@ -0,0 +1,124 @@
+"""principal changes
+
+Statement-level triggers on users, managers and employees that pg_notify
+the changed user ids, so every worker drops them from its principal
+cache when the transaction commits.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Trigger DDL as of this revision, kept verbatim: the app.models helpers may change later
+UPGRADE_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION notify_principal_changes_users() RETURNS trigger AS $$
+    DECLARE
+        ids text;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN SELECT string_agg(DISTINCT id::text, ',') INTO ids FROM (SELECT id FROM new_rows) changed;
+        ELSIF TG_OP = 'DELETE' THEN SELECT string_agg(DISTINCT id::text, ',') INTO ids FROM (SELECT id FROM old_rows) changed;
+        ELSE SELECT string_agg(DISTINCT id::text, ',') INTO ids FROM (SELECT id FROM new_rows UNION SELECT id FROM old_rows) changed;
+        END IF;
+        IF ids IS NOT NULL THEN
+            PERFORM pg_notify('principal_changes', CASE WHEN length(ids) > 7000 THEN '*' ELSE ids END);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_principal_changes_users_insert ON users",
+    ("CREATE TRIGGER trg_principal_changes_users_insert AFTER INSERT ON users "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_users()"),
+    "DROP TRIGGER IF EXISTS trg_principal_changes_users_update ON users",
+    ("CREATE TRIGGER trg_principal_changes_users_update AFTER UPDATE ON users "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_users()"),
+    "DROP TRIGGER IF EXISTS trg_principal_changes_users_delete ON users",
+    ("CREATE TRIGGER trg_principal_changes_users_delete AFTER DELETE ON users "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_users()"),
+    """
+    CREATE OR REPLACE FUNCTION notify_principal_changes_managers() RETURNS trigger AS $$
+    DECLARE
+        ids text;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN SELECT string_agg(DISTINCT user_id::text, ',') INTO ids FROM (SELECT user_id FROM new_rows) changed;
+        ELSIF TG_OP = 'DELETE' THEN SELECT string_agg(DISTINCT user_id::text, ',') INTO ids FROM (SELECT user_id FROM old_rows) changed;
+        ELSE SELECT string_agg(DISTINCT user_id::text, ',') INTO ids FROM (SELECT user_id FROM new_rows UNION SELECT user_id FROM old_rows) changed;
+        END IF;
+        IF ids IS NOT NULL THEN
+            PERFORM pg_notify('principal_changes', CASE WHEN length(ids) > 7000 THEN '*' ELSE ids END);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_principal_changes_managers_insert ON managers",
+    ("CREATE TRIGGER trg_principal_changes_managers_insert AFTER INSERT ON managers "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_managers()"),
+    "DROP TRIGGER IF EXISTS trg_principal_changes_managers_update ON managers",
+    ("CREATE TRIGGER trg_principal_changes_managers_update AFTER UPDATE ON managers "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_managers()"),
+    "DROP TRIGGER IF EXISTS trg_principal_changes_managers_delete ON managers",
+    ("CREATE TRIGGER trg_principal_changes_managers_delete AFTER DELETE ON managers "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_managers()"),
+    """
+    CREATE OR REPLACE FUNCTION notify_principal_changes_employees() RETURNS trigger AS $$
+    DECLARE
+        ids text;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN SELECT string_agg(DISTINCT user_id::text, ',') INTO ids FROM (SELECT user_id FROM new_rows) changed;
+        ELSIF TG_OP = 'DELETE' THEN SELECT string_agg(DISTINCT user_id::text, ',') INTO ids FROM (SELECT user_id FROM old_rows) changed;
+        ELSE SELECT string_agg(DISTINCT user_id::text, ',') INTO ids FROM (SELECT user_id FROM new_rows UNION SELECT user_id FROM old_rows) changed;
+        END IF;
+        IF ids IS NOT NULL THEN
+            PERFORM pg_notify('principal_changes', CASE WHEN length(ids) > 7000 THEN '*' ELSE ids END);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_principal_changes_employees_insert ON employees",
+    ("CREATE TRIGGER trg_principal_changes_employees_insert AFTER INSERT ON employees "
+     "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_employees()"),
+    "DROP TRIGGER IF EXISTS trg_principal_changes_employees_update ON employees",
+    ("CREATE TRIGGER trg_principal_changes_employees_update AFTER UPDATE ON employees "
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_employees()"),
+    "DROP TRIGGER IF EXISTS trg_principal_changes_employees_delete ON employees",
+    ("CREATE TRIGGER trg_principal_changes_employees_delete AFTER DELETE ON employees "
+     "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+     "EXECUTE FUNCTION notify_principal_changes_employees()"),
+]
+
+DOWNGRADE_DDL = [
+    "DROP FUNCTION IF EXISTS notify_principal_changes_users() CASCADE",
+    "DROP FUNCTION IF EXISTS notify_principal_changes_managers() CASCADE",
+    "DROP FUNCTION IF EXISTS notify_principal_changes_employees() CASCADE",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for statement in UPGRADE_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for statement in DOWNGRADE_DDL:
+        op.execute(statement)
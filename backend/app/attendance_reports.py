@@ -0,0 +1,478 @@
+"""
+Attendance Report Renderers
+
+Each renderer turns a ReportData (app/report_data.py) into an ExcelReport
+(app/excel_export.py). Renderers only read ReportData - no database access -
+so they run in a worker thread via build_report().
+
+The same reports are also available as flat tables (build_table) with typed
+values - dates, numbers, booleans, None for empty - for the CSV and Parquet
+exports (app/table_export.py).
+"""
+
+import calendar
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.excel_export import ExcelReport, ReportStyle
+from app.excel_translations import get_excel_translation, get_headers_translated
+from app.report_data import ReportData, ScheduleRow, LeaveDay
+from app.table_export import TableExport
+
+
+LEAVE_SCHEDULE_STATUSES = ('leave', 'leave_half_morning', 'leave_half_afternoon', 'comp_off_taken')
+YES = '✓ Yes'
+
+
+def _period_label(data: ReportData) -> str:
+    return f"{calendar.month_name[data.start_date.month]} {data.start_date.year}"
+
+
+def _shift_label(schedule: Optional[ScheduleRow], separator: str = " - ") -> str:
+    if schedule and schedule.start_time and schedule.end_time:
+        return f"{schedule.start_time}{separator}{schedule.end_time}"
+    return '-'
+
+
+def _shift_hours(schedule: Optional[ScheduleRow]) -> Optional[float]:
+    """Length of the assigned shift in hours (overnight shifts wrap)"""
+    return schedule.hours if schedule else None
+
+
+def _assigned_hours(schedule: Optional[ScheduleRow]) -> str:
+    """Length of the assigned shift as '8.00'"""
+    hours = _shift_hours(schedule)
+    return '-' if hours is None else f"{hours:.2f}"
+
+
+def _leave_status(schedule: Optional[ScheduleRow], leave: Optional[LeaveDay]) -> str:
+    """Leave column of the monthly report - schedule status wins over the request"""
+    if schedule and schedule.status in LEAVE_SCHEDULE_STATUSES:
+        if schedule.status == 'leave_half_morning':
+            return "LEAVE - Half Day AM (0.5)"
+        if schedule.status == 'leave_half_afternoon':
+            return "LEAVE - Half Day PM (0.5)"
+        if schedule.status == 'comp_off_taken':
+            return "COMP_OFF - Full Day (1.0)"
+        return "LEAVE - Full Day (1.0)"
+    if leave:
+        if leave.duration_type == 'half_day_morning':
+            return f"{leave.leave_type.upper()} - Half Day AM (0.5)"
+        if leave.duration_type == 'half_day_afternoon':
+            return f"{leave.leave_type.upper()} - Half Day PM (0.5)"
+        return f"{leave.leave_type.upper()} - Full Day (1.0)"
+    return '-'
+
+
+def _short_leave_status(schedule: Optional[ScheduleRow], leave: Optional[LeaveDay]) -> str:
+    """Leave/Comp-Off column of the comprehensive report"""
+    if schedule and schedule.status in LEAVE_SCHEDULE_STATUSES:
+        return {
+            'leave_half_morning': "LEAVE-AM",
+            'leave_half_afternoon': "LEAVE-PM",
+            'comp_off_taken': "COMP-OFF"
+        }.get(schedule.status, "LEAVE")
+    if leave:
+        return f"{leave.leave_type}-Half" if 'half' in leave.duration_type else leave.leave_type
+    return '-'
+
+
+def _hours(value) -> str:
+    return f"{value:.2f}" if value else '-'
+
+
+def _summary_rows(sheet, title_key: str, items, language: str, merged: bool = False):
+    """Blue section header followed by label/value rows"""
+    title = get_excel_translation(title_key, language)
+    if merged:
+        sheet.merged(title, ReportStyle.SECTION, 2, fill_style=ReportStyle.SECTION_FILL)
+    else:
+        sheet.append([title, None], [ReportStyle.SECTION, ReportStyle.SECTION_FILL])
+    for label, value in items:
+        if label:
+            sheet.append([label, value], [ReportStyle.LABEL, ReportStyle.VALUE])
+        else:  # Spacer row
+            sheet.append([label, value], [ReportStyle.BOXED, None])
+
+
+def _daily_rows(data: ReportData, leave_column: bool):
+    """Employee-day rows of the monthly / weekly details sheet"""
+    for record in data.attendance:
+        employee = data.employees_by_id.get(record.employee_id)
+        if not employee:
+            continue
+        key = (record.employee_id, record.date)
+        schedule = data.schedules.get(key)
+        row = [
+            employee.employee_id,
+            f"{employee.first_name} {employee.last_name}",
+            record.date.isoformat()
+        ]
+        if leave_column:
+            row.append(_leave_status(schedule, data.leave_days.get(key)))
+        row += [
+            _shift_label(schedule),
+            _assigned_hours(schedule),
+            record.in_time or '-',
+            record.out_time or '-',
+            _hours(record.worked_hours),
+            f"{record.break_minutes}" if record.break_minutes else '-',
+            _hours(record.overtime_hours),
+            record.status or '-',
+            YES if key in data.comp_off_earned else '-',
+            YES if key in data.comp_off_used else '-'
+        ]
+        yield row
+
+
+def _details_headers(language: str, leave_column: bool):
+    keys = ['employee_id', 'name', 'date'] + (['leave_status'] if leave_column else []) + [
+        'assigned_shift', 'total_hrs_assigned', 'check_in', 'check_out', 'total_hrs_worked',
+        'break_time', 'overtime_hours', 'status', 'comp_off_earned', 'comp_off_used'
+    ]
+    return [get_excel_translation(key, language) for key in keys]
+
+
+def render_monthly_report(data: ReportData, language: str = 'en') -> ExcelReport:
+    """Department month: summary with day counts and holidays + one row per attendance record"""
+    report = ExcelReport()
+    totals, days = data.totals, data.days
+
+    summary_ws = report.sheet("Summary", widths=[35, 20])
+    summary_ws.merged(f"{data.title} - {get_excel_translation('monthly_attendance_summary', language)}", ReportStyle.TITLE, 2)
+    summary_ws.merged(_period_label(data), ReportStyle.SUBTITLE, 2)
+    summary_ws.blank()
+    _summary_rows(summary_ws, 'department_statistics', [
+        (get_excel_translation('total_days_in_month', language), days['total_days']),
+        (get_excel_translation('public_holidays', language), days['public_holidays']),
+        (get_excel_translation('weekends', language), days['weekends']),
+        (get_excel_translation('total_non_working_days', language), days['public_holidays'] + days['weekends']),
+        (get_excel_translation('working_days_available', language), days['working_days_available']),
+        (get_excel_translation('working_days_completed', language), totals['days_worked']),
+        ('', ''),
+        (get_excel_translation('total_working_hours_all', language), f"{totals['worked_hours']:.2f}"),
+        (get_excel_translation('total_overtime_hours_all', language), f"{totals['overtime_hours']:.2f}"),
+    ], language)
+
+    # Holiday Details
+    summary_ws.blank()
+    summary_ws.merged(
+        get_excel_translation('public_holidays_in_month', language), ReportStyle.SECTION, 2,
+        fill_style=ReportStyle.SECTION_FILL
+    )
+    for holiday_date, holiday_name in data.holidays.items():
+        summary_ws.append([holiday_date.isoformat(), holiday_name], ReportStyle.BOXED)
+
+    # Employee ID, Name, Date, Leave Status, Assigned Shift, Total Hrs Assigned, Check-In,
+    # Check-Out, Total Hrs Worked, Break Time, Overtime Hours, Status, Comp-Off Earned / Used
+    ws = report.sheet(
+        get_excel_translation('attendance_details', language),
+        widths=[13, 22, 14, 30, 18, 16, 12, 12, 16, 12, 16, 12, 15, 15]
+    )
+    ws.merged(f"{data.title} - {get_excel_translation('monthly_attendance_report', language)}", ReportStyle.TITLE, 14)
+    ws.merged(
+        f"{_period_label(data)} | {get_excel_translation('total_employees', language)}: {len(data.employees)}",
+        ReportStyle.SUBTITLE, 14
+    )
+    ws.blank()
+    ws.append(_details_headers(language, leave_column=True), ReportStyle.HEADER)
+    for row in _daily_rows(data, leave_column=True):
+        ws.data_row(row, text_columns=(2, 4, 5, 6))
+    return report
+
+
+def render_weekly_report(data: ReportData, language: str = 'en') -> ExcelReport:
+    """Department date range: summary totals + one row per attendance record"""
+    report = ExcelReport()
+    totals = data.totals
+    period = f"{data.start_date.isoformat()} to {data.end_date.isoformat()}"
+
+    summary_ws = report.sheet("Summary", widths=[35, 20])
+    summary_ws.merged(f"{data.title} - {get_excel_translation('weekly_attendance_summary', language)}", ReportStyle.TITLE, 2)
+    summary_ws.merged(period, ReportStyle.SUBTITLE, 2)
+    summary_ws.blank()
+    _summary_rows(summary_ws, 'weekly_statistics', [
+        (get_excel_translation('total_employees', language), len(data.employees)),
+        (get_excel_translation('employees_present', language), totals['days_worked']),
+        (get_excel_translation('total_working_hours_all', language), f"{totals['worked_hours']:.2f}"),
+        (get_excel_translation('total_overtime_hours_all', language), f"{totals['overtime_hours']:.2f}"),
+    ], language)
+
+    ws = report.sheet(
+        get_excel_translation('attendance_details', language),
+        widths=[13, 22, 14, 18, 16, 12, 12, 16, 12, 16, 12, 15, 15]
+    )
+    ws.merged(f"{data.title} - {get_excel_translation('weekly_attendance_report', language)}", ReportStyle.TITLE, 13)
+    ws.merged(
+        f"{period} | {get_excel_translation('total_employees', language)}: {len(data.employees)}",
+        ReportStyle.SUBTITLE, 13
+    )
+    ws.blank()
+    ws.append(_details_headers(language, leave_column=False), ReportStyle.HEADER)
+    for row in _daily_rows(data, leave_column=False):
+        ws.data_row(row, text_columns=(2, 4, 5))
+    return report
+
+
+def _comprehensive_times(data: ReportData, key) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Check-in, check-out and status of an employee-day: attendance first, else the raw check-in"""
+    att_rec = data.attendance_by_key.get(key)
+    checkin = data.checkins.get(key)
+
+    check_in_time = check_out_time = None
+    if att_rec:
+        check_in_time = att_rec.in_time
+        check_out_time = att_rec.out_time
+    elif checkin:
+        check_in_time = checkin.check_in_time.strftime('%H:%M') if checkin.check_in_time else None
+        check_out_time = checkin.check_out_time.strftime('%H:%M') if checkin.check_out_time else None
+
+    status_val = None
+    if att_rec and att_rec.status:
+        status_val = att_rec.status
+    elif checkin and checkin.check_in_status:
+        status_val = checkin.check_in_status
+    return check_in_time, check_out_time, status_val
+
+
+def comprehensive_rows(data: ReportData, employee):
+    """One row per day of the period for an employee (comprehensive report)"""
+    for day in data.dates:
+        key = (employee.id, day)
+        att_rec = data.attendance_by_key.get(key)
+        schedule = data.schedules.get(key)
+        check_in_time, check_out_time, status_val = _comprehensive_times(data, key)
+
+        yield [
+            day.isoformat(),
+            day.strftime('%A')[:3],
+            _shift_label(schedule, separator="-"),
+            check_in_time or '-',
+            check_out_time or '-',
+            _hours(att_rec.worked_hours) if att_rec else '-',
+            str(att_rec.break_minutes) if att_rec and att_rec.break_minutes else '-',
+            f"{att_rec.overtime_hours:.2f}" if att_rec and att_rec.overtime_hours and att_rec.overtime_hours > 0 else '-',
+            status_val or '-',
+            _short_leave_status(schedule, data.leave_days.get(key)),
+            att_rec.notes if att_rec and att_rec.notes else ''
+        ]
+
+
+def render_comprehensive_report(data: ReportData, language: str = 'en') -> ExcelReport:
+    """Department month: every day of the month for every employee, grouped by employee"""
+    report = ExcelReport()
+
+    summary_ws = report.sheet("Summary", widths=[25, 15, 20, 20])
+    summary_ws.merged(f"{data.title} - Monthly Attendance Summary", ReportStyle.TITLE, 4)
+    summary_ws.merged(_period_label(data), ReportStyle.HEADING, 4)
+    summary_ws.blank()
+    summary_ws.append(["Report Statistics:"], ReportStyle.BOLD)
+    for label, value in [
+        ("Total Employees", len(data.employees)),
+        ("Total Attendance Records", len(data.attendance)),
+        ("Month", _period_label(data)),
+    ]:
+        summary_ws.append([label, value], [ReportStyle.BOLD, ReportStyle.BOXED])
+
+    details_ws = report.sheet("All Employee Details", widths=[12, 5, 14, 12, 12, 12, 10, 10, 12, 14, 20])
+    details_ws.merged(f"{data.title} - Complete Monthly Attendance", ReportStyle.TITLE, 13)
+    details_ws.merged(_period_label(data), ReportStyle.BOLD, 13)
+    details_ws.blank()
+
+    headers = ['Date', 'Day', 'Shift Time', 'Check-In', 'Check-Out', 'Worked Hours', 'Break Min', 'Overtime', 'Status', 'Leave/Comp-Off', 'Notes']
+    row_styles = [ReportStyle.CELL] * 10 + [ReportStyle.TEXT]
+    for employee in data.employees:
+        details_ws.merged("EMPLOYEE DETAILS", ReportStyle.EMPLOYEE_HEADER, 13)
+        details_ws.merged(
+            f"ID: {employee.employee_id} | Name: {employee.first_name} {employee.last_name} | "
+            f"Email: {employee.email} | Phone: {employee.phone or 'N/A'}",
+            ReportStyle.NOTE, 13
+        )
+        details_ws.append(headers, ReportStyle.HEADER)
+        for row in comprehensive_rows(data, employee):
+            details_ws.append(row, row_styles)
+        details_ws.blank()
+    return report
+
+
+def render_employee_monthly_report(data: ReportData, language: str = 'en') -> ExcelReport:
+    """One employee's month: attendance, leave, comp-off and hours summary + daily rows"""
+    report = ExcelReport()
+    employee = data.employees[0]
+    totals, days = data.totals, data.days
+    leave = data.leave_totals(employee.id)
+    comp_off_earned = len(data.comp_off_earned)
+    comp_off_used = len(data.comp_off_used)
+
+    summary_sheet = report.sheet("Summary", widths=[30, 20])
+    summary_sheet.merged(f"{data.title} - {get_excel_translation('monthly_report', language)}", ReportStyle.TITLE, 2)
+    summary_sheet.merged(_period_label(data), ReportStyle.SUBTITLE, 2)
+    summary_sheet.append([f"{get_excel_translation('employee_id', language)}: {employee.employee_id}"], ReportStyle.NOTE)
+    summary_sheet.blank()
+
+    _summary_rows(summary_sheet, 'attendance_summary', [
+        (get_excel_translation('total_days_in_month', language), days['total_days']),
+        (get_excel_translation('public_holidays', language), days['public_holidays']),
+        (get_excel_translation('weekends', language), days['weekends']),
+        (get_excel_translation('total_non_working_days', language), days['public_holidays'] + days['weekends']),
+        (get_excel_translation('working_days_available', language), days['working_days_available']),
+        (get_excel_translation('working_days_worked', language), totals['days_worked']),
+    ], language, merged=True)
+    summary_sheet.blank()
+    _summary_rows(summary_sheet, 'leave_summary', [
+        (get_excel_translation('annual_paid_leave_entitlement', language), f'{employee.paid_leave_per_year}'),
+        (get_excel_translation('paid_leave_days_used', language), f"{leave['paid']:.1f}"),
+        (get_excel_translation('paid_leave_days_remaining', language), f"{max(0, employee.paid_leave_per_year - leave['paid']):.1f}"),
+        (get_excel_translation('unpaid_leave_days', language), f"{leave['unpaid']:.1f}"),
+        (get_excel_translation('total_leave_days', language), f"{leave['paid'] + leave['unpaid']:.1f}"),
+    ], language, merged=True)
+    summary_sheet.blank()
+    _summary_rows(summary_sheet, 'comp_off_summary', [
+        (get_excel_translation('comp_off_earned_days', language), f'{comp_off_earned}'),
+        (get_excel_translation('comp_off_used_days', language), f'{comp_off_used}'),
+        (get_excel_translation('comp_off_balance', language), f'{comp_off_earned - comp_off_used}'),
+    ], language, merged=True)
+    summary_sheet.blank()
+    _summary_rows(summary_sheet, 'hours_summary', [
+        (get_excel_translation('total_hours_worked', language), f"{totals['worked_hours']:.2f}"),
+        (get_excel_translation('total_overtime_hours', language), f"{totals['overtime_hours']:.2f}"),
+        (get_excel_translation('total_night_hours', language), f"{totals['night_hours']:.2f}"),
+    ], language, merged=True)
+
+    ws = report.sheet(
+        get_excel_translation('daily_attendance', language),
+        widths=[14, 14, 18, 12, 12, 14, 20, 12, 16, 12, 15, 15, 20]
+    )
+    ws.merged(f"{data.title} - {get_excel_translation('daily_attendance', language)}", ReportStyle.TITLE, 13)
+    ws.merged(_period_label(data), ReportStyle.SUBTITLE, 13)
+    ws.blank()
+    ws.append([get_excel_translation(key, language) for key in [
+        'date', 'day', 'assigned_shift', 'check_in', 'check_out', 'hours_worked', 'night_hours',
+        'break_minutes', 'overtime_hours', 'status', 'comp_off_earned', 'comp_off_used', 'notes'
+    ]], ReportStyle.HEADER)
+    for record, night_hours in zip(data.attendance, data.attendance.night_hours):
+        key = (record.employee_id, record.date)
+        ws.data_row([
+            record.date.isoformat(),
+            record.date.strftime('%A'),
+            _shift_label(data.schedules.get(key)),
+            record.in_time or '-',
+            record.out_time or '-',
+            _hours(record.worked_hours),
+            f"{night_hours:.2f}" if night_hours > 0 else '-',
+            f"{record.break_minutes}" if record.break_minutes else '-',
+            _hours(record.overtime_hours),
+            record.status or '-',
+            YES if key in data.comp_off_earned else '-',
+            YES if key in data.comp_off_used else '-',
+            record.notes or '-'
+        ], text_columns=(3, 4, 5, 6, 7, 8, 9, 13))
+    return report
+
+
+def _text(value: str) -> Optional[str]:
+    """'-' placeholders of the Excel reports -> None"""
+    return None if value == '-' else value
+
+
+def _number(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def monthly_table_rows(data: ReportData) -> Iterator[tuple]:
+    """Typed rows of the monthly / weekly details (get_headers_translated 'monthly')"""
+    for record in data.attendance:
+        employee = data.employees_by_id.get(record.employee_id)
+        if not employee:
+            continue
+        key = (record.employee_id, record.date)
+        schedule = data.schedules.get(key)
+        yield (
+            employee.employee_id,
+            f"{employee.first_name} {employee.last_name}",
+            record.date,
+            _text(_leave_status(schedule, data.leave_days.get(key))),
+            _text(_shift_label(schedule, separator="-")),
+            _shift_hours(schedule),
+            record.in_time,
+            record.out_time,
+            _number(record.worked_hours),
+            record.break_minutes,
+            _number(record.overtime_hours),
+            record.status,
+            key in data.comp_off_earned,
+            key in data.comp_off_used
+        )
+
+
+def comprehensive_table_rows(data: ReportData) -> Iterator[tuple]:
+    """Typed rows of the comprehensive report: every employee, every day (get_headers_translated 'comprehensive')"""
+    for employee in data.employees:
+        name = f"{employee.first_name} {employee.last_name}"
+        for day in data.dates:
+            key = (employee.id, day)
+            att_rec = data.attendance_by_key.get(key)
+            schedule = data.schedules.get(key)
+            check_in_time, check_out_time, status_val = _comprehensive_times(data, key)
+            yield (
+                employee.employee_id,
+                name,
+                day,
+                day.strftime('%A')[:3],
+                _text(_shift_label(schedule, separator="-")),
+                check_in_time,
+                check_out_time,
+                _number(att_rec.worked_hours) if att_rec else None,
+                att_rec.break_minutes if att_rec else None,
+                _number(att_rec.overtime_hours) if att_rec else None,
+                status_val,
+                _text(_short_leave_status(schedule, data.leave_days.get(key))),
+                att_rec.notes if att_rec and att_rec.notes else None
+            )
+
+
+def employee_table_rows(data: ReportData) -> Iterator[tuple]:
+    """Typed rows of an employee's month (get_headers_translated 'employee')"""
+    for record, night_hours in zip(data.attendance, data.attendance.night_hours):
+        yield (
+            record.date,
+            _text(_shift_label(data.schedules.get((record.employee_id, record.date)), separator="-")),
+            record.in_time,
+            record.out_time,
+            _number(record.worked_hours),
+            float(night_hours),
+            record.break_minutes,
+            _number(record.overtime_hours),
+            record.status
+        )
+
+
+# Report name -> renderer
+REPORT_RENDERERS: Dict[str, Callable[[ReportData, str], ExcelReport]] = {
+    "monthly": render_monthly_report,
+    "comprehensive": render_comprehensive_report,
+    "weekly": render_weekly_report,
+    "employee_monthly": render_employee_monthly_report,
+}
+
+
+async def build_report(name: str, data: ReportData, language: str = 'en') -> ExcelReport:
+    """Render report `name` in a worker thread"""
+    return await run_in_threadpool(REPORT_RENDERERS[name], data, language)
+
+
+# Report name -> (get_headers_translated report type, typed row generator)
+REPORT_TABLES: Dict[str, Tuple[str, Callable[[ReportData], Iterator[tuple]]]] = {
+    "monthly": ("monthly", monthly_table_rows),
+    "comprehensive": ("comprehensive", comprehensive_table_rows),
+    "weekly": ("monthly", monthly_table_rows),
+    "employee_monthly": ("employee", employee_table_rows),
+}
+
+
+def build_table(name: str, data: ReportData, language: str = 'en') -> TableExport:
+    """Report `name` as a table; rows are generated lazily while writing"""
+    header_type, rows = REPORT_TABLES[name]
+    columns = list(get_headers_translated(language, header_type).items())
+    return TableExport(columns, rows(data))
@@ -0,0 +1,347 @@
+"""
+Attendance Month Snapshots
+
+Closing a department's month (POST /admin/attendance/close-month) computes
+its attendance aggregates once - per employee and for the department:
+worked / night / overtime hours, break minutes, on-time and late counts,
+leave days and comp-off earned / used - and stores them in
+employee_month_snapshots and department_month_snapshots. Reports over
+closed months then read one row per employee and month instead of every
+attendance row, so a year-over-year view costs O(employees), not O(records).
+
+A close records the month's export_data_versions counter. Any later write
+to the month (a late correction) moves the counter on, and the snapshot is
+ignored - readers fall back to the live rows - until the month is closed
+again. Reopening a month deletes its snapshots.
+
+The attendance exports (app/report_data.py) do not read snapshots: they
+render one row per attendance record and day, which only the live rows
+hold. A snapshot is current only while the month's counter is unchanged,
+and the export cache is keyed on that same counter. So for a closed month,
+an export shows exactly the rows the snapshot was computed from. After a
+late correction, both show the corrected rows. Closing a month does not
+freeze exports, just as it does not freeze /attendance/summary.
+"""
+
+import calendar
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, Integer, and_, column, delete, func, or_, select, true, tuple_, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import (
+    Attendance, AttendancePeriodClose, Department, DepartmentMonthSnapshot, Employee,
+    EmployeeMonthSnapshot, ExportDataVersion
+)
+from app.report_data import LATE_STATUSES, ReportData, load_department_report
+
+
+AGGREGATE_FIELDS = (
+    "records", "days_worked", "worked_hours", "night_hours", "overtime_hours", "break_minutes",
+    "on_time_count", "late_count", "paid_leave_days", "unpaid_leave_days", "comp_off_earned", "comp_off_used"
+)
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """First and last day of the month"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _empty_aggregates() -> Dict:
+    return {field: 0 for field in AGGREGATE_FIELDS}
+
+
+def employee_aggregates(data: ReportData) -> Dict[int, Dict]:
+    """
+    Month aggregates per employee id of everyone with attendance, leave or
+    comp-off in the period (leave days within the period, half days 0.5)
+    """
+    aggregates = {
+        employee_id: {**_empty_aggregates(), **row} for employee_id, row in data.attendance.per_employee().items()
+    }
+    for (employee_id, _), leave in data.leave_days.items():
+        row = aggregates.setdefault(employee_id, _empty_aggregates())
+        days = 0.5 if leave.duration_type.startswith('half_day') else 1.0
+        if leave.leave_type.lower() == 'paid':
+            row["paid_leave_days"] += days
+        else:
+            row["unpaid_leave_days"] += days
+    for field, keys in (("comp_off_earned", data.comp_off_earned), ("comp_off_used", data.comp_off_used)):
+        for employee_id, _ in keys:
+            aggregates.setdefault(employee_id, _empty_aggregates())[field] += 1
+    return aggregates
+
+
+def department_aggregates(employees: Dict[int, Dict]) -> Dict:
+    """Sum of the employee aggregates plus the number of employees"""
+    totals = _empty_aggregates()
+    for row in employees.values():
+        for field in AGGREGATE_FIELDS:
+            totals[field] += row[field]
+    totals["employees"] = len(employees)
+    return totals
+
+
+async def compute_month(db: AsyncSession, department: Department, year: int, month: int) -> Tuple[Dict[int, Dict], Dict]:
+    """Live (employee aggregates, department totals) of a department month"""
+    start_date, end_date = month_bounds(year, month)
+    data = await load_department_report(db, department, start_date, end_date, active_only=False)
+    employees = employee_aggregates(data)
+    return employees, department_aggregates(employees)
+
+
+async def current_data_version(db: AsyncSession, department_id: int, period: date) -> int:
+    result = await db.execute(
+        select(ExportDataVersion.version).filter(
+            ExportDataVersion.department_id == department_id,
+            ExportDataVersion.period == period
+        )
+    )
+    return result.scalar() or 0
+
+
+async def close_month(
+    db: AsyncSession,
+    department: Department,
+    year: int,
+    month: int,
+    closed_by: Optional[int]
+) -> Dict:
+    """
+    Compute and store the department's snapshots for the month, replacing a
+    previous close. The caller commits.
+    """
+    period = date(year, month, 1)
+    # Read before the data: a write landing in between leaves the snapshot
+    # marked stale rather than silently missing it
+    data_version = await current_data_version(db, department.id, period)
+    employees, totals = await compute_month(db, department, year, month)
+
+    # Snapshots go with the close row (ON DELETE CASCADE)
+    await db.execute(delete(AttendancePeriodClose).filter(
+        AttendancePeriodClose.department_id == department.id,
+        AttendancePeriodClose.period == period
+    ))
+    db.add(AttendancePeriodClose(
+        department_id=department.id,
+        period=period,
+        data_version=data_version,
+        closed_at=datetime.utcnow(),
+        closed_by=closed_by
+    ))
+    await db.flush()
+    db.add_all([
+        EmployeeMonthSnapshot(department_id=department.id, period=period, employee_id=employee_id, **row)
+        for employee_id, row in employees.items()
+    ])
+    db.add(DepartmentMonthSnapshot(department_id=department.id, period=period, **totals))
+    await db.flush()
+    return {
+        "department_id": department.id,
+        "period": period.isoformat(),
+        "data_version": data_version,
+        "employees": len(employees),
+        "totals": _rounded(totals)
+    }
+
+
+async def reopen_month(db: AsyncSession, department_id: int, year: int, month: int) -> bool:
+    """Delete the month's close and snapshots; False if it was not closed. The caller commits."""
+    result = await db.execute(delete(AttendancePeriodClose).filter(
+        AttendancePeriodClose.department_id == department_id,
+        AttendancePeriodClose.period == date(year, month, 1)
+    ))
+    return result.rowcount > 0
+
+
+def fresh_closes(start_date: date, end_date: date):
+    """
+    SELECT of (department_id, period) of the closed months lying wholly in
+    the range whose snapshots are still current
+    """
+    after_range = (end_date + timedelta(days=1)).replace(day=1)
+    return (
+        select(AttendancePeriodClose.department_id, AttendancePeriodClose.period)
+        .outerjoin(ExportDataVersion, and_(
+            ExportDataVersion.department_id == AttendancePeriodClose.department_id,
+            ExportDataVersion.period == AttendancePeriodClose.period
+        ))
+        .filter(
+            AttendancePeriodClose.period >= start_date,
+            AttendancePeriodClose.period < after_range,
+            AttendancePeriodClose.data_version == func.coalesce(ExportDataVersion.version, 0)
+        )
+    )
+
+
+def _next_month(period: date) -> date:
+    return (period + timedelta(days=32)).replace(day=1)
+
+
+def _stats_columns(records, worked_hours, overtime_hours, on_time_count, late_count) -> list:
+    return [records, worked_hours, overtime_hours, on_time_count, late_count]
+
+
+async def attendance_period_stats(db: AsyncSession, start_date: date, end_date: date, employee_filter=None) -> Dict[int, Dict]:
+    """
+    Attendance rows, worked / overtime hours and on-time / late counts per
+    employee id over the range, for employees matching employee_filter (an
+    Employee clause, None for everyone).
+
+    Months with a current snapshot are read from it: the attendance table is
+    only range-scanned for the other months, plus index lookups of covered
+    months for employees without a snapshot row there (e.g. moved from a
+    department that is not closed).
+    """
+    fresh_result = await db.execute(fresh_closes(start_date, end_date))
+    fresh_pairs = [tuple(row) for row in fresh_result.all()]
+    covered_periods = sorted({period for _, period in fresh_pairs})
+    employee_ids = select(Employee.id).filter(employee_filter) if employee_filter is not None else None
+
+    attendance_columns = _stats_columns(
+        func.count(Attendance.id),
+        func.coalesce(func.sum(Attendance.worked_hours), 0.0),
+        func.coalesce(func.sum(Attendance.overtime_hours), 0.0),
+        func.count(Attendance.id).filter(Attendance.status == 'onTime'),
+        func.count(Attendance.id).filter(Attendance.status.in_(LATE_STATUSES))
+    )
+    queries = []
+
+    # Open months: contiguous date intervals between the covered months
+    intervals = []
+    day = start_date
+    for period in covered_periods:
+        if day < period:
+            intervals.append((day, period - timedelta(days=1)))
+        day = _next_month(period)
+    if day <= end_date:
+        intervals.append((day, end_date))
+    if intervals:
+        query = (
+            select(Attendance.employee_id, *attendance_columns)
+            .filter(or_(*(Attendance.date.between(first, last) for first, last in intervals)))
+            .group_by(Attendance.employee_id)
+        )
+        if employee_ids is not None:
+            query = query.filter(Attendance.employee_id.in_(employee_ids))
+        queries.append(query)
+
+    if covered_periods:
+        in_fresh = tuple_(EmployeeMonthSnapshot.department_id, EmployeeMonthSnapshot.period).in_(fresh_pairs)
+        query = (
+            select(
+                EmployeeMonthSnapshot.employee_id,
+                *_stats_columns(
+                    func.sum(EmployeeMonthSnapshot.records),
+                    func.sum(EmployeeMonthSnapshot.worked_hours),
+                    func.sum(EmployeeMonthSnapshot.overtime_hours),
+                    func.sum(EmployeeMonthSnapshot.on_time_count),
+                    func.sum(EmployeeMonthSnapshot.late_count)
+                )
+            )
+            .filter(in_fresh, EmployeeMonthSnapshot.records > 0)
+            .group_by(EmployeeMonthSnapshot.employee_id)
+        )
+        if employee_ids is not None:
+            query = query.filter(EmployeeMonthSnapshot.employee_id.in_(employee_ids))
+        queries.append(query)
+
+        months = values(
+            column("period", Date), column("period_end", Date), name="covered_months"
+        ).data([(period, _next_month(period)) for period in covered_periods])
+        uncovered_query = (
+            select(Employee.id, months.c.period, months.c.period_end)
+            .select_from(Employee)
+            .join(months, true())
+            .filter(~(
+                select(EmployeeMonthSnapshot.employee_id)
+                .filter(
+                    EmployeeMonthSnapshot.employee_id == Employee.id,
+                    EmployeeMonthSnapshot.period == months.c.period,
+                    in_fresh
+                )
+                .exists()
+            ))
+        )
+        if employee_filter is not None:
+            uncovered_query = uncovered_query.filter(employee_filter)
+        # Fetched first: given the exact pairs the planner probes the
+        # (employee_id, date) index instead of scanning the covered months
+        uncovered_pairs = [tuple(row) for row in (await db.execute(uncovered_query)).all()]
+        if uncovered_pairs:
+            uncovered = values(
+                column("employee_id", Integer), column("period", Date), column("period_end", Date),
+                name="uncovered_months"
+            ).data(uncovered_pairs)
+            queries.append(
+                select(Attendance.employee_id, *attendance_columns)
+                .select_from(uncovered)
+                .join(Attendance, and_(
+                    Attendance.employee_id == uncovered.c.employee_id,
+                    Attendance.date >= uncovered.c.period,
+                    Attendance.date < uncovered.c.period_end
+                ))
+                .group_by(Attendance.employee_id)
+            )
+
+    stats: Dict[int, Dict] = {}
+    for query in queries:
+        result = await db.execute(query)
+        for employee_id, records, worked, overtime, on_time, late in result.all():
+            row = stats.setdefault(employee_id, {
+                "records": 0, "worked_hours": 0.0, "overtime_hours": 0.0, "on_time_count": 0, "late_count": 0
+            })
+            row["records"] += int(records)
+            row["worked_hours"] += float(worked)
+            row["overtime_hours"] += float(overtime or 0)
+            row["on_time_count"] += int(on_time)
+            row["late_count"] += int(late)
+    return stats
+
+
+async def department_month_totals(db: AsyncSession, department: Department, start_year: int, end_year: int) -> List[Dict]:
+    """
+    Department totals of every month of the years, up to the current month:
+    from the snapshot where the month is closed and current, otherwise
+    computed from the live rows
+    """
+    first = date(start_year, 1, 1)
+    last = min(date(end_year, 12, 31), date.today())
+    fresh = fresh_closes(first, last).filter(AttendancePeriodClose.department_id == department.id).subquery()
+    snapshot_result = await db.execute(
+        select(DepartmentMonthSnapshot).join(fresh, and_(
+            fresh.c.department_id == DepartmentMonthSnapshot.department_id,
+            fresh.c.period == DepartmentMonthSnapshot.period
+        ))
+    )
+    snapshots = {snapshot.period: snapshot for snapshot in snapshot_result.scalars().all()}
+    closed_result = await db.execute(
+        select(AttendancePeriodClose.period).filter(
+            AttendancePeriodClose.department_id == department.id,
+            AttendancePeriodClose.period >= first,
+            AttendancePeriodClose.period <= last
+        )
+    )
+    closed = set(closed_result.scalars().all())
+
+    months = []
+    period = first
+    while period <= last:
+        snapshot = snapshots.get(period)
+        if snapshot is not None:
+            totals = {field: getattr(snapshot, field) for field in AGGREGATE_FIELDS + ("employees",)}
+        else:
+            _, totals = await compute_month(db, department, period.year, period.month)
+        months.append({
+            "period": period.strftime("%Y-%m"),
+            "closed": period in closed,
+            "source": "snapshot" if snapshot is not None else "live",
+            **_rounded(totals)
+        })
+        period = (period + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def _rounded(totals: Dict) -> Dict:
+    return {field: round(value, 2) if isinstance(value, float) else value for field, value in totals.items()}
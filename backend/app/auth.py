@@ -2,34 +2,37 @@
 Authentication utilities
 """
 
+import hashlib
+import secrets
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.config import settings
-from app.database import get_db
-from app.models import User, UserType
+from app.database import async_session_maker, get_db
+from app.models import PunchDevice, User, UserType
+from app.password_hashing import pwd_context
+from app.principals import Principal, cached_principal
 from app.schemas import TokenData
 
-# Password hashing - use argon2 due to bcrypt/passlib compatibility issues
-pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
-
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Scope of the tokens that only open the notification stream
+STREAM_TOKEN_SCOPE = "notification_stream"
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (blocking: endpoints await password_hasher.verify)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
+    """Hash a password (blocking: endpoints await password_hasher.hash)"""
     return pwd_context.hash(password)
 
 
@@ -45,31 +48,73 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(
+async def get_current_principal(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-) -> User:
+) -> Principal:
+    """Authenticated user with their department and employee id (cached, see app/principals.py)"""
+    return await principal_from_token(token, db)
+
+
+async def get_current_user(principal: Principal = Depends(get_current_principal)) -> User:
     """Get current authenticated user"""
+    return principal.user
+
+
+async def principal_from_token(token: Optional[str], db: AsyncSession, scope: Optional[str] = None) -> Principal:
+    """
+    Resolve a token to its principal (401 if invalid). Access tokens carry no
+    scope; a scoped token (create_stream_token) is only accepted where that
+    scope is asked for
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+    if not token:
+        raise credentials_exception
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("scope") != scope:
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).filter(User.username == token_data.username))
-    user = result.scalar_one_or_none()
-    
-    if user is None:
+    principal = await cached_principal(db, token_data.username)
+    if principal is None:
         raise credentials_exception
+    return principal
+
+
+def create_stream_token(username: str) -> str:
+    """Short-lived token that only opens the notification stream"""
+    return create_access_token(
+        {"sub": username, "scope": STREAM_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=settings.NOTIFICATION_STREAM_TOKEN_SECONDS)
+    )
+
+
+async def get_stream_user(
+    authorization: Optional[str] = Header(None),
+    stream_token: Optional[str] = None
+) -> User:
+    """
+    Authenticate a long-lived stream. EventSource cannot set headers, so it
+    passes ?stream_token= from POST /notifications/stream-token instead of the
+    access token, which then never appears in URLs or access logs. Uses its
+    own short session so no connection is held while the stream is open
+    """
+    async with async_session_maker() as db:
+        if authorization and authorization.lower().startswith("bearer "):
+            user = (await principal_from_token(authorization[7:], db)).user
+        else:
+            user = (await principal_from_token(stream_token, db, scope=STREAM_TOKEN_SCOPE)).user
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
     return user
 
 
@@ -80,6 +125,13 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     return current_user
 
 
+async def get_principal(principal: Principal = Depends(get_current_principal)) -> Principal:
+    """Active principal: the user plus department_id / employee_id without further queries"""
+    if not principal.user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+
 async def require_admin(current_user: User = Depends(get_current_active_user)) -> User:
     """Require admin role"""
     if current_user.user_type != UserType.ADMIN:
@@ -108,3 +160,32 @@ async def require_employee(current_user: User = Depends(get_current_active_user)
             detail="Employee access required"
         )
     return current_user
+
+
+def generate_device_key() -> str:
+    """New random API key for a punch device"""
+    return secrets.token_urlsafe(32)
+
+
+def hash_device_key(api_key: str) -> str:
+    """Stored form of a device API key (random keys need no slow hash)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+async def require_device(
+    x_device_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+) -> PunchDevice:
+    """Require an active punch device (X-Device-Key header)"""
+    if not x_device_key:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Device key required")
+    result = await db.execute(
+        select(PunchDevice).filter(
+            PunchDevice.api_key_hash == hash_device_key(x_device_key),
+            PunchDevice.is_active.is_(True)
+        )
+    )
+    device = result.scalar_one_or_none()
+    if device is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid device key")
+    return device
@@ -0,0 +1,160 @@
+"""
+Conditional GET (ETag / 304)
+
+The polled list endpoints (/employees, /roles, /shifts, /departments,
+/schedules, /notifications, /calendar/holidays) send an ETag built from
+change counters rather than from a hash of the body, so an unchanged poll
+can be answered without building the body at all.
+
+An ETag names the counters it was computed from:
+
+    W/"<version>.<keys>.<digest>"
+
+keys are resource:scope pairs joined by '+' (e.g. 'schedules:d:3' or
+'shifts:d:*' for every department). version is the sum of those counters,
+and digest is an HMAC (SECRET_KEY) over the keys, the token subject and
+the request path and query. ConditionalGetMiddleware answers If-None-Match
+before routing: when the digest matches the request and the counters
+still add up to version, it returns 304 after one small SQL query. No user
+lookup, ORM query or response serialization happens on that path. Any
+other request goes through, and the endpoint calls set_etag. set_etag
+reads the counters before the data, so a write in between costs at most
+one extra full response.
+
+The counters live in resource_versions (migration 0009) and are bumped by
+triggers. 'principal:u:<id>' counts changes to the user's own user,
+manager and employee rows, so an ETag stops matching when what the user
+may see changes. LOCAL_VERSIONS holds counters computed in-process, such
+as the holiday calendar's fingerprint.
+"""
+
+import hashlib
+import hmac
+from typing import Callable, Dict, List, Optional
+
+from fastapi import Request, Response
+from jose import JWTError, jwt
+from sqlalchemy import text
+
+from app.config import settings
+
+CACHE_CONTROL = "private, no-cache"  # browsers keep the body and revalidate on every poll
+MAX_KEYS = 8
+
+LOCAL_VERSIONS: Dict[str, Callable[[], int]] = {}
+
+
+def _target(scope: dict) -> str:
+    query = scope.get("query_string", b"").decode("latin-1")
+    return f"{scope['path']}?{query}" if query else scope["path"]
+
+
+def _digest(keys: str, subject: str, target: str) -> str:
+    message = f"{keys}\n{subject}\n{target}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:20]
+
+
+def _is_user_bound(keys: List[str]) -> bool:
+    return any(key.startswith("principal:") for key in keys)
+
+
+async def current_version(conn, keys: List[str]) -> int:
+    """Sum of the counters named by keys (conn: AsyncSession or AsyncConnection)"""
+    total = 0
+    clauses, params = [], {}
+    for i, key in enumerate(keys):
+        resource, _, scope = key.partition(":")
+        if resource in LOCAL_VERSIONS:
+            total += LOCAL_VERSIONS[resource]()
+            continue
+        params[f"r{i}"] = resource
+        if scope.endswith("*"):
+            clauses.append(f"(resource = :r{i} AND scope LIKE :s{i})")
+            params[f"s{i}"] = scope[:-1] + "%"
+        else:
+            clauses.append(f"(resource = :r{i} AND scope = :s{i})")
+            params[f"s{i}"] = scope
+    if clauses:
+        result = await conn.execute(
+            text(f"SELECT coalesce(sum(version), 0) FROM resource_versions WHERE {' OR '.join(clauses)}"), params
+        )
+        total += int(result.scalar())
+    return total
+
+
+async def set_etag(request: Request, response: Response, keys: List[str], db=None, user=None):
+    """
+    Add the ETag for the data the endpoint is about to read (call it after
+    working out the user's scope and before the queries)
+    """
+    keys = list(keys)
+    if user is not None:
+        keys.append(f"principal:u:{user.id}")
+    version = await current_version(db, keys)
+    joined = "+".join(keys)
+    subject = user.username if user is not None else ""
+    response.headers["ETag"] = f'W/"{version}.{joined}.{_digest(joined, subject, _target(request.scope))}"'
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def _token_subject(authorization: Optional[str]) -> Optional[str]:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    # Scoped tokens (notification stream) are not API credentials
+    return payload.get("sub") if payload.get("scope") is None else None
+
+
+class ConditionalGetMiddleware:
+    """Answer If-None-Match with 304 when the named counters have not moved"""
+
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            headers = dict(scope["headers"])
+            if_none_match = headers.get(b"if-none-match")
+            if if_none_match:
+                try:
+                    etag = await self._unchanged(scope, if_none_match.decode("latin-1"), headers.get(b"authorization"))
+                except Exception as e:
+                    print(f"[DEBUG] Conditional GET check failed: {e}", flush=True)
+                    etag = None
+                if etag:
+                    response = Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+    async def _unchanged(self, scope: dict, if_none_match: str, authorization: Optional[bytes]) -> Optional[str]:
+        """The matching ETag of If-None-Match if its counters are unchanged"""
+        target = _target(scope)
+        subject = None
+        for etag in if_none_match.split(","):
+            etag = etag.strip()
+            if not (etag.startswith('W/"') and etag.endswith('"')):
+                continue
+            version, _, rest = etag[3:-1].partition(".")
+            joined, _, digest = rest.rpartition(".")
+            keys = joined.split("+")
+            if not version.isdigit() or not joined or len(keys) > MAX_KEYS:
+                continue
+            if _is_user_bound(keys):
+                if subject is None:
+                    subject = _token_subject(authorization.decode("latin-1") if authorization else None) or ""
+                if not subject:
+                    continue
+                expected = _digest(joined, subject, target)
+            else:
+                expected = _digest(joined, "", target)
+            if not hmac.compare_digest(digest, expected):
+                continue
+            async with self.engine.connect() as conn:
+                if await current_version(conn, keys) == int(version):
+                    return etag
+        return None
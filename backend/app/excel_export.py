@@ -0,0 +1,191 @@
+"""
+Streaming Excel Export Engine
+
+Attendance reports are written with openpyxl write-only worksheets: each
+appended row is serialized to the sheet's temporary XML file straight away
+instead of being kept as Cell objects, and every cell references one of the
+named styles registered once per workbook (no Font/Border/PatternFill
+objects per cell). The finished .xlsx is saved into a spooled temporary file
+and streamed to the client in chunks, so memory stays flat regardless of
+department size.
+"""
+
+import tempfile
+from typing import Callable, Iterator, Optional, Sequence, Union
+
+from fastapi.concurrency import run_in_threadpool
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Response chunk size and how much of a finished file is kept in memory
+# before the spool moves to disk
+STREAM_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+HEADER_BLUE = "4472C4"
+SUMMARY_BLUE = "D9E1F2"
+EMPLOYEE_GREEN = "70AD47"
+STRIPE_GREY = "F2F2F2"
+
+
+class ReportStyle:
+    """Named styles shared by all attendance reports"""
+    TITLE = "Report Title"
+    SUBTITLE = "Report Subtitle"
+    HEADING = "Report Heading"
+    BOLD = "Report Bold"
+    NOTE = "Report Note"
+    SECTION = "Report Section"
+    SECTION_FILL = "Report Section Fill"
+    LABEL = "Report Label"
+    VALUE = "Report Value"
+    BOXED = "Report Boxed"
+    HEADER = "Report Header"
+    EMPLOYEE_HEADER = "Report Employee Header"
+    CELL = "Report Cell"
+    CELL_STRIPED = "Report Cell Striped"
+    TEXT = "Report Text"
+    TEXT_STRIPED = "Report Text Striped"
+
+
+def _named_styles() -> Sequence[NamedStyle]:
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    summary_fill = PatternFill(start_color=SUMMARY_BLUE, end_color=SUMMARY_BLUE, fill_type="solid")
+    stripe_fill = PatternFill(start_color=STRIPE_GREY, end_color=STRIPE_GREY, fill_type="solid")
+    center = Alignment(horizontal='center', vertical='center')
+    left = Alignment(horizontal='left', vertical='center')
+    body = Font(size=11)
+
+    return [
+        NamedStyle(name=ReportStyle.TITLE, font=Font(bold=True, size=14)),
+        NamedStyle(name=ReportStyle.SUBTITLE, font=Font(size=11)),
+        NamedStyle(name=ReportStyle.HEADING, font=Font(bold=True, size=12)),
+        NamedStyle(name=ReportStyle.BOLD, font=Font(bold=True, size=11)),
+        NamedStyle(name=ReportStyle.NOTE, font=Font(size=10)),
+        NamedStyle(name=ReportStyle.SECTION, font=Font(bold=True, size=12), fill=summary_fill, border=border),
+        NamedStyle(name=ReportStyle.SECTION_FILL, font=body, fill=summary_fill, border=border),
+        NamedStyle(name=ReportStyle.LABEL, font=Font(bold=True, color="000000"), fill=summary_fill, border=border),
+        NamedStyle(name=ReportStyle.VALUE, font=body, border=border, alignment=Alignment(horizontal='right')),
+        NamedStyle(name=ReportStyle.BOXED, font=body, border=border),
+        NamedStyle(
+            name=ReportStyle.HEADER,
+            font=Font(bold=True, color="FFFFFF", size=11),
+            fill=PatternFill(start_color=HEADER_BLUE, end_color=HEADER_BLUE, fill_type="solid"),
+            border=border,
+            alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)
+        ),
+        NamedStyle(
+            name=ReportStyle.EMPLOYEE_HEADER,
+            font=Font(bold=True, color="FFFFFF", size=10),
+            fill=PatternFill(start_color=EMPLOYEE_GREEN, end_color=EMPLOYEE_GREEN, fill_type="solid")
+        ),
+        NamedStyle(name=ReportStyle.CELL, font=body, border=border, alignment=center),
+        NamedStyle(name=ReportStyle.CELL_STRIPED, font=body, border=border, alignment=center, fill=stripe_fill),
+        NamedStyle(name=ReportStyle.TEXT, font=body, border=border, alignment=left),
+        NamedStyle(name=ReportStyle.TEXT_STRIPED, font=body, border=border, alignment=left, fill=stripe_fill),
+    ]
+
+
+class ReportSheet:
+    """Append-only worksheet of an ExcelReport"""
+
+    def __init__(self, ws, widths: Sequence[float] = ()):
+        self.ws = ws
+        self.row = 0  # last written row (1-based)
+        # Column widths must be set before the first row is written
+        for index, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+
+    def _cell(self, value, style: Optional[str]):
+        if style is None:
+            return value
+        cell = WriteOnlyCell(self.ws, value=value)
+        cell.style = style
+        return cell
+
+    def append(self, values: Sequence, styles: Union[None, str, Sequence[Optional[str]]] = None) -> int:
+        """
+        Write one row. styles is one style for all cells or one per cell
+        (None = unstyled). Returns the row number.
+        """
+        if styles is None or isinstance(styles, str):
+            styles = [styles] * len(values)
+        self.ws.append([self._cell(value, style) for value, style in zip(values, styles)])
+        self.row += 1
+        return self.row
+
+    def blank(self, count: int = 1):
+        for _ in range(count):
+            self.ws.append([])
+            self.row += 1
+
+    def merged(self, value, style: Optional[str], last_column: int, fill_style: Optional[str] = None) -> int:
+        """Write value in column A merged across to last_column"""
+        styles = [style] + [fill_style] * (last_column - 1) if fill_style else [style]
+        values = [value] + [None] * (len(styles) - 1)
+        row = self.append(values, styles)
+        self.ws.merged_cells.add(f"A{row}:{get_column_letter(last_column)}{row}")
+        return row
+
+    def data_row(self, values: Sequence, text_columns: Sequence[int] = ()) -> int:
+        """
+        Bordered table row: columns in text_columns (1-based) are left aligned,
+        the rest centered; even sheet rows are striped
+        """
+        striped = (self.row + 1) % 2 == 0
+        cell_style = ReportStyle.CELL_STRIPED if striped else ReportStyle.CELL
+        text_style = ReportStyle.TEXT_STRIPED if striped else ReportStyle.TEXT
+        return self.append(
+            values,
+            [text_style if col in text_columns else cell_style for col in range(1, len(values) + 1)]
+        )
+
+
+class ExcelReport:
+    """Write-only workbook with the report named styles registered"""
+
+    def __init__(self):
+        self.wb = Workbook(write_only=True)
+        for style in _named_styles():
+            self.wb.add_named_style(style)
+
+    def sheet(self, title: str, widths: Sequence[float] = ()) -> ReportSheet:
+        """Add a worksheet; the first one added opens when the file is opened"""
+        return ReportSheet(self.wb.create_sheet(title=title), widths)
+
+    def save(self, fileobj):
+        self.wb.save(fileobj)
+
+
+def iter_file(fileobj) -> Iterator[bytes]:
+    """Read fileobj in STREAM_CHUNK_SIZE chunks and close it"""
+    try:
+        while True:
+            chunk = fileobj.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+async def save_report(report: Union[ExcelReport, Callable]):
+    """
+    Save a report - or run a writer function(fileobj) - into a spooled
+    temporary file (in a worker thread), rewound for reading
+    """
+    write = report.save if isinstance(report, ExcelReport) else report
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        await run_in_threadpool(write, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
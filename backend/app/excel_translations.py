@@ -236,7 +236,7 @@ def get_headers_translated(language: str = 'en', report_type: str = 'monthly') -
     
     Args:
         language: Language code ('en' or 'ja')
-        report_type: Type of report ('monthly', 'weekly', 'employee', 'leave')
+        report_type: Type of report ('monthly', 'comprehensive', 'employee')
     
     Returns:
         Dictionary of translated headers
@@ -269,6 +269,21 @@ def get_headers_translated(language: str = 'en', report_type: str = 'monthly') -
             'ot_hours',
             'status',
         ],
+        'comprehensive': [
+            'employee_id',
+            'name',
+            'date',
+            'day',
+            'assigned_shift',
+            'check_in',
+            'check_out',
+            'hours_worked',
+            'break_minutes',
+            'overtime_hours',
+            'status',
+            'leave_status',
+            'notes',
+        ],
     }
     
     header_keys = headers_map.get(report_type, headers_map['monthly'])
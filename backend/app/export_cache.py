@@ -0,0 +1,302 @@
+"""
+Attendance Export Cache
+
+Generated export files are kept on disk under a SHA-256 digest of everything
+that determines their content: report type, department (or employee),
+period, filters, language and the department's data version. The data
+version is read from export_data_versions, which database triggers bump on
+every write to attendance, check-ins, schedules, leave and comp-off for that
+department and month, plus the resource_versions counters of the
+department list, the department's employees (bumped for both departments
+when an employee moves), roles and shifts, which supply names and headers.
+A changed version gives a new key, so entries never need invalidating - old
+ones are simply never asked for again and age out of the size budget.
+
+The digest doubles as the response ETag: a client sending If-None-Match
+with the current digest gets 304 without the file being read, and a repeat
+download of an unchanged month is a plain file read.
+
+attendance_export_response serves a report in any of EXPORT_FORMATS:
+xlsx and parquet through the cache, CSV streamed as it is encoded.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.attendance_reports import build_report, build_table
+from app.excel_export import XLSX_MEDIA_TYPE, iter_file, save_report
+from app.models import ExportDataVersion, ResourceVersion
+from app.report_data import ReportData
+from app.table_export import CSV_MEDIA_TYPE, PARQUET_MEDIA_TYPE, parquet_available
+
+
+# Part of every key: bump when a renderer's output changes so files written
+# by older code are not served
+REPORT_FORMAT_VERSION = 1
+
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+
+# Partly written files older than this are removed by prune()
+STALE_TMP_SECONDS = 3600
+
+
+# resource_versions counters per department that feed the reports besides
+# the attendance-side tables (the department list is counted as a whole)
+REFERENCE_RESOURCES = ('employees', 'roles', 'shifts')
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+async def get_data_version(db: AsyncSession, department_id: int, start_date: date, end_date: date) -> str:
+    """
+    Stamp of the department's export data for the months overlapping the
+    range: the trigger-maintained change counters plus the counters of the
+    reference data the reports read (department names, the department's
+    employees and their department assignment, roles and shifts)
+    """
+    version_result = await db.execute(
+        select(ExportDataVersion.period, ExportDataVersion.version, ExportDataVersion.updated_at)
+        .filter(
+            ExportDataVersion.department_id == department_id,
+            ExportDataVersion.period >= _month_start(start_date),
+            ExportDataVersion.period <= end_date
+        )
+        .order_by(ExportDataVersion.period)
+    )
+    scope = f"d:{department_id}"
+    reference_result = await db.execute(
+        select(ResourceVersion.resource, ResourceVersion.version)
+        .filter(
+            ((ResourceVersion.resource == 'departments') & (ResourceVersion.scope == 'all'))
+            | (ResourceVersion.resource.in_(REFERENCE_RESOURCES) & (ResourceVersion.scope == scope))
+        )
+        .order_by(ResourceVersion.resource)
+    )
+
+    parts = [f"{period.isoformat()}:{version}:{updated_at.isoformat()}" for period, version, updated_at in version_result.all()]
+    parts.extend(f"{resource}:{version}" for resource, version in reference_result.all())
+    return "|".join(parts)
+
+
+def cache_key(report: str, data_version: str, **params) -> str:
+    """Hex SHA-256 of the report type, its parameters and the data version"""
+    payload = json.dumps(
+        {"format": REPORT_FORMAT_VERSION, "report": report, "version": data_version, "params": params},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def export_cache_key(
+    db: AsyncSession,
+    report: str,
+    department_id: int,
+    start_date: date,
+    end_date: date,
+    **params
+) -> str:
+    """Cache key of a department (or department employee's) report for the range"""
+    data_version = await get_data_version(db, department_id, start_date, end_date)
+    return cache_key(
+        report, data_version,
+        department_id=department_id, start_date=start_date, end_date=end_date, **params
+    )
+
+
+class ExportCache:
+    """
+    Content files in <directory>/<key[:2]>/<key><suffix>, written atomically
+    (temporary file + rename) and pruned least-recently-used first once the
+    directory exceeds max_bytes. Safe to share between worker processes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path(self, key: str, suffix: str) -> Path:
+        return self.directory / key[:2] / f"{key}{suffix}"
+
+    def open(self, key: str, suffix: str):
+        """Open the cached file for reading (None on a miss) and mark it used"""
+        path = self.path(key, suffix)
+        try:
+            fileobj = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return fileobj
+
+    def store(self, key: str, suffix: str, write: Callable):
+        """
+        Write a file with write(fileobj), move it into place and return it
+        opened for reading (blocking)
+        """
+        path = self.path(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                write(tmp)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        # Opened before pruning: a concurrent prune may unlink it, the open
+        # file stays readable
+        fileobj = open(path, "rb")
+        self.prune()
+        return fileobj
+
+    def prune(self):
+        """Delete least recently used files until the cache fits max_bytes"""
+        files = []
+        total = 0
+        stale_before = time.time() - STALE_TMP_SECONDS
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name.startswith(".tmp-"):
+                # Left behind by a worker that died mid-write
+                if stat.st_mtime < stale_before:
+                    path.unlink(missing_ok=True)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+export_cache = ExportCache(
+    settings.EXPORT_CACHE_DIR or os.path.join(tempfile.gettempdir(), "shift_scheduler_exports"),
+    settings.EXPORT_CACHE_MAX_MB * 1024 * 1024
+)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, '*' matches anything)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+async def cached_file_response(
+    request: Request,
+    key: str,
+    filename: str,
+    media_type: str,
+    suffix: str,
+    build: Callable[[], Awaitable[Callable]]
+) -> Response:
+    """
+    304 when the client already has this version, the cached file when there
+    is one, otherwise build() a writer (fileobj -> None), cache its output
+    and stream it
+    """
+    headers = _etag_headers(key)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        print(f"[DEBUG] Export {key[:12]} not modified", flush=True)
+        return Response(status_code=304, headers=headers)
+
+    fileobj = export_cache.open(key, suffix) if export_cache.enabled else None
+    if fileobj is not None:
+        print(f"[DEBUG] Export {key[:12]} served from cache", flush=True)
+    else:
+        write = await build()
+        if export_cache.enabled:
+            fileobj = await run_in_threadpool(export_cache.store, key, suffix, write)
+            print(f"[DEBUG] Export {key[:12]} built and cached", flush=True)
+        else:
+            fileobj = await save_report(write)
+
+    return StreamingResponse(
+        iter_file(fileobj),
+        media_type=media_type,
+        headers={**headers, "Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+def _etag_headers(key: str) -> dict:
+    return {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+
+
+async def attendance_export_response(
+    request: Request,
+    db: AsyncSession,
+    report: str,
+    department_id: int,
+    start_date: date,
+    end_date: date,
+    filename: str,
+    export_format: str,
+    language: str,
+    load: Callable[[], Awaitable[ReportData]],
+    **key_params
+) -> Response:
+    """
+    Attendance export `report` as xlsx, csv or parquet (filename without
+    extension). xlsx and parquet files go through the export cache; CSV is
+    streamed row by row. All three answer If-None-Match with 304.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export is not available on this server (pyarrow is not installed)")
+
+    key = await export_cache_key(
+        db, report, department_id, start_date, end_date,
+        format=export_format, language=language, **key_params
+    )
+
+    if export_format == "xlsx":
+        async def build_xlsx():
+            return (await build_report(report, await load(), language)).save
+        return await cached_file_response(request, key, f"{filename}.xlsx", XLSX_MEDIA_TYPE, ".xlsx", build_xlsx)
+
+    if export_format == "parquet":
+        async def build_parquet():
+            return build_table(report, await load(), language).save
+        return await cached_file_response(request, key, f"{filename}.parquet", PARQUET_MEDIA_TYPE, ".parquet", build_parquet)
+
+    headers = _etag_headers(key)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    table = build_table(report, await load(), language)
+    return StreamingResponse(
+        table.iter_csv(),
+        media_type=CSV_MEDIA_TYPE,
+        headers={**headers, "Content-Disposition": f"attachment; filename={filename}.csv"}
+    )
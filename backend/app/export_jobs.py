@@ -0,0 +1,234 @@
+"""
+Company-Wide Export Bundles
+
+POST /admin/exports/monthly-bundle starts a background job that builds the
+monthly (and optionally comprehensive) attendance report of every active
+department and zips them. Jobs use the same in-process registry as schedule
+generation jobs (app/schedule_jobs.py): poll progress from the worker that
+created the job, then download the ZIP from it.
+
+Departments are processed concurrently: up to EXPORT_BUNDLE_CONCURRENCY load
+their data at once (one session each), and workbooks are rendered in a
+process pool - openpyxl rendering is CPU-bound and would serialize on the
+GIL in threads. Reports still current in the export cache are copied
+instead of rendered, and freshly rendered ones are added to the cache, so a
+bundle after a close costs little more than file copies.
+"""
+
+import asyncio
+import calendar
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+
+from app.attendance_reports import REPORT_RENDERERS
+from app.config import settings
+from app.database import async_session_maker
+from app.export_cache import export_cache, export_cache_key
+from app.models import Department
+from app.report_data import ReportData, load_department_report
+from app.schedule_jobs import GenerationProgress, ScheduleJob, ScheduleJobRegistry
+
+
+# Reports a bundle can contain: name -> file name part (as in the single downloads)
+BUNDLE_REPORTS = {
+    "monthly": "attendance",
+    "comprehensive": "complete_attendance",
+}
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_render_pool_size() -> int:
+    return settings.EXPORT_RENDER_PROCESSES or os.cpu_count() or 1
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Process pool rendering bundle workbooks (created on first use)"""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(
+            max_workers=get_render_pool_size(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _render_pool
+
+
+def shutdown_render_pool():
+    """Stop worker processes (application shutdown)"""
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+def render_report_file(name: str, data: ReportData, language: str, path: str) -> str:
+    """Render report `name` and save it to path (runs in a pool process)"""
+    REPORT_RENDERERS[name](data, language).save(path)
+    return path
+
+
+def _safe_name(name: str) -> str:
+    """Department name usable as a ZIP entry name"""
+    return re.sub(r'[\\/:*?"<>|]+', '_', name).strip() or "department"
+
+
+class ExportBundleJob(ScheduleJob):
+    """One bundle run; result carries the download URL once completed"""
+
+    def __init__(self, user_id: int, params: Dict):
+        super().__init__(department_id=None, user_id=user_id, params=params)
+        self.path: Optional[Path] = None
+
+    @property
+    def filename(self) -> str:
+        return f"attendance_bundle_{self.params['year']}-{self.params['month']:02d}.zip"
+
+    def discard(self):
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
+
+
+def _bundle_dir() -> Path:
+    directory = Path(settings.EXPORT_BUNDLE_DIR or os.path.join(tempfile.gettempdir(), "shift_scheduler_bundles"))
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+async def _department_reports(
+    department: Department,
+    reports: List[str],
+    start_date: date,
+    end_date: date,
+    language: str,
+    work_dir: Path
+) -> List[tuple]:
+    """
+    (ZIP entry name, file path) of each report of one department: copied
+    from the export cache when current, otherwise rendered in the pool
+    """
+    files = []
+    to_render = []
+    data = None
+    async with async_session_maker() as db:
+        for name in reports:
+            # dept_id keeps entries apart when two names sanitize to the same string
+            entry = (
+                f"{department.dept_id}_{_safe_name(department.name)}_{BUNDLE_REPORTS[name]}_"
+                f"{start_date.year}-{start_date.month:02d}.xlsx"
+            )
+            path = work_dir / f"{department.id}_{name}.xlsx"
+
+            # Same key as the GET /attendance/export/* download of this report
+            key = await export_cache_key(
+                db, name, department.id, start_date, end_date,
+                format="xlsx", language=language,
+                **({"employment_type": None} if name == "monthly" else {})
+            )
+            cached = export_cache.open(key, ".xlsx") if export_cache.enabled else None
+            if cached is not None:
+                with cached, open(path, "wb") as out:
+                    await run_in_threadpool(shutil.copyfileobj, cached, out)
+            else:
+                if data is None:
+                    # Check-ins are only read by the comprehensive report
+                    data = await load_department_report(
+                        db, department, start_date, end_date, include_checkins="comprehensive" in reports
+                    )
+                to_render.append((name, key, path))
+            files.append((entry, path))
+
+    # Session closed: rendering does not hold a database connection
+    loop = asyncio.get_running_loop()
+    for name, key, path in to_render:
+        await loop.run_in_executor(get_render_pool(), render_report_file, name, data, language, str(path))
+        if export_cache.enabled:
+            def copy_into(fileobj, source=path):
+                with open(source, "rb") as src:
+                    shutil.copyfileobj(src, fileobj)
+            (await run_in_threadpool(export_cache.store, key, ".xlsx", copy_into)).close()
+    return files
+
+
+async def build_monthly_bundle(
+    job: ExportBundleJob,
+    progress: GenerationProgress,
+    year: int,
+    month: int,
+    include_comprehensive: bool,
+    language: str
+) -> Dict:
+    """Build every active department's reports concurrently and zip them"""
+    start_date = date(year, month, 1)
+    end_date = date(year, month, calendar.monthrange(year, month)[1])
+    reports = ["monthly"] + (["comprehensive"] if include_comprehensive else [])
+
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(Department).filter(Department.is_active == True).order_by(Department.id)
+        )
+        departments = result.scalars().all()
+
+    bundle_dir = _bundle_dir()
+    work_dir = Path(tempfile.mkdtemp(prefix=f"bundle-{job.id}-", dir=bundle_dir))
+    zip_path = bundle_dir / f"{job.id}.zip"
+    job.path = zip_path
+    total = len(departments)
+    done = 0
+    failed = []
+    semaphore = asyncio.Semaphore(settings.EXPORT_BUNDLE_CONCURRENCY)
+    zip_lock = asyncio.Lock()
+    progress.set_phase(f"building 0/{total} departments", 0)
+
+    try:
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as bundle:
+            async def build_department(department: Department):
+                nonlocal done
+                async with semaphore:
+                    try:
+                        files = await _department_reports(department, reports, start_date, end_date, language, work_dir)
+                    except Exception as e:
+                        print(f"[DEBUG] Bundle {job.id}: {department.name} failed: {str(e)}", flush=True)
+                        failed.append({"department_id": department.id, "name": department.name, "error": str(e)})
+                        progress.feedback.append(f"{department.name}: failed ({str(e)})")
+                        files = []
+                # xlsx is already compressed: store entries as they are
+                async with zip_lock:
+                    for entry, path in files:
+                        await run_in_threadpool(bundle.write, path, entry)
+                        path.unlink(missing_ok=True)
+                done += 1
+                progress.set_phase(f"building {done}/{total} departments", 95 * done / max(total, 1))
+
+            await asyncio.gather(*(build_department(department) for department in departments))
+    except BaseException:
+        job.discard()
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "year": year,
+        "month": month,
+        "departments": total,
+        "reports": reports,
+        "failed": failed,
+        "size_bytes": zip_path.stat().st_size,
+        "filename": job.filename,
+        "download_url": f"/admin/exports/jobs/{job.id}/download"
+    }
+
+
+# Global instance (bundle jobs of this process)
+export_jobs = ScheduleJobRegistry()
@@ -3,96 +3,148 @@ Japanese Calendar and Holiday Utilities
 
 Provides functions to check if a date is a Japanese public holiday
 and to get holiday information.
+
+Holidays are precomputed once per process for CALENDAR_FIRST_YEAR to
+CALENDAR_LAST_YEAR into a date -> name dict and a sorted date array, so
+single-day checks are dict lookups and range queries are two bisects.
+Company holidays (calendar_holidays rows added by admins, migration 0006)
+are merged in by load_company_holidays at startup and after every change;
+dates outside the precomputed years fall back to the holidays library.
+Week info records are cached per week start and rebuilt when the company
+holidays change.
 """
 
+import asyncio
+import zlib
+from bisect import bisect_left, bisect_right
 from datetime import date, datetime, timedelta
 from typing import Optional, Dict, List
 import holidays as holidays_lib
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import CalendarHoliday
+
+CALENDAR_FIRST_YEAR = 2000
+CALENDAR_LAST_YEAR = 2050
 
 
 class JapaneseCalendar:
     """Utility class for Japanese calendar operations"""
-    
-    def __init__(self):
-        """Initialize Japanese holidays library"""
+
+    def __init__(self, first_year: int = CALENDAR_FIRST_YEAR, last_year: int = CALENDAR_LAST_YEAR):
+        """Precompute the public holidays of first_year..last_year"""
         self.holidays_jp = holidays_lib.Japan()
-    
+        self.first_day = date(first_year, 1, 1)
+        self.last_day = date(last_year, 12, 31)
+        self.public_holidays: Dict[date, str] = dict(
+            holidays_lib.Japan(years=range(first_year, last_year + 1)).items()
+        )
+        self.company_holidays: Dict[date, str] = {}
+        self._rebuild()
+
+    def _rebuild(self):
+        """Merge public and company holidays into the lookup dict and sorted array"""
+        # A public holiday keeps its name when the company also closes that day
+        self._names: Dict[date, str] = {**self.company_holidays, **self.public_holidays}
+        self._dates: List[date] = sorted(self._names)
+        self._week_info: Dict[date, Dict] = {}
+        # Same on every worker with the same company holidays (ETag of /calendar/holidays)
+        self.fingerprint = zlib.crc32(repr(sorted(self.company_holidays.items())).encode())
+
+    def set_company_holidays(self, company_holidays: Dict[date, str]):
+        """Replace the company holidays (clears the week info cache)"""
+        self.company_holidays = dict(company_holidays)
+        self._rebuild()
+
+    def _in_range(self, target_date: date) -> bool:
+        return self.first_day <= target_date <= self.last_day
+
     def is_holiday(self, target_date: date) -> bool:
-        """Check if a date is a Japanese public holiday"""
-        return target_date in self.holidays_jp
-    
+        """Check if a date is a Japanese public holiday (or a company holiday)"""
+        if isinstance(target_date, datetime):
+            target_date = target_date.date()
+        if target_date in self._names:
+            return True
+        return not self._in_range(target_date) and target_date in self.holidays_jp
+
+    def is_company_holiday(self, target_date: date) -> bool:
+        """Check if a date was added as a company holiday"""
+        return target_date in self.company_holidays
+
     def is_weekend(self, target_date: date) -> bool:
         """Check if a date is Saturday or Sunday"""
         day_of_week = target_date.weekday()
         return day_of_week >= 5  # 5 = Saturday, 6 = Sunday
-    
+
     def is_weekend_or_holiday(self, target_date: date) -> bool:
         """Check if a date is either weekend or public holiday"""
         return self.is_weekend(target_date) or self.is_holiday(target_date)
-    
+
     def get_holiday_name(self, target_date: date) -> Optional[str]:
         """Get the name of the holiday for a given date"""
-        if target_date in self.holidays_jp:
+        if isinstance(target_date, datetime):
+            target_date = target_date.date()
+        name = self._names.get(target_date)
+        if name is None and not self._in_range(target_date) and target_date in self.holidays_jp:
             return self.holidays_jp[target_date]
-        return None
-    
+        return name
+
     def get_holidays_in_range(self, start_date: date, end_date: date) -> Dict[date, str]:
         """Get all holidays within a date range"""
-        holidays_in_range = {}
-        current_date = start_date
-        
-        while current_date <= end_date:
-            if current_date in self.holidays_jp:
-                holidays_in_range[current_date] = self.holidays_jp[current_date]
-            current_date += timedelta(days=1)
-        
-        return holidays_in_range
-    
+        if not (self._in_range(start_date) and self._in_range(end_date)):
+            holidays_in_range = {}
+            current_date = start_date
+            while current_date <= end_date:
+                name = self.get_holiday_name(current_date)
+                if name is not None:
+                    holidays_in_range[current_date] = name
+                current_date += timedelta(days=1)
+            return holidays_in_range
+
+        first = bisect_left(self._dates, start_date)
+        last = bisect_right(self._dates, end_date)
+        return {day: self._names[day] for day in self._dates[first:last]}
+
     def get_non_working_days_in_range(self, start_date: date, end_date: date) -> Dict[date, str]:
         """Get all non-working days (weekends and holidays) in a date range"""
-        non_working = {}
-        current_date = start_date
-        
-        while current_date <= end_date:
-            if self.is_weekend(current_date):
-                day_name = current_date.strftime('%A')
-                non_working[current_date] = day_name
-            elif current_date in self.holidays_jp:
-                non_working[current_date] = self.holidays_jp[current_date]
-            current_date += timedelta(days=1)
-        
-        return non_working
-    
+        non_working = self.get_holidays_in_range(start_date, end_date)
+        # Saturdays and Sundays a week at a time; weekends keep the day name
+        if start_date.weekday() == 6:
+            non_working[start_date] = 'Sunday'
+        saturday = start_date + timedelta(days=(5 - start_date.weekday()) % 7)
+        while saturday <= end_date:
+            non_working[saturday] = 'Saturday'
+            if saturday + timedelta(days=1) <= end_date:
+                non_working[saturday + timedelta(days=1)] = 'Sunday'
+            saturday += timedelta(days=7)
+        return dict(sorted(non_working.items()))
+
     def get_shifts_required_for_week(self, week_start: date) -> int:
         """
         Get the number of shifts required for a week, considering holidays.
-        
+
         - Default: 5 shifts per week (Mon-Fri)
         - Exception 1: If there's a public holiday in the week, reduce by 1
         - Exception 2: If comp-off is applied, it adds an extra shift to compensate
-        
+
         Returns the minimum shifts required for the week.
         """
-        week_end = week_start + timedelta(days=6)  # Full week Mon-Sun
-        
-        # Count weekday holidays
-        weekday_holidays = 0
-        current_date = week_start
-        
-        while current_date <= week_end:
-            # Check if it's a weekday (Mon-Fri) and a holiday
-            if current_date.weekday() < 5 and self.is_holiday(current_date):
-                weekday_holidays += 1
-            current_date += timedelta(days=1)
-        
-        # Base 5 shifts, minus 1 for each weekday holiday
-        required_shifts = max(4, 5 - weekday_holidays)
-        return required_shifts
-    
+        return self.get_week_info(week_start)['required_shifts']
+
     def get_week_info(self, week_start: date) -> Dict:
-        """Get comprehensive week information for scheduling"""
+        """
+        Get comprehensive week information for scheduling (cached per week
+        start; the returned record is shared, do not modify it)
+        """
+        week_info = self._week_info.get(week_start)
+        if week_info is None:
+            week_info = self._week_info[week_start] = self._build_week_info(week_start)
+        return week_info
+
+    def _build_week_info(self, week_start: date) -> Dict:
         week_end = week_start + timedelta(days=6)
-        
+
         week_info = {
             'week_start': week_start,
             'week_end': week_end,
@@ -102,33 +154,35 @@ class JapaneseCalendar:
             'weekday_holiday_count': 0,
             'required_shifts': 5
         }
-        
+
         current_date = week_start
         while current_date <= week_end:
+            holiday_name = self.get_holiday_name(current_date)
+            is_weekend = self.is_weekend(current_date)
             day_info = {
                 'date': current_date,
                 'day_name': current_date.strftime('%A'),
-                'is_weekend': self.is_weekend(current_date),
-                'is_holiday': self.is_holiday(current_date),
-                'holiday_name': self.get_holiday_name(current_date),
-                'is_non_working': self.is_weekend_or_holiday(current_date)
+                'is_weekend': is_weekend,
+                'is_holiday': holiday_name is not None,
+                'holiday_name': holiday_name,
+                'is_non_working': is_weekend or holiday_name is not None
             }
-            
+
             week_info['days'].append(day_info)
-            
+
             if day_info['is_weekend']:
                 week_info['weekend_count'] += 1
-            
+
             if day_info['is_holiday']:
                 week_info['holiday_count'] += 1
                 if not day_info['is_weekend']:
                     week_info['weekday_holiday_count'] += 1
-            
+
             current_date += timedelta(days=1)
-        
-        # Calculate required shifts
+
+        # Base 5 shifts, minus 1 for each weekday holiday
         week_info['required_shifts'] = max(4, 5 - week_info['weekday_holiday_count'])
-        
+
         return week_info
 
 
@@ -136,6 +190,40 @@ class JapaneseCalendar:
 jp_calendar = JapaneseCalendar()
 
 
+def public_holiday_rows(first_year: int = CALENDAR_FIRST_YEAR, last_year: int = CALENDAR_LAST_YEAR) -> List[Dict]:
+    """calendar_holidays rows of the public holidays (migration 0006, init_db.py)"""
+    created_at = datetime.utcnow()
+    return [
+        {'date': day, 'name': name, 'is_company': False, 'created_by': None, 'created_at': created_at}
+        for day, name in sorted(holidays_lib.Japan(years=range(first_year, last_year + 1)).items())
+    ]
+
+
+async def load_company_holidays(db: AsyncSession) -> int:
+    """Merge the company holidays stored in calendar_holidays into jp_calendar"""
+    result = await db.execute(
+        select(CalendarHoliday.date, CalendarHoliday.name).filter(CalendarHoliday.is_company.is_(True))
+    )
+    company_holidays = dict(result.all())
+    if company_holidays != jp_calendar.company_holidays:
+        jp_calendar.set_company_holidays(company_holidays)
+    return len(company_holidays)
+
+
+async def refresh_company_holidays(session_maker, interval_seconds: float):
+    """
+    Reload the company holidays every interval_seconds (started from the app
+    startup hook), so changes made through another worker show up here too
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with session_maker() as db:
+                await load_company_holidays(db)
+        except Exception as e:
+            print(f"[DEBUG] Company holiday refresh failed: {e}", flush=True)
+
+
 def is_japanese_holiday(target_date: date) -> bool:
     """Convenience function to check if date is Japanese holiday"""
     return jp_calendar.is_holiday(target_date)
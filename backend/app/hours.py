@@ -0,0 +1,194 @@
+"""
+Working-Time Calculations
+
+Hour computations shared by attendance recording and the reports.
+
+Times are handled as minutes since midnight in NumPy arrays, so a whole
+report (or a single check-out) goes through the same batched arithmetic:
+- minutes_array parses "HH:MM" strings / time / datetime values once
+  (strings through a small cache - a month of attendance has few distinct
+  times), NaN for missing or invalid ones
+- compute_hours returns worked, break, night and overtime hours of every
+  row in one pass; spans that end before they start wrap past midnight
+
+calculate_night_hours is the original one-row version, kept for callers
+with a single pair of strings and as the reference the batched version is
+tested against (test_hours_vectorized.py).
+"""
+
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+
+MINUTES_PER_DAY = 24 * 60
+
+# Night work starts at 22:00 and, unless an end hour is given, runs to the
+# next day's 22:00 (hours after 22:00 count as night hours)
+NIGHT_START_HOUR = 22
+
+
+@lru_cache(maxsize=4096)
+def _string_minutes(value: str) -> float:
+    parts = value.split(':')
+    try:
+        return int(parts[0]) * 60 + (int(parts[1]) if len(parts) > 1 else 0)
+    except ValueError:
+        return np.nan
+
+
+def to_minutes(value, day: Optional[date] = None) -> float:
+    """
+    "HH:MM" string, time or datetime -> minutes since midnight (NaN when
+    missing or invalid). Datetimes count from midnight of `day` when given,
+    so a check-out on the next day is past 1440 rather than wrapped.
+    """
+    if value is None or value == '':
+        return np.nan
+    if isinstance(value, str):
+        return _string_minutes(value)
+    if isinstance(value, datetime) and day is not None:
+        return (value - datetime.combine(day, time.min)).total_seconds() / 60
+    if isinstance(value, (datetime, time)):
+        return value.hour * 60 + value.minute + (value.second + value.microsecond / 1e6) / 60
+    return np.nan
+
+
+def minutes_array(values: Iterable, day: Optional[date] = None) -> np.ndarray:
+    """to_minutes of every value as a float64 array"""
+    return np.array([to_minutes(value, day) for value in values], dtype=np.float64)
+
+
+def span_minutes(start: np.ndarray, end: np.ndarray, equal_is_full_day: bool = False) -> np.ndarray:
+    """
+    Minutes from start to end, wrapping past midnight when end is earlier
+    (and when equal with equal_is_full_day, as for a 24-hour shift)
+    """
+    # Rounded so datetime differences (seconds / 60) compare exactly with
+    # whole-minute breaks
+    span = np.round(np.asarray(end, dtype=np.float64) - np.asarray(start, dtype=np.float64), 6)
+    wrap = span <= 0 if equal_is_full_day else span < 0
+    return np.where(wrap, span + MINUTES_PER_DAY, span)
+
+
+def shift_hours(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """Length of scheduled shifts in hours (end <= start wraps; NaN if a time is missing)"""
+    return span_minutes(start, end, equal_is_full_day=True) / 60
+
+
+def night_minutes(
+    start: np.ndarray,
+    end: np.ndarray,
+    night_start_hour: float = NIGHT_START_HOUR,
+    night_end_hour: Optional[float] = None
+) -> np.ndarray:
+    """
+    Minutes of each start-end span inside the night window: from
+    night_start_hour to night_end_hour (wrapping past midnight, and
+    counting the previous night's window for early starts), or without an
+    end hour to the next day's night_start_hour. Missing times give 0.
+    """
+    start = np.asarray(start, dtype=np.float64)
+    work_end = start + span_minutes(start, end)
+    window_start = night_start_hour * 60
+    if night_end_hour is None:
+        windows = [(window_start, window_start + MINUTES_PER_DAY)]
+    else:
+        length = (night_end_hour * 60 - window_start) % MINUTES_PER_DAY or MINUTES_PER_DAY
+        windows = [
+            (window_start + offset, window_start + offset + length)
+            for offset in (-MINUTES_PER_DAY, 0, MINUTES_PER_DAY)
+        ]
+    total = np.zeros_like(start)
+    for first, last in windows:
+        total += np.clip(np.minimum(work_end, last) - np.maximum(start, first), 0, None)
+    return np.nan_to_num(total)
+
+
+class HoursColumns(NamedTuple):
+    """Per-row results of compute_hours (NaN where a time is missing)"""
+    total_minutes: np.ndarray  # check-in to check-out
+    break_minutes: np.ndarray  # break deducted
+    worked_hours: np.ndarray
+    night_hours: np.ndarray  # 0 where a time is missing
+    overtime_hours: np.ndarray  # worked beyond daily_max_hours
+
+
+def compute_hours(
+    in_minutes: np.ndarray,
+    out_minutes: np.ndarray,
+    break_minutes=0,
+    daily_max_hours=None,
+    night_start_hour: float = NIGHT_START_HOUR,
+    night_end_hour: Optional[float] = None,
+    break_needs_span: bool = True
+) -> HoursColumns:
+    """
+    Worked, night and overtime hours of attendance rows. break_minutes and
+    daily_max_hours are scalars or per-row arrays. With break_needs_span a
+    break is only deducted from spans at least as long as the break (check-in
+    recording); otherwise it is always deducted and worked time floors at 0.
+    """
+    in_minutes = np.asarray(in_minutes, dtype=np.float64)
+    total = span_minutes(in_minutes, out_minutes)
+    breaks = np.nan_to_num(np.broadcast_to(np.asarray(break_minutes, dtype=np.float64), total.shape))
+    if break_needs_span:
+        breaks = np.where(total >= breaks, breaks, 0.0)
+    worked = np.maximum(total - breaks, 0.0) / 60
+    worked = np.where(np.isnan(total), np.nan, worked)
+    if daily_max_hours is None:
+        overtime = np.where(np.isnan(total), np.nan, 0.0)
+    else:
+        overtime = np.maximum(worked - np.asarray(daily_max_hours, dtype=np.float64), 0.0)
+    night = night_minutes(in_minutes, out_minutes, night_start_hour, night_end_hour) / 60
+    return HoursColumns(total, breaks, worked, night, overtime)
+
+
+def calculate_night_hours(in_time_str, out_time_str, night_start_hour=22):
+    """Calculate hours worked after the night_start_hour (default 22:00)
+    Returns night hours worked after 22:00
+    """
+    if not in_time_str or not out_time_str:
+        return 0.0
+    
+    try:
+        # Parse times
+        in_parts = in_time_str.split(':')
+        out_parts = out_time_str.split(':')
+        
+        in_hour = int(in_parts[0])
+        in_min = int(in_parts[1]) if len(in_parts) > 1 else 0
+        out_hour = int(out_parts[0])
+        out_min = int(out_parts[1]) if len(out_parts) > 1 else 0
+        
+        in_decimal = in_hour + in_min / 60.0
+        out_decimal = out_hour + out_min / 60.0
+        
+        # Handle day wrap (e.g., 10:00 to 22:00 wraps to next day)
+        if out_decimal < in_decimal:
+            out_decimal += 24
+        
+        # Night hours are hours worked after 22:00
+        night_start = night_start_hour
+        night_end = night_start + 24  # Next day 22:00
+        
+        # Calculate intersection of work hours with night period
+        work_start = in_decimal
+        work_end = out_decimal
+        
+        if work_end <= night_start:
+            # All work before night period
+            return 0.0
+        elif work_start >= night_end:
+            # All work after next night period (shouldn't happen in 24h)
+            return 0.0
+        else:
+            # Some work during night period
+            night_work_start = max(work_start, night_start)
+            night_work_end = min(work_end, night_end)
+            night_hours = night_work_end - night_work_start
+            return max(0.0, night_hours)
+    except:
+        return 0.0
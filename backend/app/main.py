@@ -3,17 +3,20 @@ FastAPI Main Application - Shift Scheduler V5.1
 Complete with Employee Portal, Messaging, and Check-In/Out
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 import io
-import calendar
+import os
+import asyncio
+import time
+import numpy as np
 from calendar import monthrange
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update, and_, or_, func, Float, Integer
+from sqlalchemy import select, delete, and_, or_, func, tuple_, Float, Integer, text
 from sqlalchemy.orm import selectinload, with_loader_criteria
 from datetime import datetime, timedelta, date
 from typing import List, Dict, Optional
@@ -22,22 +25,52 @@ from collections import defaultdict
 from ortools.sat.python import cp_model
 
 from app.config import settings
-from app.database import get_db
+from app.database import get_db, async_session_maker, engine, log_pool_status, pool_status
 from app.models import (
     User, Department, Manager, Employee, Role, Schedule, LeaveRequest,
     CheckInOut, Message, Notification,
     UserType, LeaveStatus, Attendance, Unavailability, Shift,
     OvertimeTracking, OvertimeRequest, OvertimeWorked, OvertimeStatus,
-    CompOffRequest, CompOffTracking, CompOffDetail
+    CompOffRequest, CompOffTracking, CompOffDetail, CalendarHoliday, PunchDevice
 )
 from app.schemas import *
 from app.auth import (
-    get_password_hash, verify_password, create_access_token,
-    get_current_active_user, require_admin, require_manager, require_employee
+    create_access_token,
+    get_current_active_user, require_admin, require_manager, require_employee,
+    generate_device_key, hash_device_key, require_device, get_stream_user, get_principal, create_stream_token
 )
 from app.schedule_generator import ShiftScheduleGenerator
-from app.holidays_jp import jp_calendar, is_japanese_holiday, get_japanese_holiday_name
-from app.excel_translations import get_excel_translation, get_headers_translated
+from app.schedule_context import (
+    ScheduleContext, PreloadedScheduleContext, count_week_coverage,
+    check_weekly_shift_limit
+)
+from app.schedule_writer import delete_schedules
+from app.schedule_engine import (
+    generate_greedy, generate_with_cpsat, get_solver_pool_size, normalize_schedule_config, shutdown_solver_pool
+)
+from app.schedule_jobs import schedule_jobs, ScheduleJob, GenerationProgress, JobStatus
+from app.schedule_incremental import regenerate_incremental
+from app.holidays_jp import (
+    jp_calendar, is_japanese_holiday, get_japanese_holiday_name, load_company_holidays, refresh_company_holidays
+)
+from app.excel_translations import get_headers_translated
+from app.export_cache import attendance_export_response
+from app.export_jobs import ExportBundleJob, build_monthly_bundle, export_jobs, shutdown_render_pool
+from app.attendance_snapshots import (
+    attendance_period_stats, close_month, department_month_totals, reopen_month
+)
+from app.report_data import load_department_report, load_employee_report
+from app.hours import MINUTES_PER_DAY, compute_hours, minutes_array, night_minutes, shift_hours
+from app.time_columns import duration_minutes, normalize_time, parse_time
+from app.punch_ingest import check_in_status, checkout_overtime_hours, ingest_punches
+from app.notification_stream import listen_for_notifications, notification_events, notify_created
+from app.schedule_changes import (
+    changed_schedule_keys, decode_cursor, encode_cursor, prune_schedule_changes_periodically, sync_position
+)
+from app.migrations import check_schema_version
+from app.principals import Principal, listen_for_principal_changes, principal_cache
+from app.password_hashing import login_latency, password_hasher
+from app.etags import LOCAL_VERSIONS, ConditionalGetMiddleware, set_etag
 
 app = FastAPI(
     title="Shift Scheduler V5.1 API",
@@ -45,6 +78,11 @@ app = FastAPI(
     version="5.1.0"
 )
 
+# Conditional GET: answers unchanged polls with 304 before routing
+# (added before CORS so that CORS stays the outermost middleware)
+app.add_middleware(ConditionalGetMiddleware, engine=engine)
+LOCAL_VERSIONS['holiday_calendar'] = lambda: jp_calendar.fingerprint
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -55,211 +93,42 @@ app.add_middleware(
 )
 
 
-# =============== DATABASE UPGRADE FUNCTION ===============
-
-async def upgrade_database():
-    """Run database migrations for comp-off tracking enhancement"""
-    from app.database import engine
-    from sqlalchemy import text
-    
-    try:
-        async with engine.begin() as conn:
-            # Check if columns already exist
-            try:
-                result = await conn.execute(text("""
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = 'comp_off_tracking' AND column_name = 'earned_date'
-                """))
-                if result.scalar():
-                    print("✓ comp_off_tracking already has earned_date column")
-                    return
-            except Exception as e:
-                print(f"Note: {e}")
-
-            try:
-                # Add new columns to comp_off_tracking
-                print("Adding new columns to comp_off_tracking...")
-                await conn.execute(text("""
-                    ALTER TABLE comp_off_tracking
-                    ADD COLUMN IF NOT EXISTS earned_date TIMESTAMP,
-                    ADD COLUMN IF NOT EXISTS expired_days INTEGER DEFAULT 0
-                """))
-                print("✓ Added earned_date and expired_days columns to comp_off_tracking")
-                await conn.commit()
-            except Exception as e:
-                print(f"Error adding columns: {e}")
-                await conn.rollback()
-
-            try:
-                # Create comp_off_details table
-                print("Creating comp_off_details table...")
-                await conn.execute(text("""
-                    CREATE TABLE IF NOT EXISTS comp_off_details (
-                        id SERIAL PRIMARY KEY,
-                        employee_id INTEGER NOT NULL,
-                        tracking_id INTEGER NOT NULL,
-                        type VARCHAR(50) DEFAULT 'earned',
-                        date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        earned_month VARCHAR(7),
-                        expired_at TIMESTAMP,
-                        notes VARCHAR(255),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_compoff_detail_employee FOREIGN KEY (employee_id) 
-                            REFERENCES employees(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_compoff_detail_tracking FOREIGN KEY (tracking_id) 
-                            REFERENCES comp_off_tracking(id) ON DELETE CASCADE
-                    )
-                """))
-                print("✓ Created comp_off_details table")
-                await conn.commit()
-            except Exception as e:
-                print(f"Error creating table: {e}")
-                await conn.rollback()
-
-            # Create indexes for performance
-            try:
-                print("Creating indexes...")
-                await conn.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_compoff_details_employee 
-                    ON comp_off_details(employee_id)
-                """))
-                await conn.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_compoff_details_earned_month 
-                    ON comp_off_details(earned_month)
-                """))
-                await conn.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_compoff_details_type 
-                    ON comp_off_details(type)
-                """))
-                print("✓ Created indexes for comp_off_details")
-                await conn.commit()
-            except Exception as e:
-                print(f"Note: {e}")
-
-            print("✓ Database migration completed successfully!")
-    except Exception as e:
-        print(f"Database upgrade error: {e}")
-
-
-async def add_manager_id_column():
-    """Migration to add manager_id field to Manager table"""
-    from app.database import engine
-    from sqlalchemy import text
-    
-    try:
-        async with engine.begin() as conn:
-            # Check if column already exists
-            result = await conn.execute(
-                text("SELECT column_name FROM information_schema.columns WHERE table_name='managers' AND column_name='manager_id'")
-            )
-            if result.scalar():
-                print("✓ manager_id column already exists")
-                return
-            
-            print("Adding manager_id column to managers table...")
-            
-            # Add the column
-            await conn.execute(
-                text("ALTER TABLE managers ADD COLUMN manager_id VARCHAR(10) UNIQUE")
-            )
-            await conn.commit()
-            print("✓ Column added successfully")
-            
-            # Get all managers and assign manager_ids
-            print("Populating manager_id values...")
-            result = await conn.execute(text("SELECT id FROM managers ORDER BY id"))
-            managers = result.fetchall()
-            
-            for manager in managers:
-                manager_id_str = f"{manager[0]:03d}"  # Format as 3-digit: 001, 002, 003
-                await conn.execute(
-                    text(f"UPDATE managers SET manager_id = '{manager_id_str}' WHERE id = {manager[0]}")
-                )
-                print(f"  Manager {manager[0]} -> {manager_id_str}")
-            
-            await conn.commit()
-            print(f"✓ Created manager_ids for {len(managers)} managers")
-            
-    except Exception as e:
-        print(f"Manager ID migration error: {e}")
-
-
-async def add_employee_id_column():
-    """Migration to add employee_id column to employees table"""
-    from app.database import engine
-    from sqlalchemy import text
-    
-    try:
-        async with engine.begin() as conn:
-            # Check if column already exists
-            result = await conn.execute(
-                text("""
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name='employees' AND column_name='employee_id'
-                """)
-            )
-            
-            if result.fetchone():
-                print("✓ Column employee_id already exists")
-            else:
-                print("Adding employee_id column...")
-                await conn.execute(
-                    text("""
-                        ALTER TABLE employees 
-                        ADD COLUMN employee_id VARCHAR(10)
-                    """)
-                )
-                print("✓ Column employee_id added")
-                
-                # Update existing employees with auto-generated IDs
-                print("Generating employee IDs...")
-                await conn.execute(
-                    text("""
-                        UPDATE employees 
-                        SET employee_id = LPAD(id::text, 5, '0')
-                        WHERE employee_id IS NULL
-                    """)
-                )
-                print("✓ Employee IDs generated")
-                
-                # Make it unique and not null
-                print("Adding constraints...")
-                await conn.execute(
-                    text("""
-                        ALTER TABLE employees 
-                        ALTER COLUMN employee_id SET NOT NULL
-                    """)
-                )
-                await conn.execute(
-                    text("""
-                        CREATE UNIQUE INDEX IF NOT EXISTS idx_employee_id 
-                        ON employees(employee_id)
-                    """)
-                )
-                print("✓ Constraints added")
-                await conn.commit()
-            
-    except Exception as e:
-        print(f"Employee ID migration error: {e}")
-
-
-
-
 @app.on_event("startup")
 async def startup_event():
-    """Run all database migrations on startup"""
-    print("\n" + "="*60)
-    print("Running database migrations on startup...")
-    print("="*60)
-    
-    # Run migrations in order
-    await add_employee_id_column()
-    await add_manager_id_column()
-    await upgrade_database()
-    
-    print("="*60)
-    print("All migrations completed!")
-    print("="*60 + "\n")
+    """
+    Verify the database schema revision (no DDL here - migrations are applied
+    by `python migrate.py` before the workers start)
+    """
+    if settings.SCHEMA_VERSION_CHECK:
+        revisions = await check_schema_version(engine)
+        print(f"✓ Database schema at revision {', '.join(sorted(revisions))}")
+    if settings.DB_POOL_LOG_INTERVAL_SECONDS > 0:
+        app.state.pool_log_task = asyncio.create_task(log_pool_status(settings.DB_POOL_LOG_INTERVAL_SECONDS))
+    async with async_session_maker() as db:
+        company_holidays = await load_company_holidays(db)
+    print(f"✓ Holiday calendar loaded ({company_holidays} company holidays)")
+    if settings.HOLIDAY_REFRESH_SECONDS > 0:
+        app.state.holiday_refresh_task = asyncio.create_task(
+            refresh_company_holidays(async_session_maker, settings.HOLIDAY_REFRESH_SECONDS)
+        )
+    app.state.notification_listener_task = asyncio.create_task(listen_for_notifications(engine))
+    app.state.principal_listener_task = asyncio.create_task(listen_for_principal_changes(engine))
+    app.state.schedule_change_prune_task = asyncio.create_task(
+        prune_schedule_changes_periodically(async_session_maker, settings.SCHEDULE_CHANGE_RETENTION_HOURS)
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop CP-SAT solver / export render worker processes and the background tasks"""
+    shutdown_solver_pool()
+    shutdown_render_pool()
+    password_hasher.shutdown()
+    for task_name in ("pool_log_task", "holiday_refresh_task", "notification_listener_task",
+                      "principal_listener_task", "schedule_change_prune_task"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
 
 
 # =============== HELPER FUNCTIONS ===============
@@ -368,69 +237,10 @@ async def validate_5_shifts_per_week(
     
     Returns: (is_valid, error_message)
     """
-    week_start = target_date - timedelta(days=target_date.weekday())
-    week_end = week_start + timedelta(days=6)
-    
-    # Get required shifts for this week (considering Japanese holidays)
-    required_shifts = jp_calendar.get_shifts_required_for_week(week_start)
-    
-    # Count WEEKDAY (Mon-Fri) coverage: regular shifts + comp-off (both count toward requirement)
-    weekday_coverage_query = select(func.count(Schedule.id)).filter(
-        Schedule.employee_id == employee_id,
-        Schedule.date >= week_start,
-        Schedule.date <= week_end,
-        Schedule.status.in_(['scheduled', 'leave', 'comp_off_taken', 'comp_off_earned', 'leave_half_morning', 'leave_half_afternoon']),
-        # Only count Mon-Fri (1=Mon, 5=Fri in PostgreSQL extraction)
-        func.extract('dow', Schedule.date).in_([1, 2, 3, 4, 5])
+    weekday_coverage, weekend_regular_shifts = await count_week_coverage(
+        db, employee_id, target_date, exclude_schedule_id
     )
-    
-    if exclude_schedule_id:
-        weekday_coverage_query = weekday_coverage_query.filter(Schedule.id != exclude_schedule_id)
-    
-    result = await db.execute(weekday_coverage_query)
-    weekday_coverage = result.scalar() or 0
-    
-    # Count weekend (Sat-Sun) shifts - only comp-off (earning extra time off) don't count
-    weekend_regular_query = select(func.count(Schedule.id)).filter(
-        Schedule.employee_id == employee_id,
-        Schedule.date >= week_start,
-        Schedule.date <= week_end,
-        Schedule.status.in_(['scheduled', 'leave', 'leave_half_morning', 'leave_half_afternoon']),  # Regular shifts only
-        # Only count Sat-Sun (6=Sat, 0=Sun in PostgreSQL extraction)
-        func.extract('dow', Schedule.date).in_([6, 0])
-    )
-    
-    if exclude_schedule_id:
-        weekend_regular_query = weekend_regular_query.filter(Schedule.id != exclude_schedule_id)
-    
-    result = await db.execute(weekend_regular_query)
-    weekend_regular_shifts = result.scalar() or 0
-    
-    # Get week info for detailed error messaging
-    week_info = jp_calendar.get_week_info(week_start)
-    holiday_str = ""
-    if week_info['weekday_holiday_count'] > 0:
-        holiday_names = [day['holiday_name'] for day in week_info['days'] if day['holiday_name']]
-        holiday_str = f" (Contains {week_info['weekday_holiday_count']} weekday holiday(s): {', '.join(holiday_names)})"
-    
-    # Check if target is weekday or weekend
-    target_weekday = target_date.weekday()  # 0=Mon, 5=Sat, 6=Sun
-    
-    if target_weekday >= 5:
-        # Weekend (Sat-Sun) shift
-        # Check if weekday requirement is already met
-        if weekday_coverage >= required_shifts:
-            return False, f"Cannot assign weekend shift on {target_date} - weekday requirement already met. Employee has {weekday_coverage} weekday shifts/comp-offs (required: {required_shifts}){holiday_str}"
-        # Weekend regular shifts also count toward total
-        total_shifts = weekday_coverage + weekend_regular_shifts
-        if total_shifts >= required_shifts:
-            return False, f"Cannot assign more than {required_shifts} shifts per week. Employee has {weekday_coverage} weekday + {weekend_regular_shifts} weekend shifts (total: {total_shifts}){holiday_str}"
-    else:
-        # Weekday (Mon-Fri) shift
-        if weekday_coverage >= required_shifts:
-            return False, f"Cannot assign more than {required_shifts} weekday shifts per week. Employee already has {weekday_coverage} weekday shifts/comp-offs (required: {required_shifts}){holiday_str} (Mon-Sun: {week_start} to {week_end})"
-    
-    return True, ""
+    return check_weekly_shift_limit(target_date, weekday_coverage, weekend_regular_shifts)
 
 
 async def validate_consecutive_shifts_limit(
@@ -497,16 +307,30 @@ async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
+    started = time.perf_counter()
+    try:
+        return await authenticate_login(form_data, db)
+    finally:
+        login_latency.observe(time.perf_counter() - started)
+
+
+async def authenticate_login(form_data: OAuth2PasswordRequestForm, db: AsyncSession) -> dict:
     result = await db.execute(select(User).filter(User.username == form_data.username))
     user = result.scalar_one_or_none()
-    
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Don't hold a pooled connection while the password hash waits for a thread
+    await db.commit()
+
+    valid, upgraded_hash = await password_hasher.verify(form_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Rehash with the current Argon2 parameters
+    if upgraded_hash:
+        user.hashed_password = upgraded_hash
     # Update last login
     user.last_login = datetime.utcnow()
     await db.commit()
@@ -579,7 +403,7 @@ async def create_user(
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await password_hasher.hash(user_data.password),
         full_name=user_data.full_name,
         user_type=user_data.user_type,
         is_active=True
@@ -601,6 +425,47 @@ async def list_users(
     return result.scalars().all()
 
 
+@app.get("/admin/auth/hashing")
+async def get_password_hashing_stats(current_user: User = Depends(require_admin)):
+    """
+    Password hashing pool of the worker serving the request: threads,
+    pending / rejected hashes, Argon2 parameters and latency histograms of
+    the queue wait, the hash itself and the whole login, for tuning
+    PASSWORD_HASH_THREADS and PASSWORD_ARGON2_*
+    """
+    return {
+        "worker_pid": os.getpid(),
+        "hashing": password_hasher.status(),
+        "login": login_latency.snapshot()
+    }
+
+
+@app.get("/admin/db/pool")
+async def get_db_pool_stats(
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Connection pool of the worker serving the request: settings, connections
+    checked out / overflow, checkout wait times and timeouts, plus the
+    server's max_connections and its current connection count for sizing
+    DB_POOL_SIZE + DB_MAX_OVERFLOW across workers
+    """
+    server_result = await db.execute(text(
+        "SELECT current_setting('max_connections')::int, "
+        "(SELECT count(*) FROM pg_stat_activity WHERE datname = current_database())"
+    ))
+    max_connections, database_connections = server_result.one()
+    return {
+        "worker_pid": os.getpid(),
+        "pool": pool_status(),
+        "server": {
+            "max_connections": max_connections,
+            "database_connections": database_connections
+        }
+    }
+
+
 @app.delete("/admin/users/{user_id}")
 async def delete_user(
     user_id: int,
@@ -692,10 +557,13 @@ async def update_department(
 
 @app.get("/departments", response_model=List[DepartmentResponse])
 async def list_departments(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     # All authenticated users can view active departments
+    await set_etag(request, response, ['departments:all'], db, current_user)
     result = await db.execute(select(Department).filter(Department.is_active == True))
     return result.scalars().all()
 
@@ -1216,7 +1084,7 @@ async def create_employee(
             username=username,
             email=emp_data.email,
             full_name=f"{emp_data.first_name} {emp_data.last_name}",
-            hashed_password=get_password_hash(emp_data.password),
+            hashed_password=await password_hasher.hash(emp_data.password),
             user_type=UserType.EMPLOYEE,
             is_active=True
         )
@@ -1234,6 +1102,8 @@ async def create_employee(
 
 @app.get("/employees", response_model=List[EmployeeResponse])
 async def list_employees(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     show_inactive: bool = False,  # Query parameter to show inactive employees
     db: AsyncSession = Depends(get_db)
@@ -1242,6 +1112,7 @@ async def list_employees(
 
     if current_user.user_type == UserType.ADMIN:
         # Admin sees all employees in their departments
+        await set_etag(request, response, ['employees:d:*'], db, current_user)
         if not show_inactive:
             filters.append(Employee.is_active == True)
         result = await db.execute(select(Employee).filter(*filters) if filters else select(Employee))
@@ -1250,6 +1121,7 @@ async def list_employees(
         manager_result = await db.execute(select(Manager).filter(Manager.user_id == current_user.id))
         manager = manager_result.scalar_one_or_none()
 
+        await set_etag(request, response, [f'employees:d:{manager.department_id}'] if manager else [], db, current_user)
         if manager:
             filters.append(Employee.department_id == manager.department_id)
             if not show_inactive:
@@ -1261,6 +1133,8 @@ async def list_employees(
                 select(Employee).filter(Employee.id == -1)  # Returns empty
             )
     else:  # Employee
+        # Their own record: covered by the principal counter
+        await set_etag(request, response, [], db, current_user)
         if not show_inactive:
             filters.append(Employee.is_active == True)
         filters.append(Employee.user_id == current_user.id)
@@ -1302,7 +1176,7 @@ async def update_employee(
             result = await db.execute(select(User).filter(User.id == employee.user_id))
             user = result.scalar_one_or_none()
             if user:
-                user.hashed_password = get_password_hash(emp_data.password)
+                user.hashed_password = await password_hasher.hash(emp_data.password)
                 # Ensure user is in the session
                 db.add(user)
         else:
@@ -1314,7 +1188,7 @@ async def update_employee(
                     username=username,
                     email=emp_data.email,
                     full_name=f"{emp_data.first_name} {emp_data.last_name}",
-                    hashed_password=get_password_hash(emp_data.password),
+                    hashed_password=await password_hasher.hash(emp_data.password),
                     user_type=UserType.EMPLOYEE,
                     is_active=True
                 )
@@ -1394,6 +1268,8 @@ async def create_role(
 
 @app.get("/roles", response_model=List[RoleDetailResponse])
 async def list_roles(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -1404,10 +1280,12 @@ async def list_roles(
     )
 
     if current_user.user_type == UserType.ADMIN:
+        await set_etag(request, response, ['roles:d:*', 'shifts:d:*'], db, current_user)
         stmt = stmt.filter(Role.is_active == True)
     else:
         # For managers, use get_manager_department helper
         manager_dept = await get_manager_department(current_user, db)
+        await set_etag(request, response, [f'roles:d:{manager_dept}', f'shifts:d:{manager_dept}'] if manager_dept else [], db, current_user)
         stmt = stmt.filter(
             Role.department_id == manager_dept,
             Role.is_active == True
@@ -1513,6 +1391,10 @@ async def delete_role(
 # Helper functions to resolve department ownership
 async def get_user_department(user: User, db: AsyncSession) -> Optional[int]:
     """Resolve the department for a manager or employee user"""
+    principal = principal_cache.for_user(user.id)
+    if principal is not None:
+        return principal.department_id
+
     if user.user_type == UserType.MANAGER:
         result = await db.execute(select(Manager).filter(Manager.user_id == user.id))
         manager = result.scalar_one_or_none()
@@ -1526,6 +1408,15 @@ async def get_user_department(user: User, db: AsyncSession) -> Optional[int]:
     return None
 
 
+async def get_user_employee_id(user: User, db: AsyncSession) -> Optional[int]:
+    """Resolve the Employee.id linked to an employee user"""
+    principal = principal_cache.for_user(user.id)
+    if principal is not None:
+        return principal.employee_id
+    result = await db.execute(select(Employee.id).filter(Employee.user_id == user.id))
+    return result.scalars().first()
+
+
 async def get_manager_department(user: User, db: AsyncSession) -> Optional[int]:
     """Get the department ID for a manager user"""
     if user.user_type != UserType.MANAGER:
@@ -1615,28 +1506,7 @@ async def check_in(
         
         # Calculate late status
         now = datetime.now()
-        status_val = "on-time"
-        
-        try:
-            if isinstance(schedule.start_time, str):
-                scheduled_time = datetime.strptime(schedule.start_time, "%H:%M").time()
-            else:
-                scheduled_time = schedule.start_time if isinstance(schedule.start_time, type(None)) is False else datetime.strptime("09:00", "%H:%M").time()
-            
-            if scheduled_time:
-                scheduled_datetime = datetime.combine(today, scheduled_time)
-                diff_minutes = (now - scheduled_datetime).total_seconds() / 60
-                
-                if diff_minutes <= 0:
-                    status_val = "on-time"
-                elif diff_minutes <= 15:
-                    status_val = "slightly-late"
-                else:
-                    status_val = "late"
-        except (ValueError, TypeError, AttributeError) as e:
-            # If we can't parse the time, just mark as on-time
-            print(f"Time parsing error: {str(e)}")
-            status_val = "on-time"
+        status_val = check_in_status(schedule.start_time, now)
         
         # Create check-in record
         check_in = CheckInOut(
@@ -1787,32 +1657,24 @@ async def check_out(
             
             # Calculate worked hours and overtime
             if check_in.check_in_time and check_in.check_out_time:
-                total_minutes = (check_in.check_out_time - check_in.check_in_time).total_seconds() / 60
-                
-                # Get break minutes from role, but only apply if total time is long enough
-                break_minutes = 0
+                # Break from the role, only deducted if the total time is at
+                # least the break duration; minutes count from midnight of
+                # today so a check-out after midnight does not wrap
+                role_break = 0
                 if check_in.schedule and check_in.schedule.role:
                     role_break = check_in.schedule.role.break_minutes or 0
-                    # Only apply break if total time is at least the break duration
-                    if total_minutes >= role_break:
-                        break_minutes = role_break
-                
-                worked_minutes = max(0, total_minutes - break_minutes)
-                worked_hours = round(worked_minutes / 60, 2)
+                hours = compute_hours(
+                    minutes_array([check_in.check_in_time], day=today),
+                    minutes_array([check_in.check_out_time], day=today),
+                    break_minutes=role_break
+                )
+                break_minutes = int(hours.break_minutes[0])
+                worked_hours = round(float(hours.worked_hours[0]), 2)
                 
                 attendance.worked_hours = worked_hours
                 attendance.break_minutes = break_minutes
                 
-                # ==================== OVERTIME CALCULATION ====================
-                # Rule: Calculate overtime based on approved overtime window
-                # If 1hr approved OT 18-19 and shift is 9-18:
-                #   - Checkout at 19:00 → 1hr OT
-                #   - Checkout at 19:30 → 1hr OT (capped by approval)
-                #   - Checkout at 18:30 → 0.5hr OT (proportional)
-                
-                attendance.overtime_hours = 0.0
-                
-                # Get approved overtime for this date if exists
+                # Overtime within the approved window (see checkout_overtime_hours)
                 approved_ot_result = await db.execute(
                     select(OvertimeRequest).filter(
                         OvertimeRequest.employee_id == employee.id,
@@ -1820,67 +1682,10 @@ async def check_out(
                         OvertimeRequest.status == OvertimeStatus.APPROVED
                     )
                 )
-                overtime_request = approved_ot_result.scalar_one_or_none()
-                
-                if overtime_request and check_in.schedule:
-                    # Parse shift end time
-                    try:
-                        shift_end_str = check_in.schedule.end_time
-                        if isinstance(shift_end_str, str):
-                            shift_end_h, shift_end_m = map(int, shift_end_str.split(':'))
-                        else:
-                            shift_end_h, shift_end_m = shift_end_str.hour, shift_end_str.minute
-                        
-                        shift_end_time = datetime.combine(today, datetime.min.time().replace(hour=shift_end_h, minute=shift_end_m))
-                        
-                        # Parse approved OT window (from_time to to_time)
-                        ot_start_str = overtime_request.from_time
-                        ot_end_str = overtime_request.to_time
-                        
-                        if ot_start_str and ot_end_str:
-                            ot_start_h, ot_start_m = map(int, ot_start_str.split(':'))
-                            ot_end_h, ot_end_m = map(int, ot_end_str.split(':'))
-                            
-                            ot_window_start = datetime.combine(today, datetime.min.time().replace(hour=ot_start_h, minute=ot_start_m))
-                            ot_window_end = datetime.combine(today, datetime.min.time().replace(hour=ot_end_h, minute=ot_end_m))
-                            
-                            # Calculate how much OT was actually worked
-                            # OT period: from shift end to checkout time, capped by approval window
-                            # Example: Shift ends 18:00, approved OT 18:00-20:00, checkout 19:30
-                            # → OT worked: 18:00-19:30 = 1.5 hours (within 2-hour window)
-                            
-                            ot_period_start = shift_end_time  # When OT begins (shift end)
-                            ot_period_end = check_in.check_out_time  # When employee actually left
-                            
-                            # Cap the actual OT by the approved window
-                            actual_ot_start = max(ot_period_start, ot_window_start)
-                            actual_ot_end = min(ot_period_end, ot_window_end)
-                            
-                            if actual_ot_end > actual_ot_start:
-                                actual_ot_minutes = (actual_ot_end - actual_ot_start).total_seconds() / 60
-                                actual_ot_hours = actual_ot_minutes / 60
-                                
-                                # Cap at approved hours
-                                overtime_hours = min(actual_ot_hours, overtime_request.request_hours)
-                                attendance.overtime_hours = round(overtime_hours, 2)
-                        else:
-                            # No specific time window, use approved hours if worked > 8hrs/day
-                            actual_overtime = worked_hours - employee.daily_max_hours
-                            if actual_overtime > 0:
-                                overtime_hours = min(actual_overtime, overtime_request.request_hours)
-                                attendance.overtime_hours = round(overtime_hours, 2)
-                    except Exception as e:
-                        print(f"Error parsing OT times: {str(e)}")
-                        # Fallback: simple calculation
-                        actual_overtime = worked_hours - employee.daily_max_hours
-                        if actual_overtime > 0:
-                            overtime_hours = min(actual_overtime, overtime_request.request_hours)
-                            attendance.overtime_hours = round(overtime_hours, 2)
-                elif worked_hours > employee.daily_max_hours:
-                    # No approved OT, but worked more than 8hrs - show actual OT
-                    actual_overtime = worked_hours - employee.daily_max_hours
-                    attendance.overtime_hours = round(actual_overtime, 2)
-                # ==================== END OVERTIME CALCULATION ====================
+                attendance.overtime_hours = checkout_overtime_hours(
+                    today, check_in.check_out_time, worked_hours, employee.daily_max_hours,
+                    check_in.schedule, approved_ot_result.scalar_one_or_none()
+                )
             
             db.add(attendance)
             await db.commit()
@@ -1901,6 +1706,86 @@ async def check_out(
         raise HTTPException(status_code=500, detail=f"Check-out failed: {error_msg}")
 
 
+@app.post("/devices/punches", response_model=PunchBatchResponse)
+async def ingest_device_punches(
+    batch: PunchBatch,
+    device: PunchDevice = Depends(require_device),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Check-in / check-out punches buffered by a kiosk or badge reader
+    (X-Device-Key header). Each punch carries an idempotency key: replaying
+    a batch returns the stored results instead of punching again. Results
+    are per punch, in request order.
+    """
+    if len(batch.punches) > settings.PUNCH_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"At most {settings.PUNCH_BATCH_MAX_SIZE} punches per batch"
+        )
+
+    results = await ingest_punches(db, device, batch.punches)
+    counts = defaultdict(int)
+    for result in results:
+        counts[result['status']] += 1
+    print(
+        f"[DEBUG] Device {device.id} punches: {len(results)} received, {counts['accepted']} accepted, "
+        f"{counts['rejected']} rejected, {counts['duplicate']} duplicates",
+        flush=True
+    )
+    return {
+        'device_id': device.id,
+        'received': len(results),
+        'accepted': counts['accepted'],
+        'rejected': counts['rejected'],
+        'duplicates': counts['duplicate'],
+        'results': results
+    }
+
+
+@app.post("/admin/devices", response_model=PunchDeviceCreated)
+async def create_punch_device(
+    device_data: PunchDeviceCreate,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Register a kiosk / badge reader; the API key is only returned here"""
+    if device_data.department_id is not None and not await db.get(Department, device_data.department_id):
+        raise HTTPException(status_code=404, detail="Department not found")
+
+    api_key = generate_device_key()
+    device = PunchDevice(
+        name=device_data.name, department_id=device_data.department_id, api_key_hash=hash_device_key(api_key)
+    )
+    db.add(device)
+    await db.commit()
+    await db.refresh(device)
+    return {**PunchDeviceResponse.model_validate(device).model_dump(), 'api_key': api_key}
+
+
+@app.get("/admin/devices", response_model=List[PunchDeviceResponse])
+async def list_punch_devices(
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(select(PunchDevice).order_by(PunchDevice.id))
+    return result.scalars().all()
+
+
+@app.delete("/admin/devices/{device_id}")
+async def deactivate_punch_device(
+    device_id: int,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revoke a device's key (its punch receipts are kept)"""
+    device = await db.get(PunchDevice, device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    device.is_active = False
+    await db.commit()
+    return {"message": "Device deactivated", "device_id": device_id}
+
+
 @app.post("/attendance/record")
 async def record_attendance(
     attendance_data: dict,
@@ -1930,6 +1815,13 @@ async def record_attendance(
         if not schedule:
             raise HTTPException(status_code=400, detail="Schedule not found")
         
+        # One attendance record per employee per day
+        existing_result = await db.execute(
+            select(Attendance.id).filter(Attendance.employee_id == employee.id, Attendance.date == today)
+        )
+        if existing_result.scalar_one_or_none():
+            raise HTTPException(status_code=400, detail="Attendance already recorded for today")
+        
         # Create attendance record
         attendance = Attendance(
             employee_id=employee.id,
@@ -2014,11 +1906,17 @@ async def get_attendance(
         result = await db.execute(query.order_by(Attendance.date.desc()))
         attendance_records = list(result.scalars().all())
         
-        # Calculate and populate night_hours if not already set
+        # Calculate and populate night_hours if not already set (one batch)
+        missing_night = [r for r in attendance_records if r.in_time and r.out_time and not r.night_hours]
+        if missing_night:
+            night = night_minutes(
+                minutes_array(r.in_time for r in missing_night),
+                minutes_array(r.out_time for r in missing_night)
+            ) / 60
+            for record, night_hours in zip(missing_night, night.tolist()):
+                record.night_hours = night_hours
+
         for record in attendance_records:
-            if record.in_time and record.out_time and not record.night_hours:
-                record.night_hours = calculate_night_hours(record.in_time, record.out_time, night_start_hour=22)
-            
             # If schedule is a leave/comp-off, clear the times for employees viewing
             if current_user.user_type == UserType.EMPLOYEE and record.schedule and record.schedule.status in ['leave', 'comp_off_taken', 'comp_off_earned']:
                 record.schedule.start_time = None
@@ -2140,6 +2038,7 @@ async def get_attendance_stats(
     start_date: date,
     end_date: date,
     current_user: User = Depends(get_current_active_user),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Get attendance statistics"""
@@ -2149,7 +2048,7 @@ async def get_attendance_stats(
     )
 
     if current_user.user_type == UserType.EMPLOYEE:
-        query = query.filter(CheckInOut.employee_id == current_user.employee_id)
+        query = query.filter(CheckInOut.employee_id == principal.employee_id)
     elif current_user.user_type == UserType.MANAGER:
         manager_dept = await get_manager_department(current_user, db)
         if manager_dept:
@@ -2174,382 +2073,57 @@ async def get_attendance_stats(
 
 
 # Attendance Reports (Excel Export)
+async def get_report_department(db: AsyncSession, current_user: User, department_id: int) -> Department:
+    """Department of an attendance report: admins any department, managers only their own"""
+    if current_user.user_type == UserType.MANAGER:
+        manager_result = await db.execute(
+            select(Manager).filter(Manager.user_id == current_user.id, Manager.department_id == department_id)
+        )
+        if not manager_result.scalar_one_or_none():
+            raise HTTPException(status_code=403, detail="You don't have permission to download reports for this department")
+    elif current_user.user_type != UserType.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins and managers can download attendance reports")
+
+    dept_result = await db.execute(select(Department).filter(Department.id == department_id))
+    department = dept_result.scalar_one_or_none()
+    if not department:
+        raise HTTPException(status_code=404, detail="Department not found")
+    return department
+
+
 @app.get("/attendance/export/monthly")
 async def export_monthly_attendance(
     department_id: int,
     year: int,
     month: int,
+    request: Request,
     employment_type: Optional[str] = None,
     language: str = 'en',
+    format: str = 'xlsx',
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Export monthly attendance report as Excel
     employment_type: Optional filter - 'full_time', 'part_time', or None for all
     language: Language for Excel ('en' or 'ja')
+    format: 'xlsx' (default), 'csv' or 'parquet' (attendance rows only)
+    Served from the export cache while the month's data is unchanged (ETag / If-None-Match)
     """
     try:
-        # Check authorization: only admins can download any department, managers only their own
-        if current_user.user_type == UserType.MANAGER:
-            # For managers, check if they manage this department
-            manager_result = await db.execute(
-                select(Manager).filter(Manager.user_id == current_user.id, Manager.department_id == department_id)
-            )
-            if not manager_result.scalar_one_or_none():
-                raise HTTPException(status_code=403, detail="You don't have permission to download reports for this department")
-        elif current_user.user_type != UserType.ADMIN:
-            raise HTTPException(status_code=403, detail="Only admins and managers can download attendance reports")
-
-        # Get department
-        dept_result = await db.execute(select(Department).filter(Department.id == department_id))
-        department = dept_result.scalar_one_or_none()
-        if not department:
-            raise HTTPException(status_code=404, detail="Department not found")
-
-        # Get employees in department with optional employment_type filter
-        emp_query = select(Employee).filter(Employee.department_id == department_id, Employee.is_active == True)
-        if employment_type and employment_type in ['full_time', 'part_time']:
-            emp_query = emp_query.filter(Employee.employment_type == employment_type)
-        
-        emp_result = await db.execute(emp_query)
-        employees = emp_result.scalars().all()
+        department = await get_report_department(db, current_user, department_id)
 
-        # Get attendance for the month
         start_date = date(year, month, 1)
         end_date = date(year, month, monthrange(year, month)[1])
-
-        att_result = await db.execute(
-            select(Attendance).filter(
-                Attendance.employee_id.in_([e.id for e in employees]) if employees else False,
-                Attendance.date >= start_date,
-                Attendance.date <= end_date
-            ).order_by(Attendance.date, Attendance.employee_id)
-        )
-        attendance_records = att_result.scalars().all()
-
-        # Create workbook
-        wb = Workbook()
-        
-        # Define professional styles
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        title_font = Font(bold=True, size=14)
-        section_font = Font(bold=True, size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        center_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        summary_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-        summary_font = Font(bold=True, color="000000")
-        
-        # Create Summary Sheet First
-        summary_ws = wb.active
-        summary_ws.title = "Summary"
-        
-        # Title
-        summary_ws['A1'] = f"{department.name} - {get_excel_translation('monthly_attendance_summary', language)}"
-        summary_ws['A1'].font = title_font
-        summary_ws.merge_cells('A1:B1')
-        
-        summary_ws['A2'] = f"{calendar.month_name[month]} {year}"
-        summary_ws['A2'].font = Font(size=11)
-        summary_ws.merge_cells('A2:B2')
-        
-        summary_ws['A3'] = ""
-        
-        # Get all dates in the month to calculate statistics
-        from dateutil.rrule import rrule, DAILY
-        import datetime
-        all_dates = list(rrule(DAILY, dtstart=start_date, until=end_date))
-        
-        # Calculate public holidays and weekends
-        from app.holidays_jp import JapaneseCalendar
-        jp_calendar = JapaneseCalendar()
-        jp_holidays_dict = jp_calendar.get_holidays_in_range(start_date, end_date)
-        
-        # Count working days, holidays, weekends
-        public_holidays = 0
-        weekends = 0
-        working_days_available = 0
-        
-        for current_date in all_dates:
-            date_obj = current_date.date() if hasattr(current_date, 'date') else current_date
-            is_weekend = date_obj.weekday() >= 5  # Saturday = 5, Sunday = 6
-            is_public_holiday = date_obj in jp_holidays_dict
-            
-            if is_public_holiday:
-                public_holidays += 1
-            elif is_weekend:
-                weekends += 1
-            else:
-                working_days_available += 1
-        
-        # Calculate totals from attendance records
-        total_worked_hours = 0
-        total_overtime_hours = 0
-        working_days_actual = 0
-        
-        for record in attendance_records:
-            if record.worked_hours and record.worked_hours > 0:
-                total_worked_hours += record.worked_hours
-                working_days_actual += 1
-            if record.overtime_hours:
-                total_overtime_hours += record.overtime_hours
-        
-        # Summary data with styling
-        summary_ws['A4'] = get_excel_translation('department_statistics', language)
-        summary_ws['A4'].font = section_font
-        summary_ws['A4'].fill = summary_fill
-        summary_ws['A4'].border = border
-        summary_ws['B4'].fill = summary_fill
-        summary_ws['B4'].border = border
-        
-        summary_data = [
-            [get_excel_translation('total_days_in_month', language), len(all_dates)],
-            [get_excel_translation('public_holidays', language), public_holidays],
-            [get_excel_translation('weekends', language), weekends],
-            [get_excel_translation('total_non_working_days', language), public_holidays + weekends],
-            [get_excel_translation('working_days_available', language), working_days_available],
-            [get_excel_translation('working_days_completed', language), working_days_actual],
-            ['', ''],
-            [get_excel_translation('total_working_hours_all', language), f'{total_worked_hours:.2f}'],
-            [get_excel_translation('total_overtime_hours_all', language), f'{total_overtime_hours:.2f}'],
-        ]
-        
-        row = 5
-        for label, value in summary_data:
-            summary_ws[f'A{row}'] = label
-            summary_ws[f'B{row}'] = value
-            if label:  # Skip empty rows
-                summary_ws[f'A{row}'].font = summary_font
-                summary_ws[f'A{row}'].fill = summary_fill
-                summary_ws[f'B{row}'].border = border
-                summary_ws[f'B{row}'].alignment = Alignment(horizontal='right')
-            summary_ws[f'A{row}'].border = border
-            row += 1
-        
-        # Holiday Details
-        holiday_row = row + 1
-        summary_ws[f'A{holiday_row}'] = get_excel_translation('public_holidays_in_month', language)
-        summary_ws[f'A{holiday_row}'].font = section_font
-        summary_ws[f'A{holiday_row}'].fill = summary_fill
-        summary_ws[f'A{holiday_row}'].border = border
-        summary_ws[f'B{holiday_row}'].fill = summary_fill
-        summary_ws[f'B{holiday_row}'].border = border
-        summary_ws.merge_cells(f'A{holiday_row}:B{holiday_row}')
-        
-        holiday_row += 1
-        for holiday_date, holiday_name in jp_holidays_dict.items():
-            summary_ws[f'A{holiday_row}'] = holiday_date.isoformat()
-            summary_ws[f'B{holiday_row}'] = holiday_name
-            summary_ws[f'A{holiday_row}'].border = border
-            summary_ws[f'B{holiday_row}'].border = border
-            holiday_row += 1
-        
-        # Adjust column widths for summary
-        summary_ws.column_dimensions['A'].width = 35
-        summary_ws.column_dimensions['B'].width = 20
-        
-        # Create Attendance Details Sheet
-        ws = wb.create_sheet("Attendance Details")
-        ws.title = f"{get_excel_translation('attendance_details', language)}"
-
-        # Title and Info
-        ws['A1'] = f"{department.name} - {get_excel_translation('monthly_attendance_report', language)}"
-        ws['A1'].font = title_font
-        ws.merge_cells('A1:N1')
-
-        ws['A2'] = f"{calendar.month_name[month]} {year} | {get_excel_translation('total_employees', language)}: {len(employees)}"
-        ws['A2'].font = Font(size=11)
-        ws.merge_cells('A2:N2')
-
-        ws['A3'] = ""
-
-        # Headers - Same as weekly format for consistency
-        headers = [
-            get_excel_translation('employee_id', language),
-            get_excel_translation('name', language),
-            get_excel_translation('date', language),
-            get_excel_translation('leave_status', language),
-            get_excel_translation('assigned_shift', language),
-            get_excel_translation('total_hrs_assigned', language),
-            get_excel_translation('check_in', language),
-            get_excel_translation('check_out', language),
-            get_excel_translation('total_hrs_worked', language),
-            get_excel_translation('break_time', language),
-            get_excel_translation('overtime_hours', language),
-            get_excel_translation('status', language),
-            get_excel_translation('comp_off_earned', language),
-            get_excel_translation('comp_off_used', language)
-        ]
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = center_alignment
-            cell.border = border
-
-        # Get schedules for shift information
-        sched_result = await db.execute(
-            select(Schedule).filter(
-                Schedule.employee_id.in_([e.id for e in employees]) if employees else False,
-                Schedule.date >= start_date,
-                Schedule.date <= end_date
-            )
-        )
-        schedules = sched_result.scalars().all()
-        schedule_map = {}
-        comp_off_earned_map = {}
-        for sched in schedules:
-            schedule_map[(sched.employee_id, sched.date)] = sched
-            # Track comp-off earned days
-            if sched.status == 'comp_off_earned':
-                comp_off_earned_map[(sched.employee_id, sched.date)] = True
-
-        # Get comp-off details for used days
-        compoff_details_result = await db.execute(
-            select(CompOffDetail).filter(
-                CompOffDetail.employee_id.in_([e.id for e in employees]) if employees else False,
-                CompOffDetail.date >= start_date,
-                CompOffDetail.date <= end_date,
-                CompOffDetail.type == 'used'
-            )
-        )
-        compoff_details = compoff_details_result.scalars().all()
-        comp_off_used_map = {}
-        for detail in compoff_details:
-            detail_date = detail.date.date() if hasattr(detail.date, 'date') else detail.date
-            comp_off_used_map[(detail.employee_id, detail_date)] = True
-        
-        # Get approved leave requests for the month
-        leaves_result = await db.execute(
-            select(LeaveRequest).filter(
-                LeaveRequest.employee_id.in_([e.id for e in employees]) if employees else False,
-                LeaveRequest.start_date <= end_date,
-                LeaveRequest.end_date >= start_date,
-                LeaveRequest.status == LeaveStatus.APPROVED
-            )
-        )
-        leave_requests = leaves_result.scalars().all()
-        # Create a map of (employee_id, date) -> leave info
-        leave_map = {}
-        for leave in leave_requests:
-            for i in range((leave.end_date - leave.start_date).days + 1):
-                current_date = leave.start_date + timedelta(days=i)
-                if start_date <= current_date <= end_date:
-                    leave_info = {
-                        'leave_type': leave.leave_type,
-                        'duration_type': leave.duration_type or 'full_day',
-                        'days': 0.5 if leave.duration_type and leave.duration_type.startswith('half_day') else 1.0
-                    }
-                    leave_map[(leave.employee_id, current_date)] = leave_info
-
-        # Data - Similar to weekly format
-        row = 5
-        for record in attendance_records:
-            employee = next((e for e in employees if e.id == record.employee_id), None)
-            if employee:
-                schedule = schedule_map.get((record.employee_id, record.date))
-                total_hrs_assigned = '-'
-                assigned_shift = '-'
-                if schedule and schedule.start_time and schedule.end_time:
-                    assigned_shift = f"{schedule.start_time} - {schedule.end_time}"
-                    try:
-                        start_h, start_m = map(int, schedule.start_time.split(':'))
-                        end_h, end_m = map(int, schedule.end_time.split(':'))
-                        start_decimal = start_h + start_m / 60
-                        end_decimal = end_h + end_m / 60
-                        hours = end_decimal - start_decimal if end_decimal > start_decimal else 24 - start_decimal + end_decimal
-                        total_hrs_assigned = f"{hours:.2f}"
-                    except:
-                        pass
-
-                # Check if comp-off earned or used on this date
-                comp_off_earned_str = '✓ Yes' if comp_off_earned_map.get((record.employee_id, record.date)) else '-'
-                comp_off_used_str = '✓ Yes' if comp_off_used_map.get((record.employee_id, record.date)) else '-'
-                
-                # Get leave info for this date - check both LeaveRequest and Schedule status
-                leave_info = leave_map.get((record.employee_id, record.date))
-                leave_status = '-'
-                if schedule and schedule.status in ['leave', 'leave_half_morning', 'leave_half_afternoon', 'comp_off_taken']:
-                    # Get from schedule status
-                    if schedule.status == 'leave_half_morning':
-                        leave_status = f"LEAVE - Half Day AM (0.5)"
-                    elif schedule.status == 'leave_half_afternoon':
-                        leave_status = f"LEAVE - Half Day PM (0.5)"
-                    elif schedule.status == 'comp_off_taken':
-                        leave_status = "COMP_OFF - Full Day (1.0)"
-                    else:  # 'leave'
-                        leave_status = "LEAVE - Full Day (1.0)"
-                elif leave_info:
-                    if leave_info['duration_type'] == 'half_day_morning':
-                        leave_status = f"{leave_info['leave_type'].upper()} - Half Day AM (0.5)"
-                    elif leave_info['duration_type'] == 'half_day_afternoon':
-                        leave_status = f"{leave_info['leave_type'].upper()} - Half Day PM (0.5)"
-                    else:
-                        leave_status = f"{leave_info['leave_type'].upper()} - Full Day (1.0)"
-
-                ws.cell(row=row, column=1).value = employee.employee_id
-                ws.cell(row=row, column=2).value = f"{employee.first_name} {employee.last_name}"
-                ws.cell(row=row, column=3).value = record.date.isoformat()
-                ws.cell(row=row, column=4).value = leave_status
-                ws.cell(row=row, column=5).value = assigned_shift
-                ws.cell(row=row, column=6).value = total_hrs_assigned
-                ws.cell(row=row, column=7).value = record.in_time or '-'
-                ws.cell(row=row, column=8).value = record.out_time or '-'
-                ws.cell(row=row, column=9).value = f"{record.worked_hours:.2f}" if record.worked_hours else '-'
-                ws.cell(row=row, column=10).value = f"{record.break_minutes}" if record.break_minutes else '-'
-                ws.cell(row=row, column=11).value = f"{record.overtime_hours:.2f}" if record.overtime_hours else '-'
-                ws.cell(row=row, column=12).value = record.status or '-'
-                ws.cell(row=row, column=13).value = comp_off_earned_str
-                ws.cell(row=row, column=14).value = comp_off_used_str
-                
-                # Apply borders and alignment to all cells
-                for col in range(1, 15):
-                    cell = ws.cell(row=row, column=col)
-                    cell.border = border
-                    cell.alignment = Alignment(horizontal='center', vertical='center') if col in [1, 3, 7, 8, 9, 10, 11, 12, 13, 14] else Alignment(horizontal='left', vertical='center')
-                    # Alternate row colors for better readability
-                    if row % 2 == 0:
-                        cell.fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
-                
-                row += 1
-        
-        # Set Summary as the active sheet so it shows first
-        wb.active = wb['Summary']
-        
-        # Adjust column widths for better readability
-        ws.column_dimensions['A'].width = 13  # Employee ID
-        ws.column_dimensions['B'].width = 22  # Name
-        ws.column_dimensions['C'].width = 14  # Date
-        ws.column_dimensions['D'].width = 30  # Leave Status
-        ws.column_dimensions['E'].width = 18  # Assigned Shift
-        ws.column_dimensions['F'].width = 16  # Total Hrs Assigned
-        ws.column_dimensions['G'].width = 12  # Check-In
-        ws.column_dimensions['H'].width = 12  # Check-Out
-        ws.column_dimensions['I'].width = 16  # Total Hrs Worked
-        ws.column_dimensions['J'].width = 12  # Break Time
-        ws.column_dimensions['K'].width = 16  # Overtime Hours
-        ws.column_dimensions['L'].width = 12  # Status
-        ws.column_dimensions['M'].width = 15  # Comp-Off Earned
-        ws.column_dimensions['N'].width = 15  # Comp-Off Used
-
-        # Save to bytes
-        file_bytes = io.BytesIO()
-        wb.save(file_bytes)
-        file_bytes.seek(0)
-
-        return StreamingResponse(
-            iter([file_bytes.getvalue()]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename={department.name}_attendance_{year}-{month:02d}{'_' + employment_type if employment_type else ''}.xlsx"
-            }
+        return await attendance_export_response(
+            request, db, "monthly", department.id, start_date, end_date,
+            filename=f"{department.name}_attendance_{year}-{month:02d}{'_' + employment_type if employment_type else ''}",
+            export_format=format,
+            language=language,
+            load=lambda: load_department_report(db, department, start_date, end_date, employment_type=employment_type),
+            employment_type=employment_type
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Export error: {str(e)}")
         import traceback
@@ -2562,315 +2136,35 @@ async def export_monthly_comprehensive_attendance(
     department_id: int,
     year: int,
     month: int,
+    request: Request,
+    language: str = 'en',
+    format: str = 'xlsx',
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Export comprehensive monthly attendance report with all employee details and daily check-in/out times"""
+    """Export comprehensive monthly attendance report with all employee details and daily check-in/out times
+    format: 'xlsx' (default), 'csv' or 'parquet' (one row per employee per day)
+    language: column names of csv / parquet ('en' or 'ja')
+    """
     try:
-        # Check authorization
-        if current_user.user_type == UserType.MANAGER:
-            manager_result = await db.execute(
-                select(Manager).filter(Manager.user_id == current_user.id, Manager.department_id == department_id)
-            )
-            if not manager_result.scalar_one_or_none():
-                raise HTTPException(status_code=403, detail="You don't have permission to download reports for this department")
-        elif current_user.user_type != UserType.ADMIN:
-            raise HTTPException(status_code=403, detail="Only admins and managers can download attendance reports")
-
-        # Get department
-        dept_result = await db.execute(select(Department).filter(Department.id == department_id))
-        department = dept_result.scalar_one_or_none()
-        if not department:
-            raise HTTPException(status_code=404, detail="Department not found")
+        department = await get_report_department(db, current_user, department_id)
 
-        # Get employees in department
-        emp_result = await db.execute(
-            select(Employee).filter(Employee.department_id == department_id, Employee.is_active == True)
-            .order_by(Employee.first_name)
-        )
-        employees = emp_result.scalars().all()
-
-        # Get attendance for the month
         start_date = date(year, month, 1)
         end_date = date(year, month, monthrange(year, month)[1])
-
-        att_result = await db.execute(
-            select(Attendance).filter(
-                Attendance.employee_id.in_([e.id for e in employees]) if employees else False,
-                Attendance.date >= start_date,
-                Attendance.date <= end_date
-            ).order_by(Attendance.employee_id, Attendance.date)
-        )
-        attendance_records = att_result.scalars().all()
-
-        # Get check-in details
-        checkin_result = await db.execute(
-            select(CheckInOut).filter(
-                CheckInOut.employee_id.in_([e.id for e in employees]) if employees else False,
-                CheckInOut.date >= start_date,
-                CheckInOut.date <= end_date
-            ).order_by(CheckInOut.employee_id, CheckInOut.date)
-        )
-        checkin_records = checkin_result.scalars().all()
-        
-        # Create checkin map for easy lookup
-        checkin_map = {}
-        for record in checkin_records:
-            checkin_map[(record.employee_id, record.date)] = record
-
-        # Get schedules
-        sched_result = await db.execute(
-            select(Schedule).filter(
-                Schedule.employee_id.in_([e.id for e in employees]) if employees else False,
-                Schedule.date >= start_date,
-                Schedule.date <= end_date
-            )
+        return await attendance_export_response(
+            request, db, "comprehensive", department.id, start_date, end_date,
+            filename=f"{department.name}_complete_attendance_{year}-{month:02d}",
+            export_format=format,
+            language=language,
+            load=lambda: load_department_report(db, department, start_date, end_date, include_checkins=True)
         )
-        schedules = sched_result.scalars().all()
-        schedule_map = {}
-        for sched in schedules:
-            schedule_map[(sched.employee_id, sched.date)] = sched
-
-        # Get approved leave requests
-        leaves_result = await db.execute(
-            select(LeaveRequest).filter(
-                LeaveRequest.employee_id.in_([e.id for e in employees]) if employees else False,
-                LeaveRequest.start_date <= end_date,
-                LeaveRequest.end_date >= start_date,
-                LeaveRequest.status == LeaveStatus.APPROVED
-            )
-        )
-        leave_requests = leaves_result.scalars().all()
-        leave_map = {}
-        for leave in leave_requests:
-            for i in range((leave.end_date - leave.start_date).days + 1):
-                current_date = leave.start_date + timedelta(days=i)
-                if start_date <= current_date <= end_date:
-                    leave_info = {
-                        'leave_type': leave.leave_type,
-                        'duration_type': leave.duration_type or 'full_day',
-                    }
-                    leave_map[(leave.employee_id, current_date)] = leave_info
-
-        # Create workbook
-        wb = Workbook()
-        summary_ws = wb.active
-        summary_ws.title = "Summary"
-        
-        # Styles
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        emp_header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        emp_header_font = Font(bold=True, color="FFFFFF", size=10)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Summary Sheet
-        summary_ws['A1'] = f"{department.name} - Monthly Attendance Summary"
-        summary_ws['A1'].font = Font(bold=True, size=14)
-        summary_ws.merge_cells('A1:D1')
-        
-        summary_ws['A2'] = f"{calendar.month_name[month]} {year}"
-        summary_ws['A2'].font = Font(bold=True, size=12)
-        summary_ws.merge_cells('A2:D2')
-        
-        # Department summary stats
-        summary_ws['A4'] = "Report Statistics:"
-        summary_ws['A4'].font = Font(bold=True, size=11)
-        
-        summary_ws['A5'] = "Total Employees"
-        summary_ws['B5'] = len(employees)
-        summary_ws['A6'] = "Total Attendance Records"
-        summary_ws['B6'] = len(attendance_records)
-        summary_ws['A7'] = "Month"
-        summary_ws['B7'] = f"{calendar.month_name[month]} {year}"
-        
-        for row in range(5, 8):
-            summary_ws[f'A{row}'].font = Font(bold=True)
-            summary_ws[f'B{row}'].border = border
-        
-        summary_ws.column_dimensions['A'].width = 25
-        summary_ws.column_dimensions['B'].width = 15
-        summary_ws.column_dimensions['C'].width = 20
-        summary_ws.column_dimensions['D'].width = 20
-
-        # Create Employee Details Sheet with all daily records
-        details_ws = wb.create_sheet("All Employee Details")
-        
-        # Title
-        details_ws['A1'] = f"{department.name} - Complete Monthly Attendance"
-        details_ws['A1'].font = Font(bold=True, size=13)
-        details_ws.merge_cells('A1:M1')
-        
-        details_ws['A2'] = f"{calendar.month_name[month]} {year}"
-        details_ws['A2'].font = Font(bold=True, size=11)
-        details_ws.merge_cells('A2:M2')
-        
-        current_row = 4
-        
-        # Process each employee
-        for employee in employees:
-            # Employee Header with details
-            details_ws[f'A{current_row}'] = "EMPLOYEE DETAILS"
-            details_ws[f'A{current_row}'].fill = emp_header_fill
-            details_ws[f'A{current_row}'].font = emp_header_font
-            details_ws.merge_cells(f'A{current_row}:M{current_row}')
-            current_row += 1
-            
-            # Employee info row
-            emp_info = f"ID: {employee.employee_id} | Name: {employee.first_name} {employee.last_name} | Email: {employee.email} | Phone: {employee.phone or 'N/A'}"
-            details_ws[f'A{current_row}'] = emp_info
-            details_ws[f'A{current_row}'].font = Font(size=10)
-            details_ws.merge_cells(f'A{current_row}:M{current_row}')
-            current_row += 1
-            
-            # Column headers for this employee
-            headers = ['Date', 'Day', 'Shift Time', 'Check-In', 'Check-Out', 'Worked Hours', 'Break Min', 'Overtime', 'Status', 'Leave/Comp-Off', 'Notes']
-            for col, header in enumerate(headers, 1):
-                cell = details_ws.cell(row=current_row, column=col)
-                cell.value = header
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                cell.border = border
-            current_row += 1
-            
-            # Get employee's attendance for the month
-            emp_attendance = [r for r in attendance_records if r.employee_id == employee.id]
-            
-            # Generate all dates and show attendance
-            from dateutil.rrule import rrule, DAILY
-            all_dates = list(rrule(DAILY, dtstart=start_date, until=end_date))
-            
-            for current_date in all_dates:
-                date_obj = current_date.date() if hasattr(current_date, 'date') else current_date
-                day_name = date_obj.strftime('%A')[:3]
-                
-                # Get attendance record for this date
-                att_rec = next((r for r in emp_attendance if r.date == date_obj), None)
-                
-                # Get schedule
-                schedule = schedule_map.get((employee.id, date_obj))
-                
-                # Get leave info
-                leave_info = leave_map.get((employee.id, date_obj))
-                
-                # Get check-in details
-                checkin = checkin_map.get((employee.id, date_obj))
-                
-                # Build leave/comp-off status
-                leave_status = '-'
-                if schedule and schedule.status in ['leave', 'leave_half_morning', 'leave_half_afternoon', 'comp_off_taken']:
-                    if schedule.status == 'leave_half_morning':
-                        leave_status = "LEAVE-AM"
-                    elif schedule.status == 'leave_half_afternoon':
-                        leave_status = "LEAVE-PM"
-                    elif schedule.status == 'comp_off_taken':
-                        leave_status = "COMP-OFF"
-                    else:
-                        leave_status = "LEAVE"
-                elif leave_info:
-                    if 'half' in leave_info['duration_type']:
-                        leave_status = f"{leave_info['leave_type']}-Half"
-                    else:
-                        leave_status = leave_info['leave_type']
-                
-                # Shift time
-                shift_time = '-'
-                if schedule and schedule.start_time and schedule.end_time:
-                    shift_time = f"{schedule.start_time}-{schedule.end_time}"
-                
-                # Check-in/out times
-                check_in_time = '-'
-                check_out_time = '-'
-                if att_rec:
-                    check_in_time = att_rec.in_time or '-'
-                    check_out_time = att_rec.out_time or '-'
-                elif checkin:
-                    check_in_time = checkin.check_in_time.strftime('%H:%M') if checkin.check_in_time else '-'
-                    check_out_time = checkin.check_out_time.strftime('%H:%M') if checkin.check_out_time else '-'
-                
-                # Worked hours
-                worked_hours = '-'
-                if att_rec and att_rec.worked_hours:
-                    worked_hours = f"{att_rec.worked_hours:.2f}"
-                
-                # Break
-                break_mins = '-'
-                if att_rec and att_rec.break_minutes:
-                    break_mins = str(att_rec.break_minutes)
-                
-                # Overtime
-                overtime = '-'
-                if att_rec and att_rec.overtime_hours and att_rec.overtime_hours > 0:
-                    overtime = f"{att_rec.overtime_hours:.2f}"
-                
-                # Status
-                status_val = '-'
-                if att_rec and att_rec.status:
-                    status_val = att_rec.status
-                elif checkin and checkin.check_in_status:
-                    status_val = checkin.check_in_status
-                
-                # Notes
-                notes = att_rec.notes if att_rec and att_rec.notes else ''
-                
-                # Write row
-                details_ws.cell(row=current_row, column=1).value = date_obj.isoformat()
-                details_ws.cell(row=current_row, column=2).value = day_name
-                details_ws.cell(row=current_row, column=3).value = shift_time
-                details_ws.cell(row=current_row, column=4).value = check_in_time
-                details_ws.cell(row=current_row, column=5).value = check_out_time
-                details_ws.cell(row=current_row, column=6).value = worked_hours
-                details_ws.cell(row=current_row, column=7).value = break_mins
-                details_ws.cell(row=current_row, column=8).value = overtime
-                details_ws.cell(row=current_row, column=9).value = status_val
-                details_ws.cell(row=current_row, column=10).value = leave_status
-                details_ws.cell(row=current_row, column=11).value = notes
-                
-                # Apply borders and alignment
-                for col in range(1, 12):
-                    cell = details_ws.cell(row=current_row, column=col)
-                    cell.border = border
-                    cell.alignment = Alignment(horizontal='center' if col != 11 else 'left', vertical='center')
-                
-                current_row += 1
-            
-            # Add summary for this employee
-            current_row += 1
-            
-        # Adjust column widths
-        details_ws.column_dimensions['A'].width = 12
-        details_ws.column_dimensions['B'].width = 5
-        details_ws.column_dimensions['C'].width = 14
-        details_ws.column_dimensions['D'].width = 12
-        details_ws.column_dimensions['E'].width = 12
-        details_ws.column_dimensions['F'].width = 12
-        details_ws.column_dimensions['G'].width = 10
-        details_ws.column_dimensions['H'].width = 10
-        details_ws.column_dimensions['I'].width = 12
-        details_ws.column_dimensions['J'].width = 14
-        details_ws.column_dimensions['K'].width = 20
-        
-        # Save to bytes
-        file_bytes = io.BytesIO()
-        wb.save(file_bytes)
-        file_bytes.seek(0)
-
-        return StreamingResponse(
-            iter([file_bytes.getvalue()]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={department.name}_complete_attendance_{year}-{month:02d}.xlsx"}
-        )
-    except Exception as e:
-        print(f"Comprehensive export error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Comprehensive export error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
 @app.get("/attendance/export/weekly")
@@ -2878,276 +2172,31 @@ async def export_weekly_attendance(
     department_id: int,
     start_date: date,
     end_date: date,
+    request: Request,
     employment_type: Optional[str] = None,
     language: str = 'en',
+    format: str = 'xlsx',
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Export weekly attendance report as Excel
     employment_type: Optional filter - 'full_time', 'part_time', or None for all
     language: Language for Excel ('en' or 'ja')
+    format: 'xlsx' (default), 'csv' or 'parquet' - any date range, e.g. a year for data pipelines
     """
     try:
-        # Check authorization: only admins can download any department, managers only their own
-        if current_user.user_type == UserType.MANAGER:
-            # For managers, check if they manage this department
-            manager_result = await db.execute(
-                select(Manager).filter(Manager.user_id == current_user.id, Manager.department_id == department_id)
-            )
-            if not manager_result.scalar_one_or_none():
-                raise HTTPException(status_code=403, detail="You don't have permission to download reports for this department")
-        elif current_user.user_type != UserType.ADMIN:
-            raise HTTPException(status_code=403, detail="Only admins and managers can download attendance reports")
-        
-        # Get department
-        dept_result = await db.execute(select(Department).filter(Department.id == department_id))
-        department = dept_result.scalar_one_or_none()
-        if not department:
-            raise HTTPException(status_code=404, detail="Department not found")
-        
-        # Get employees in department with optional employment_type filter
-        emp_query = select(Employee).filter(Employee.department_id == department_id, Employee.is_active == True)
-        if employment_type and employment_type in ['full_time', 'part_time']:
-            emp_query = emp_query.filter(Employee.employment_type == employment_type)
-        
-        emp_result = await db.execute(emp_query)
-        employees = emp_result.scalars().all()
-        
-        # Get attendance for the week
-        att_result = await db.execute(
-            select(Attendance).filter(
-                Attendance.employee_id.in_([e.id for e in employees]) if employees else False,
-                Attendance.date >= start_date,
-                Attendance.date <= end_date
-            ).order_by(Attendance.date, Attendance.employee_id)
-        )
-        attendance_records = att_result.scalars().all()
-        
-        # Create workbook
-        wb = Workbook()
-        
-        # Define professional styles (same as monthly)
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        title_font = Font(bold=True, size=14)
-        section_font = Font(bold=True, size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        center_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        summary_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-        summary_font = Font(bold=True, color="000000")
-        
-        # Create Summary Sheet First
-        summary_ws = wb.active
-        summary_ws.title = "Summary"
-        
-        # Summary Title
-        summary_ws['A1'] = f"{department.name} - {get_excel_translation('weekly_attendance_summary', language)}"
-        summary_ws['A1'].font = title_font
-        summary_ws.merge_cells('A1:B1')
-        
-        summary_ws['A2'] = f"{start_date.isoformat()} to {end_date.isoformat()}"
-        summary_ws['A2'].font = Font(size=11)
-        summary_ws.merge_cells('A2:B2')
-        
-        summary_ws['A3'] = ""
-        
-        # Get schedules for shift information
-        sched_result = await db.execute(
-            select(Schedule).filter(
-                Schedule.employee_id.in_([e.id for e in employees]) if employees else False,
-                Schedule.date >= start_date,
-                Schedule.date <= end_date
-            )
-        )
-        schedules = sched_result.scalars().all()
-        schedule_map = {}
-        comp_off_earned_map = {}
-        for sched in schedules:
-            schedule_map[(sched.employee_id, sched.date)] = sched
-            # Track comp-off earned days
-            if sched.status == 'comp_off_earned':
-                comp_off_earned_map[(sched.employee_id, sched.date)] = True
-
-        # Get comp-off details for used days
-        compoff_details_result = await db.execute(
-            select(CompOffDetail).filter(
-                CompOffDetail.employee_id.in_([e.id for e in employees]) if employees else False,
-                CompOffDetail.date >= start_date,
-                CompOffDetail.date <= end_date,
-                CompOffDetail.type == 'used'
-            )
-        )
-        compoff_details = compoff_details_result.scalars().all()
-        comp_off_used_map = {}
-        for detail in compoff_details:
-            detail_date = detail.date.date() if hasattr(detail.date, 'date') else detail.date
-            comp_off_used_map[(detail.employee_id, detail_date)] = True
-        
-        # Calculate totals from attendance records for summary
-        total_worked_hours = 0
-        total_overtime_hours = 0
-        present_count = 0
-        
-        for record in attendance_records:
-            if record.worked_hours and record.worked_hours > 0:
-                total_worked_hours += record.worked_hours
-                present_count += 1
-            if record.overtime_hours:
-                total_overtime_hours += record.overtime_hours
-        
-        # Summary data with styling
-        summary_ws['A4'] = get_excel_translation('weekly_statistics', language)
-        summary_ws['A4'].font = section_font
-        summary_ws['A4'].fill = summary_fill
-        summary_ws['A4'].border = border
-        summary_ws['B4'].fill = summary_fill
-        summary_ws['B4'].border = border
-        
-        summary_data = [
-            [get_excel_translation('total_employees', language), len(employees)],
-            [get_excel_translation('employees_present', language), present_count],
-            [get_excel_translation('total_working_hours_all', language), f'{total_worked_hours:.2f}'],
-            [get_excel_translation('total_overtime_hours_all', language), f'{total_overtime_hours:.2f}'],
-        ]
-        
-        row = 5
-        for label, value in summary_data:
-            summary_ws[f'A{row}'] = label
-            summary_ws[f'B{row}'] = value
-            summary_ws[f'A{row}'].font = summary_font
-            summary_ws[f'A{row}'].fill = summary_fill
-            summary_ws[f'A{row}'].border = border
-            summary_ws[f'B{row}'].border = border
-            summary_ws[f'B{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-        
-        # Adjust column widths for summary
-        summary_ws.column_dimensions['A'].width = 35
-        summary_ws.column_dimensions['B'].width = 20
-        
-        # Create Attendance Details Sheet
-        ws = wb.create_sheet(get_excel_translation('attendance_details', language))
-        ws.title = get_excel_translation('attendance_details', language)
-        
-        # Title and Info
-        ws['A1'] = f"{department.name} - {get_excel_translation('weekly_attendance_report', language)}"
-        ws['A1'].font = title_font
-        ws.merge_cells('A1:M1')
+        department = await get_report_department(db, current_user, department_id)
 
-        ws['A2'] = f"{start_date.isoformat()} to {end_date.isoformat()} | {get_excel_translation('total_employees', language)}: {len(employees)}"
-        ws['A2'].font = Font(size=11)
-        ws.merge_cells('A2:M2')
-
-        ws['A3'] = ""
-        
-        # Headers - Added Comp-Off columns
-        headers = [
-            get_excel_translation('employee_id', language),
-            get_excel_translation('name', language),
-            get_excel_translation('date', language),
-            get_excel_translation('assigned_shift', language),
-            get_excel_translation('total_hrs_assigned', language),
-            get_excel_translation('check_in', language),
-            get_excel_translation('check_out', language),
-            get_excel_translation('total_hrs_worked', language),
-            get_excel_translation('break_time', language),
-            get_excel_translation('overtime_hours', language),
-            get_excel_translation('status', language),
-            get_excel_translation('comp_off_earned', language),
-            get_excel_translation('comp_off_used', language)
-        ]
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = center_alignment
-            cell.border = border
-        
-        # Data
-        row = 5
-        for record in attendance_records:
-            employee = next((e for e in employees if e.id == record.employee_id), None)
-            if employee:
-                schedule = schedule_map.get((record.employee_id, record.date))
-                total_hrs_assigned = '-'
-                assigned_shift = '-'
-                if schedule and schedule.start_time and schedule.end_time:
-                    assigned_shift = f"{schedule.start_time} - {schedule.end_time}"
-                    try:
-                        start_h, start_m = map(int, schedule.start_time.split(':'))
-                        end_h, end_m = map(int, schedule.end_time.split(':'))
-                        start_decimal = start_h + start_m / 60
-                        end_decimal = end_h + end_m / 60
-                        hours = end_decimal - start_decimal if end_decimal > start_decimal else 24 - start_decimal + end_decimal
-                        total_hrs_assigned = f"{hours:.2f}"
-                    except:
-                        pass
-
-                # Check if comp-off earned or used on this date
-                comp_off_earned_str = '✓ Yes' if comp_off_earned_map.get((record.employee_id, record.date)) else '-'
-                comp_off_used_str = '✓ Yes' if comp_off_used_map.get((record.employee_id, record.date)) else '-'
-
-                ws.cell(row=row, column=1).value = employee.employee_id
-                ws.cell(row=row, column=2).value = f"{employee.first_name} {employee.last_name}"
-                ws.cell(row=row, column=3).value = record.date.isoformat()
-                ws.cell(row=row, column=4).value = assigned_shift
-                ws.cell(row=row, column=5).value = total_hrs_assigned
-                ws.cell(row=row, column=6).value = record.in_time or '-'
-                ws.cell(row=row, column=7).value = record.out_time or '-'
-                ws.cell(row=row, column=8).value = f"{record.worked_hours:.2f}" if record.worked_hours else '-'
-                ws.cell(row=row, column=9).value = f"{record.break_minutes}" if record.break_minutes else '-'
-                ws.cell(row=row, column=10).value = f"{record.overtime_hours:.2f}" if record.overtime_hours else '-'
-                ws.cell(row=row, column=11).value = record.status or '-'
-                ws.cell(row=row, column=12).value = comp_off_earned_str
-                ws.cell(row=row, column=13).value = comp_off_used_str
-                
-                # Apply borders and alignment to all cells
-                for col in range(1, 14):
-                    cell = ws.cell(row=row, column=col)
-                    cell.border = border
-                    cell.alignment = Alignment(horizontal='center', vertical='center') if col in [1, 3, 6, 7, 8, 9, 10, 11, 12, 13] else Alignment(horizontal='left', vertical='center')
-                    # Alternate row colors for better readability
-                    if row % 2 == 0:
-                        cell.fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
-                
-                row += 1
-
-        # Adjust column widths for better readability
-        ws.column_dimensions['A'].width = 13  # Employee ID
-        ws.column_dimensions['B'].width = 22  # Name
-        ws.column_dimensions['C'].width = 14  # Date
-        ws.column_dimensions['D'].width = 18  # Assigned Shift
-        ws.column_dimensions['E'].width = 16  # Total Hrs Assigned
-        ws.column_dimensions['F'].width = 12  # Check-In
-        ws.column_dimensions['G'].width = 12  # Check-Out
-        ws.column_dimensions['H'].width = 16  # Total Hrs Worked
-        ws.column_dimensions['I'].width = 12  # Break Time
-        ws.column_dimensions['J'].width = 16  # Overtime Hours
-        ws.column_dimensions['K'].width = 12  # Status
-        ws.column_dimensions['L'].width = 15  # Comp-Off Earned
-        ws.column_dimensions['M'].width = 15  # Comp-Off Used
-
-        # Set Summary as the active sheet so it shows first
-        wb.active = wb['Summary']
-
-        # Save to bytes
-        file_bytes = io.BytesIO()
-        wb.save(file_bytes)
-        file_bytes.seek(0)
-
-        return StreamingResponse(
-            iter([file_bytes.getvalue()]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename={department.name}_attendance_weekly_{start_date.isoformat()}_to_{end_date.isoformat()}{'_' + employment_type if employment_type else ''}.xlsx"
-            }
+        return await attendance_export_response(
+            request, db, "weekly", department.id, start_date, end_date,
+            filename=f"{department.name}_attendance_weekly_{start_date.isoformat()}_to_{end_date.isoformat()}{'_' + employment_type if employment_type else ''}",
+            export_format=format,
+            language=language,
+            load=lambda: load_department_report(db, department, start_date, end_date, employment_type=employment_type),
+            employment_type=employment_type
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Weekly export error: {str(e)}")
         import traceback
@@ -3155,60 +2204,14 @@ async def export_weekly_attendance(
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
-def calculate_night_hours(in_time_str, out_time_str, night_start_hour=22):
-    """Calculate hours worked after the night_start_hour (default 22:00)
-    Returns night hours worked after 22:00
-    """
-    if not in_time_str or not out_time_str:
-        return 0.0
-    
-    try:
-        # Parse times
-        in_parts = in_time_str.split(':')
-        out_parts = out_time_str.split(':')
-        
-        in_hour = int(in_parts[0])
-        in_min = int(in_parts[1]) if len(in_parts) > 1 else 0
-        out_hour = int(out_parts[0])
-        out_min = int(out_parts[1]) if len(out_parts) > 1 else 0
-        
-        in_decimal = in_hour + in_min / 60.0
-        out_decimal = out_hour + out_min / 60.0
-        
-        # Handle day wrap (e.g., 10:00 to 22:00 wraps to next day)
-        if out_decimal < in_decimal:
-            out_decimal += 24
-        
-        # Night hours are hours worked after 22:00
-        night_start = night_start_hour
-        night_end = night_start + 24  # Next day 22:00
-        
-        # Calculate intersection of work hours with night period
-        work_start = in_decimal
-        work_end = out_decimal
-        
-        if work_end <= night_start:
-            # All work before night period
-            return 0.0
-        elif work_start >= night_end:
-            # All work after next night period (shouldn't happen in 24h)
-            return 0.0
-        else:
-            # Some work during night period
-            night_work_start = max(work_start, night_start)
-            night_work_end = min(work_end, night_end)
-            night_hours = night_work_end - night_work_start
-            return max(0.0, night_hours)
-    except:
-        return 0.0
-
-
 @app.get("/attendance/export/employee-monthly")
 async def export_employee_monthly_attendance(
     year: int,
     month: int,
+    request: Request,
     employee_id: Optional[str] = None,
     language: str = 'en',
+    format: str = 'xlsx',
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -3217,6 +2220,7 @@ async def export_employee_monthly_attendance(
     - If employee_id is provided, only MANAGER and ADMIN can download
     - If employee_id is not provided, current user gets their own report
     language: Language for Excel ('en' or 'ja')
+    format: 'xlsx' (default), 'csv' or 'parquet' (daily rows only)
     """
     try:
         # Determine which employee to get
@@ -3250,413 +2254,18 @@ async def export_employee_monthly_attendance(
             if not employee:
                 raise HTTPException(status_code=404, detail="Employee not found")
         
-        # Get attendance for the month
         start_date = date(year, month, 1)
         end_date = date(year, month, monthrange(year, month)[1])
-        
-        att_result = await db.execute(
-            select(Attendance).filter(
-                Attendance.employee_id == employee.id,
-                Attendance.date >= start_date,
-                Attendance.date <= end_date
-            ).order_by(Attendance.date)
-        )
-        attendance_records = att_result.scalars().all()
-        
-        # Get leave records for the month
-        leave_result = await db.execute(
-            select(LeaveRequest).filter(
-                LeaveRequest.employee_id == employee.id,
-                LeaveRequest.start_date <= end_date,
-                LeaveRequest.end_date >= start_date,
-                LeaveRequest.status == LeaveStatus.APPROVED
-            )
-        )
-        leave_records = leave_result.scalars().all()
-        
-        # Get schedules for shift information
-        sched_result = await db.execute(
-            select(Schedule).filter(
-                Schedule.employee_id == employee.id,
-                Schedule.date >= start_date,
-                Schedule.date <= end_date
-            )
-        )
-        schedules = sched_result.scalars().all()
-        schedule_map = {}
-        comp_off_earned_dates = []
-        comp_off_used_dates = []
-        
-        for sched in schedules:
-            schedule_map[sched.date] = sched
-            # Track comp-off earned days
-            if sched.status == 'comp_off_earned':
-                comp_off_earned_dates.append(sched.date)
-        
-        # Get comp-off details for used days
-        compoff_details_result = await db.execute(
-            select(CompOffDetail).filter(
-                CompOffDetail.employee_id == employee.id,
-                CompOffDetail.earned_month.ilike(f"{year:04d}-{month:02d}%"),
-                CompOffDetail.type == 'used'
-            )
-        )
-        compoff_details = compoff_details_result.scalars().all()
-        for detail in compoff_details:
-            comp_off_used_dates.append(detail.date.date() if hasattr(detail.date, 'date') else detail.date)
-        
-        # Calculate leave dates
-        leave_dates = set()
-        for leave in leave_records:
-            current = leave.start_date
-            while current <= leave.end_date:
-                leave_dates.add(current)
-                current += timedelta(days=1)
-        
-        # Create workbook with multiple sheets
-        wb = Workbook()
-        wb.remove(wb.active)  # Remove default sheet
-        
-        # Define professional styles
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        title_font = Font(bold=True, size=14)
-        section_font = Font(bold=True, size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        center_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        summary_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-        summary_font = Font(bold=True, color="000000")
-        
-        # === SHEET 1: SUMMARY ===
-        summary_sheet = wb.create_sheet("Summary")
-        
-        # Title
-        month_name = calendar.month_name[month]
-        summary_sheet['A1'] = f"{employee.first_name} {employee.last_name} - {get_excel_translation('monthly_report', language)}"
-        summary_sheet['A1'].font = title_font
-        summary_sheet.merge_cells('A1:B1')
-        
-        summary_sheet['A2'] = f"{month_name} {year}"
-        summary_sheet['A2'].font = Font(size=11)
-        summary_sheet.merge_cells('A2:B2')
-        
-        summary_sheet['A3'] = f"{get_excel_translation('employee_id', language)}: {employee.employee_id}"
-        summary_sheet['A3'].font = Font(size=10)
-        
-        summary_sheet['A4'] = ""
-        
-        # Calculate statistics
-        from dateutil.rrule import rrule, DAILY
-        all_dates = list(rrule(DAILY, dtstart=start_date, until=end_date))
-        
-        # Get public holidays
-        from app.holidays_jp import JapaneseCalendar
-        jp_calendar = JapaneseCalendar()
-        jp_holidays_dict = jp_calendar.get_holidays_in_range(start_date, end_date)
-        
-        # Count statistics
-        total_days_in_month = len(all_dates)
-        public_holidays = len(jp_holidays_dict)
-        weekends = 0
-        working_days_available = 0
-        
-        for current_date in all_dates:
-            date_obj = current_date.date() if hasattr(current_date, 'date') else current_date
-            is_weekend = date_obj.weekday() >= 5
-            is_public_holiday = date_obj in jp_holidays_dict
-            
-            if is_weekend and not is_public_holiday:
-                weekends += 1
-            elif not is_public_holiday and not is_weekend:
-                working_days_available += 1
-        
-        # Count leave types
-        paid_leave_days = 0
-        unpaid_leave_days = 0
-        
-        for leave in leave_records:
-            days = (leave.end_date - leave.start_date).days + 1
-            if leave.duration_type and leave.duration_type.startswith('half_day'):
-                days = 0.5
-            
-            if leave.leave_type.lower() == 'paid':
-                paid_leave_days += days
-            else:
-                unpaid_leave_days += days
-        
-        # Count worked hours and night hours
-        total_worked_hours = 0
-        total_ot_hours = 0
-        total_night_hours = 0
-        working_days_worked = 0
-        
-        for record in attendance_records:
-            if record.worked_hours and record.worked_hours > 0:
-                total_worked_hours += record.worked_hours
-                working_days_worked += 1
-            if record.overtime_hours:
-                total_ot_hours += record.overtime_hours
-            
-            # Calculate night hours (after 22:00)
-            night_hours = calculate_night_hours(record.in_time, record.out_time, night_start_hour=22)
-            total_night_hours += night_hours
-        
-        # Summary sections
-        row = 5
-        
-        # ATTENDANCE SUMMARY
-        summary_sheet[f'A{row}'] = get_excel_translation('attendance_summary', language)
-        summary_sheet[f'A{row}'].font = section_font
-        summary_sheet[f'A{row}'].fill = summary_fill
-        summary_sheet[f'A{row}'].border = border
-        summary_sheet[f'B{row}'].fill = summary_fill
-        summary_sheet[f'B{row}'].border = border
-        summary_sheet.merge_cells(f'A{row}:B{row}')
-        
-        row += 1
-        attendance_items = [
-            (get_excel_translation('total_days_in_month', language), total_days_in_month),
-            (get_excel_translation('public_holidays', language), public_holidays),
-            (get_excel_translation('weekends', language), weekends),
-            (get_excel_translation('total_non_working_days', language), public_holidays + weekends),
-            (get_excel_translation('working_days_available', language), working_days_available),
-            (get_excel_translation('working_days_worked', language), working_days_worked),
-        ]
-        
-        for label, value in attendance_items:
-            summary_sheet[f'A{row}'] = label
-            summary_sheet[f'B{row}'] = value
-            summary_sheet[f'A{row}'].font = summary_font
-            summary_sheet[f'A{row}'].fill = summary_fill
-            summary_sheet[f'A{row}'].border = border
-            summary_sheet[f'B{row}'].border = border
-            summary_sheet[f'B{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-        
-        # LEAVE SUMMARY
-        row += 1
-        summary_sheet[f'A{row}'] = get_excel_translation('leave_summary', language)
-        summary_sheet[f'A{row}'].font = section_font
-        summary_sheet[f'A{row}'].fill = summary_fill
-        summary_sheet[f'A{row}'].border = border
-        summary_sheet[f'B{row}'].fill = summary_fill
-        summary_sheet[f'B{row}'].border = border
-        summary_sheet.merge_cells(f'A{row}:B{row}')
-        
-        row += 1
-        leave_items = [
-            (get_excel_translation('annual_paid_leave_entitlement', language), f'{employee.paid_leave_per_year}'),
-            (get_excel_translation('paid_leave_days_used', language), f'{paid_leave_days:.1f}'),
-            (get_excel_translation('paid_leave_days_remaining', language), f'{max(0, employee.paid_leave_per_year - paid_leave_days):.1f}'),
-            (get_excel_translation('unpaid_leave_days', language), f'{unpaid_leave_days:.1f}'),
-            (get_excel_translation('total_leave_days', language), f'{paid_leave_days + unpaid_leave_days:.1f}'),
-        ]
-        
-        for label, value in leave_items:
-            summary_sheet[f'A{row}'] = label
-            summary_sheet[f'B{row}'] = value
-            summary_sheet[f'A{row}'].font = summary_font
-            summary_sheet[f'A{row}'].fill = summary_fill
-            summary_sheet[f'A{row}'].border = border
-            summary_sheet[f'B{row}'].border = border
-            summary_sheet[f'B{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-        
-        # COMP-OFF SUMMARY
-        row += 1
-        comp_off_earned = len(comp_off_earned_dates)
-        comp_off_used = len(comp_off_used_dates)
-        summary_sheet[f'A{row}'] = get_excel_translation('comp_off_summary', language)
-        summary_sheet[f'A{row}'].font = section_font
-        summary_sheet[f'A{row}'].fill = summary_fill
-        summary_sheet[f'A{row}'].border = border
-        summary_sheet[f'B{row}'].fill = summary_fill
-        summary_sheet[f'B{row}'].border = border
-        summary_sheet.merge_cells(f'A{row}:B{row}')
-        
-        row += 1
-        compoff_items = [
-            (get_excel_translation('comp_off_earned_days', language), f'{comp_off_earned}'),
-            (get_excel_translation('comp_off_used_days', language), f'{comp_off_used}'),
-            (get_excel_translation('comp_off_balance', language), f'{comp_off_earned - comp_off_used}'),
-        ]
-        
-        for label, value in compoff_items:
-            summary_sheet[f'A{row}'] = label
-            summary_sheet[f'B{row}'] = value
-            summary_sheet[f'A{row}'].font = summary_font
-            summary_sheet[f'A{row}'].fill = summary_fill
-            summary_sheet[f'A{row}'].border = border
-            summary_sheet[f'B{row}'].border = border
-            summary_sheet[f'B{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-        
-        # HOURS SUMMARY
-        row += 1
-        summary_sheet[f'A{row}'] = get_excel_translation('hours_summary', language)
-        summary_sheet[f'A{row}'].font = section_font
-        summary_sheet[f'A{row}'].fill = summary_fill
-        summary_sheet[f'A{row}'].border = border
-        summary_sheet[f'B{row}'].fill = summary_fill
-        summary_sheet[f'B{row}'].border = border
-        summary_sheet.merge_cells(f'A{row}:B{row}')
-        
-        row += 1
-        hours_items = [
-            (get_excel_translation('total_hours_worked', language), f'{total_worked_hours:.2f}'),
-            (get_excel_translation('total_overtime_hours', language), f'{total_ot_hours:.2f}'),
-            (get_excel_translation('total_night_hours', language), f'{total_night_hours:.2f}'),
-        ]
-        
-        for label, value in hours_items:
-            summary_sheet[f'A{row}'] = label
-            summary_sheet[f'B{row}'] = value
-            summary_sheet[f'A{row}'].font = summary_font
-            summary_sheet[f'A{row}'].fill = summary_fill
-            summary_sheet[f'A{row}'].border = border
-            summary_sheet[f'B{row}'].border = border
-            summary_sheet[f'B{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-        
-        summary_sheet.column_dimensions['A'].width = 30
-        summary_sheet.column_dimensions['B'].width = 20
-        
-        # === SHEET 2: DAILY ATTENDANCE ===
-        ws = wb.create_sheet("Daily Attendance")
-        ws.title = get_excel_translation('daily_attendance', language)
-        
-        # Title
-        ws['A1'] = f"{employee.first_name} {employee.last_name} - {get_excel_translation('daily_attendance', language)}"
-        ws['A1'].font = title_font
-        ws.merge_cells('A1:M1')
-        
-        ws['A2'] = f"{month_name} {year}"
-        ws['A2'].font = Font(size=11)
-        ws.merge_cells('A2:M2')
-        
-        ws['A3'] = ""
-        
-        # Headers
-        headers = [
-            get_excel_translation('date', language),
-            get_excel_translation('day', language),
-            get_excel_translation('assigned_shift', language),
-            get_excel_translation('check_in', language),
-            get_excel_translation('check_out', language),
-            get_excel_translation('hours_worked', language),
-            get_excel_translation('night_hours', language),
-            get_excel_translation('break_minutes', language),
-            get_excel_translation('overtime_hours', language),
-            get_excel_translation('status', language),
-            get_excel_translation('comp_off_earned', language),
-            get_excel_translation('comp_off_used', language),
-            get_excel_translation('notes', language)
-        ]
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = center_alignment
-            cell.border = border
-        
-        # Data
-        row = 5
-        total_worked_hours = 0
-        total_ot_hours = 0
-        total_night_hours = 0
-        working_days_count = 0
-        comp_off_earned_count = 0
-        comp_off_used_count = 0
-        
-        for record in attendance_records:
-            schedule = schedule_map.get(record.date)
-            assigned_shift = '-'
-            if schedule and schedule.start_time and schedule.end_time:
-                assigned_shift = f"{schedule.start_time} - {schedule.end_time}"
-            
-            day_name = record.date.strftime('%A')
-            
-            # Calculate night hours
-            night_hours = calculate_night_hours(record.in_time, record.out_time, night_start_hour=22)
-            
-            # Check if comp-off earned or used on this date
-            comp_off_earned_str = '✓ Yes' if record.date in comp_off_earned_dates else '-'
-            comp_off_used_str = '✓ Yes' if record.date in comp_off_used_dates else '-'
-            
-            ws.cell(row=row, column=1).value = record.date.isoformat()
-            ws.cell(row=row, column=2).value = day_name
-            ws.cell(row=row, column=3).value = assigned_shift
-            ws.cell(row=row, column=4).value = record.in_time or '-'
-            ws.cell(row=row, column=5).value = record.out_time or '-'
-            ws.cell(row=row, column=6).value = f"{record.worked_hours:.2f}" if record.worked_hours else '-'
-            ws.cell(row=row, column=7).value = f"{night_hours:.2f}" if night_hours > 0 else '-'
-            ws.cell(row=row, column=8).value = f"{record.break_minutes}" if record.break_minutes else '-'
-            ws.cell(row=row, column=9).value = f"{record.overtime_hours:.2f}" if record.overtime_hours else '-'
-            ws.cell(row=row, column=10).value = record.status or '-'
-            ws.cell(row=row, column=11).value = comp_off_earned_str
-            ws.cell(row=row, column=12).value = comp_off_used_str
-            ws.cell(row=row, column=13).value = record.notes or '-'
-            
-            # Apply styling
-            for col in range(1, 14):
-                cell = ws.cell(row=row, column=col)
-                cell.border = border
-                cell.alignment = center_alignment if col in [1, 2, 10, 11, 12] else Alignment(horizontal='left', vertical='center')
-                # Alternate row colors
-                if row % 2 == 0:
-                    cell.fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
-            
-            if record.worked_hours and record.worked_hours > 0:
-                total_worked_hours += record.worked_hours
-                working_days_count += 1
-            
-            if record.overtime_hours:
-                total_ot_hours += record.overtime_hours
-            
-            # Add night hours to total
-            total_night_hours += night_hours
-            
-            if record.date in comp_off_earned_dates:
-                comp_off_earned_count += 1
-            if record.date in comp_off_used_dates:
-                comp_off_used_count += 1
-            
-            row += 1
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 14
-        ws.column_dimensions['B'].width = 14
-        ws.column_dimensions['C'].width = 18
-        ws.column_dimensions['D'].width = 12
-        ws.column_dimensions['E'].width = 12
-        ws.column_dimensions['F'].width = 14
-        ws.column_dimensions['G'].width = 20  # Night Hours column
-        ws.column_dimensions['H'].width = 12
-        ws.column_dimensions['I'].width = 16
-        ws.column_dimensions['J'].width = 12
-        ws.column_dimensions['K'].width = 15
-        ws.column_dimensions['L'].width = 15
-        ws.column_dimensions['M'].width = 20
-        
-        # Set Summary as the active sheet
-        wb.active = summary_sheet
-        
-        # Save to bytes
-        file_bytes = io.BytesIO()
-        wb.save(file_bytes)
-        file_bytes.seek(0)
-        
-        return StreamingResponse(
-            iter([file_bytes.getvalue()]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={employee.employee_id}_{employee.first_name}_{year}-{month:02d}_attendance.xlsx"}
+        return await attendance_export_response(
+            request, db, "employee_monthly", employee.department_id, start_date, end_date,
+            filename=f"{employee.employee_id}_{employee.first_name}_{year}-{month:02d}_attendance",
+            export_format=format,
+            language=language,
+            load=lambda: load_employee_report(db, employee, start_date, end_date),
+            employee_id=employee.id
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Employee export error: {str(e)}")
         import traceback
@@ -3664,6 +2273,168 @@ async def export_employee_monthly_attendance(
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
+@app.post("/admin/exports/monthly-bundle")
+async def create_monthly_export_bundle(
+    year: int,
+    month: int,
+    include_comprehensive: bool = False,
+    language: str = 'en',
+    current_user: User = Depends(require_admin)
+):
+    """
+    Build every active department's monthly report (and the comprehensive
+    report if include_comprehensive) in the background and zip them.
+    Poll GET /admin/exports/jobs/{job_id}; result.download_url when completed.
+    """
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="month must be 1-12")
+
+    params = {"year": year, "month": month, "include_comprehensive": include_comprehensive, "language": language}
+    job = ExportBundleJob(current_user.id, params)
+
+    async def run(progress: GenerationProgress) -> dict:
+        return await build_monthly_bundle(job, progress, year, month, include_comprehensive, language)
+
+    export_jobs.start(job, run)
+    print(f"[DEBUG] Export bundle job {job.id} started for {year}-{month:02d}", flush=True)
+    return {"job_id": job.id, "status": job.status}
+
+
+def get_export_job(job_id: str) -> ExportBundleJob:
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/admin/exports/jobs/{job_id}")
+async def get_export_bundle_job(
+    job_id: str,
+    current_user: User = Depends(require_admin)
+):
+    """Phase ('building 12/40 departments'), percent done, per-department failures and the result"""
+    return get_export_job(job_id).to_dict()
+
+
+@app.get("/admin/exports/jobs/{job_id}/download")
+async def download_export_bundle(
+    job_id: str,
+    current_user: User = Depends(require_admin)
+):
+    """ZIP of a completed bundle job"""
+    job = get_export_job(job_id)
+    if job.status != JobStatus.COMPLETED or job.path is None or not job.path.exists():
+        raise HTTPException(status_code=409, detail=f"Bundle is not ready (job {job.status})")
+    return FileResponse(job.path, media_type="application/zip", filename=job.filename)
+
+
+@app.post("/admin/exports/jobs/{job_id}/cancel")
+async def cancel_export_bundle(
+    job_id: str,
+    current_user: User = Depends(require_admin)
+):
+    """Cancel a running bundle job; the partial ZIP is deleted"""
+    job = get_export_job(job_id)
+    if not export_jobs.cancel(job):
+        raise HTTPException(status_code=400, detail=f"Job already {job.status}")
+    return {"job_id": job.id, "status": "cancelling"}
+
+
+# Closed Attendance Months
+async def get_period_departments(department_id: Optional[int], db: AsyncSession) -> List[Department]:
+    """The given department, or every active department when None"""
+    if department_id is not None:
+        department = await db.get(Department, department_id)
+        if not department:
+            raise HTTPException(status_code=404, detail="Department not found")
+        return [department]
+    result = await db.execute(select(Department).filter(Department.is_active == True).order_by(Department.id))
+    return result.scalars().all()
+
+
+@app.post("/admin/attendance/close-month")
+async def close_attendance_month(
+    year: int,
+    month: int,
+    department_id: Optional[int] = None,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Snapshot the month's attendance aggregates of a department (all active
+    departments when department_id is omitted). Closing again refreshes the
+    snapshot, e.g. after a late correction.
+    """
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="month must be 1-12")
+    if date(year, month, 1) > date.today().replace(day=1):
+        raise HTTPException(status_code=400, detail="Cannot close a future month")
+
+    closed = []
+    for department in await get_period_departments(department_id, db):
+        closed.append(await close_month(db, department, year, month, current_user.id))
+    await db.commit()
+    print(f"[DEBUG] Closed {year}-{month:02d} for {len(closed)} department(s)", flush=True)
+    return {"year": year, "month": month, "closed": closed}
+
+
+@app.post("/admin/attendance/reopen-month")
+async def reopen_attendance_month(
+    year: int,
+    month: int,
+    department_id: Optional[int] = None,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Reopen a closed month: its snapshots are deleted and reports read the live rows"""
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="month must be 1-12")
+
+    reopened = []
+    for department in await get_period_departments(department_id, db):
+        if await reopen_month(db, department.id, year, month):
+            reopened.append(department.id)
+    await db.commit()
+    print(f"[DEBUG] Reopened {year}-{month:02d} for departments {reopened}", flush=True)
+    return {"year": year, "month": month, "reopened": reopened}
+
+
+@app.get("/attendance/monthly-totals")
+async def get_attendance_monthly_totals(
+    start_year: int,
+    end_year: Optional[int] = None,
+    department_id: Optional[int] = None,
+    current_user: User = Depends(require_manager),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Department attendance totals per month for year-over-year comparison.
+    Closed months come from their snapshots; open (or since corrected)
+    months are computed from the attendance rows.
+    """
+    end_year = end_year or start_year
+    if end_year < start_year or end_year - start_year >= 10:
+        raise HTTPException(status_code=400, detail="end_year must be within 10 years after start_year")
+
+    if current_user.user_type == UserType.MANAGER:
+        manager_dept = await get_manager_department(current_user, db)
+        if not manager_dept or (department_id is not None and department_id != manager_dept):
+            raise HTTPException(status_code=403, detail="Not authorized for this department")
+        department_id = manager_dept
+    if department_id is None:
+        raise HTTPException(status_code=400, detail="department_id is required")
+
+    department = await db.get(Department, department_id)
+    if not department:
+        raise HTTPException(status_code=404, detail="Department not found")
+
+    return {
+        "department_id": department.id,
+        "department_name": department.name,
+        "months": await department_month_totals(db, department, start_year, end_year)
+    }
+
+
 # Leave Requests
 @app.post("/leave-requests", response_model=LeaveRequestResponse)
 async def create_leave_request(
@@ -3785,21 +2556,17 @@ async def create_leave_request(
 @app.get("/leave-requests", response_model=List[LeaveRequestResponse])
 async def list_leave_requests(
     current_user: User = Depends(get_current_active_user),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     if current_user.user_type == UserType.EMPLOYEE:
-        # Get employee record for current user
-        emp_result = await db.execute(
-            select(Employee).filter(Employee.user_id == current_user.id)
-        )
-        employee = emp_result.scalar_one_or_none()
-        if not employee:
+        if not principal.employee_id:
             return []
 
         result = await db.execute(
             select(LeaveRequest)
             .options(selectinload(LeaveRequest.employee))
-            .filter(LeaveRequest.employee_id == employee.id)
+            .filter(LeaveRequest.employee_id == principal.employee_id)
             .order_by(LeaveRequest.start_date)
         )
     elif current_user.user_type == UserType.MANAGER:
@@ -4329,25 +3096,23 @@ async def export_leave_compoff_report(
     total_ot_hours = 0
     total_work_hours = 0
     
-    for att_rec in attendance_records:
+    # Check-in to check-out span of every record (overnight wraps), one batch
+    spans = shift_hours(
+        minutes_array(str(r.in_time) if r.in_time else None for r in attendance_records),
+        minutes_array(str(r.out_time) if r.out_time else None for r in attendance_records)
+    ).tolist()
+    
+    for att_rec, hours in zip(attendance_records, spans):
         schedule = schedule_map.get(att_rec.date)
         shift_str = '-'
         if schedule and schedule.start_time and schedule.end_time:
             shift_str = f"{schedule.start_time} - {schedule.end_time}"
         
-        # Calculate hours worked
+        # Hours worked
         hours_worked = '-'
-        if att_rec.in_time and att_rec.out_time:
-            try:
-                in_h, in_m = map(int, str(att_rec.in_time).split(':')[:2])
-                out_h, out_m = map(int, str(att_rec.out_time).split(':')[:2])
-                in_decimal = in_h + in_m / 60
-                out_decimal = out_h + out_m / 60
-                hours = out_decimal - in_decimal if out_decimal > in_decimal else 24 - in_decimal + out_decimal
-                hours_worked = f"{hours:.2f}"
-                total_work_hours += hours
-            except:
-                pass
+        if not np.isnan(hours):
+            hours_worked = f"{hours:.2f}"
+            total_work_hours += hours
         
         ot_hours = att_rec.overtime_hours or 0
         total_ot_hours += ot_hours
@@ -4415,6 +3180,26 @@ async def export_leave_compoff_report(
     )
 
 
+async def regenerate_after_change(department_id: int, changes: Dict[int, List[date]]) -> tuple:
+    """
+    Re-solve the weeks touched by an already committed approval or
+    unavailability, in a session of its own. Only the changed employees'
+    days are re-solved. A failure is logged and reported instead of undoing
+    the change: returns (schedule_changes, warning), one of them None.
+    """
+    async with async_session_maker() as session:
+        try:
+            schedule_changes = await regenerate_incremental(
+                session, department_id, changes, from_date=date.today()
+            )
+            await session.commit()
+            return schedule_changes, None
+        except Exception as e:
+            await session.rollback()
+            print(f"[DEBUG] Incremental regeneration after change failed for department {department_id}: {e}", flush=True)
+            return None, "Saved, but the schedule could not be updated automatically - regenerate the affected weeks"
+
+
 @app.post("/manager/approve-leave/{leave_id}")
 
 async def approve_leave(
@@ -4738,7 +3523,16 @@ async def approve_leave(
 
     await db.commit()
 
-    return {"message": "Leave approved successfully"}
+    # Re-solve the affected weeks of an already generated schedule
+    schedule_changes, warning = None, None
+    if employee and employee.department_id:
+        leave_dates = [
+            leave_request.start_date + timedelta(days=i)
+            for i in range((leave_request.end_date - leave_request.start_date).days + 1)
+        ]
+        schedule_changes, warning = await regenerate_after_change(employee.department_id, {employee.id: leave_dates})
+
+    return {"message": "Leave approved successfully", "schedule_changes": schedule_changes, "warning": warning}
 
 
 @app.post("/manager/reject-leave/{leave_id}")
@@ -4911,23 +3705,19 @@ async def create_comp_off_request(
 @app.get("/comp-off-requests", response_model=List[CompOffRequestResponse])
 async def list_comp_off_requests(
     current_user: User = Depends(get_current_active_user),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """List comp-off requests - employees see their own, managers see their department's"""
     if current_user.user_type == UserType.EMPLOYEE:
         # Employees see only their own requests
-        emp_result = await db.execute(
-            select(Employee).filter(Employee.user_id == current_user.id)
-        )
-        employee = emp_result.scalar_one_or_none()
-
-        if not employee:
+        if not principal.employee_id:
             return []
 
         result = await db.execute(
             select(CompOffRequest)
             .options(selectinload(CompOffRequest.employee))
-            .filter(CompOffRequest.employee_id == employee.id)
+            .filter(CompOffRequest.employee_id == principal.employee_id)
             .order_by(CompOffRequest.comp_off_date.desc())
         )
     elif current_user.user_type == UserType.MANAGER:
@@ -5421,8 +4211,15 @@ async def approve_comp_off(
     
     # Commit all changes
     await db.commit()
-    
-    return {"message": "Comp-off approved successfully"}
+
+    # Re-solve the affected week of an already generated schedule
+    schedule_changes, warning = None, None
+    if employee.department_id:
+        schedule_changes, warning = await regenerate_after_change(
+            employee.department_id, {employee.id: [comp_off.comp_off_date]}
+        )
+
+    return {"message": "Comp-off approved successfully", "schedule_changes": schedule_changes, "warning": warning}
 
 
 @app.post("/manager/reject-comp-off/{comp_off_id}")
@@ -5782,6 +4579,8 @@ async def create_notification(
         )
         db.add(notification)
         await db.flush()
+        # Pushed to the user's open streams when the caller commits
+        await notify_created(db, notification)
         return notification
     except Exception as e:
         print(f"Error creating notification: {e}")
@@ -5791,10 +4590,13 @@ async def create_notification(
 # Notifications
 @app.get("/notifications", response_model=List[NotificationResponse])
 async def get_notifications(
+    request: Request,
+    response: Response,
     unread_only: bool = False,
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
+    await set_etag(request, response, [f'notifications:u:{current_user.id}'], db, current_user)
     query = select(Notification).filter(Notification.user_id == current_user.id)
 
     if unread_only:
@@ -5804,6 +4606,44 @@ async def get_notifications(
     return result.scalars().all()
 
 
+@app.post("/notifications/stream-token")
+async def create_notification_stream_token(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Short-lived token for ?stream_token= on /notifications/stream (EventSource cannot send headers)"""
+    return {
+        "stream_token": create_stream_token(current_user.username),
+        "expires_in": settings.NOTIFICATION_STREAM_TOKEN_SECONDS
+    }
+
+
+@app.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    after: Optional[int] = None,
+    current_user: User = Depends(get_stream_user)
+):
+    """
+    Server-sent events with the user's new notifications (event id =
+    notification id). Resumes after ?after= or the Last-Event-ID header
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            after = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    return StreamingResponse(
+        notification_events(
+            current_user.id, after, async_session_maker,
+            settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS, settings.NOTIFICATION_STREAM_MAX_SECONDS
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/notifications/{notification_id}/mark-read")
 async def mark_notification_read(
     notification_id: int,
@@ -5874,10 +4714,13 @@ async def delete_notification(
 # Schedules
 @app.get("/calendar/holidays")
 async def get_holidays(
+    request: Request,
+    response: Response,
     year: int,
     month: int
 ):
     """Get Japanese holidays for a specific month (public endpoint)"""
+    await set_etag(request, response, ['holiday_calendar'])
     from calendar import monthrange
     
     # Get the calendar days for the month
@@ -6028,43 +4871,87 @@ async def get_week_info(
     }
 
 
-@app.get("/schedules", response_model=List[ScheduleResponse])
-async def get_schedules(
-    start_date: date = None,
-    end_date: date = None,
-    current_user: User = Depends(get_current_active_user),
+@app.get("/admin/holidays", response_model=List[CalendarHolidayResponse])
+async def list_calendar_holidays(
+    year: int,
+    company_only: bool = False,
+    current_user: User = Depends(require_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    query = select(Schedule).options(
-        selectinload(Schedule.employee).selectinload(Employee.user),
-        selectinload(Schedule.role)
+    """Public and company holidays of a year from the holiday calendar"""
+    query = select(CalendarHoliday).filter(
+        CalendarHoliday.date >= date(year, 1, 1),
+        CalendarHoliday.date <= date(year, 12, 31)
     )
+    if company_only:
+        query = query.filter(CalendarHoliday.is_company.is_(True))
+    result = await db.execute(query.order_by(CalendarHoliday.date))
+    return result.scalars().all()
 
-    if current_user.user_type == UserType.EMPLOYEE:
-        # Get employee by user_id
-        emp_result = await db.execute(
-            select(Employee).filter(Employee.user_id == current_user.id)
+
+@app.post("/admin/holidays", response_model=CalendarHolidayResponse)
+async def create_company_holiday(
+    holiday_data: CompanyHolidayCreate,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Add a company holiday: it counts as a holiday for scheduling (fewer
+    required shifts, no generated shifts) and in the attendance reports
+    """
+    name = holiday_data.name.strip()
+    if not name or len(name) > 100:
+        raise HTTPException(status_code=400, detail="Holiday name must be 1-100 characters")
+    existing = await db.get(CalendarHoliday, holiday_data.date)
+    if existing or jp_calendar.is_holiday(holiday_data.date):
+        raise HTTPException(
+            status_code=400,
+            detail=f"{holiday_data.date} is already a holiday ({jp_calendar.get_holiday_name(holiday_data.date) or existing.name})"
         )
-        employee = emp_result.scalar_one_or_none()
-        if employee:
-            query = query.filter(Schedule.employee_id == employee.id)
-        else:
-            return []
+
+    holiday = CalendarHoliday(date=holiday_data.date, name=name, is_company=True, created_by=current_user.id)
+    db.add(holiday)
+    await db.commit()
+    await db.refresh(holiday)
+    await load_company_holidays(db)
+    print(f"[DEBUG] Company holiday added: {holiday.date} {holiday.name}", flush=True)
+    return holiday
+
+
+@app.delete("/admin/holidays/{holiday_date}")
+async def delete_company_holiday(
+    holiday_date: date,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Remove a company holiday (public holidays cannot be removed)"""
+    holiday = await db.get(CalendarHoliday, holiday_date)
+    if not holiday or not holiday.is_company:
+        raise HTTPException(status_code=404, detail="Company holiday not found")
+
+    await db.delete(holiday)
+    await db.commit()
+    await load_company_holidays(db)
+    print(f"[DEBUG] Company holiday removed: {holiday_date}", flush=True)
+    return {"message": "Company holiday removed", "date": holiday_date.isoformat()}
+
+
+async def schedule_scope(current_user: User, db: AsyncSession) -> Optional[dict]:
+    """
+    Column filters limiting schedules to what the user may see ({} for
+    admins), or None if the user sees none
+    """
+    if current_user.user_type == UserType.EMPLOYEE:
+        employee_id = await get_user_employee_id(current_user, db)
+        return {'employee_id': employee_id} if employee_id else None
     elif current_user.user_type == UserType.MANAGER:
         manager_dept = await get_manager_department(current_user, db)
-        if manager_dept:
-            query = query.filter(Schedule.department_id == manager_dept)
-        else:
-            return []
+        return {'department_id': manager_dept} if manager_dept else None
+    return {}
 
-    if start_date:
-        query = query.filter(Schedule.date >= start_date)
-    if end_date:
-        query = query.filter(Schedule.date <= end_date)
 
-    result = await db.execute(query.order_by(Schedule.date, Schedule.status))
-    all_schedules = result.scalars().all()
-    
+async def present_schedules(all_schedules: list, current_user: User, db: AsyncSession) -> list:
+    """Pick the rows GET /schedules shows for each (employee, date) group"""
     # For both employees and managers: filter out leave schedules if a shift schedule exists
     # Group schedules by (employee_id, date)
     schedules_by_emp_date = {}
@@ -6107,6 +4994,96 @@ async def get_schedules(
     return filtered_schedules
 
 
+def schedule_etag_keys(scope: Optional[dict]) -> List[str]:
+    """ETag counters of GET /schedules for a schedule_scope (shift times fill in leave rows)"""
+    if scope is None:
+        return []
+    if 'department_id' in scope:
+        return [f"schedules:d:{scope['department_id']}", f"shifts:d:{scope['department_id']}"]
+    if 'employee_id' in scope:
+        return [f"schedules:e:{scope['employee_id']}", 'shifts:d:*']
+    return ['schedules:d:*', 'shifts:d:*']
+
+
+def _schedules_query(scope: dict):
+    return select(Schedule).options(
+        selectinload(Schedule.employee).selectinload(Employee.user),
+        selectinload(Schedule.role)
+    ).filter(*[getattr(Schedule, column) == value for column, value in scope.items()])
+
+
+@app.get("/schedules", response_model=List[ScheduleResponse])
+async def get_schedules(
+    request: Request,
+    response: Response,
+    start_date: date = None,
+    end_date: date = None,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    scope = await schedule_scope(current_user, db)
+    await set_etag(request, response, schedule_etag_keys(scope), db, current_user)
+    if scope is None:
+        return []
+    query = _schedules_query(scope)
+
+    if start_date:
+        query = query.filter(Schedule.date >= start_date)
+    if end_date:
+        query = query.filter(Schedule.date <= end_date)
+
+    result = await db.execute(query.order_by(Schedule.date, Schedule.status))
+    return await present_schedules(result.scalars().all(), current_user, db)
+
+
+@app.get("/schedules/changes", response_model=ScheduleChanges)
+async def get_schedule_changes(
+    since: Optional[str] = None,
+    start_date: date = None,
+    end_date: date = None,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Delta sync of GET /schedules. Without ?since= (or with a cursor older
+    than the change log) the whole range is returned with full=true;
+    otherwise only the (employee, date) groups changed since the cursor,
+    each with all its current rows. Pass the returned cursor next time
+    """
+    # The cursor must be taken before anything is read
+    xmin, now = await sync_position(db)
+    since_xmin = None
+    if since:
+        try:
+            since_xmin = decode_cursor(since, now, settings.SCHEDULE_CHANGE_RETENTION_HOURS)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = {'cursor': encode_cursor(xmin, now), 'full': since_xmin is None, 'keys': [], 'schedules': []}
+
+    scope = await schedule_scope(current_user, db)
+    if scope is None:
+        return response
+    query = _schedules_query(scope)
+
+    if since_xmin is None:
+        if start_date:
+            query = query.filter(Schedule.date >= start_date)
+        if end_date:
+            query = query.filter(Schedule.date <= end_date)
+    else:
+        keys = await changed_schedule_keys(db, since_xmin, scope, start_date, end_date)
+        if not keys:
+            return response
+        response['keys'] = [{'employee_id': employee_id, 'date': day} for employee_id, day in keys]
+        query = query.filter(tuple_(Schedule.employee_id, Schedule.date).in_(keys))
+
+    result = await db.execute(query.order_by(Schedule.date, Schedule.status))
+    response['schedules'] = await present_schedules(result.scalars().all(), current_user, db)
+    changed = "full" if since_xmin is None else f"{len(response['keys'])} groups"
+    print(f"[DEBUG] Schedule changes for user {current_user.id}: {changed}, {len(response['schedules'])} rows", flush=True)
+    return response
+
+
 @app.post("/schedules", response_model=ScheduleResponse)
 async def create_schedule(
     schedule_data: ScheduleCreate,
@@ -6125,14 +5102,11 @@ async def create_schedule(
         if not manager_dept or employee.department_id != manager_dept:
             raise HTTPException(status_code=403, detail="Can only schedule employees in your department")
 
-    # Get the shift/role to calculate hours
-    try:
-        start_h, start_m = map(int, schedule_data.start_time.split(':'))
-        end_h, end_m = map(int, schedule_data.end_time.split(':'))
-        start_decimal = start_h + start_m / 60
-        end_decimal = end_h + end_m / 60
-        shift_hours = end_decimal - start_decimal if end_decimal > start_decimal else 24 - start_decimal + end_decimal
-    except:
+    # Get the shift/role to calculate hours (times are validated by the schema)
+    if schedule_data.start_time and schedule_data.end_time:
+        shift_minutes = (parse_time(schedule_data.end_time) - parse_time(schedule_data.start_time)) % MINUTES_PER_DAY
+        shift_hours = (shift_minutes or MINUTES_PER_DAY) / 60  # equal times: a 24-hour shift
+    else:
         shift_hours = 0
     
     # ===== CONSTRAINT VALIDATION =====
@@ -6157,26 +5131,22 @@ async def create_schedule(
         daily_overtime = True
         overtime_hours = shift_hours - 8
     
-    # Check existing schedules for the day to see if daily limit exceeded
+    # Existing hours for the day and the week, summed in the database
+    week_start = schedule_data.date - timedelta(days=schedule_data.date.weekday())
+    week_end = week_start + timedelta(days=6)
+    scheduled_minutes = duration_minutes(Schedule.start_time, Schedule.end_time, equal_is_full_day=True)
     existing_result = await db.execute(
-        select(Schedule).filter(
+        select(
+            func.coalesce(func.sum(scheduled_minutes).filter(Schedule.date == schedule_data.date), 0),
+            func.coalesce(func.sum(scheduled_minutes), 0)
+        ).filter(
             Schedule.employee_id == schedule_data.employee_id,
-            Schedule.date == schedule_data.date
+            Schedule.date >= week_start,
+            Schedule.date <= week_end
         )
     )
-    existing_schedules = existing_result.scalars().all()
-    
-    existing_hours = 0
-    for sched in existing_schedules:
-        try:
-            start_h, start_m = map(int, sched.start_time.split(':'))
-            end_h, end_m = map(int, sched.end_time.split(':'))
-            start_decimal = start_h + start_m / 60
-            end_decimal = end_h + end_m / 60
-            hours = end_decimal - start_decimal if end_decimal > start_decimal else 24 - start_decimal + end_decimal
-            existing_hours += hours
-        except:
-            pass
+    existing_day_minutes, existing_week_minutes = existing_result.one()
+    existing_hours = existing_day_minutes / 60
     
     # CONSTRAINT 2: Total hours for the day must be 9 hrs (8 hrs work + 1 hr break)
     total_daily_hours = existing_hours + shift_hours
@@ -6188,26 +5158,7 @@ async def create_schedule(
             overtime_hours = total_daily_hours - 8
     
     # CONSTRAINT 3: Check weekly hours - max 40 hours per week
-    week_result = await db.execute(
-        select(Schedule).filter(
-            Schedule.employee_id == schedule_data.employee_id,
-            Schedule.date >= week_start,
-            Schedule.date <= week_end
-        )
-    )
-    week_schedules = week_result.scalars().all()
-    
-    existing_weekly_hours = 0
-    for sched in week_schedules:
-        try:
-            start_h, start_m = map(int, sched.start_time.split(':'))
-            end_h, end_m = map(int, sched.end_time.split(':'))
-            start_decimal = start_h + start_m / 60
-            end_decimal = end_h + end_m / 60
-            hours = end_decimal - start_decimal if end_decimal > start_decimal else 24 - start_decimal + end_decimal
-            existing_weekly_hours += hours
-        except:
-            pass
+    existing_weekly_hours = existing_week_minutes / 60
     
     total_weekly_hours = existing_weekly_hours + shift_hours
     weekly_overtime_hours = 0
@@ -6333,45 +5284,303 @@ async def update_schedule(
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_msg)
 
-    for key, value in schedule_data.dict(exclude_unset=True).items():
-        # Convert string date to date object if needed
-        if key == 'date' and isinstance(value, str):
-            value = datetime.strptime(value, '%Y-%m-%d').date()
-        setattr(schedule, key, value)
+    for key, value in schedule_data.dict(exclude_unset=True).items():
+        # Convert string date to date object if needed
+        if key == 'date' and isinstance(value, str):
+            value = datetime.strptime(value, '%Y-%m-%d').date()
+        setattr(schedule, key, value)
+
+    schedule.updated_at = datetime.utcnow()
+    await db.commit()
+
+    # Re-fetch with eager loading
+    result = await db.execute(
+        select(Schedule)
+        .filter(Schedule.id == schedule_id)
+        .options(selectinload(Schedule.role))
+    )
+    return result.scalar_one()
+
+
+@app.delete("/schedules/{schedule_id}")
+async def delete_schedule(
+    schedule_id: int,
+    current_user: User = Depends(require_manager),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(select(Schedule).filter(Schedule.id == schedule_id))
+    schedule = result.scalar_one_or_none()
+
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+
+    if current_user.user_type == UserType.MANAGER:
+        manager_dept = await get_manager_department(current_user, db)
+        if not manager_dept or schedule.department_id != manager_dept:
+            raise HTTPException(status_code=403, detail="Can only delete schedules in your department")
+
+    await db.delete(schedule)
+    await db.commit()
+
+    return {"message": "Schedule deleted successfully"}
+
+
+async def run_schedule_generation(
+    db: AsyncSession,
+    department_id: int,
+    start_date: date,
+    end_date: date,
+    regenerate: bool = False,
+    preload: bool = True,
+    engine: str = "greedy",
+    time_limit_seconds: Optional[float] = None,
+    num_workers: Optional[int] = None,
+    progress: Optional[GenerationProgress] = None,
+    warm_start: bool = True,
+    max_changes: Optional[int] = None
+) -> dict:
+    """
+    Generate schedules for one department (see POST /schedules/generate).
+    Commits its own transaction and returns the endpoint response dict.
+    progress (background jobs) receives phase/percent and the feedback and
+    overtime warnings as they accumulate.
+    """
+    if time_limit_seconds is None:
+        time_limit_seconds = settings.SCHEDULER_TIME_LIMIT_SECONDS
+    if num_workers is None:
+        num_workers = settings.SCHEDULER_NUM_WORKERS
+
+    print(f"[DEBUG] Schedule generation started for dates {start_date} to {end_date}", flush=True)
+    print(f"[DEBUG] Department ID: {department_id}", flush=True)
+    if progress:
+        progress.set_phase("loading", 0)
+
+    # ===== NEW: Check if schedules already exist in this date range =====
+    existing_schedules_result = await db.execute(
+        select(Schedule)
+        .filter(
+            Schedule.department_id == department_id,
+            Schedule.date >= start_date,
+            Schedule.date <= end_date
+        )
+    )
+    existing_schedules = existing_schedules_result.scalars().all()
+    
+    if existing_schedules and not regenerate:
+        # Return message asking if user wants to regenerate
+        return {
+            "success": False,
+            "schedules_created": 0,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "requires_confirmation": True,
+            "existing_count": len(existing_schedules),
+            "feedback": [
+                f"⚠️  Found {len(existing_schedules)} existing schedules for this date range.",
+                "Do you want to regenerate and replace them?"
+            ],
+            "schedules": []
+        }
+    
+    # ===== PRESERVE SCHEDULES WITH CHECK-INS DURING REGENERATION =====
+    # Get schedule IDs that have check-in records - these should NOT be deleted
+    schedules_with_checkins = set()
+    if existing_schedules and regenerate:
+        checkin_sched_result = await db.execute(
+            select(CheckInOut.schedule_id)
+            .where(CheckInOut.schedule_id != None)
+            .distinct()
+        )
+        schedules_with_checkins = set(checkin_sched_result.scalars().all())
+        
+        if schedules_with_checkins:
+            print(f"[DEBUG] Found {len(schedules_with_checkins)} schedules with check-in records - will skip deletion", flush=True)
+    
+    # If regenerate is True, delete existing schedules first (but PRESERVE leaves, comp-off, and schedules with check-ins)
+    if existing_schedules and regenerate:
+        print(f"[DEBUG] Regenerating - deleting {len(existing_schedules)} existing schedules (excluding ones with check-ins)", flush=True)
+        
+        # Get ONLY 'scheduled' schedules to delete (will recreate them)
+        # BUT: Exclude any that have check-in records
+        # Preserve: 'leave', 'leave_half_morning', 'leave_half_afternoon', 'comp_off_earned', 'comp_off_taken'
+        # comp_off_taken is approved leave and should NOT be deleted!
+        # Build filter conditions dynamically
+        filter_conditions = [
+            Schedule.department_id == department_id,
+            Schedule.date >= start_date,
+            Schedule.date <= end_date,
+            Schedule.status == 'scheduled'  # Only delete work shifts, NOT approved leaves or comp-off usage
+        ]
+        # Exclude schedules with check-ins if any exist
+        if schedules_with_checkins:
+            filter_conditions.append(~Schedule.id.in_(list(schedules_with_checkins)))
+        
+        schedules_to_delete_result = await db.execute(
+            select(Schedule.id).filter(*filter_conditions)
+        )
+        schedules_to_delete_ids = schedules_to_delete_result.scalars().all()
+        
+        if schedules_to_delete_ids:
+            print(f"[DEBUG] Deleting {len(schedules_to_delete_ids)} work shift schedules (excluding {len(schedules_with_checkins)} with check-ins)", flush=True)
+
+        # IMPORTANT: Do NOT touch check-in records - they are historical data
+        # Comp-off requests and attendance keep their rows, only the schedule reference is removed
+        # Committed with the new rows, or before returning early when nothing can be generated
+        await delete_schedules(db, list(schedules_to_delete_ids))
+        feedback = [f"Cleared work shift schedules. Generating new schedule (preserving comp-off, regular leaves, and schedules with check-ins)..."]
+    else:
+        feedback = []
+
+    # Get all roles in this department
+    roles_result = await db.execute(
+        select(Role)
+        .filter(Role.department_id == department_id, Role.is_active == True)
+    )
+    roles = roles_result.scalars().all()
+    print(f"[DEBUG] Found {len(roles)} roles", flush=True)
 
-    schedule.updated_at = datetime.utcnow()
-    await db.commit()
+    if not roles:
+        await db.commit()  # keep the regenerate delete
+        return {
+            "success": True,
+            "schedules_created": 0,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "feedback": ["❌ No active roles found in your department. Create roles first."],
+            "schedules": []
+        }
 
-    # Re-fetch with eager loading
-    result = await db.execute(
-        select(Schedule)
-        .filter(Schedule.id == schedule_id)
-        .options(selectinload(Schedule.role))
+    # Get all shifts for these roles
+    role_ids = [r.id for r in roles]
+    shifts_result = await db.execute(
+        select(Shift)
+        .filter(Shift.role_id.in_(role_ids), Shift.is_active == True)
     )
-    return result.scalar_one()
+    shifts = shifts_result.scalars().all()
+    print(f"[DEBUG] Found {len(shifts)} shifts", flush=True)
+
+    # Log shift details and ensure all shifts have schedule_config
+    print(f"[DEBUG] Processing {len(shifts)} shifts for schedule_config validation", flush=True)
+    for shift in shifts:
+        if not shift.schedule_config or not isinstance(shift.schedule_config, dict) or len(shift.schedule_config) == 0:
+            print(f"[DEBUG] Shift {shift.id} ({shift.name}) has empty/invalid schedule_config, enabling all days for backward compatibility", flush=True)
+        normalize_schedule_config(shift)
+        enabled_days = [day for day, cfg in shift.schedule_config.items() if isinstance(cfg, dict) and cfg.get('enabled', False)]
+        print(f"[DEBUG] Final Shift: {shift.id} - {shift.name}, enabled_days={enabled_days}", flush=True)
+
+    if not shifts:
+        await db.commit()  # keep the regenerate delete
+        return {
+            "success": True,
+            "schedules_created": 0,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "feedback": ["❌ No active shifts found in your roles. Create shifts first."],
+            "schedules": []
+        }
 
+    # Get all employees in the department
+    employees_result = await db.execute(
+        select(Employee)
+        .filter(Employee.department_id == department_id, Employee.is_active == True)
+    )
+    employees = employees_result.scalars().all()
+    print(f"[DEBUG] Found {len(employees)} employees", flush=True)
 
-@app.delete("/schedules/{schedule_id}")
-async def delete_schedule(
-    schedule_id: int,
-    current_user: User = Depends(require_manager),
-    db: AsyncSession = Depends(get_db)
-):
-    result = await db.execute(select(Schedule).filter(Schedule.id == schedule_id))
-    schedule = result.scalar_one_or_none()
+    # Log employee details
+    for emp in employees:
+        print(f"[DEBUG] Employee: {emp.id} - {emp.first_name}, active={emp.is_active}, weekly_hours={emp.weekly_hours}, daily_max={emp.daily_max_hours}, shifts_per_week={emp.shifts_per_week}", flush=True)
 
-    if not schedule:
-        raise HTTPException(status_code=404, detail="Schedule not found")
+    if not employees:
+        await db.commit()  # keep the regenerate delete
+        return {
+            "success": True,
+            "schedules_created": 0,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "feedback": ["❌ No active employees found in your department. Create employees first."],
+            "schedules": []
+        }
 
-    if current_user.user_type == UserType.MANAGER:
-        manager_dept = await get_manager_department(current_user, db)
-        if not manager_dept or schedule.department_id != manager_dept:
-            raise HTTPException(status_code=403, detail="Can only delete schedules in your department")
+    # Leave/comp-off/schedule lookups for the checks below
+    if preload or engine == "cpsat":
+        ctx = await PreloadedScheduleContext.load(
+            db, [emp.id for emp in employees], roles, start_date, end_date
+        )
+        print(f"[DEBUG] Preloaded generation context for {len(employees)} employees", flush=True)
+    else:
+        ctx = ScheduleContext(db)
 
-    await db.delete(schedule)
+    # Generate date range (one schedule per shift per day)
+    feedback = progress.feedback if progress else []
+    overtime_warnings = progress.overtime_warnings if progress else []  # Track shifts requiring overtime approval
+    if progress:
+        progress.set_phase("solving" if engine == "cpsat" else "assigning", 10)
+
+    # Group shifts by role for fair distribution
+    shifts_by_role = defaultdict(list)
+    for shift in shifts:
+        shifts_by_role[shift.role_id].append(shift)
+
+    # Calculate which employees are eligible for each shift (based on role)
+    # Strategy: Assign employees to shifts day-by-day
+    # Each employee gets ONE shift per day maximum (no double shifts)
+    # If shifts are Mon-Friday, all eligible employees get all 5 days
+    eligible_for_shift = {}  # {shift_id: [emp1, emp2, emp3...]} - only eligible employees per shift
+
+    print(f"[DEBUG] Building eligibility matrix for {len(shifts)} shifts and {len(employees)} employees", flush=True)
+    for shift in shifts:
+        eligible_for_shift[shift.id] = []
+        
+        for emp in employees:
+            # Employee is eligible if:
+            # 1. They have no specific role assignment (flexible=True), OR
+            # 2. Their role matches the shift's role
+            is_eligible = (emp.role_id is None) or (emp.role_id == shift.role_id)
+            
+            if is_eligible:
+                eligible_for_shift[shift.id].append(emp)
+                print(f"[DEBUG] Shift {shift.id} ({shift.name}): {emp.id} ({emp.first_name}) is ELIGIBLE", flush=True)
+            else:
+                print(f"[DEBUG] Shift {shift.id} ({shift.name}): {emp.id} ({emp.first_name}) is NOT eligible (role mismatch: emp.role={emp.role_id} vs shift.role={shift.role_id})", flush=True)
+
+    if engine == "cpsat":
+        # ===== CP-SAT: leave rows, then one solve per calendar week =====
+        print(f"[DEBUG] Solving with CP-SAT (time_limit={time_limit_seconds}s, workers={num_workers})", flush=True)
+        schedules_created, cpsat_feedback, cpsat_warnings = await generate_with_cpsat(
+            ctx, department_id, roles, shifts, employees, start_date, end_date,
+            time_limit_seconds, num_workers, progress=progress,
+            warm_start=warm_start, max_changes=max_changes
+        )
+        feedback.extend(cpsat_feedback)
+        overtime_warnings.extend(cpsat_warnings)
+    else:
+        schedules_created = await generate_greedy(
+            ctx, department_id, roles, shifts, eligible_for_shift, start_date, end_date,
+            feedback, overtime_warnings, progress=progress
+        )
+
+    # Regenerate delete + new rows commit together
+    if progress:
+        progress.set_phase("saving", 90)
+    await ctx.write_new_schedules()
     await db.commit()
 
-    return {"message": "Schedule deleted successfully"}
+    feedback.insert(0, f"Successfully generated {schedules_created} schedules")
+    
+    # Add overtime warnings to feedback
+    if overtime_warnings:
+        feedback.append(f"⚠️  {len(overtime_warnings)} overtime alert(s) - shifts exceed 9 hours on that day")
+
+    return {
+        "success": True,
+        "schedules_created": schedules_created,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "feedback": feedback,
+        "overtime_warnings": overtime_warnings,
+        "schedules": []
+    }
 
 
 @app.post("/schedules/generate")
@@ -6379,12 +5588,30 @@ async def generate_schedules(
     start_date: date,
     end_date: date,
     regenerate: bool = False,
+    preload: bool = True,
+    engine: str = "greedy",
+    time_limit_seconds: Optional[float] = None,
+    num_workers: Optional[int] = None,
+    warm_start: bool = True,
+    max_changes: Optional[int] = None,
     current_user: User = Depends(require_manager),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Generate fair schedules with equal shift distribution.
 
+    preload=True loads leaves, comp-offs, schedules and roles for the whole
+    department/date range up front, runs every check in memory and writes
+    the result with one bulk insert; preload=False queries the database for
+    each check (same output). Regenerate deletes commit with the new rows.
+
+    engine=greedy assigns day by day in employee order; engine=cpsat solves each
+    week with the OR-Tools ShiftSchedulerV5 model (always preloaded), bounded by
+    time_limit_seconds / num_workers (defaults from settings). CP-SAT is
+    warm-started (warm_start): the first week from the previous 7 days'
+    assignments, each later week from the week solved before it. max_changes
+    caps how many assignments per week may differ from those hints.
+
     Algorithm:
     1. Get all roles and shifts for the department in the date range
     2. Get all employees in the department
@@ -6392,605 +5619,202 @@ async def generate_schedules(
     4. Fairly assign shifts equally across different shift types
     5. Respect min_emp and max_emp constraints for each shift
     """
-    try:
-        print(f"[DEBUG] Schedule generation started for dates {start_date} to {end_date}", flush=True)
+    if engine not in ("greedy", "cpsat"):
+        raise HTTPException(status_code=400, detail="engine must be 'greedy' or 'cpsat'")
 
+    try:
         # Get manager's department
         department_id = await get_manager_department(current_user, db)
         if not department_id:
             raise HTTPException(status_code=400, detail="Manager department not found")
 
-        print(f"[DEBUG] Department ID: {department_id}", flush=True)
-
-        # ===== NEW: Check if schedules already exist in this date range =====
-        existing_schedules_result = await db.execute(
-            select(Schedule)
-            .filter(
-                Schedule.department_id == department_id,
-                Schedule.date >= start_date,
-                Schedule.date <= end_date
-            )
+        return await run_schedule_generation(
+            db, department_id, start_date, end_date,
+            regenerate=regenerate, preload=preload, engine=engine,
+            time_limit_seconds=time_limit_seconds, num_workers=num_workers,
+            warm_start=warm_start, max_changes=max_changes
         )
-        existing_schedules = existing_schedules_result.scalars().all()
-        
-        if existing_schedules and not regenerate:
-            # Return message asking if user wants to regenerate
-            return {
-                "success": False,
-                "schedules_created": 0,
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
-                "requires_confirmation": True,
-                "existing_count": len(existing_schedules),
-                "feedback": [
-                    f"⚠️  Found {len(existing_schedules)} existing schedules for this date range.",
-                    "Do you want to regenerate and replace them?"
-                ],
-                "schedules": []
-            }
-        
-        # ===== PRESERVE SCHEDULES WITH CHECK-INS DURING REGENERATION =====
-        # Get schedule IDs that have check-in records - these should NOT be deleted
-        schedules_with_checkins = set()
-        if existing_schedules and regenerate:
-            checkin_sched_result = await db.execute(
-                select(CheckInOut.schedule_id)
-                .where(CheckInOut.schedule_id != None)
-                .distinct()
-            )
-            schedules_with_checkins = set(checkin_sched_result.scalars().all())
-            
-            if schedules_with_checkins:
-                print(f"[DEBUG] Found {len(schedules_with_checkins)} schedules with check-in records - will skip deletion", flush=True)
-        
-        # If regenerate is True, delete existing schedules first (but PRESERVE leaves, comp-off, and schedules with check-ins)
-        if existing_schedules and regenerate:
-            print(f"[DEBUG] Regenerating - deleting {len(existing_schedules)} existing schedules (excluding ones with check-ins)", flush=True)
-            
-            # Get ONLY 'scheduled' schedules to delete (will recreate them)
-            # BUT: Exclude any that have check-in records
-            # Preserve: 'leave', 'leave_half_morning', 'leave_half_afternoon', 'comp_off_earned', 'comp_off_taken'
-            # comp_off_taken is approved leave and should NOT be deleted!
-            # Build filter conditions dynamically
-            filter_conditions = [
-                Schedule.department_id == department_id,
-                Schedule.date >= start_date,
-                Schedule.date <= end_date,
-                Schedule.status == 'scheduled'  # Only delete work shifts, NOT approved leaves or comp-off usage
-            ]
-            # Exclude schedules with check-ins if any exist
-            if schedules_with_checkins:
-                filter_conditions.append(~Schedule.id.in_(list(schedules_with_checkins)))
-            
-            schedules_to_delete_result = await db.execute(
-                select(Schedule.id).filter(*filter_conditions)
-            )
-            schedules_to_delete_ids = schedules_to_delete_result.scalars().all()
-            
-            if schedules_to_delete_ids:
-                print(f"[DEBUG] Deleting {len(schedules_to_delete_ids)} work shift schedules (excluding {len(schedules_with_checkins)} with check-ins)", flush=True)
-                
-                # IMPORTANT: Do NOT touch check-in records - they are historical data
-                # Just delete the schedules that don't have check-ins
-                
-                # Nullify in CompOffRequest table (preserve comp-off requests)
-                await db.execute(
-                    update(CompOffRequest)
-                    .where(CompOffRequest.schedule_id.in_(schedules_to_delete_ids))
-                    .values(schedule_id=None)
-                )
-                
-                # Nullify in Attendance table (preserve attendance records but remove schedule reference)
-                await db.execute(
-                    update(Attendance)
-                    .where(Attendance.schedule_id.in_(schedules_to_delete_ids))
-                    .values(schedule_id=None)
-                )
-            
-            # Now delete ONLY the work shift schedules that don't have check-ins
-            # (do NOT delete comp-off taken or approved leaves or schedules with check-ins)
-            delete_filter_conditions = [
-                Schedule.department_id == department_id,
-                Schedule.date >= start_date,
-                Schedule.date <= end_date,
-                Schedule.status == 'scheduled'  # Only delete work shifts, NOT comp-off taken or leaves
-            ]
-            # Exclude schedules with check-ins if any exist
-            if schedules_with_checkins:
-                delete_filter_conditions.append(~Schedule.id.in_(list(schedules_with_checkins)))
-            
-            await db.execute(
-                delete(Schedule).filter(*delete_filter_conditions)
-            )
-            await db.commit()
-            feedback = [f"Cleared work shift schedules. Generating new schedule (preserving comp-off, regular leaves, and schedules with check-ins)..."]
-        else:
-            feedback = []
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in schedule generation: {str(e)}", flush=True)
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Schedule generation error: {str(e)}")
 
-        # Get all roles in this department
-        roles_result = await db.execute(
-            select(Role)
-            .filter(Role.department_id == department_id, Role.is_active == True)
-        )
-        roles = roles_result.scalars().all()
-        print(f"[DEBUG] Found {len(roles)} roles", flush=True)
 
-        if not roles:
-            return {
-                "success": True,
-                "schedules_created": 0,
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
-                "feedback": ["❌ No active roles found in your department. Create roles first."],
-                "schedules": []
-            }
+@app.post("/schedules/generate-all")
+async def generate_all_schedules(
+    start_date: date,
+    end_date: date,
+    regenerate: bool = False,
+    time_limit_seconds: Optional[float] = None,
+    num_workers: Optional[int] = None,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate schedules for every active department (admin only).
 
-        # Get all shifts for these roles
-        role_ids = [r.id for r in roles]
-        shifts_result = await db.execute(
-            select(Shift)
-            .filter(Shift.role_id.in_(role_ids), Shift.is_active == True)
-        )
-        shifts = shifts_result.scalars().all()
-        print(f"[DEBUG] Found {len(shifts)} shifts", flush=True)
-
-        # Log shift details and ensure all shifts have schedule_config
-        print(f"[DEBUG] Processing {len(shifts)} shifts for schedule_config validation", flush=True)
-        for shift in shifts:
-            # For backward compatibility:
-            # - If shift has NO schedule_config or empty, assume ALL days are enabled
-            # - If shift has schedule_config, use the configured days
-            if not shift.schedule_config or not isinstance(shift.schedule_config, dict) or len(shift.schedule_config) == 0:
-                print(f"[DEBUG] Shift {shift.id} ({shift.name}) has empty/invalid schedule_config, enabling all days for backward compatibility", flush=True)
-                # Old shift without schedule_config - enable all days for backward compatibility
-                shift.schedule_config = {
-                    'Monday': {'enabled': True},
-                    'Tuesday': {'enabled': True},
-                    'Wednesday': {'enabled': True},
-                    'Thursday': {'enabled': True},
-                    'Friday': {'enabled': True},
-                    'Saturday': {'enabled': True},
-                    'Sunday': {'enabled': True}
-                }
-            else:
-                # Ensure all days have proper structure
-                if isinstance(shift.schedule_config, dict):
-                    for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']:
-                        if day not in shift.schedule_config or not isinstance(shift.schedule_config[day], dict):
-                            # Missing day or malformed - fix it
-                            shift.schedule_config[day] = {'enabled': False}
-                        elif 'enabled' not in shift.schedule_config[day]:
-                            # Missing 'enabled' key - add it
-                            shift.schedule_config[day]['enabled'] = False
-            
-            enabled_days = [day for day, cfg in shift.schedule_config.items() if isinstance(cfg, dict) and cfg.get('enabled', False)]
-            print(f"[DEBUG] Final Shift: {shift.id} - {shift.name}, enabled_days={enabled_days}", flush=True)
+    Each department is solved with the CP-SAT engine in the shared process
+    pool (SCHEDULER_PROCESS_POOL_SIZE), so departments run on all cores
+    while the event loop keeps serving requests. Each department is loaded
+    and persisted in its own session/transaction on the event loop.
+    num_workers defaults to the cores left per pool process.
+    """
+    departments_result = await db.execute(
+        select(Department)
+        .filter(Department.is_active == True)
+        .order_by(Department.id)
+    )
+    departments = departments_result.scalars().all()
+
+    pool_size = get_solver_pool_size()
+    if num_workers is None:
+        num_workers = max(1, (os.cpu_count() or 1) // pool_size)
+
+    # Bounds open sessions to the number of solves that can run at once
+    semaphore = asyncio.Semaphore(pool_size)
+
+    async def generate_department(department: Department) -> dict:
+        async with semaphore:
+            async with async_session_maker() as session:
+                try:
+                    result = await run_schedule_generation(
+                        session, department.id, start_date, end_date,
+                        regenerate=regenerate, engine="cpsat",
+                        time_limit_seconds=time_limit_seconds, num_workers=num_workers
+                    )
+                except Exception as e:
+                    await session.rollback()
+                    print(f"Error generating schedules for department {department.id}: {str(e)}", flush=True)
+                    result = {
+                        "success": False,
+                        "schedules_created": 0,
+                        "feedback": [f"Schedule generation error: {str(e)}"]
+                    }
+        return {
+            "department_id": department.id,
+            "department_name": department.name,
+            **result
+        }
 
-        if not shifts:
-            return {
-                "success": True,
-                "schedules_created": 0,
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
-                "feedback": ["❌ No active shifts found in your roles. Create shifts first."],
-                "schedules": []
-            }
+    results = await asyncio.gather(*(generate_department(d) for d in departments))
 
-        # Get all employees in the department
-        employees_result = await db.execute(
-            select(Employee)
-            .filter(Employee.department_id == department_id, Employee.is_active == True)
-        )
-        employees = employees_result.scalars().all()
-        print(f"[DEBUG] Found {len(employees)} employees", flush=True)
+    return {
+        "success": all(r.get("success") for r in results),
+        "schedules_created": sum(r.get("schedules_created", 0) for r in results),
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "departments": results
+    }
 
-        # Log employee details
-        for emp in employees:
-            print(f"[DEBUG] Employee: {emp.id} - {emp.first_name}, active={emp.is_active}, weekly_hours={emp.weekly_hours}, daily_max={emp.daily_max_hours}, shifts_per_week={emp.shifts_per_week}", flush=True)
 
-        if not employees:
-            return {
-                "success": True,
-                "schedules_created": 0,
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
-                "feedback": ["❌ No active employees found in your department. Create employees first."],
-                "schedules": []
-            }
+@app.post("/schedules/regenerate-incremental")
+async def regenerate_schedules_incremental(
+    request: IncrementalRegenerationRequest,
+    current_user: User = Depends(require_manager),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Re-solve only the weeks containing the given dates for the given
+    employees (greedy engine). Other assignments, leave rows and schedules
+    with check-ins are kept; returns the added/removed/changed assignments.
+    """
+    department_id = await get_manager_department(current_user, db)
+    if not department_id:
+        raise HTTPException(status_code=400, detail="Manager department not found")
 
-        # Generate date range (one schedule per shift per day)
-        current_date = start_date
-        schedules_created = 0
-        feedback = []
-        overtime_warnings = []  # Track shifts requiring overtime approval
-
-        # Group shifts by role for fair distribution
-        shifts_by_role = defaultdict(list)
-        for shift in shifts:
-            shifts_by_role[shift.role_id].append(shift)
-
-        # Calculate which employees are eligible for each shift (based on role)
-        # Strategy: Assign employees to shifts day-by-day
-        # Each employee gets ONE shift per day maximum (no double shifts)
-        # If shifts are Mon-Friday, all eligible employees get all 5 days
-        eligible_for_shift = {}  # {shift_id: [emp1, emp2, emp3...]} - only eligible employees per shift
-
-        print(f"[DEBUG] Building eligibility matrix for {len(shifts)} shifts and {len(employees)} employees", flush=True)
-        for shift in shifts:
-            eligible_for_shift[shift.id] = []
-            
-            for emp in employees:
-                # Employee is eligible if:
-                # 1. They have no specific role assignment (flexible=True), OR
-                # 2. Their role matches the shift's role
-                is_eligible = (emp.role_id is None) or (emp.role_id == shift.role_id)
-                
-                if is_eligible:
-                    eligible_for_shift[shift.id].append(emp)
-                    print(f"[DEBUG] Shift {shift.id} ({shift.name}): {emp.id} ({emp.first_name}) is ELIGIBLE", flush=True)
-                else:
-                    print(f"[DEBUG] Shift {shift.id} ({shift.name}): {emp.id} ({emp.first_name}) is NOT eligible (role mismatch: emp.role={emp.role_id} vs shift.role={shift.role_id})", flush=True)
+    changes = defaultdict(list)
+    for change in request.changes:
+        changes[change.employee_id].extend(change.dates)
 
-        # Create schedules
-        current_date = start_date
-        while current_date <= end_date:
-            day_name = current_date.strftime('%A')  # e.g., 'Monday', 'Sunday'
-            
-            # ===== SKIP PUBLIC HOLIDAYS - Don't assign shifts on holidays =====
-            if is_japanese_holiday(current_date):
-                holiday_name = get_japanese_holiday_name(current_date)
-                print(f"[DEBUG] Skipping {current_date} ({day_name}) - Public Holiday: {holiday_name}", flush=True)
-                current_date += timedelta(days=1)
-                continue
+    try:
+        diff = await regenerate_incremental(db, department_id, changes)
+        await db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"Error in incremental regeneration: {str(e)}", flush=True)
+        raise HTTPException(status_code=500, detail=f"Incremental regeneration failed: {str(e)}")
 
-            for shift in shifts:
-                # Check if shift operates on this day
-                role = next((r for r in roles if r.id == shift.role_id), None)
-                
-                # Determine if this shift should run on this day
-                should_skip = False
-                
-                if shift.schedule_config and isinstance(shift.schedule_config, dict):
-                    # Shift has a schedule_config with day configuration
-                    day_config = shift.schedule_config.get(day_name, {})
-                    is_day_enabled = day_config.get('enabled', False) if isinstance(day_config, dict) else False
-                    
-                    if not is_day_enabled:
-                        should_skip = True
-                        print(f"[DEBUG] ✗ Shift {shift.id} ({shift.name}) - Day {day_name} is disabled, skipping", flush=True)
-                    else:
-                        print(f"[DEBUG] ✓ Shift {shift.id} ({shift.name}) - Day {day_name} is ENABLED, processing", flush=True)
-                else:
-                    # No schedule_config or invalid format - skip to prevent unintended assignments
-                    should_skip = True
-                    print(f"[DEBUG] ✗ Shift {shift.id} ({shift.name}) - No valid schedule_config, skipping {day_name}", flush=True)
+    return {"success": True, **diff}
 
-                if should_skip:
-                    continue
 
-                # Assign employees to this shift on this day
-                # Only consider employees who are eligible for this shift
-                assigned_count = 0
-                
-                for emp in eligible_for_shift[shift.id]:
-                    # Check leave - if employee is on approved leave, mark them as leave (not shift)
-                    leave_result = await db.execute(
-                        select(LeaveRequest)
-                        .filter(
-                            LeaveRequest.employee_id == emp.id,
-                            LeaveRequest.start_date <= current_date,
-                            LeaveRequest.end_date >= current_date,
-                            LeaveRequest.status == LeaveStatus.APPROVED
-                        )
-                    )
-                    leave_request = leave_result.scalars().first()
-                    
-                    # Also check for approved comp-off requests
-                    comp_off_result = await db.execute(
-                        select(CompOffRequest)
-                        .filter(
-                            CompOffRequest.employee_id == emp.id,
-                            CompOffRequest.comp_off_date == current_date,
-                            CompOffRequest.status == LeaveStatus.APPROVED
-                        )
-                    )
-                    comp_off_request = comp_off_result.scalars().first()
-                    
-                    if leave_request or comp_off_request:
-                        # Employee is on approved leave or comp-off - create appropriate schedule entry
-                        existing_today = await db.execute(
-                            select(Schedule)
-                            .filter(
-                                Schedule.employee_id == emp.id,
-                                Schedule.date == current_date
-                            )
-                        )
-                        if not existing_today.scalars().first():
-                            # Determine status based on type
-                            if comp_off_request:
-                                # This is a comp-off earned day (employee worked, earned comp-off)
-                                # Get the correct shift time for this employee
-                                leave_status = 'comp_off_earned'
-                                
-                                # Try to get shift times from same week first
-                                week_start = current_date - timedelta(days=current_date.weekday())
-                                week_end = week_start + timedelta(days=6)
-                                
-                                week_shift = await db.execute(
-                                    select(Schedule)
-                                    .filter(
-                                        Schedule.employee_id == emp.id,
-                                        Schedule.date >= week_start,
-                                        Schedule.date <= week_end,
-                                        Schedule.date != current_date,
-                                        Schedule.status.in_(['scheduled', 'completed', 'comp_off_earned'])
-                                    )
-                                    .order_by(Schedule.date)
-                                    .limit(1)
-                                )
-                                week_sched = week_shift.scalar_one_or_none()
-                                
-                                if week_sched and week_sched.start_time and week_sched.end_time:
-                                    start_time = week_sched.start_time
-                                    end_time = week_sched.end_time
-                                else:
-                                    # Fallback to same day of week from previous weeks
-                                    day_name = current_date.strftime('%A')
-                                    same_day = await db.execute(
-                                        select(Schedule)
-                                        .filter(
-                                            Schedule.employee_id == emp.id,
-                                            func.to_char(Schedule.date, 'Day').ilike(f'%{day_name}%'),
-                                            Schedule.status.in_(['scheduled', 'completed', 'comp_off_earned'])
-                                        )
-                                        .order_by(Schedule.date.desc())
-                                        .limit(1)
-                                    )
-                                    same_day_sched = same_day.scalar_one_or_none()
-                                    
-                                    if same_day_sched and same_day_sched.start_time and same_day_sched.end_time:
-                                        start_time = same_day_sched.start_time
-                                        end_time = same_day_sched.end_time
-                                    else:
-                                        # Default fallback
-                                        start_time = "00:00"
-                                        end_time = "23:59"
-                                
-                                leave_notes = f"Comp-Off Earned: {comp_off_request.reason or 'Worked on non-shift day'}"
-                            elif leave_request.leave_type == 'comp_off':
-                                # This is using comp-off (taking the earned comp-off) - no shift times, full day off
-                                leave_status = 'comp_off_taken'
-                                start_time = None  # No shift time for comp-off usage
-                                end_time = None
-                                leave_notes = f"Comp-Off Taken: {leave_request.reason or 'Using earned comp-off'}"
-                            elif leave_request.duration_type == 'half_day_morning':
-                                leave_status = 'leave_half_morning'
-                                # Use shift's start time to 12:00 for morning leave
-                                start_time = shift.start_time
-                                end_time = "12:00"
-                                leave_notes = f"Half Day Leave (Morning) - {leave_request.leave_type}"
-                            elif leave_request.duration_type == 'half_day_afternoon':
-                                leave_status = 'leave_half_afternoon'
-                                # Use 12:00 to shift's end time for afternoon leave
-                                start_time = "12:00"
-                                end_time = shift.end_time
-                                leave_notes = f"Half Day Leave (Afternoon) - {leave_request.leave_type}"
-                            else:
-                                # Full day leave - use the actual shift times
-                                leave_status = 'leave'
-                                start_time = shift.start_time
-                                end_time = shift.end_time
-                                leave_notes = f"Full Day Leave - {leave_request.leave_type}"
-
-                            leave_type_desc = 'comp-off' if comp_off_request else leave_request.leave_type
-                            print(f"[DEBUG] ✓ {emp.first_name} is on approved {leave_type_desc} on {current_date}, creating {leave_status} schedule", flush=True)
-                            leave_schedule = Schedule(
-                                department_id=department_id,
-                                employee_id=emp.id,
-                                role_id=shift.role_id,
-                                shift_id=shift.id,
-                                date=current_date,
-                                start_time=start_time,
-                                end_time=end_time,
-                                status=leave_status,
-                                notes=leave_notes
-                            )
-                            db.add(leave_schedule)
-                            schedules_created += 1
-                        else:
-                            print(f"[DEBUG] ✗ {emp.first_name} already has a schedule entry on {current_date}, skipping leave creation", flush=True)
-                        continue  # Don't assign shift for leave/comp-off day
-                    
-                    # CRITICAL: Check if employee already has a shift on this day (NO DOUBLE SHIFTS)
-                    existing_today = await db.execute(
-                        select(Schedule)
-                        .filter(
-                            Schedule.employee_id == emp.id,
-                            Schedule.date == current_date
-                        )
-                    )
-                    if existing_today.scalars().first():
-                        print(f"[DEBUG] ✗ {emp.first_name} already has a shift on {current_date}, skipping (NO DOUBLE SHIFTS)", flush=True)
-                        continue  # Skip if employee already has a shift today
-                    
-                    print(f"[DEBUG] Checking {emp.first_name} ({emp.id}) for shift {shift.id} ({shift.name}) on {current_date}", flush=True)
-                    
-                    # Check 5 consecutive shifts limit
-                    week_start = current_date - timedelta(days=current_date.weekday())
-                    week_end = week_start + timedelta(days=6)
-                    
-                    consecutive_check = await db.execute(
-                        select(Schedule)
-                        .filter(
-                            Schedule.employee_id == emp.id,
-                            Schedule.date >= week_start,
-                            Schedule.date <= week_end,
-                            Schedule.status.in_(['scheduled', 'completed', 'comp_off_earned'])  # Exclude 'leave', 'comp_off_taken' status
-                        )
-                        .order_by(Schedule.date)
-                    )
-                    week_schedules = consecutive_check.scalars().all()
-                    
-                    # Check consecutive shifts INCLUDING the new one
-                    # NOTE: Leave days are not counted as "shifts" for the consecutive limit
-                    week_dates = [s.date for s in week_schedules]
-                    if current_date not in week_dates:
-                        week_dates.append(current_date)
-                    
-                    week_dates.sort()
-                    max_consecutive = 1
-                    current_consecutive = 1
-                    
-                    for i in range(1, len(week_dates)):
-                        if (week_dates[i] - week_dates[i-1]).days == 1:
-                            current_consecutive += 1
-                            max_consecutive = max(max_consecutive, current_consecutive)
-                        else:
-                            current_consecutive = 1
-                    
-                    if max_consecutive > 5:
-                        print(f"[DEBUG] ✗ {emp.first_name} would have {max_consecutive} consecutive shifts, skipping (MAX 5 consecutive)", flush=True)
-                        continue  # Skip if would exceed 5 consecutive shifts
-
-                    # Fetch existing schedules for the week (with eager loading of role)
-                    # IMPORTANT: Only count actual work shifts, not leave days, for hour calculations
-                    existing_schedules_result = await db.execute(
-                        select(Schedule)
-                        .filter(
-                            Schedule.employee_id == emp.id,
-                            Schedule.date >= week_start,
-                            Schedule.date <= week_end,
-                            Schedule.status.in_(['scheduled', 'completed', 'comp_off_earned'])  # Exclude 'leave', 'comp_off_taken' status
-                        )
-                        .options(selectinload(Schedule.role))
-                    )
-                    existing_schedules = existing_schedules_result.scalars().all()
-
-                    # Also count leave days for scheduling fairness, but not for hours calculation
-                    leave_schedules_result = await db.execute(
-                        select(Schedule)
-                        .filter(
-                            Schedule.employee_id == emp.id,
-                            Schedule.date >= week_start,
-                            Schedule.date <= week_end,
-                            Schedule.status.in_(['leave', 'leave_half_morning', 'leave_half_afternoon', 'comp_off_taken'])
-                        )
-                    )
-                    leave_schedules = leave_schedules_result.scalars().all()
-                    leave_days_count = len(leave_schedules)
-
-                    # Calculate existing hours in Python, subtracting break time
-                    # NOTE: Leave days don't add to hour count, but they fulfill part of weekly requirement
-                    existing_hours = 0
-                    existing_hours_today = 0
-                    for sched in existing_schedules:
-                        if sched.start_time and sched.end_time:
-                            try:
-                                start = datetime.strptime(sched.start_time, '%H:%M')
-                                end = datetime.strptime(sched.end_time, '%H:%M')
-                                total_hours = (end - start).total_seconds() / 3600
-
-                                # Subtract break time from role
-                                break_hours = (sched.role.break_minutes or 0) / 60 if sched.role else 0
-                                work_hours = total_hours - break_hours
-
-                                existing_hours += work_hours
-                                # Check hours for current day
-                                if sched.date == current_date:
-                                    existing_hours_today += work_hours
-                            except (ValueError, TypeError):
-                                pass
-
-                    # Calculate shift hours (total time) and work hours (minus breaks)
-                    shift_start = datetime.strptime(shift.start_time, '%H:%M')
-                    shift_end = datetime.strptime(shift.end_time, '%H:%M')
-                    total_shift_hours = (shift_end - shift_start).total_seconds() / 3600
-
-                    # Subtract break time from role
-                    break_hours = (role.break_minutes or 0) / 60
-                    work_hours = total_shift_hours - break_hours
-
-                    # Check both weekly and daily limits using work hours (excluding breaks)
-                    daily_max = emp.daily_max_hours or 8
-                    print(f"[DEBUG] {emp.first_name}: weekly {existing_hours:.1f}+{work_hours:.1f}<={emp.weekly_hours}, daily {existing_hours_today:.1f}+{work_hours:.1f}<={daily_max}", flush=True)
-
-                    # ===== Check for overtime (> 9 hours total in a day) =====
-                    daily_total_with_shift = existing_hours_today + total_shift_hours
-                    has_overtime = daily_total_with_shift > 9
-                    
-                    if has_overtime:
-                        overtime_warnings.append({
-                            'employee_id': emp.id,
-                            'employee_name': f"{emp.first_name} {emp.last_name}",
-                            'date': current_date.isoformat(),
-                            'shift_hours': total_shift_hours,
-                            'existing_daily_hours': existing_hours_today,
-                            'total_daily_hours': daily_total_with_shift,
-                            'total_weekly_hours': existing_hours + work_hours,
-                            'message': f"Total {daily_total_with_shift:.1f}h on {current_date} (includes {total_shift_hours}h shift)"
-                        })
-                        print(f"[DEBUG] ⚠️  OVERTIME: {emp.first_name} would work {daily_total_with_shift:.1f} hours on {current_date}", flush=True)
-
-                    if (existing_hours + work_hours <= emp.weekly_hours and
-                        existing_hours_today + work_hours <= daily_max):
-                        
-                        # ===== NEW: Check 5-shifts-per-week limit with holiday awareness =====
-                        is_valid_shifts, shifts_error = await validate_5_shifts_per_week(emp.id, current_date, db)
-                        if not is_valid_shifts:
-                            print(f"[DEBUG] ✗ {emp.first_name} failed 5-shifts validation on {current_date}: {shifts_error}", flush=True)
-                            continue  # Skip this employee for this shift due to weekly shift limit
-                        
-                        print(f"[DEBUG] ✓ Creating schedule for {emp.first_name} on {current_date}", flush=True)
-                        # Create schedule
-                        schedule = Schedule(
-                            department_id=department_id,
-                            employee_id=emp.id,
-                            role_id=shift.role_id,
-                            shift_id=shift.id,
-                            date=current_date,
-                            start_time=shift.start_time,
-                            end_time=shift.end_time,
-                            status="scheduled"
-                        )
-                        db.add(schedule)
-                        schedules_created += 1
-                        assigned_count += 1
-                        
-                        if assigned_count >= shift.max_emp:
-                            break  # Max employees for this shift on this day
-                    else:
-                        print(f"[DEBUG] ✗ {emp.first_name} failed hours check on {current_date}", flush=True)
+@app.post("/schedules/jobs")
+async def create_schedule_job(
+    start_date: date,
+    end_date: date,
+    regenerate: bool = False,
+    engine: str = "greedy",
+    time_limit_seconds: Optional[float] = None,
+    num_workers: Optional[int] = None,
+    warm_start: bool = True,
+    max_changes: Optional[int] = None,
+    current_user: User = Depends(require_manager),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Start schedule generation in the background and return a job id at once.
+    Same parameters as POST /schedules/generate; poll GET /schedules/jobs/{job_id}.
+    """
+    if engine not in ("greedy", "cpsat"):
+        raise HTTPException(status_code=400, detail="engine must be 'greedy' or 'cpsat'")
 
-                # Ensure minimum employees are assigned
-                if assigned_count < shift.min_emp:
-                    feedback.append(f"Warning: {shift.name} on {current_date} has {assigned_count} employees (min: {shift.min_emp})")
+    department_id = await get_manager_department(current_user, db)
+    if not department_id:
+        raise HTTPException(status_code=400, detail="Manager department not found")
 
-            current_date += timedelta(days=1)
+    params = {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "regenerate": regenerate,
+        "engine": engine,
+        "max_changes": max_changes
+    }
 
-        await db.commit()
+    async def run(progress: GenerationProgress) -> dict:
+        # The request session closes with the response - use a fresh one
+        async with async_session_maker() as session:
+            return await run_schedule_generation(
+                session, department_id, start_date, end_date,
+                regenerate=regenerate, engine=engine,
+                time_limit_seconds=time_limit_seconds, num_workers=num_workers,
+                progress=progress, warm_start=warm_start, max_changes=max_changes
+            )
 
-        feedback.insert(0, f"Successfully generated {schedules_created} schedules")
-        
-        # Add overtime warnings to feedback
-        if overtime_warnings:
-            feedback.append(f"⚠️  {len(overtime_warnings)} overtime alert(s) - shifts exceed 9 hours on that day")
+    job = schedule_jobs.start(ScheduleJob(department_id, current_user.id, params), run)
+    return {"job_id": job.id, "status": job.status}
 
-        return {
-            "success": True,
-            "schedules_created": schedules_created,
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat(),
-            "feedback": feedback,
-            "overtime_warnings": overtime_warnings,
-            "schedules": []
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error in schedule generation: {str(e)}", flush=True)
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Schedule generation error: {str(e)}")
+
+def get_schedule_job_for_user(job_id: str, current_user: User) -> ScheduleJob:
+    """Job visible to its creator and admins"""
+    job = schedule_jobs.get(job_id)
+    if not job or (current_user.user_type != UserType.ADMIN and job.user_id != current_user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/schedules/jobs/{job_id}")
+async def get_schedule_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Phase, percent done, accumulated feedback/overtime warnings and final result"""
+    return get_schedule_job_for_user(job_id, current_user).to_dict()
+
+
+@app.post("/schedules/jobs/{job_id}/cancel")
+async def cancel_schedule_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Cancel a running job; nothing is written (generation commits only at the end) and its CP-SAT solves are stopped"""
+    job = get_schedule_job_for_user(job_id, current_user)
+    if not schedule_jobs.cancel(job):
+        raise HTTPException(status_code=400, detail=f"Job already {job.status}")
+    return {"job_id": job.id, "status": "cancelling"}
 
 
 @app.get("/schedules/conflicts")
@@ -7048,6 +5872,7 @@ async def check_schedule_conflicts(
 async def record_attendance(
     attendance_data: AttendanceCreate,
     current_user: User = Depends(require_employee),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -7061,7 +5886,7 @@ async def record_attendance(
     # Check if already checked in
     result = await db.execute(
         select(Attendance).filter(
-            Attendance.employee_id == current_user.employee_id,
+            Attendance.employee_id == principal.employee_id,
             Attendance.date == today,
             Attendance.in_time.isnot(None)
         )
@@ -7074,14 +5899,14 @@ async def record_attendance(
         result = await db.execute(
             select(Schedule).filter(
                 Schedule.id == attendance_data.schedule_id,
-                Schedule.employee_id == current_user.employee_id,
+                Schedule.employee_id == principal.employee_id,
                 Schedule.date == today
             )
         )
     else:
         result = await db.execute(
             select(Schedule).filter(
-                Schedule.employee_id == current_user.employee_id,
+                Schedule.employee_id == principal.employee_id,
                 Schedule.date == today
             )
         )
@@ -7113,9 +5938,16 @@ async def record_attendance(
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid time format")
     
+    # One attendance record per employee per day
+    existing_result = await db.execute(
+        select(Attendance.id).filter(Attendance.employee_id == principal.employee_id, Attendance.date == today)
+    )
+    if existing_result.scalar_one_or_none():
+        raise HTTPException(status_code=400, detail="Attendance already recorded for today")
+    
     # Create attendance record
     attendance = Attendance(
-        employee_id=current_user.employee_id,
+        employee_id=principal.employee_id,
         schedule_id=attendance_data.schedule_id,
         date=today,
         in_time=attendance_data.in_time,
@@ -7135,6 +5967,7 @@ async def record_checkout(
     attendance_id: int,
     checkout_data: AttendanceUpdate,
     current_user: User = Depends(require_employee),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -7143,7 +5976,7 @@ async def record_checkout(
     result = await db.execute(
         select(Attendance).filter(
             Attendance.id == attendance_id,
-            Attendance.employee_id == current_user.employee_id
+            Attendance.employee_id == principal.employee_id
         )
     )
     attendance = result.scalar_one_or_none()
@@ -7157,16 +5990,10 @@ async def record_checkout(
     # Calculate worked hours
     if attendance.in_time and checkout_data.out_time:
         try:
-            in_parts = attendance.in_time.split(':')
-            out_parts = checkout_data.out_time.split(':')
-            
-            in_minutes = int(in_parts[0]) * 60 + int(in_parts[1])
-            out_minutes = int(out_parts[0]) * 60 + int(out_parts[1])
-            
-            if out_minutes < in_minutes:
-                out_minutes += 24 * 60  # Handle overnight shifts
-            
-            total_minutes = out_minutes - in_minutes
+            in_minutes = minutes_array([attendance.in_time])
+            out_minutes = minutes_array([checkout_data.out_time])
+            if np.isnan(in_minutes[0]) or np.isnan(out_minutes[0]):
+                raise ValueError("Invalid time format")
             
             # Get role for break time
             schedule = await db.get(Schedule, attendance.schedule_id)
@@ -7176,9 +6003,9 @@ async def record_checkout(
             else:
                 break_minutes = 0
             
-            # Calculate worked hours
-            worked_minutes = total_minutes - break_minutes
-            worked_hours = max(0, worked_minutes / 60)
+            # Calculate worked hours (overnight shifts wrap; the break is always deducted)
+            hours = compute_hours(in_minutes, out_minutes, break_minutes=break_minutes, break_needs_span=False)
+            worked_hours = float(hours.worked_hours[0])
             
             attendance.worked_hours = round(worked_hours, 2)
             attendance.break_minutes = break_minutes
@@ -7225,11 +6052,12 @@ async def get_weekly_attendance(
     employee_id: int,
     start_date: date,
     current_user: User = Depends(get_current_active_user),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Get weekly attendance for an employee"""
     # Check authorization
-    if current_user.user_type == UserType.EMPLOYEE and current_user.employee_id != employee_id:
+    if current_user.user_type == UserType.EMPLOYEE and principal.employee_id != employee_id:
         raise HTTPException(status_code=403, detail="Cannot view other employees' attendance")
     
     # Calculate week end
@@ -7284,61 +6112,39 @@ async def get_attendance_summary(
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get attendance summary for department or individual"""
-    query = select(Attendance).filter(
-        Attendance.date >= start_date,
-        Attendance.date <= end_date
-    )
-    
+    """
+    Get attendance summary for department or individual. Closed months are
+    read from their snapshots (app/attendance_snapshots.py).
+    """
+    employee_filter = None
     if current_user.user_type == UserType.EMPLOYEE:
-        query = query.filter(Attendance.employee_id == current_user.employee_id)
+        employee_filter = Employee.user_id == current_user.id
     elif current_user.user_type == UserType.MANAGER:
         manager_dept = await get_manager_department(current_user, db)
         if not manager_dept:
             return []
-        # Get employees in manager's department
-        subquery = select(Employee.id).filter(
-            Employee.department_id == manager_dept
-        )
-        query = query.filter(Attendance.employee_id.in_(subquery))
-    
-    result = await db.execute(query)
-    records = result.scalars().all()
-    
-    # Group by employee
-    emp_stats = defaultdict(lambda: {
-        "total_worked_hours": 0,
-        "total_overtime": 0,
-        "on_time": 0,
-        "late": 0,
-        "total_days": 0
-    })
-    
-    for record in records:
-        stats = emp_stats[record.employee_id]
-        stats["total_worked_hours"] += record.worked_hours
-        stats["total_overtime"] += record.overtime_hours
-        if record.status == "onTime":
-            stats["on_time"] += 1
-        elif record.status in ["slightlyLate", "late", "veryLate"]:
-            stats["late"] += 1
-        stats["total_days"] += 1
-    
-    # Convert to list with employee details
+        employee_filter = Employee.department_id == manager_dept
+
+    emp_stats = await attendance_period_stats(db, start_date, end_date, employee_filter)
+
+    names_result = await db.execute(
+        select(Employee.id, Employee.first_name, Employee.last_name).filter(Employee.id.in_(list(emp_stats)))
+    )
+    names = {emp_id: f"{first_name} {last_name}" for emp_id, first_name, last_name in names_result.all()}
+
     summary_list = []
     for emp_id, stats in emp_stats.items():
-        emp = await db.get(Employee, emp_id)
-        if emp:
+        if emp_id in names:
             summary_list.append({
                 "employee_id": emp_id,
-                "employee_name": f"{emp.first_name} {emp.last_name}",
-                "total_worked_hours": round(stats["total_worked_hours"], 2),
-                "total_overtime": round(stats["total_overtime"], 2),
-                "on_time_percentage": round((stats["on_time"] / stats["total_days"] * 100) if stats["total_days"] > 0 else 0, 2),
-                "late_count": stats["late"],
-                "days_worked": stats["total_days"]
+                "employee_name": names[emp_id],
+                "total_worked_hours": round(stats["worked_hours"], 2),
+                "total_overtime": round(stats["overtime_hours"], 2),
+                "on_time_percentage": round((stats["on_time_count"] / stats["records"] * 100) if stats["records"] > 0 else 0, 2),
+                "late_count": stats["late_count"],
+                "days_worked": stats["records"]
             })
-    
+
     return {
         "period": {
             "start": start_date.isoformat(),
@@ -7380,6 +6186,11 @@ async def create_unavailability(
     db.add(unavailability)
     await db.commit()
     await db.refresh(unavailability)
+
+    # Free the day in an already generated schedule (a failure is logged only)
+    if employee.department_id:
+        await regenerate_after_change(employee.department_id, {employee.id: [unavail.date]})
+
     return unavailability
 
 
@@ -7389,6 +6200,7 @@ async def list_unavailability(
     start_date: date = None,
     end_date: date = None,
     current_user: User = Depends(get_current_active_user),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """List unavailability records for department (manager) or specific employee (employee)"""
@@ -7409,11 +6221,9 @@ async def list_unavailability(
             query = query.filter(Unavailability.employee_id == employee_id)
     elif current_user.user_type == UserType.EMPLOYEE:
         # Employee sees only their own unavailability
-        result = await db.execute(select(Employee).filter(Employee.user_id == current_user.id))
-        employee = result.scalar_one_or_none()
-        if not employee:
+        if not principal.employee_id:
             raise HTTPException(status_code=404, detail="Employee record not found")
-        query = query.filter(Unavailability.employee_id == employee.id)
+        query = query.filter(Unavailability.employee_id == principal.employee_id)
     
     if start_date:
         query = query.filter(Unavailability.date >= start_date)
@@ -7499,6 +6309,8 @@ async def create_shift(
 
 @app.get("/shifts", response_model=List[ShiftResponse])
 async def list_shifts(
+    request: Request,
+    response: Response,
     role_id: int = None,
     include_inactive: bool = False,
     current_user: User = Depends(get_current_active_user),
@@ -7517,9 +6329,12 @@ async def list_shifts(
         manager_dept = await get_manager_department(current_user, db)
         if not manager_dept:
             raise HTTPException(status_code=403, detail="Not authorized")
+        await set_etag(request, response, [f'shifts:d:{manager_dept}'], db, current_user)
         query = query.join(Role).filter(Role.department_id == manager_dept)
     elif current_user.user_type != UserType.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
+    else:
+        await set_etag(request, response, ['shifts:d:*'], db, current_user)
 
     result = await db.execute(query.order_by(Shift.created_at.desc()))
     shifts = result.scalars().all()
@@ -7664,6 +6479,7 @@ async def create_overtime_request(
 async def list_overtime_requests(
     status: str = None,
     current_user: User = Depends(get_current_active_user),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """List overtime requests. Managers see pending requests, employees see their own"""
@@ -7671,13 +6487,9 @@ async def list_overtime_requests(
     
     if current_user.user_type == UserType.EMPLOYEE:
         # Employees see their own requests
-        emp_result = await db.execute(
-            select(Employee).filter(Employee.user_id == current_user.id)
-        )
-        employee = emp_result.scalar_one_or_none()
-        if not employee:
+        if not principal.employee_id:
             raise HTTPException(status_code=400, detail="Employee record not found")
-        query = query.filter(OvertimeRequest.employee_id == employee.id)
+        query = query.filter(OvertimeRequest.employee_id == principal.employee_id)
     elif current_user.user_type == UserType.MANAGER:
         # Managers see pending requests for their department
         manager_dept = await get_manager_department(current_user, db)
@@ -7839,7 +6651,12 @@ async def manager_approve_overtime(
     to_time = approve_data.get("to_time")
     request_hours = approve_data.get("request_hours", 0)
     reason = approve_data.get("reason", "Manager approved")
-    
+    try:
+        from_time = normalize_time(from_time)
+        to_time = normalize_time(to_time)
+    except (ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=str(e) or "Invalid from_time/to_time")
+
     # Verify manager's authority
     emp_result = await db.execute(
         select(Employee).filter(Employee.id == employee_id)
@@ -8101,6 +6918,7 @@ async def list_overtime_worked(
     start_date: date = None,
     end_date: date = None,
     current_user: User = Depends(get_current_active_user),
+    principal: Principal = Depends(get_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """List overtime worked records"""
@@ -8108,13 +6926,9 @@ async def list_overtime_worked(
     
     if current_user.user_type == UserType.EMPLOYEE:
         # Employees see their own overtime
-        emp_result = await db.execute(
-            select(Employee).filter(Employee.user_id == current_user.id)
-        )
-        employee = emp_result.scalar_one_or_none()
-        if not employee:
+        if not principal.employee_id:
             raise HTTPException(status_code=400, detail="Employee record not found")
-        query = query.filter(OvertimeWorked.employee_id == employee.id)
+        query = query.filter(OvertimeWorked.employee_id == principal.employee_id)
     elif current_user.user_type == UserType.MANAGER:
         # Managers see overtime for their department
         manager_dept = await get_manager_department(current_user, db)
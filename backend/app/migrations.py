@@ -0,0 +1,130 @@
+"""
+Database Migrations
+
+Schema changes are Alembic revisions in backend/alembic/versions. They are
+applied by the migrate CLI, not by the API workers:
+
+    python migrate.py            # upgrade to head
+    python migrate.py current    # show applied revision
+
+Every migration run (including plain `alembic upgrade`) holds a PostgreSQL
+advisory lock, so concurrent runs from several hosts/containers apply each
+revision once. API workers only compare the database revision with the
+code's head at startup (check_schema_version).
+
+Databases created with Base.metadata.create_all (init_db.py) are stamped at
+head instead.
+"""
+
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Set
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# pg_advisory_lock key shared by every migration run
+MIGRATION_LOCK_KEY = 727_465_001
+LOCK_POLL_SECONDS = 1.0
+
+
+class SchemaVersionError(RuntimeError):
+    """Database revision differs from the code's migration head"""
+
+
+def get_alembic_config() -> Config:
+    """Alembic config for backend/alembic.ini, usable from any working directory"""
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    return config
+
+
+def get_head_revisions() -> Set[str]:
+    """Head revision(s) of the migration scripts shipped with this code"""
+    return set(ScriptDirectory.from_config(get_alembic_config()).get_heads())
+
+
+@contextmanager
+def migration_lock(connection: Connection):
+    """
+    Hold the migration advisory lock on connection (session level, so it
+    spans the per-revision transactions). Other runs wait for it.
+    """
+    if connection.dialect.name != "postgresql":
+        yield
+        return
+
+    # Poll outside any transaction: a session blocked in pg_advisory_lock
+    # keeps a transaction open, which CREATE INDEX CONCURRENTLY would wait on
+    waiting = False
+    while True:
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        ).scalar()
+        connection.commit()
+        if acquired:
+            break
+        if not waiting:
+            print("Another migration is running - waiting for it to finish...", flush=True)
+            waiting = True
+        time.sleep(LOCK_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        connection.rollback()
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+
+
+def upgrade(revision: str = "head"):
+    """Apply revisions up to revision (blocking; runs its own event loop)"""
+    command.upgrade(get_alembic_config(), revision)
+
+
+def downgrade(revision: str):
+    """Revert revisions down to revision"""
+    command.downgrade(get_alembic_config(), revision)
+
+
+def current():
+    """Print the database's applied revision"""
+    command.current(get_alembic_config(), verbose=False)
+
+
+def stamp_head():
+    """Mark the database as current without running revisions"""
+    command.stamp(get_alembic_config(), "head")
+
+
+async def get_database_revisions(engine) -> Set[str]:
+    """Revision(s) recorded in alembic_version (empty if never migrated)"""
+    async with engine.connect() as conn:
+        exists = await conn.run_sync(
+            lambda sync_conn: sync_conn.dialect.has_table(sync_conn, "alembic_version")
+        )
+        if not exists:
+            return set()
+        result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        return set(result.scalars().all())
+
+
+async def check_schema_version(engine):
+    """
+    Startup check: one small query, no DDL and no locks.
+    Raises SchemaVersionError when the database is not at the code's head.
+    """
+    expected = get_head_revisions()
+    actual = await get_database_revisions(engine)
+    if actual != expected:
+        raise SchemaVersionError(
+            f"Database schema revision {sorted(actual) or 'none'} does not match "
+            f"code revision {sorted(expected)} - run `python migrate.py` first"
+        )
+    return actual
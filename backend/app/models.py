@@ -4,10 +4,14 @@ Optimized with clean foreign key relationships
 """
 
 from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey, JSON, Date, Text, Enum as SQLEnum
+from sqlalchemy import Index, UniqueConstraint, ForeignKeyConstraint, BigInteger, DDL, event, text
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
+from typing import Optional
 import enum
 
+from app.time_columns import MinuteTime
+
 Base = declarative_base()
 
 
@@ -156,8 +160,8 @@ class Schedule(Base):
     role_id = Column(Integer, ForeignKey('roles.id', name='fk_schedule_role'), nullable=False)
     shift_id = Column(Integer, ForeignKey('shifts.id', name='fk_schedule_shift'), nullable=True)  # Optional - can be custom if None
     date = Column(Date, nullable=False, index=True)
-    start_time = Column(String(5))
-    end_time = Column(String(5))
+    start_time = Column(MinuteTime)  # HH:MM, stored as minutes
+    end_time = Column(MinuteTime)
     status = Column(String(20), default='scheduled')  # scheduled, completed, missed, cancelled
     notes = Column(Text)
     day_priority = Column(Integer, default=1)  # For priority-based distribution
@@ -173,6 +177,12 @@ class Schedule(Base):
     check_in = relationship("CheckInOut", back_populates="schedule", uselist=False, cascade="all, delete-orphan")
     attendance = relationship("Attendance", back_populates="schedule", uselist=False, cascade="all, delete-orphan")
 
+    # Hot paths: per-employee day/week lookups, department calendars and generation
+    __table_args__ = (
+        Index('ix_schedules_employee_date', 'employee_id', 'date'),
+        Index('ix_schedules_department_date_status', 'department_id', 'date', 'status'),
+    )
+
 
 class LeaveRequest(Base):
     """Leave requests with approval workflow"""
@@ -195,6 +205,10 @@ class LeaveRequest(Base):
     employee = relationship("Employee", back_populates="leave_requests")
     manager = relationship("Manager", back_populates="leave_requests")
 
+    __table_args__ = (
+        Index('ix_leave_requests_employee_status_dates', 'employee_id', 'status', 'start_date', 'end_date'),
+    )
+
 
 class CheckInOut(Base):
     """Employee Check-In/Out tracking"""
@@ -217,6 +231,12 @@ class CheckInOut(Base):
     employee = relationship("Employee", back_populates="check_ins")
     schedule = relationship("Schedule", back_populates="check_in")
 
+    __table_args__ = (
+        Index('ix_check_ins_employee_date', 'employee_id', 'date'),
+        # Regeneration looks up schedules that have check-ins
+        Index('ix_check_ins_schedule_id', 'schedule_id', postgresql_where=text('schedule_id IS NOT NULL')),
+    )
+
 
 class Attendance(Base):
     """Attendance records with worked hours tracking"""
@@ -226,8 +246,8 @@ class Attendance(Base):
     employee_id = Column(Integer, ForeignKey('employees.id', name='fk_attendance_employee'), nullable=False)
     schedule_id = Column(Integer, ForeignKey('schedules.id', name='fk_attendance_schedule'), nullable=True)
     date = Column(Date, nullable=False, index=True)
-    in_time = Column(String(5))  # HH:MM format
-    out_time = Column(String(5))  # HH:MM format
+    in_time = Column(MinuteTime)  # HH:MM format, stored as minutes
+    out_time = Column(MinuteTime)  # HH:MM format, stored as minutes
     status = Column(String(20))  # onTime, slightlyLate, late, veryLate, missed
     out_status = Column(String(20))
     worked_hours = Column(Float, default=0)
@@ -242,6 +262,12 @@ class Attendance(Base):
     employee = relationship("Employee")
     schedule = relationship("Schedule", back_populates="attendance")
 
+    __table_args__ = (
+        # One attendance record per employee per day (also serves (employee_id, date) lookups)
+        UniqueConstraint('employee_id', 'date', name='uq_attendance_employee_date'),
+        Index('ix_attendance_schedule_id', 'schedule_id', postgresql_where=text('schedule_id IS NOT NULL')),
+    )
+
 
 class Message(Base):
     """Messaging system"""
@@ -296,6 +322,10 @@ class Unavailability(Base):
     # Relationships
     employee = relationship("Employee")
 
+    __table_args__ = (
+        Index('ix_unavailability_employee_date', 'employee_id', 'date'),
+    )
+
 
 class Shift(Base):
     """Shift/Shift Type model - for detailed shift timing and configuration"""
@@ -304,8 +334,8 @@ class Shift(Base):
     id = Column(Integer, primary_key=True, index=True)
     role_id = Column(Integer, ForeignKey('roles.id', name='fk_shift_role'), nullable=False)
     name = Column(String(100), nullable=False)
-    start_time = Column(String(5), nullable=False)  # HH:MM format
-    end_time = Column(String(5), nullable=False)  # HH:MM format
+    start_time = Column(MinuteTime, nullable=False)  # HH:MM format, stored as minutes
+    end_time = Column(MinuteTime, nullable=False)  # HH:MM format, stored as minutes
     priority = Column(Integer, default=50)
     min_emp = Column(Integer, default=1)  # Minimum employees required
     max_emp = Column(Integer, default=10)  # Maximum employees allowed
@@ -349,8 +379,8 @@ class OvertimeRequest(Base):
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey('employees.id', name='fk_ot_request_employee'), nullable=False)
     request_date = Column(Date, nullable=False)  # Date of overtime request
-    from_time = Column(String(5), nullable=True)  # Start time (HH:MM format)
-    to_time = Column(String(5), nullable=True)  # End time (HH:MM format)
+    from_time = Column(MinuteTime, nullable=True)  # Start time (HH:MM format, stored as minutes)
+    to_time = Column(MinuteTime, nullable=True)  # End time (HH:MM format, stored as minutes)
     request_hours = Column(Float, nullable=False)  # Hours requested
     reason = Column(Text, nullable=False)  # Reason for overtime
     status = Column(SQLEnum(OvertimeStatus), default=OvertimeStatus.PENDING)
@@ -403,6 +433,10 @@ class CompOffRequest(Base):
     manager = relationship("Manager")
     schedule = relationship("Schedule")
 
+    __table_args__ = (
+        Index('ix_comp_off_requests_employee_date', 'employee_id', 'comp_off_date'),
+    )
+
 
 class CompOffTracking(Base):
     """Track comp-off balance per employee (earned and used) with monthly expiry"""
@@ -439,3 +473,454 @@ class CompOffDetail(Base):
 
     # Relationships
     tracking = relationship("CompOffTracking", back_populates="comp_off_details")
+
+
+class CalendarHoliday(Base):
+    """
+    Holiday calendar: the Japanese public holidays (seeded by migration
+    0006) and the company holidays added by admins. app.holidays_jp keeps
+    them in memory for lookups.
+    """
+    __tablename__ = "calendar_holidays"
+
+    date = Column(Date, primary_key=True)
+    name = Column(String(100), nullable=False)
+    is_company = Column(Boolean, nullable=False, default=False)  # added by an admin
+    created_by = Column(Integer, ForeignKey('users.id', name='fk_calendar_holiday_user', ondelete='SET NULL'), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class PunchDevice(Base):
+    """
+    Kiosk / badge reader allowed to post check-in and check-out punches.
+    Authenticates with an API key, of which only the SHA-256 is stored.
+    """
+    __tablename__ = "punch_devices"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    department_id = Column(Integer, ForeignKey('departments.id', name='fk_punch_device_department', ondelete='CASCADE'), nullable=True)  # None = any department
+    api_key_hash = Column(String(64), nullable=False, unique=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, nullable=True)
+
+
+class DevicePunch(Base):
+    """
+    Receipt of a punch received from a device, keyed by the device's
+    idempotency key: a replayed punch returns the stored result instead of
+    being applied again
+    """
+    __tablename__ = "device_punches"
+
+    id = Column(BigInteger, primary_key=True)
+    device_id = Column(Integer, ForeignKey('punch_devices.id', name='fk_device_punch_device', ondelete='CASCADE'), nullable=False)
+    idempotency_key = Column(String(64), nullable=False)
+    employee_code = Column(String(50), nullable=False)
+    punch_type = Column(String(10), nullable=False)  # in, out
+    punched_at = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False)  # accepted, rejected
+    reason = Column(String(50), nullable=True)  # why it was rejected
+    check_in_id = Column(Integer, ForeignKey('check_ins.id', name='fk_device_punch_check_in', ondelete='SET NULL'), nullable=True)
+    received_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('device_id', 'idempotency_key', name='uq_device_punch_key'),
+    )
+
+
+class ExportDataVersion(Base):
+    """
+    Change counter per department and month of the data the attendance
+    exports read. Maintained by database triggers (export_version_ddl), so
+    ORM writes, bulk statements and COPY all bump it.
+    """
+    __tablename__ = "export_data_versions"
+
+    department_id = Column(Integer, primary_key=True)
+    period = Column(Date, primary_key=True)  # first day of the month
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# (table, SELECT of the changed (department_id, period) pairs from the
+# transition table {rows})
+EXPORT_VERSION_SOURCES = [
+    ('attendance',
+     "SELECT e.department_id, date_trunc('month', r.date)::date AS period "
+     "FROM {rows} r JOIN employees e ON e.id = r.employee_id"),
+    ('check_ins',
+     "SELECT e.department_id, date_trunc('month', r.date)::date AS period "
+     "FROM {rows} r JOIN employees e ON e.id = r.employee_id"),
+    ('schedules',
+     "SELECT r.department_id, date_trunc('month', r.date)::date AS period FROM {rows} r"),
+    ('leave_requests',
+     "SELECT e.department_id, m::date AS period "
+     "FROM {rows} r JOIN employees e ON e.id = r.employee_id "
+     "CROSS JOIN generate_series(date_trunc('month', r.start_date), r.end_date, interval '1 month') m"),
+    ('comp_off_requests',
+     "SELECT e.department_id, date_trunc('month', r.comp_off_date)::date AS period "
+     "FROM {rows} r JOIN employees e ON e.id = r.employee_id"),
+    ('comp_off_details',
+     "SELECT e.department_id, date_trunc('month', r.date)::date AS period "
+     "FROM {rows} r JOIN employees e ON e.id = r.employee_id"),
+    # Holidays appear in every department's reports
+    ('calendar_holidays',
+     "SELECT d.id AS department_id, date_trunc('month', r.date)::date AS period "
+     "FROM {rows} r CROSS JOIN departments d"),
+]
+
+
+def _bump_versions_sql(source: str) -> str:
+    return f"""
+        INSERT INTO export_data_versions (department_id, period, version, updated_at)
+        SELECT department_id, period, 1, clock_timestamp() FROM ({source}) changed
+        WHERE department_id IS NOT NULL AND period IS NOT NULL
+        GROUP BY department_id, period
+        ORDER BY department_id, period
+        ON CONFLICT (department_id, period) DO UPDATE
+        SET version = export_data_versions.version + 1, updated_at = clock_timestamp();"""
+
+
+def export_version_ddl(tables: Optional[list] = None) -> list:
+    """
+    PostgreSQL statements creating the statement-level triggers that bump
+    export_data_versions for every insert/update/delete on the tables in
+    EXPORT_VERSION_SOURCES (one upsert per statement, not per row);
+    tables limits them to some of the sources
+    """
+    statements = []
+    for table, source in EXPORT_VERSION_SOURCES:
+        if tables is not None and table not in tables:
+            continue
+        new_rows = source.format(rows="new_rows")
+        old_rows = source.format(rows="old_rows")
+        statements.append(f"""
+    CREATE OR REPLACE FUNCTION bump_export_versions_{table}() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN{_bump_versions_sql(new_rows)}
+        ELSIF TG_OP = 'DELETE' THEN{_bump_versions_sql(old_rows)}
+        ELSE{_bump_versions_sql(f"{new_rows} UNION {old_rows}")}
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""")
+        for operation, referencing in [
+            ('INSERT', 'NEW TABLE AS new_rows'),
+            ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('DELETE', 'OLD TABLE AS old_rows'),
+        ]:
+            name = f"trg_export_versions_{table}_{operation.lower()}"
+            statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            statements.append(
+                f"CREATE TRIGGER {name} AFTER {operation} ON {table} "
+                f"REFERENCING {referencing} FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION bump_export_versions_{table}()"
+            )
+    return statements
+
+
+def drop_export_version_ddl(tables: Optional[list] = None) -> list:
+    return [
+        f"DROP FUNCTION IF EXISTS bump_export_versions_{table}() CASCADE"
+        for table, _ in EXPORT_VERSION_SOURCES if tables is None or table in tables
+    ]
+
+
+# Databases created with create_all (init_db.py) get the triggers too
+for _statement in export_version_ddl():
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+class AttendancePeriodClose(Base):
+    """
+    A closed attendance month of a department. data_version is the
+    export_data_versions counter the snapshots were computed at: once the
+    counter moves on (a late correction), the snapshots are stale and
+    readers fall back to the live rows until the month is closed again.
+    """
+    __tablename__ = "attendance_period_closes"
+
+    department_id = Column(Integer, ForeignKey('departments.id', name='fk_period_close_department', ondelete='CASCADE'), primary_key=True)
+    period = Column(Date, primary_key=True)  # first day of the month
+    data_version = Column(BigInteger, nullable=False, default=0)
+    closed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    closed_by = Column(Integer, ForeignKey('users.id', name='fk_period_close_user', ondelete='SET NULL'), nullable=True)
+
+
+class EmployeeMonthSnapshot(Base):
+    """Attendance aggregates of one employee for a closed month"""
+    __tablename__ = "employee_month_snapshots"
+
+    department_id = Column(Integer, primary_key=True)
+    period = Column(Date, primary_key=True)
+    employee_id = Column(Integer, ForeignKey('employees.id', name='fk_month_snapshot_employee', ondelete='CASCADE'), primary_key=True)
+    records = Column(Integer, nullable=False, default=0)  # attendance rows
+    days_worked = Column(Integer, nullable=False, default=0)  # rows with worked hours
+    worked_hours = Column(Float, nullable=False, default=0.0)
+    night_hours = Column(Float, nullable=False, default=0.0)
+    overtime_hours = Column(Float, nullable=False, default=0.0)
+    break_minutes = Column(Integer, nullable=False, default=0)
+    on_time_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    paid_leave_days = Column(Float, nullable=False, default=0.0)
+    unpaid_leave_days = Column(Float, nullable=False, default=0.0)
+    comp_off_earned = Column(Integer, nullable=False, default=0)
+    comp_off_used = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['department_id', 'period'],
+            ['attendance_period_closes.department_id', 'attendance_period_closes.period'],
+            name='fk_month_snapshot_close', ondelete='CASCADE'
+        ),
+        Index('idx_month_snapshot_employee_period', 'employee_id', 'period'),
+    )
+
+
+class DepartmentMonthSnapshot(Base):
+    """Attendance totals of one department for a closed month"""
+    __tablename__ = "department_month_snapshots"
+
+    department_id = Column(Integer, primary_key=True)
+    period = Column(Date, primary_key=True)
+    employees = Column(Integer, nullable=False, default=0)  # employees with a snapshot row
+    records = Column(Integer, nullable=False, default=0)
+    days_worked = Column(Integer, nullable=False, default=0)
+    worked_hours = Column(Float, nullable=False, default=0.0)
+    night_hours = Column(Float, nullable=False, default=0.0)
+    overtime_hours = Column(Float, nullable=False, default=0.0)
+    break_minutes = Column(Integer, nullable=False, default=0)
+    on_time_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    paid_leave_days = Column(Float, nullable=False, default=0.0)
+    unpaid_leave_days = Column(Float, nullable=False, default=0.0)
+    comp_off_earned = Column(Integer, nullable=False, default=0)
+    comp_off_used = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['department_id', 'period'],
+            ['attendance_period_closes.department_id', 'attendance_period_closes.period'],
+            name='fk_department_snapshot_close', ondelete='CASCADE'
+        ),
+    )
+
+
+class ScheduleChange(Base):
+    """
+    Change log of schedules for delta sync (GET /schedules/changes). Triggers
+    add one row per (employee, date) group touched by a statement, including
+    groups whose rows were deleted or moved away (the tombstones). change_xid
+    is the id of the writing transaction; rows older than
+    SCHEDULE_CHANGE_RETENTION_HOURS are pruned.
+    """
+    __tablename__ = "schedule_changes"
+
+    id = Column(BigInteger, primary_key=True)
+    change_xid = Column(BigInteger, nullable=False, server_default=text('txid_current()'), index=True)
+    # No foreign keys: a tombstone outlives its schedules
+    department_id = Column(Integer, nullable=False)
+    employee_id = Column(Integer, nullable=False)
+    date = Column(Date, nullable=False)
+    changed_at = Column(DateTime, nullable=False, server_default=text('now()'), index=True)
+
+
+def _log_schedule_changes_sql(source: str) -> str:
+    return f"""
+        INSERT INTO schedule_changes (department_id, employee_id, date)
+        SELECT DISTINCT department_id, employee_id, date FROM ({source}) changed;"""
+
+
+def schedule_change_ddl() -> list:
+    """
+    PostgreSQL statements creating the statement-level triggers that log the
+    (employee, date) groups changed by every insert/update/delete on schedules
+    """
+    new_rows = "SELECT department_id, employee_id, date FROM new_rows"
+    old_rows = "SELECT department_id, employee_id, date FROM old_rows"
+    statements = [f"""
+    CREATE OR REPLACE FUNCTION log_schedule_changes() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN{_log_schedule_changes_sql(new_rows)}
+        ELSIF TG_OP = 'DELETE' THEN{_log_schedule_changes_sql(old_rows)}
+        ELSE{_log_schedule_changes_sql(f"{new_rows} UNION {old_rows}")}
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql"""]
+    for operation, referencing in [
+        ('INSERT', 'NEW TABLE AS new_rows'),
+        ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+        ('DELETE', 'OLD TABLE AS old_rows'),
+    ]:
+        name = f"trg_schedule_changes_{operation.lower()}"
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON schedules")
+        statements.append(
+            f"CREATE TRIGGER {name} AFTER {operation} ON schedules "
+            f"REFERENCING {referencing} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION log_schedule_changes()"
+        )
+    return statements
+
+
+def drop_schedule_change_ddl() -> list:
+    return ["DROP FUNCTION IF EXISTS log_schedule_changes() CASCADE"]
+
+
+for _statement in schedule_change_ddl():
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+class ResourceVersion(Base):
+    """
+    Change counters behind the ETags of the polled list endpoints
+    (app/etags.py). Bumped by statement-level triggers, one counter per
+    resource and scope: 'd:<department_id>', 'e:<employee_id>' or
+    'u:<user_id>' ('principal' counts changes to a user's own user, manager
+    and employee rows, i.e. to what they may see)
+    """
+    __tablename__ = "resource_versions"
+
+    resource = Column(String(30), primary_key=True)
+    scope = Column(String(30), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+# (table, SELECT of the changed (resource, scope) pairs from the transition
+# table {rows})
+RESOURCE_VERSION_SOURCES = [
+    ('departments', "SELECT 'departments' AS resource, 'all' AS scope FROM {rows}"),
+    ('users', "SELECT 'principal' AS resource, 'u:' || id AS scope FROM {rows}"),
+    ('managers', "SELECT 'principal' AS resource, 'u:' || user_id AS scope FROM {rows}"),
+    ('employees',
+     "SELECT 'employees' AS resource, 'd:' || department_id AS scope FROM {rows} "
+     "UNION ALL SELECT 'principal', 'u:' || user_id FROM {rows} WHERE user_id IS NOT NULL"),
+    ('roles', "SELECT 'roles' AS resource, 'd:' || department_id AS scope FROM {rows}"),
+    ('shifts',
+     "SELECT 'shifts' AS resource, 'd:' || ro.department_id AS scope "
+     "FROM {rows} r JOIN roles ro ON ro.id = r.role_id"),
+    ('schedules',
+     "SELECT 'schedules' AS resource, 'd:' || department_id AS scope FROM {rows} "
+     "UNION ALL SELECT 'schedules', 'e:' || employee_id FROM {rows}"),
+    ('notifications', "SELECT 'notifications' AS resource, 'u:' || user_id AS scope FROM {rows}"),
+]
+
+
+def _bump_resource_versions_sql(source: str) -> str:
+    return f"""
+        INSERT INTO resource_versions (resource, scope, version)
+        SELECT resource, scope, 1 FROM ({source}) changed
+        WHERE scope IS NOT NULL
+        GROUP BY resource, scope
+        ORDER BY resource, scope
+        ON CONFLICT (resource, scope) DO UPDATE
+        SET version = resource_versions.version + 1;"""
+
+
+def resource_version_ddl(tables: Optional[list] = None) -> list:
+    """
+    PostgreSQL statements creating the statement-level triggers that bump
+    resource_versions for every insert/update/delete on the tables in
+    RESOURCE_VERSION_SOURCES; tables limits them to some of the sources
+    """
+    statements = []
+    for table, source in RESOURCE_VERSION_SOURCES:
+        if tables is not None and table not in tables:
+            continue
+        new_rows = source.format(rows="new_rows")
+        old_rows = source.format(rows="old_rows")
+        statements.append(f"""
+    CREATE OR REPLACE FUNCTION bump_resource_versions_{table}() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN{_bump_resource_versions_sql(new_rows)}
+        ELSIF TG_OP = 'DELETE' THEN{_bump_resource_versions_sql(old_rows)}
+        ELSE{_bump_resource_versions_sql(f"{new_rows} UNION {old_rows}")}
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""")
+        for operation, referencing in [
+            ('INSERT', 'NEW TABLE AS new_rows'),
+            ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('DELETE', 'OLD TABLE AS old_rows'),
+        ]:
+            name = f"trg_resource_versions_{table}_{operation.lower()}"
+            statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            statements.append(
+                f"CREATE TRIGGER {name} AFTER {operation} ON {table} "
+                f"REFERENCING {referencing} FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION bump_resource_versions_{table}()"
+            )
+    return statements
+
+
+def drop_resource_version_ddl(tables: Optional[list] = None) -> list:
+    return [
+        f"DROP FUNCTION IF EXISTS bump_resource_versions_{table}() CASCADE"
+        for table, _ in RESOURCE_VERSION_SOURCES if tables is None or table in tables
+    ]
+
+
+for _statement in resource_version_ddl():
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+# Principal cache invalidation (app/principals.py): the users whose cached
+# user row, manager department or employee record changed are sent on this
+# channel when the writing transaction commits
+PRINCIPAL_CHANNEL = "principal_changes"
+PRINCIPAL_SOURCES = [('users', 'id'), ('managers', 'user_id'), ('employees', 'user_id')]
+
+
+def _principal_ids_sql(column: str, rows: str) -> str:
+    return f"SELECT string_agg(DISTINCT {column}::text, ',') INTO ids FROM ({rows}) changed;"
+
+
+def principal_change_ddl() -> list:
+    """
+    PostgreSQL statements creating the statement-level triggers that
+    pg_notify PRINCIPAL_CHANNEL with the changed user ids ('*' when too many
+    for one payload: every worker clears its cache)
+    """
+    statements = []
+    for table, column in PRINCIPAL_SOURCES:
+        new_rows = f"SELECT {column} FROM new_rows"
+        old_rows = f"SELECT {column} FROM old_rows"
+        statements.append(f"""
+    CREATE OR REPLACE FUNCTION notify_principal_changes_{table}() RETURNS trigger AS $$
+    DECLARE
+        ids text;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN {_principal_ids_sql(column, new_rows)}
+        ELSIF TG_OP = 'DELETE' THEN {_principal_ids_sql(column, old_rows)}
+        ELSE {_principal_ids_sql(column, f"{new_rows} UNION {old_rows}")}
+        END IF;
+        IF ids IS NOT NULL THEN
+            PERFORM pg_notify('{PRINCIPAL_CHANNEL}', CASE WHEN length(ids) > 7000 THEN '*' ELSE ids END);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""")
+        for operation, referencing in [
+            ('INSERT', 'NEW TABLE AS new_rows'),
+            ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('DELETE', 'OLD TABLE AS old_rows'),
+        ]:
+            name = f"trg_principal_changes_{table}_{operation.lower()}"
+            statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            statements.append(
+                f"CREATE TRIGGER {name} AFTER {operation} ON {table} "
+                f"REFERENCING {referencing} FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION notify_principal_changes_{table}()"
+            )
+    return statements
+
+
+def drop_principal_change_ddl() -> list:
+    return [f"DROP FUNCTION IF EXISTS notify_principal_changes_{table}() CASCADE" for table, _ in PRINCIPAL_SOURCES]
+
+
+for _statement in principal_change_ddl():
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
@@ -0,0 +1,190 @@
+"""
+Notification Push Channel
+
+GET /notifications/stream keeps one server-sent events connection per
+browser tab open instead of polling GET /notifications every few seconds.
+
+create_notification calls notify_created, which issues pg_notify on
+NOTIFICATION_CHANNEL inside the caller's transaction. PostgreSQL delivers
+it only when that transaction commits (a rolled-back notification is never
+pushed) and to every worker. Each worker holds one LISTEN connection
+(listen_for_notifications, started from the app startup hook) and passes
+the notification ids to the in-process hub, which wakes the open streams
+of that user. A woken stream loads the new rows and sends them.
+
+The SSE event id is the notification id. A reconnecting EventSource sends
+the last one back as Last-Event-ID (or the client passes ?after=), and the
+stream first replays the user's notifications after it.
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Notification
+from app.schemas import NotificationResponse
+
+NOTIFICATION_CHANNEL = "notifications"
+QUEUE_SIZE = 100  # pending wake-ups per stream; more are dropped (the next fetch covers them)
+FETCH_LIMIT = 100
+RECENT_IDS = 256  # ids already sent, for notifications committed out of id order
+RETRY_MILLISECONDS = 3000  # EventSource reconnect delay
+
+
+class NotificationHub:
+    """In-process pub/sub: user id -> queues of the open streams of that user"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: int, notification_id: Optional[int]):
+        """Wake the user's streams (notification_id None = check for anything new)"""
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(notification_id)
+            except asyncio.QueueFull:
+                pass
+
+    def wake_all(self):
+        """Wake every stream, e.g. after the LISTEN connection was re-established"""
+        for user_id in list(self._subscribers):
+            self.publish(user_id, None)
+
+    @property
+    def stream_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+# Global instance
+notification_hub = NotificationHub()
+
+
+async def notify_created(db: AsyncSession, notification: Notification):
+    """Announce a flushed notification to all workers once the transaction commits"""
+    payload = json.dumps({'id': notification.id, 'user_id': notification.user_id})
+    await db.execute(select(func.pg_notify(NOTIFICATION_CHANNEL, payload)))
+
+
+def _on_notify(connection, pid, channel, payload):
+    try:
+        message = json.loads(payload)
+        notification_hub.publish(int(message['user_id']), int(message['id']))
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"[DEBUG] Ignoring notification payload {payload!r}: {e}", flush=True)
+
+
+async def listen_for_notifications(engine, ping_seconds: float = 30.0, reconnect_seconds: float = 5.0):
+    """
+    Hold a LISTEN connection for this worker (started from the app startup
+    hook). The connection is pinged every ping_seconds and re-established
+    after reconnect_seconds if it breaks
+    """
+    while True:
+        try:
+            async with engine.connect() as conn:
+                driver_connection = (await conn.get_raw_connection()).driver_connection
+                await driver_connection.add_listener(NOTIFICATION_CHANNEL, _on_notify)
+                try:
+                    # Anything committed while we were not listening
+                    notification_hub.wake_all()
+                    while True:
+                        await asyncio.sleep(ping_seconds)
+                        await driver_connection.execute("SELECT 1")
+                finally:
+                    if not driver_connection.is_closed():
+                        await driver_connection.remove_listener(NOTIFICATION_CHANNEL, _on_notify)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[DEBUG] Notification listener failed, reconnecting in {reconnect_seconds}s: {e}", flush=True)
+            await asyncio.sleep(reconnect_seconds)
+
+
+def _event(notification: Notification) -> str:
+    data = NotificationResponse.model_validate(notification).model_dump_json()
+    return f"id: {notification.id}\nevent: notification\ndata: {data}\n\n"
+
+
+async def notification_events(
+    user_id: int,
+    after: Optional[int],
+    session_maker,
+    heartbeat_seconds: float,
+    max_seconds: float
+) -> AsyncIterator[str]:
+    """
+    SSE frames for one stream. Without a cursor the stream starts at the
+    user's latest notification (a `ready` event carries it); with one it
+    first sends everything after it. Ends after max_seconds so the client
+    reconnects and authenticates again. Database sessions are only opened
+    for each fetch, never held while waiting
+    """
+    queue = notification_hub.subscribe(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    sent = deque(maxlen=RECENT_IDS)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        if after is None:
+            async with session_maker() as db:
+                cursor = (await db.execute(
+                    select(func.coalesce(func.max(Notification.id), 0)).filter(Notification.user_id == user_id)
+                )).scalar()
+            yield f"id: {cursor}\nevent: ready\ndata: {{}}\n\n"
+            wanted = None
+        else:
+            cursor = after
+            wanted = set()
+
+        while True:
+            # wanted None = nothing to fetch, otherwise ids announced out of order
+            while wanted is not None:
+                async with session_maker() as db:
+                    result = await db.execute(
+                        select(Notification).filter(
+                            Notification.user_id == user_id,
+                            or_(Notification.id > cursor, Notification.id.in_(wanted))
+                        ).order_by(Notification.id).limit(FETCH_LIMIT)
+                    )
+                    notifications = result.scalars().all()
+                for notification in notifications:
+                    if notification.id not in sent:
+                        sent.append(notification.id)
+                        cursor = max(cursor, notification.id)
+                        yield _event(notification)
+                wanted = set() if len(notifications) == FETCH_LIMIT else None
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                announced = [await asyncio.wait_for(queue.get(), timeout=min(heartbeat_seconds, remaining))]
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            while not queue.empty():
+                announced.append(queue.get_nowait())
+            wanted = _out_of_order(announced, cursor)
+    finally:
+        notification_hub.unsubscribe(user_id, queue)
+
+
+def _out_of_order(announced: Iterable[Optional[int]], cursor: int) -> Set[int]:
+    """Announced ids at or below the cursor (committed after a later one was sent)"""
+    return {notification_id for notification_id in announced if notification_id is not None and notification_id <= cursor}
@@ -0,0 +1,179 @@
+"""
+Password Hashing Pool
+
+Argon2 deliberately spends about a quarter of a second of CPU per hash
+and per verify. Called inline from an async endpoint, it blocked the event
+loop, and at shift change hundreds of simultaneous logins stalled every
+other request on the worker. The endpoints now await password_hasher.hash
+and password_hasher.verify, which run passlib in a dedicated pool of
+PASSWORD_HASH_THREADS threads. argon2-cffi releases the GIL, so the loop
+keeps serving requests while hashes run. The synchronous helpers in
+auth.py remain for scripts.
+
+Each worker admits at most PASSWORD_HASH_MAX_PENDING hashes queued or
+running. Beyond that, callers get a 503 with a Retry-After estimated from
+the queue length and the recent hash time. A burst therefore turns into
+quick, retryable refusals instead of a queue in which every login waits
+longer.
+
+The Argon2 cost (PASSWORD_ARGON2_*) is configurable. Hashes made with
+other parameters, or with bcrypt, still verify, and login rewrites them
+with the current parameters.
+
+The stats kept are histograms of the time a hash waited for a thread, the
+hash time itself and the whole login. They feed GET /admin/auth/hashing
+and are meant for tuning the pool and the cost.
+"""
+
+import asyncio
+import math
+import os
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import settings
+
+# argon2 for new hashes; bcrypt hashes still verify and are upgraded at login
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__rounds=settings.PASSWORD_ARGON2_TIME_COST,
+    argon2__memory_cost=settings.PASSWORD_ARGON2_MEMORY_KIB,
+    argon2__parallelism=settings.PASSWORD_ARGON2_PARALLELISM,
+)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (cumulative counts per upper bound, in ms)"""
+
+    BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.BUCKETS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def quantile_ms(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q quantile (None when empty or above the last bucket)"""
+        if not self.count:
+            return None
+        seen = 0
+        for bound, n in zip(self.BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= q * self.count:
+                return float(bound)
+        return None
+
+    def snapshot(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, n in zip(list(self.BUCKETS_MS) + ["+Inf"], self.counts):
+            cumulative += n
+            buckets[f"le_{bound}"] = cumulative
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_seconds / self.count * 1000, 1) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 1),
+            "p50_ms": self.quantile_ms(0.5),
+            "p95_ms": self.quantile_ms(0.95),
+            "p99_ms": self.quantile_ms(0.99),
+            "buckets": buckets,
+        }
+
+
+class PasswordHashBusy(HTTPException):
+    """Too many hashes pending on this worker (503, retry after retry_after seconds)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins at once, please retry shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Bounded thread pool for passlib hash / verify calls"""
+
+    def __init__(self, threads: Optional[int], max_pending: int):
+        # Each Argon2 call holds PASSWORD_ARGON2_MEMORY_KIB: cap the default thread count
+        self.threads = threads or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.queue_wait = LatencyHistogram()
+        self.hash_time = LatencyHistogram()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="password-hash")
+        return self._executor
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has drained, at the average hash time"""
+        average = self.hash_time.total_seconds / self.hash_time.count if self.hash_time.count else 0.25
+        return max(1, math.ceil(self.pending * average / self.threads))
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHashBusy(self.retry_after())
+        self.pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            return started, fn(*args), time.perf_counter()
+
+        try:
+            started, result, finished = await asyncio.get_running_loop().run_in_executor(self._get_executor(), timed)
+        finally:
+            self.pending -= 1
+        self.queue_wait.observe(started - submitted)
+        self.hash_time.observe(finished - started)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash when the stored one used other parameters or scheme)"""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def status(self) -> dict:
+        return {
+            "threads": self.threads,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            "argon2": {
+                "time_cost": settings.PASSWORD_ARGON2_TIME_COST,
+                "memory_kib": settings.PASSWORD_ARGON2_MEMORY_KIB,
+                "parallelism": settings.PASSWORD_ARGON2_PARALLELISM,
+            },
+            "queue_wait": self.queue_wait.snapshot(),
+            "hash_time": self.hash_time.snapshot(),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_THREADS, settings.PASSWORD_HASH_MAX_PENDING)
+login_latency = LatencyHistogram()
+
@@ -0,0 +1,177 @@
+"""
+Principal Cache
+
+Every authenticated request used to resolve its token with a query on
+users, and most endpoints then queried managers or employees again for the
+user's department (get_user_department) or employee id. A Principal holds
+all three. Each worker caches Principals in a TTL-bounded LRU keyed by the
+token subject (the username), so a typical request needs no auth queries.
+A miss loads all three with one query.
+
+Triggers on users, managers and employees (migration 0010) send the
+changed user ids on PRINCIPAL_CHANNEL. PostgreSQL delivers them when the
+writing transaction commits, to every worker. Each worker's LISTEN
+connection (listen_for_principal_changes, started from the app startup
+hook) then drops those entries, so a deactivated user is refused on the
+next request. The cache is only used while that listener is connected,
+and it is cleared whenever the listener (re)connects, because changes may
+have been missed while it was down. PRINCIPAL_CACHE_TTL_SECONDS bounds how
+stale an entry can get if notifications stop arriving.
+
+The cached User is detached and shared between requests. Treat it as
+read-only, and load the row in the request's session to change it.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import PRINCIPAL_CHANNEL, Employee, Manager, User, UserType
+
+
+@dataclass(frozen=True)
+class Principal:
+    """An authenticated user with the ids most endpoints scope by"""
+    user: User
+    department_id: Optional[int]  # the manager's or employee's department
+    employee_id: Optional[int]  # Employee.id of an employee user
+
+
+class PrincipalCache:
+    """LRU of Principals by username, entries expire after ttl_seconds"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._usernames: Dict[int, str] = {}
+        self.listening = False  # set by listen_for_principal_changes: no invalidations, no caching
+        # Bumped by every invalidation: a load that started before one is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[Principal]:
+        entry = self._entries.get(username) if self.listening else None
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(username)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return entry[1]
+
+    def for_user(self, user_id: int) -> Optional[Principal]:
+        """The cached Principal of a user id (no LRU or hit accounting)"""
+        username = self._usernames.get(user_id) if self.listening else None
+        entry = self._entries.get(username) if username is not None else None
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, username: str, principal: Principal, generation: int):
+        """Store a Principal loaded when self.generation was generation"""
+        if self.max_entries <= 0 or not self.listening or generation != self.generation:
+            return
+        self._drop(username)
+        self._entries[username] = (time.monotonic() + self.ttl_seconds, principal)
+        self._usernames[principal.user.id] = username
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, user_ids: Iterable[int]):
+        self.generation += 1
+        for user_id in user_ids:
+            username = self._usernames.get(user_id)
+            if username is not None:
+                self._drop(username)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._usernames.clear()
+
+    def _drop(self, username: str):
+        entry = self._entries.pop(username, None)
+        if entry is not None and self._usernames.get(entry[1].user.id) == username:
+            del self._usernames[entry[1].user.id]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+async def load_principal(db: AsyncSession, username: str) -> Optional[Principal]:
+    """The user with their department and employee id in one query (None if no such user)"""
+    result = await db.execute(
+        select(User, Manager.department_id, Employee.id, Employee.department_id)
+        .outerjoin(Manager, (Manager.user_id == User.id) & (User.user_type == UserType.MANAGER))
+        .outerjoin(Employee, (Employee.user_id == User.id) & (User.user_type == UserType.EMPLOYEE))
+        .filter(User.username == username)
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    user, manager_department_id, employee_id, employee_department_id = row
+    db.expunge(user)
+    return Principal(
+        user=user,
+        department_id=manager_department_id if user.user_type == UserType.MANAGER else employee_department_id,
+        employee_id=employee_id
+    )
+
+
+async def cached_principal(db: AsyncSession, username: str) -> Optional[Principal]:
+    principal = principal_cache.get(username)
+    if principal is None:
+        generation = principal_cache.generation
+        principal = await load_principal(db, username)
+        if principal is not None:
+            principal_cache.put(username, principal, generation)
+    return principal
+
+
+def _on_notify(connection, pid, channel, payload):
+    if payload == "*":
+        principal_cache.clear()
+    else:
+        principal_cache.invalidate(int(user_id) for user_id in payload.split(","))
+
+
+async def listen_for_principal_changes(engine, ping_seconds: float = 30.0, reconnect_seconds: float = 5.0):
+    """
+    Hold a LISTEN connection for this worker (started from the app startup
+    hook). The connection is pinged every ping_seconds and re-established
+    after reconnect_seconds if it breaks
+    """
+    while True:
+        try:
+            async with engine.connect() as conn:
+                driver_connection = (await conn.get_raw_connection()).driver_connection
+                await driver_connection.add_listener(PRINCIPAL_CHANNEL, _on_notify)
+                try:
+                    # Anything committed while we were not listening
+                    principal_cache.clear()
+                    principal_cache.listening = True
+                    while True:
+                        await asyncio.sleep(ping_seconds)
+                        await driver_connection.execute("SELECT 1")
+                finally:
+                    principal_cache.listening = False
+                    if not driver_connection.is_closed():
+                        await driver_connection.remove_listener(PRINCIPAL_CHANNEL, _on_notify)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[DEBUG] Principal listener failed, reconnecting in {reconnect_seconds}s: {e}", flush=True)
+            await asyncio.sleep(reconnect_seconds)
@@ -0,0 +1,423 @@
+"""
+Device Punch Ingestion
+
+Applies a batch of check-in / check-out punches from a kiosk or badge
+reader with the rules of /employee/check-in and /employee/check-out, but
+set-wise instead of a handful of queries and two commits per punch:
+1. punches whose idempotency key the device already sent get the stored
+   result back (device_punches receipts); a key repeated within the batch
+   gets the result of its first occurrence
+2. one query each loads the batch's employees, their schedules, approved
+   leave and overtime, open check-ins and attendance rows
+3. the punches are applied in memory in time order, so a burst replayed
+   after a network outage checks in and out in the order it happened
+4. one INSERT for the new check-ins, one UPDATE for the closed ones, one
+   upsert per kind of attendance change and one INSERT for the receipts,
+   committed together
+
+Batches of the same device are serialized with a transaction advisory
+lock, so a replay racing its original cannot be applied twice.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.hours import compute_hours
+from app.models import (
+    Attendance, CheckInOut, DevicePunch, Employee, LeaveRequest, LeaveStatus,
+    OvertimeRequest, OvertimeStatus, PunchDevice, Role, Schedule
+)
+
+# Schedules that block a check-in (as /employee/check-in)
+LEAVE_SCHEDULE_STATUSES = ['leave', 'comp_off_taken', 'comp_off_earned', 'leave_half_morning', 'leave_half_afternoon']
+PUNCH_LOCK_KEY = 7_120_020  # pg_advisory_xact_lock(key, device_id)
+FUTURE_TOLERANCE = timedelta(minutes=5)  # device clocks running slightly ahead
+MAX_SHIFT_SPAN = timedelta(hours=24)  # a check-out closes a check-in at most this old
+
+
+def check_in_status(schedule_start: Optional[str], check_in_time: datetime) -> str:
+    """on-time / slightly-late (up to 15 minutes) / late against the scheduled start (09:00 if unset)"""
+    try:
+        scheduled_time = datetime.strptime(schedule_start or "09:00", "%H:%M").time()
+    except ValueError as e:
+        # If we can't parse the time, just mark as on-time
+        print(f"Time parsing error: {str(e)}")
+        return "on-time"
+    diff_minutes = (check_in_time - datetime.combine(check_in_time.date(), scheduled_time)).total_seconds() / 60
+    if diff_minutes <= 0:
+        return "on-time"
+    if diff_minutes <= 15:
+        return "slightly-late"
+    return "late"
+
+
+def checkout_overtime_hours(
+    day: date,
+    check_out_time: datetime,
+    worked_hours: float,
+    daily_max_hours: float,
+    schedule,
+    overtime_request
+) -> float:
+    """
+    Overtime of a check-out:
+    - approved request with a from/to window: time from the shift end to the
+      check-out inside the window, capped at the approved hours
+      (shift 9-18, approved 18-19: out at 19:00 -> 1h, 19:30 -> 1h, 18:30 -> 0.5h)
+    - approved request without a window: hours beyond daily_max_hours,
+      capped at the approved hours
+    - no approved request: all hours beyond daily_max_hours
+    """
+    def beyond_daily_max(cap: Optional[float] = None) -> float:
+        overtime = worked_hours - daily_max_hours
+        if overtime <= 0:
+            return 0.0
+        return round(min(overtime, cap) if cap is not None else overtime, 2)
+
+    if overtime_request and schedule:
+        try:
+            shift_end_h, shift_end_m = map(int, schedule.end_time.split(':'))
+            shift_end_time = datetime.combine(day, time(shift_end_h, shift_end_m))
+            if not (overtime_request.from_time and overtime_request.to_time):
+                return beyond_daily_max(overtime_request.request_hours)
+
+            ot_start_h, ot_start_m = map(int, overtime_request.from_time.split(':'))
+            ot_end_h, ot_end_m = map(int, overtime_request.to_time.split(':'))
+            ot_window_start = datetime.combine(day, time(ot_start_h, ot_start_m))
+            ot_window_end = datetime.combine(day, time(ot_end_h, ot_end_m))
+
+            # OT runs from the shift end to the check-out, capped by the approved window
+            actual_ot_start = max(shift_end_time, ot_window_start)
+            actual_ot_end = min(check_out_time, ot_window_end)
+            if actual_ot_end <= actual_ot_start:
+                return 0.0
+            actual_ot_hours = (actual_ot_end - actual_ot_start).total_seconds() / 3600
+            return round(min(actual_ot_hours, overtime_request.request_hours), 2)
+        except Exception as e:
+            print(f"Error parsing OT times: {str(e)}")
+            return beyond_daily_max(overtime_request.request_hours)
+    return beyond_daily_max()
+
+
+async def ingest_punches(db: AsyncSession, device: PunchDevice, punches: List) -> List[Dict]:
+    """
+    Apply a batch of PunchIn (app.schemas) from device and commit. Returns
+    one result per punch, in request order: status accepted / rejected /
+    duplicate, the rejection reason and the check-in the punch opened or
+    closed.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(PUNCH_LOCK_KEY, device.id)))
+
+    results: List[Optional[Dict]] = [None] * len(punches)
+    receipts = {}
+    keys = list({punch.idempotency_key for punch in punches})
+    if keys:
+        receipt_result = await db.execute(
+            select(DevicePunch).filter(DevicePunch.device_id == device.id, DevicePunch.idempotency_key.in_(keys))
+        )
+        receipts = {receipt.idempotency_key: receipt for receipt in receipt_result.scalars()}
+
+    pending: List[int] = []
+    first_index: Dict[str, int] = {}
+    repeats: Dict[int, int] = {}
+    for index, punch in enumerate(punches):
+        receipt = receipts.get(punch.idempotency_key)
+        if receipt is not None:
+            results[index] = {
+                'idempotency_key': punch.idempotency_key, 'status': 'duplicate',
+                'reason': receipt.reason, 'check_in_id': receipt.check_in_id
+            }
+        elif punch.idempotency_key in first_index:
+            repeats[index] = first_index[punch.idempotency_key]
+        else:
+            first_index[punch.idempotency_key] = index
+            pending.append(index)
+
+    if pending:
+        batch = await _PunchBatch.load(db, device, [punches[index] for index in pending])
+        for index, result in zip(pending, await batch.apply(db, [punches[index] for index in pending])):
+            results[index] = result
+        device.last_seen_at = datetime.utcnow()
+    for index, original in repeats.items():
+        results[index] = {**results[original], 'status': 'duplicate'}
+
+    await db.commit()
+    return results
+
+
+class _PunchBatch:
+    """Employees, schedules, leave, overtime, check-ins and attendance of one batch"""
+
+    @classmethod
+    async def load(cls, db: AsyncSession, device: PunchDevice, punches: List) -> "_PunchBatch":
+        batch = cls()
+        batch.device = device
+
+        employee_query = select(Employee).filter(
+            Employee.employee_id.in_({punch.employee_code for punch in punches}),
+            Employee.is_active.is_(True)
+        )
+        if device.department_id is not None:
+            employee_query = employee_query.filter(Employee.department_id == device.department_id)
+        employees = (await db.execute(employee_query)).scalars().all()
+        batch.employees = {employee.employee_id: employee for employee in employees}
+        employee_ids = [employee.id for employee in employees]
+
+        # A check-out may close the previous day's check-in
+        days = [punch.timestamp.date() for punch in punches]
+        first_day, last_day = min(days) - timedelta(days=1), max(days)
+        in_range = lambda column: column.between(first_day, last_day)
+
+        batch.schedules = defaultdict(list)
+        schedule_result = await db.execute(
+            select(
+                Schedule.id, Schedule.employee_id, Schedule.date, Schedule.start_time,
+                Schedule.end_time, Schedule.status, Role.break_minutes
+            )
+            .outerjoin(Role, Role.id == Schedule.role_id)
+            .filter(Schedule.employee_id.in_(employee_ids), in_range(Schedule.date))
+            .order_by(Schedule.id)
+        )
+        for row in schedule_result.all():
+            batch.schedules[(row.employee_id, row.date)].append(row)
+
+        batch.leave = defaultdict(list)
+        leave_result = await db.execute(
+            select(LeaveRequest.employee_id, LeaveRequest.start_date, LeaveRequest.end_date).filter(
+                LeaveRequest.employee_id.in_(employee_ids),
+                LeaveRequest.start_date <= last_day,
+                LeaveRequest.end_date >= first_day,
+                LeaveRequest.status == LeaveStatus.APPROVED
+            )
+        )
+        for employee_id, start_date, end_date in leave_result.all():
+            batch.leave[employee_id].append((start_date, end_date))
+
+        overtime_result = await db.execute(
+            select(OvertimeRequest).filter(
+                OvertimeRequest.employee_id.in_(employee_ids),
+                in_range(OvertimeRequest.request_date),
+                OvertimeRequest.status == OvertimeStatus.APPROVED
+            )
+        )
+        batch.overtime = {(ot.employee_id, ot.request_date): ot for ot in overtime_result.scalars()}
+
+        # Open check-ins: {(employee, day): state}; existing ones have an id
+        batch.open_check_ins = {}
+        open_result = await db.execute(
+            select(
+                CheckInOut.id, CheckInOut.employee_id, CheckInOut.date, CheckInOut.check_in_time,
+                CheckInOut.check_in_status, CheckInOut.schedule_id
+            )
+            .filter(
+                CheckInOut.employee_id.in_(employee_ids),
+                in_range(CheckInOut.date),
+                CheckInOut.check_out_time.is_(None)
+            )
+            .order_by(CheckInOut.id)
+        )
+        for row in open_result.all():
+            batch.open_check_ins[(row.employee_id, row.date)] = {
+                'id': row.id, 'check_in_time': row.check_in_time,
+                'check_in_status': row.check_in_status, 'schedule_id': row.schedule_id
+            }
+
+        attendance_result = await db.execute(
+            select(Attendance.employee_id, Attendance.date, Attendance.in_time).filter(
+                Attendance.employee_id.in_(employee_ids), in_range(Attendance.date)
+            )
+        )
+        batch.attendance_times = {(row.employee_id, row.date): row.in_time for row in attendance_result.all()}
+        return batch
+
+    def _on_leave(self, employee_id: int, day: date) -> bool:
+        if any(start <= day <= end for start, end in self.leave.get(employee_id, ())):
+            return True
+        return any(s.status in LEAVE_SCHEDULE_STATUSES for s in self.schedules.get((employee_id, day), ()))
+
+    def _schedule(self, employee_id: int, day: date, schedule_id: Optional[int] = None):
+        for schedule in self.schedules.get((employee_id, day), ()):
+            if schedule_id is None or schedule.id == schedule_id:
+                return schedule
+        return None
+
+    async def apply(self, db: AsyncSession, punches: List) -> List[Dict]:
+        now = datetime.now()
+        results: List[Dict] = [
+            {'idempotency_key': punch.idempotency_key, 'status': 'rejected', 'reason': None, 'check_in_id': None}
+            for punch in punches
+        ]
+        self.new_check_ins: List[Dict] = []  # rows to insert
+        self.new_check_in_punches: List[List[int]] = []  # punches to give each new row's id
+        self.closed: List[Dict] = []  # check-outs: the check-in's state plus the out punch
+        self.attendance_in: Dict = {}  # (employee, day) -> attendance row opened by a check-in
+
+        order = sorted(range(len(punches)), key=lambda i: (punches[i].timestamp, i))
+        for i in order:
+            punch, result = punches[i], results[i]
+            employee = self.employees.get(punch.employee_code)
+            if employee is None:
+                result['reason'] = 'unknown_employee'
+            elif punch.timestamp > now + FUTURE_TOLERANCE:
+                result['reason'] = 'future_timestamp'
+            elif punch.type == 'in':
+                self._check_in(employee, punch, i, result)
+            else:
+                self._check_out(employee, punch, i, result)
+
+        await self._write(db, punches, results)
+        return results
+
+    def _check_in(self, employee: Employee, punch, index: int, result: Dict):
+        day = punch.timestamp.date()
+        if self._on_leave(employee.id, day):
+            result['reason'] = 'on_leave'
+            return
+        if (employee.id, day) in self.open_check_ins:
+            result['reason'] = 'already_checked_in'
+            return
+        schedule = self._schedule(employee.id, day)
+        if schedule is None:
+            result['reason'] = 'no_schedule'
+            return
+
+        status_val = check_in_status(schedule.start_time, punch.timestamp)
+        self.new_check_ins.append({
+            'employee_id': employee.id, 'schedule_id': schedule.id, 'date': day,
+            'check_in_time': punch.timestamp, 'check_in_status': status_val,
+            'check_out_time': None, 'location': punch.location, 'notes': None
+        })
+        self.new_check_in_punches.append([index])
+        self.open_check_ins[(employee.id, day)] = {
+            'id': None, 'new': len(self.new_check_ins) - 1, 'check_in_time': punch.timestamp,
+            'check_in_status': status_val, 'schedule_id': schedule.id
+        }
+        result['status'] = 'accepted'
+
+        # The day's attendance row gets the first check-in time
+        if not self.attendance_times.get((employee.id, day)):
+            self.attendance_times[(employee.id, day)] = punch.timestamp.strftime("%H:%M")
+            self.attendance_in[(employee.id, day)] = {
+                'employee_id': employee.id, 'schedule_id': schedule.id, 'date': day,
+                'in_time': punch.timestamp.strftime("%H:%M"), 'out_time': None, 'status': status_val,
+                'worked_hours': 0, 'overtime_hours': 0, 'break_minutes': 0
+            }
+
+    def _check_out(self, employee: Employee, punch, index: int, result: Dict):
+        # The day's open check-in, or the previous day's for a shift past midnight
+        day = punch.timestamp.date()
+        for check_in_day in (day, day - timedelta(days=1)):
+            state = self.open_check_ins.get((employee.id, check_in_day))
+            if state and state['check_in_time'] and timedelta(0) <= punch.timestamp - state['check_in_time'] <= MAX_SHIFT_SPAN:
+                break
+        else:
+            result['reason'] = 'no_active_check_in'
+            return
+
+        del self.open_check_ins[(employee.id, check_in_day)]
+        if state['id'] is None:
+            # Checked in earlier in this batch: the row is inserted closed
+            row = self.new_check_ins[state['new']]
+            row['check_out_time'] = punch.timestamp
+            row['notes'] = punch.notes
+            self.new_check_in_punches[state['new']].append(index)
+        else:
+            result['check_in_id'] = state['id']
+        self.closed.append({
+            **state, 'employee': employee, 'day': check_in_day,
+            'check_out_time': punch.timestamp, 'notes': punch.notes
+        })
+        result['status'] = 'accepted'
+
+    async def _write(self, db: AsyncSession, punches: List, results: List[Dict]):
+        if self.new_check_ins:
+            inserted = await db.execute(
+                insert(CheckInOut).returning(CheckInOut.id, sort_by_parameter_order=True),
+                self.new_check_ins
+            )
+            for check_in_id, indexes in zip(inserted.scalars().all(), self.new_check_in_punches):
+                for index in indexes:
+                    results[index]['check_in_id'] = check_in_id
+
+        existing = [c for c in self.closed if c['id'] is not None]
+        if existing:
+            await db.execute(
+                update(CheckInOut),
+                [{'id': c['id'], 'check_out_time': c['check_out_time'], 'notes': c['notes']} for c in existing]
+            )
+
+        attendance_out = {}
+        if self.closed:
+            # Worked hours and breaks of every check-out at once; minutes count
+            # from midnight of the check-in day, so past midnight does not wrap
+            hours = compute_hours(
+                _minutes_since_midnight([c['check_in_time'] for c in self.closed], [c['day'] for c in self.closed]),
+                _minutes_since_midnight([c['check_out_time'] for c in self.closed], [c['day'] for c in self.closed]),
+                break_minutes=np.array([self._break_minutes(c) for c in self.closed])
+            )
+            for i, c in enumerate(self.closed):
+                key = (c['employee'].id, c['day'])
+                worked_hours = round(float(hours.worked_hours[i]), 2)
+                attendance_out[key] = {
+                    'employee_id': c['employee'].id, 'schedule_id': c['schedule_id'], 'date': c['day'],
+                    'in_time': c['check_in_time'].strftime("%H:%M"), 'out_time': c['check_out_time'].strftime("%H:%M"),
+                    'status': c['check_in_status'] or "onTime",
+                    'worked_hours': worked_hours, 'break_minutes': int(hours.break_minutes[i]),
+                    'overtime_hours': checkout_overtime_hours(
+                        c['day'], c['check_out_time'], worked_hours, c['employee'].daily_max_hours,
+                        self._schedule(c['employee'].id, c['day'], c['schedule_id']), self.overtime.get(key)
+                    )
+                }
+                self.attendance_in.pop(key, None)
+
+        if self.attendance_in:
+            # Check-ins: only a row without a check-in time takes this one (and its status)
+            stmt = pg_insert(Attendance)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=['employee_id', 'date'],
+                    set_={
+                        'in_time': func.coalesce(Attendance.in_time, stmt.excluded.in_time),
+                        'status': case((Attendance.in_time.is_(None), stmt.excluded.status), else_=Attendance.status),
+                        'updated_at': datetime.utcnow()
+                    }
+                ),
+                list(self.attendance_in.values())
+            )
+        if attendance_out:
+            # Check-outs: times and hours replace the row's (its status stays)
+            stmt = pg_insert(Attendance)
+            replaced = ('schedule_id', 'in_time', 'out_time', 'worked_hours', 'break_minutes', 'overtime_hours')
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=['employee_id', 'date'],
+                    set_={**{column: stmt.excluded[column] for column in replaced}, 'updated_at': datetime.utcnow()}
+                ),
+                list(attendance_out.values())
+            )
+
+        await db.execute(insert(DevicePunch), [
+            {
+                'device_id': self.device.id, 'idempotency_key': punch.idempotency_key,
+                'employee_code': punch.employee_code, 'punch_type': punch.type, 'punched_at': punch.timestamp,
+                'status': result['status'], 'reason': result['reason'], 'check_in_id': result['check_in_id']
+            }
+            for punch, result in zip(punches, results)
+        ])
+
+    def _break_minutes(self, closed: Dict) -> int:
+        schedule = self._schedule(closed['employee'].id, closed['day'], closed['schedule_id'])
+        return (schedule.break_minutes or 0) if schedule else 0
+
+
+def _minutes_since_midnight(times: List[datetime], days: List[date]) -> np.ndarray:
+    """Minutes of each datetime since midnight of the matching day"""
+    return np.array([
+        (moment - datetime.combine(day, time())).total_seconds() / 60 for moment, day in zip(times, days)
+    ])
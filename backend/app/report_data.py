@@ -0,0 +1,326 @@
+"""
+Attendance Report Data Layer
+
+Loads everything an attendance report needs for a department (or a single
+employee) and a date range in a handful of column queries - no ORM objects -
+and computes the report aggregates over NumPy arrays in one pass.
+
+Every export renderer (app/attendance_reports.py) reads from ReportData, so
+adding a report does not mean adding another set of queries. Closed months
+are loaded from the attendance rows too, because the month snapshots
+(app/attendance_snapshots.py) hold aggregates only.
+"""
+
+from collections import namedtuple
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.holidays_jp import jp_calendar
+from app.hours import minutes_array, night_minutes, shift_hours
+from app.models import (
+    Attendance, CheckInOut, CompOffDetail, Employee, LeaveRequest, LeaveStatus, Schedule
+)
+
+
+EmployeeRow = namedtuple(
+    "EmployeeRow",
+    ["id", "employee_id", "first_name", "last_name", "email", "phone", "employment_type", "paid_leave_per_year"]
+)
+ScheduleRow = namedtuple("ScheduleRow", ["start_time", "end_time", "status", "hours"])  # hours: shift length or None
+CheckInRow = namedtuple("CheckInRow", ["check_in_time", "check_out_time", "check_in_status"])
+LeaveDay = namedtuple("LeaveDay", ["leave_type", "duration_type"])
+LeaveRow = namedtuple("LeaveRow", ["employee_id", "start_date", "end_date", "leave_type", "duration_type"])
+
+# Attendance statuses counted as late
+LATE_STATUSES = ('slightlyLate', 'late', 'veryLate')
+
+EMPLOYEE_COLUMNS = [getattr(Employee, field) for field in EmployeeRow._fields]
+ATTENDANCE_COLUMNS = [
+    Attendance.employee_id, Attendance.date, Attendance.in_time, Attendance.out_time,
+    Attendance.status, Attendance.worked_hours, Attendance.overtime_hours,
+    Attendance.break_minutes, Attendance.notes
+]
+
+
+def _float_column(values) -> np.ndarray:
+    """Nullable numbers -> float64 array with NaN for NULL"""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class AttendanceColumns:
+    """
+    Attendance rows of the period, ordered by date then employee.
+    records keeps the rows for rendering; the numeric columns are arrays.
+    """
+
+    def __init__(self, records: Sequence):
+        self.records = list(records)
+        self.employee_id = np.array([r.employee_id for r in self.records], dtype=np.int64)
+        self.worked_hours = _float_column(r.worked_hours for r in self.records)
+        self.overtime_hours = _float_column(r.overtime_hours for r in self.records)
+        self.night_hours = night_minutes(
+            minutes_array(r.in_time for r in self.records),
+            minutes_array(r.out_time for r in self.records)
+        ) / 60
+        self.break_minutes = _float_column(r.break_minutes for r in self.records)
+        self.on_time = np.array([r.status == 'onTime' for r in self.records], dtype=bool)
+        self.late = np.array([r.status in LATE_STATUSES for r in self.records], dtype=bool)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def totals(self) -> Dict:
+        """Worked / overtime / night hours and days with worked hours"""
+        worked = self.worked_hours > 0  # NaN compares False
+        return {
+            "records": len(self.records),
+            "days_worked": int(worked.sum()),
+            "worked_hours": float(self.worked_hours[worked].sum()),
+            "overtime_hours": float(np.nansum(self.overtime_hours)),
+            "night_hours": float(self.night_hours.sum())
+        }
+
+    def per_employee(self) -> Dict[int, Dict]:
+        """totals() plus break minutes and on-time / late counts, per employee id"""
+        ids, index = np.unique(self.employee_id, return_inverse=True)
+        worked = self.worked_hours > 0
+
+        def sums(values) -> np.ndarray:
+            return np.bincount(index, weights=values, minlength=len(ids))
+
+        columns = {
+            "records": np.bincount(index, minlength=len(ids)),
+            "days_worked": sums(worked),
+            "worked_hours": sums(np.where(worked, self.worked_hours, 0.0)),
+            "overtime_hours": sums(np.nan_to_num(self.overtime_hours)),
+            "night_hours": sums(self.night_hours),
+            "break_minutes": sums(np.nan_to_num(self.break_minutes)),
+            "on_time_count": sums(self.on_time),
+            "late_count": sums(self.late),
+        }
+        counts = ("records", "days_worked", "break_minutes", "on_time_count", "late_count")
+        return {
+            int(employee_id): {
+                name: int(values[i]) if name in counts else float(values[i])
+                for name, values in columns.items()
+            }
+            for i, employee_id in enumerate(ids)
+        }
+
+
+def day_counts(start_date: date, end_date: date, holidays: Dict[date, str]) -> Dict:
+    """Days of the range split into public holidays, weekends and working days"""
+    total_days = (end_date - start_date).days + 1
+    public_holidays = sum(1 for d in holidays if start_date <= d <= end_date)
+    weekends = sum(
+        1 for i in range(total_days)
+        if (start_date + timedelta(days=i)).weekday() >= 5
+        and (start_date + timedelta(days=i)) not in holidays
+    )
+    return {
+        "total_days": total_days,
+        "public_holidays": public_holidays,
+        "weekends": weekends,
+        "working_days_available": total_days - public_holidays - weekends
+    }
+
+
+class ReportData:
+    """Everything the attendance renderers read, for one department or employee"""
+
+    def __init__(
+        self,
+        title: str,
+        start_date: date,
+        end_date: date,
+        employees: List[EmployeeRow],
+        attendance: AttendanceColumns,
+        schedules: Dict[Tuple[int, date], ScheduleRow],
+        comp_off_earned: Set[Tuple[int, date]],
+        comp_off_used: Set[Tuple[int, date]],
+        leave_days: Dict[Tuple[int, date], LeaveDay],
+        leave_requests: List[LeaveRow],
+        checkins: Dict[Tuple[int, date], CheckInRow],
+        holidays: Dict[date, str]
+    ):
+        self.title = title  # department name or employee name
+        self.start_date = start_date
+        self.end_date = end_date
+        self.employees = employees
+        self.employees_by_id = {e.id: e for e in employees}
+        self.attendance = attendance
+        self.attendance_by_key = {(r.employee_id, r.date): r for r in attendance}
+        self.schedules = schedules
+        self.comp_off_earned = comp_off_earned
+        self.comp_off_used = comp_off_used
+        self.leave_days = leave_days
+        self.leave_requests = leave_requests
+        self.checkins = checkins
+        self.holidays = holidays
+        self.totals = attendance.totals()
+        self.days = day_counts(start_date, end_date, holidays)
+
+    @property
+    def dates(self) -> List[date]:
+        return [self.start_date + timedelta(days=i) for i in range(self.days["total_days"])]
+
+    def leave_totals(self, employee_id: int) -> Dict:
+        """
+        Paid / unpaid leave days of approved requests overlapping the period
+        (half-day requests count 0.5)
+        """
+        paid = unpaid = 0.0
+        for leave in self.leave_requests:
+            if leave.employee_id != employee_id:
+                continue
+            days = (leave.end_date - leave.start_date).days + 1
+            if leave.duration_type and leave.duration_type.startswith('half_day'):
+                days = 0.5
+            if leave.leave_type.lower() == 'paid':
+                paid += days
+            else:
+                unpaid += days
+        return {"paid": paid, "unpaid": unpaid}
+
+
+async def _load(
+    db: AsyncSession,
+    title: str,
+    employees: List[EmployeeRow],
+    start_date: date,
+    end_date: date,
+    include_checkins: bool
+) -> ReportData:
+    employee_ids = [e.id for e in employees]
+
+    attendance_result = await db.execute(
+        select(*ATTENDANCE_COLUMNS)
+        .filter(Attendance.employee_id.in_(employee_ids), Attendance.date >= start_date, Attendance.date <= end_date)
+        .order_by(Attendance.date, Attendance.employee_id, Attendance.id)
+    )
+    attendance = AttendanceColumns(attendance_result.all())
+
+    # Latest schedule row per employee-day; comp-off earned from any row
+    schedule_result = await db.execute(
+        select(Schedule.employee_id, Schedule.date, Schedule.start_time, Schedule.end_time, Schedule.status)
+        .filter(Schedule.employee_id.in_(employee_ids), Schedule.date >= start_date, Schedule.date <= end_date)
+        .order_by(Schedule.id)
+    )
+    schedule_rows = schedule_result.all()
+    lengths = shift_hours(
+        minutes_array(row.start_time for row in schedule_rows),
+        minutes_array(row.end_time for row in schedule_rows)
+    )
+    schedules = {}
+    comp_off_earned = set()
+    for (employee_id, day, start_time, end_time, status), hours in zip(schedule_rows, lengths.tolist()):
+        schedules[(employee_id, day)] = ScheduleRow(start_time, end_time, status, None if np.isnan(hours) else hours)
+        if status == 'comp_off_earned':
+            comp_off_earned.add((employee_id, day))
+
+    # CompOffDetail.date is a timestamp: include the whole last day
+    used_result = await db.execute(
+        select(CompOffDetail.employee_id, CompOffDetail.date)
+        .filter(
+            CompOffDetail.employee_id.in_(employee_ids),
+            CompOffDetail.date >= start_date,
+            CompOffDetail.date < end_date + timedelta(days=1),
+            CompOffDetail.type == 'used'
+        )
+    )
+    comp_off_used = {
+        (employee_id, used_at.date() if hasattr(used_at, 'date') else used_at)
+        for employee_id, used_at in used_result.all()
+    }
+
+    leave_result = await db.execute(
+        select(
+            LeaveRequest.employee_id, LeaveRequest.start_date, LeaveRequest.end_date,
+            LeaveRequest.leave_type, LeaveRequest.duration_type
+        )
+        .filter(
+            LeaveRequest.employee_id.in_(employee_ids),
+            LeaveRequest.start_date <= end_date,
+            LeaveRequest.end_date >= start_date,
+            LeaveRequest.status == LeaveStatus.APPROVED
+        )
+        .order_by(LeaveRequest.id)
+    )
+    leave_requests = [LeaveRow(*row) for row in leave_result.all()]
+    leave_days = {}
+    for leave in leave_requests:
+        day = max(leave.start_date, start_date)
+        while day <= min(leave.end_date, end_date):
+            leave_days[(leave.employee_id, day)] = LeaveDay(leave.leave_type, leave.duration_type or 'full_day')
+            day += timedelta(days=1)
+
+    checkins = {}
+    if include_checkins:
+        checkin_result = await db.execute(
+            select(
+                CheckInOut.employee_id, CheckInOut.date, CheckInOut.check_in_time,
+                CheckInOut.check_out_time, CheckInOut.check_in_status
+            )
+            .filter(CheckInOut.employee_id.in_(employee_ids), CheckInOut.date >= start_date, CheckInOut.date <= end_date)
+            .order_by(CheckInOut.id)
+        )
+        for employee_id, day, check_in_time, check_out_time, check_in_status in checkin_result.all():
+            checkins[(employee_id, day)] = CheckInRow(check_in_time, check_out_time, check_in_status)
+
+    return ReportData(
+        title=title,
+        start_date=start_date,
+        end_date=end_date,
+        employees=employees,
+        attendance=attendance,
+        schedules=schedules,
+        comp_off_earned=comp_off_earned,
+        comp_off_used=comp_off_used,
+        leave_days=leave_days,
+        leave_requests=leave_requests,
+        checkins=checkins,
+        holidays=jp_calendar.get_holidays_in_range(start_date, end_date)
+    )
+
+
+async def load_department_report(
+    db: AsyncSession,
+    department,
+    start_date: date,
+    end_date: date,
+    employment_type: Optional[str] = None,
+    include_checkins: bool = False,
+    active_only: bool = True
+) -> ReportData:
+    """
+    Active (or with active_only=False, all) employees of the department,
+    optionally only 'full_time' or 'part_time', ordered by first name, with
+    their data for the range
+    """
+    query = (
+        select(*EMPLOYEE_COLUMNS)
+        .filter(Employee.department_id == department.id)
+        .order_by(Employee.first_name, Employee.id)
+    )
+    if active_only:
+        query = query.filter(Employee.is_active == True)
+    if employment_type in ('full_time', 'part_time'):
+        query = query.filter(Employee.employment_type == employment_type)
+    result = await db.execute(query)
+    employees = [EmployeeRow(*row) for row in result.all()]
+    return await _load(db, department.name, employees, start_date, end_date, include_checkins)
+
+
+async def load_employee_report(db: AsyncSession, employee, start_date: date, end_date: date) -> ReportData:
+    """A single employee's data for the range"""
+    row = EmployeeRow(*(getattr(employee, field) for field in EmployeeRow._fields))
+    return await _load(
+        db, f"{employee.first_name} {employee.last_name}", [row], start_date, end_date, include_checkins=False
+    )
@@ -0,0 +1,105 @@
+"""
+Schedule Delta Sync
+
+GET /schedules/changes returns only the schedule groups that changed since
+the client's cursor. The unit of change is an (employee, date) group,
+because GET /schedules decides per group which rows to show (a 'scheduled'
+row hides the leave rows of the same day). Every changed group is sent
+whole, and the client replaces its rows for that group.
+
+The groups come from schedule_changes (migration 0008), a log written by
+statement-level triggers on schedules. Every write path (ORM, the COPY
+writer, raw SQL, cascades) is covered. The log also records groups whose
+rows were deleted or moved to another employee or date (the tombstones).
+
+A cursor is "<xmin>.<issued>". xmin is the oldest transaction still
+running when the cursor was issued, and every transaction older than
+that was visible to the read that issued it. The next sync returns the
+log rows of transactions from xmin on. A change is therefore never skipped
+because it committed late, and one that was already seen may be sent
+again (replacing a group is idempotent). Cursors older than the log
+retention get a full response.
+"""
+
+import asyncio
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ScheduleChange
+
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+async def sync_position(db: AsyncSession) -> Tuple[int, int]:
+    """(xmin of the current snapshot, database time in epoch seconds); call before reading"""
+    result = await db.execute(
+        select(
+            func.txid_snapshot_xmin(func.txid_current_snapshot()),
+            func.floor(func.extract('epoch', func.now()))
+        )
+    )
+    xmin, now = result.one()
+    return int(xmin), int(now)
+
+
+def encode_cursor(xmin: int, issued: int) -> str:
+    return f"{xmin}.{issued}"
+
+
+def decode_cursor(cursor: str, now: int, retention_hours: float) -> Optional[int]:
+    """
+    The xmin of a cursor, or None when it is older than the log retention
+    (the client needs a full response). ValueError for a malformed cursor
+    """
+    xmin, issued = (int(part) for part in cursor.split("."))
+    if xmin < 0 or issued > now:
+        raise ValueError(cursor)
+    if issued < now - retention_hours * 3600:
+        return None
+    return xmin
+
+
+async def changed_schedule_keys(
+    db: AsyncSession,
+    since_xmin: int,
+    scope: Dict[str, int],
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> List[Tuple[int, date]]:
+    """(employee_id, date) groups changed by transactions from since_xmin on"""
+    query = select(ScheduleChange.employee_id, ScheduleChange.date).distinct().filter(
+        ScheduleChange.change_xid >= since_xmin,
+        *[getattr(ScheduleChange, column) == value for column, value in scope.items()]
+    )
+    if start_date:
+        query = query.filter(ScheduleChange.date >= start_date)
+    if end_date:
+        query = query.filter(ScheduleChange.date <= end_date)
+    result = await db.execute(query)
+    return [tuple(row) for row in result.all()]
+
+
+async def prune_schedule_changes(db: AsyncSession, retention_hours: float) -> int:
+    result = await db.execute(
+        delete(ScheduleChange).filter(
+            ScheduleChange.changed_at < func.now() - text(f"interval '{float(retention_hours)} hours'")
+        )
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def prune_schedule_changes_periodically(session_maker, retention_hours: float):
+    """Drop log rows older than the retention every hour (started from the app startup hook)"""
+    while True:
+        try:
+            async with session_maker() as db:
+                pruned = await prune_schedule_changes(db, retention_hours)
+            if pruned:
+                print(f"[DEBUG] Pruned {pruned} schedule change rows", flush=True)
+        except Exception as e:
+            print(f"[DEBUG] Schedule change pruning failed: {e}", flush=True)
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
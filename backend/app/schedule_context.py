@@ -0,0 +1,576 @@
+"""
+Schedule Generation Context
+
+Answers the per-employee questions asked by the greedy schedule generator
+(approved leave, comp-off, same-day schedule, consecutive days, weekly hours,
+5-shifts-per-week rule).
+
+- ScheduleContext: issues one query per question (original behaviour)
+- PreloadedScheduleContext: loads leaves, comp-offs, schedules and roles for the
+  whole department/date range in a few set-based queries and answers every
+  question from per-employee indexes keyed by date; generated rows are
+  written with one bulk insert at the end
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Schedule, LeaveRequest, CompOffRequest, Role, LeaveStatus, Unavailability
+from app.holidays_jp import jp_calendar
+from app.schedule_writer import bulk_insert_schedules, build_schedule_row
+from app.time_columns import minutes
+
+
+# Statuses counted as actual work (hours, consecutive days)
+WORK_STATUSES = ('scheduled', 'completed', 'comp_off_earned')
+
+# Statuses counted toward the Mon-Fri shift requirement
+WEEKDAY_COVERAGE_STATUSES = (
+    'scheduled', 'leave', 'comp_off_taken', 'comp_off_earned',
+    'leave_half_morning', 'leave_half_afternoon'
+)
+
+# Statuses counted as regular weekend shifts (weekend comp-off is a bonus)
+WEEKEND_REGULAR_STATUSES = ('scheduled', 'leave', 'leave_half_morning', 'leave_half_afternoon')
+
+
+def get_week_bounds(target_date: date) -> Tuple[date, date]:
+    """Return (monday, sunday) of the week containing target_date"""
+    week_start = target_date - timedelta(days=target_date.weekday())
+    return week_start, week_start + timedelta(days=6)
+
+
+def max_consecutive_days(dates: List[date]) -> int:
+    """Length of the longest run of consecutive dates in a sorted list"""
+    max_consecutive = 1
+    current_consecutive = 1
+    for i in range(1, len(dates)):
+        if (dates[i] - dates[i-1]).days == 1:
+            current_consecutive += 1
+            max_consecutive = max(max_consecutive, current_consecutive)
+        else:
+            current_consecutive = 1
+    return max_consecutive
+
+
+def schedule_work_hours(start_time: Optional[str], end_time: Optional[str], break_minutes: Optional[int]) -> Optional[float]:
+    """Hours between HH:MM start/end minus the role break, None if times are unusable"""
+    if not (start_time and end_time):
+        return None
+    try:
+        start = datetime.strptime(start_time, '%H:%M')
+        end = datetime.strptime(end_time, '%H:%M')
+    except (ValueError, TypeError):
+        return None
+    total_hours = (end - start).total_seconds() / 3600
+    return total_hours - (break_minutes or 0) / 60
+
+
+def check_weekly_shift_limit(
+    target_date: date,
+    weekday_coverage: int,
+    weekend_regular_shifts: int
+) -> Tuple[bool, str]:
+    """
+    Apply the 5-shifts-per-week rule to already counted coverage.
+
+    Rules:
+    - Base: 5 shifts per week (Mon-Fri)
+    - Exception 1: If a weekday (Mon-Fri) is a public holiday, reduce by 1
+    - Exception 2: Comp-off taken/earned on Mon-Fri counts as fulfilling shift requirement
+    - Exception 3: Comp-off earned/taken on Sat-Sun are bonus shifts (don't count)
+
+    Returns: (is_valid, error_message)
+    """
+    week_start, week_end = get_week_bounds(target_date)
+
+    # Get required shifts for this week (considering Japanese holidays)
+    required_shifts = jp_calendar.get_shifts_required_for_week(week_start)
+
+    # Get week info for detailed error messaging
+    week_info = jp_calendar.get_week_info(week_start)
+    holiday_str = ""
+    if week_info['weekday_holiday_count'] > 0:
+        holiday_names = [day['holiday_name'] for day in week_info['days'] if day['holiday_name']]
+        holiday_str = f" (Contains {week_info['weekday_holiday_count']} weekday holiday(s): {', '.join(holiday_names)})"
+
+    if target_date.weekday() >= 5:
+        # Weekend (Sat-Sun) shift
+        # Check if weekday requirement is already met
+        if weekday_coverage >= required_shifts:
+            return False, f"Cannot assign weekend shift on {target_date} - weekday requirement already met. Employee has {weekday_coverage} weekday shifts/comp-offs (required: {required_shifts}){holiday_str}"
+        # Weekend regular shifts also count toward total
+        total_shifts = weekday_coverage + weekend_regular_shifts
+        if total_shifts >= required_shifts:
+            return False, f"Cannot assign more than {required_shifts} shifts per week. Employee has {weekday_coverage} weekday + {weekend_regular_shifts} weekend shifts (total: {total_shifts}){holiday_str}"
+    else:
+        # Weekday (Mon-Fri) shift
+        if weekday_coverage >= required_shifts:
+            return False, f"Cannot assign more than {required_shifts} weekday shifts per week. Employee already has {weekday_coverage} weekday shifts/comp-offs (required: {required_shifts}){holiday_str} (Mon-Sun: {week_start} to {week_end})"
+
+    return True, ""
+
+
+async def count_week_coverage(
+    db: AsyncSession,
+    employee_id: int,
+    target_date: date,
+    exclude_schedule_id: Optional[int] = None
+) -> Tuple[int, int]:
+    """Count (weekday coverage, weekend regular shifts) for the week of target_date"""
+    week_start, week_end = get_week_bounds(target_date)
+
+    # Count WEEKDAY (Mon-Fri) coverage: regular shifts + comp-off (both count toward requirement)
+    weekday_coverage_query = select(func.count(Schedule.id)).filter(
+        Schedule.employee_id == employee_id,
+        Schedule.date >= week_start,
+        Schedule.date <= week_end,
+        Schedule.status.in_(WEEKDAY_COVERAGE_STATUSES),
+        # Only count Mon-Fri (1=Mon, 5=Fri in PostgreSQL extraction)
+        func.extract('dow', Schedule.date).in_([1, 2, 3, 4, 5])
+    )
+    if exclude_schedule_id:
+        weekday_coverage_query = weekday_coverage_query.filter(Schedule.id != exclude_schedule_id)
+
+    result = await db.execute(weekday_coverage_query)
+    weekday_coverage = result.scalar() or 0
+
+    # Count weekend (Sat-Sun) shifts - only comp-off (earning extra time off) don't count
+    weekend_regular_query = select(func.count(Schedule.id)).filter(
+        Schedule.employee_id == employee_id,
+        Schedule.date >= week_start,
+        Schedule.date <= week_end,
+        Schedule.status.in_(WEEKEND_REGULAR_STATUSES),
+        # Only count Sat-Sun (6=Sat, 0=Sun in PostgreSQL extraction)
+        func.extract('dow', Schedule.date).in_([6, 0])
+    )
+    if exclude_schedule_id:
+        weekend_regular_query = weekend_regular_query.filter(Schedule.id != exclude_schedule_id)
+
+    result = await db.execute(weekend_regular_query)
+    weekend_regular_shifts = result.scalar() or 0
+
+    return weekday_coverage, weekend_regular_shifts
+
+
+class ScheduleContext:
+    """
+    Per-check database lookups used by the schedule generator.
+    Every method issues its own query, so rows added to the session are
+    seen through autoflush.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_approved_leave(self, employee_id: int, target_date: date) -> Optional[LeaveRequest]:
+        """Approved leave covering target_date, if any"""
+        result = await self.db.execute(
+            select(LeaveRequest)
+            .filter(
+                LeaveRequest.employee_id == employee_id,
+                LeaveRequest.start_date <= target_date,
+                LeaveRequest.end_date >= target_date,
+                LeaveRequest.status == LeaveStatus.APPROVED
+            )
+        )
+        return result.scalars().first()
+
+    async def get_approved_comp_off(self, employee_id: int, target_date: date) -> Optional[CompOffRequest]:
+        """Approved comp-off request for target_date, if any"""
+        result = await self.db.execute(
+            select(CompOffRequest)
+            .filter(
+                CompOffRequest.employee_id == employee_id,
+                CompOffRequest.comp_off_date == target_date,
+                CompOffRequest.status == LeaveStatus.APPROVED
+            )
+        )
+        return result.scalars().first()
+
+    async def has_schedule_on(self, employee_id: int, target_date: date) -> bool:
+        """True if the employee has any schedule entry on target_date"""
+        result = await self.db.execute(
+            select(Schedule)
+            .filter(
+                Schedule.employee_id == employee_id,
+                Schedule.date == target_date
+            )
+        )
+        return result.scalars().first() is not None
+
+    async def get_comp_off_shift_times(self, employee_id: int, target_date: date) -> Tuple[str, str]:
+        """
+        Shift times for a comp-off earned day:
+        same-week work shift first, then the latest same-weekday shift, then full day
+        """
+        week_start, week_end = get_week_bounds(target_date)
+
+        week_shift = await self.db.execute(
+            select(Schedule)
+            .filter(
+                Schedule.employee_id == employee_id,
+                Schedule.date >= week_start,
+                Schedule.date <= week_end,
+                Schedule.date != target_date,
+                Schedule.status.in_(WORK_STATUSES)
+            )
+            .order_by(Schedule.date)
+            .limit(1)
+        )
+        week_sched = week_shift.scalar_one_or_none()
+        if week_sched and week_sched.start_time and week_sched.end_time:
+            return week_sched.start_time, week_sched.end_time
+
+        # Fallback to same day of week from previous weeks
+        day_name = target_date.strftime('%A')
+        same_day = await self.db.execute(
+            select(Schedule)
+            .filter(
+                Schedule.employee_id == employee_id,
+                func.to_char(Schedule.date, 'Day').ilike(f'%{day_name}%'),
+                Schedule.status.in_(WORK_STATUSES)
+            )
+            .order_by(Schedule.date.desc())
+            .limit(1)
+        )
+        same_day_sched = same_day.scalar_one_or_none()
+        if same_day_sched and same_day_sched.start_time and same_day_sched.end_time:
+            return same_day_sched.start_time, same_day_sched.end_time
+
+        # Default fallback
+        return "00:00", "23:59"
+
+    async def get_week_work_dates(self, employee_id: int, target_date: date) -> List[date]:
+        """Dates of work shifts (not leave) in the week of target_date"""
+        week_start, week_end = get_week_bounds(target_date)
+        result = await self.db.execute(
+            select(Schedule)
+            .filter(
+                Schedule.employee_id == employee_id,
+                Schedule.date >= week_start,
+                Schedule.date <= week_end,
+                Schedule.status.in_(WORK_STATUSES)
+            )
+            .order_by(Schedule.date)
+        )
+        return [s.date for s in result.scalars().all()]
+
+    async def get_week_hours(self, employee_id: int, target_date: date) -> Tuple[float, float]:
+        """(week hours, target day hours) of work shifts, break time subtracted"""
+        week_start, week_end = get_week_bounds(target_date)
+        # Same arithmetic as schedule_work_hours (end - start, no wrap), summed in SQL
+        work_minutes = (
+            minutes(Schedule.end_time) - minutes(Schedule.start_time)
+            - func.coalesce(Role.break_minutes, 0)
+        )
+        result = await self.db.execute(
+            select(
+                func.coalesce(func.sum(work_minutes), 0),
+                func.coalesce(func.sum(work_minutes).filter(Schedule.date == target_date), 0)
+            )
+            .outerjoin(Role, Role.id == Schedule.role_id)
+            .filter(
+                Schedule.employee_id == employee_id,
+                Schedule.date >= week_start,
+                Schedule.date <= week_end,
+                Schedule.status.in_(WORK_STATUSES),
+                Schedule.start_time.isnot(None),
+                Schedule.end_time.isnot(None)
+            )
+        )
+        week_minutes, day_minutes = result.one()
+        existing_hours = week_minutes / 60
+        existing_hours_today = day_minutes / 60
+        return existing_hours, existing_hours_today
+
+    async def get_week_coverage(self, employee_id: int, target_date: date) -> Tuple[int, int]:
+        """(weekday coverage, weekend regular shifts) for the week of target_date"""
+        return await count_week_coverage(self.db, employee_id, target_date)
+
+    async def validate_weekly_shifts(self, employee_id: int, target_date: date) -> Tuple[bool, str]:
+        """5-shifts-per-week rule with holiday awareness"""
+        weekday_coverage, weekend_regular_shifts = await self.get_week_coverage(employee_id, target_date)
+        return check_weekly_shift_limit(target_date, weekday_coverage, weekend_regular_shifts)
+
+    def add_schedule(self, row: Dict):
+        """Add a generated schedule row to the session (seen by later checks via autoflush)"""
+        self.db.add(Schedule(**row))
+
+    async def write_new_schedules(self) -> int:
+        """Rows were added to the session one by one; the caller's commit writes them"""
+        return 0
+
+
+class PreloadedScheduleContext(ScheduleContext):
+    """
+    In-memory context for a department and date range.
+
+    Loads everything the generator needs up front:
+    - approved leaves overlapping the range
+    - approved comp-offs inside the range
+    - every schedule of the department's employees in the surrounding weeks
+    - full work history of employees with comp-off days (shift time fallback)
+    - break minutes of every role referenced by those schedules
+    - unavailability dates (used by the CP-SAT engine)
+    """
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(db)
+        self.leaves_by_employee: Dict[int, List[LeaveRequest]] = defaultdict(list)
+        self.comp_offs: Dict[Tuple[int, date], CompOffRequest] = {}
+        self.schedules_by_employee: Dict[int, Dict[date, List[Dict]]] = defaultdict(lambda: defaultdict(list))
+        self.history_by_employee: Dict[int, List[Dict]] = defaultdict(list)
+        self.role_breaks: Dict[int, int] = {}
+        self.unavailable_dates: Dict[int, set] = defaultdict(set)
+        self.new_rows: List[Dict] = []
+        self._leave_cache: Dict[Tuple[int, date], Optional[LeaveRequest]] = {}
+
+    @classmethod
+    async def load(
+        cls,
+        db: AsyncSession,
+        employee_ids: List[int],
+        roles: List[Role],
+        start_date: date,
+        end_date: date
+    ) -> "PreloadedScheduleContext":
+        """Build the context with a handful of set-based queries"""
+        ctx = cls(db)
+        ctx.role_breaks = {role.id: role.break_minutes for role in roles}
+        if not employee_ids:
+            return ctx
+
+        window_start, _ = get_week_bounds(start_date)
+        _, window_end = get_week_bounds(end_date)
+
+        leave_result = await db.execute(
+            select(LeaveRequest)
+            .filter(
+                LeaveRequest.employee_id.in_(employee_ids),
+                LeaveRequest.start_date <= end_date,
+                LeaveRequest.end_date >= start_date,
+                LeaveRequest.status == LeaveStatus.APPROVED
+            )
+            .order_by(LeaveRequest.id)
+        )
+        for leave in leave_result.scalars().all():
+            ctx.leaves_by_employee[leave.employee_id].append(leave)
+
+        comp_off_result = await db.execute(
+            select(CompOffRequest)
+            .filter(
+                CompOffRequest.employee_id.in_(employee_ids),
+                CompOffRequest.comp_off_date >= start_date,
+                CompOffRequest.comp_off_date <= end_date,
+                CompOffRequest.status == LeaveStatus.APPROVED
+            )
+            .order_by(CompOffRequest.id)
+        )
+        for comp_off in comp_off_result.scalars().all():
+            ctx.comp_offs.setdefault((comp_off.employee_id, comp_off.comp_off_date), comp_off)
+
+        schedule_columns = (
+            Schedule.id, Schedule.employee_id, Schedule.role_id, Schedule.shift_id, Schedule.date,
+            Schedule.start_time, Schedule.end_time, Schedule.status
+        )
+        schedule_result = await db.execute(
+            select(*schedule_columns)
+            .filter(
+                Schedule.employee_id.in_(employee_ids),
+                Schedule.date >= window_start,
+                Schedule.date <= window_end
+            )
+            .order_by(Schedule.date, Schedule.id)
+        )
+        for row in schedule_result.all():
+            ctx._index(dict(row._mapping))
+
+        unavailability_result = await db.execute(
+            select(Unavailability.employee_id, Unavailability.date)
+            .filter(
+                Unavailability.employee_id.in_(employee_ids),
+                Unavailability.date >= start_date,
+                Unavailability.date <= end_date
+            )
+        )
+        for employee_id, unavailable_date in unavailability_result.all():
+            ctx.unavailable_dates[employee_id].add(unavailable_date)
+
+        # Comp-off earned days fall back to the latest same-weekday shift at any date
+        comp_off_employee_ids = sorted({emp_id for emp_id, _ in ctx.comp_offs})
+        if comp_off_employee_ids:
+            history_result = await db.execute(
+                select(*schedule_columns)
+                .filter(
+                    Schedule.employee_id.in_(comp_off_employee_ids),
+                    Schedule.status.in_(WORK_STATUSES),
+                    or_(Schedule.date < window_start, Schedule.date > window_end)
+                )
+                .order_by(Schedule.date, Schedule.id)
+            )
+            for row in history_result.all():
+                entry = dict(row._mapping)
+                ctx.history_by_employee[entry['employee_id']].append(entry)
+
+        # Schedules may reference roles outside the department (transfers)
+        role_ids = {
+            entry['role_id']
+            for days in ctx.schedules_by_employee.values()
+            for entries in days.values()
+            for entry in entries
+        } - set(ctx.role_breaks)
+        if role_ids:
+            role_result = await db.execute(
+                select(Role.id, Role.break_minutes).filter(Role.id.in_(role_ids))
+            )
+            ctx.role_breaks.update({role_id: break_minutes for role_id, break_minutes in role_result.all()})
+
+        return ctx
+
+    def _index(self, entry: Dict):
+        self.schedules_by_employee[entry['employee_id']][entry['date']].append(entry)
+
+    def forget_schedule(self, entry: Dict):
+        """Drop a loaded schedule so the checks treat its slot as free"""
+        self.schedules_by_employee[entry['employee_id']][entry['date']].remove(entry)
+
+    def _week_entries(self, employee_id: int, target_date: date, statuses) -> List[Dict]:
+        week_start, _ = get_week_bounds(target_date)
+        days = self.schedules_by_employee.get(employee_id)
+        if not days:
+            return []
+        entries = []
+        for offset in range(7):
+            for entry in days.get(week_start + timedelta(days=offset), ()):
+                if entry['status'] in statuses:
+                    entries.append(entry)
+        return entries
+
+    async def get_approved_leave(self, employee_id: int, target_date: date) -> Optional[LeaveRequest]:
+        key = (employee_id, target_date)
+        if key not in self._leave_cache:
+            self._leave_cache[key] = next(
+                (leave for leave in self.leaves_by_employee.get(employee_id, ())
+                 if leave.start_date <= target_date <= leave.end_date),
+                None
+            )
+        return self._leave_cache[key]
+
+    async def get_approved_comp_off(self, employee_id: int, target_date: date) -> Optional[CompOffRequest]:
+        return self.comp_offs.get((employee_id, target_date))
+
+    async def has_schedule_on(self, employee_id: int, target_date: date) -> bool:
+        days = self.schedules_by_employee.get(employee_id)
+        return bool(days and days.get(target_date))
+
+    async def get_comp_off_shift_times(self, employee_id: int, target_date: date) -> Tuple[str, str]:
+        week_entries = [
+            entry for entry in self._week_entries(employee_id, target_date, WORK_STATUSES)
+            if entry['date'] != target_date
+        ]
+        week_sched = week_entries[0] if week_entries else None
+        if week_sched and week_sched['start_time'] and week_sched['end_time']:
+            return week_sched['start_time'], week_sched['end_time']
+
+        # Fallback to same day of week from previous weeks
+        same_day_sched = None
+        candidates = list(self.history_by_employee.get(employee_id, ()))
+        for entries in self.schedules_by_employee.get(employee_id, {}).values():
+            candidates.extend(entries)
+        for entry in candidates:
+            if entry['status'] not in WORK_STATUSES or entry['date'].weekday() != target_date.weekday():
+                continue
+            if same_day_sched is None or entry['date'] > same_day_sched['date']:
+                same_day_sched = entry
+        if same_day_sched and same_day_sched['start_time'] and same_day_sched['end_time']:
+            return same_day_sched['start_time'], same_day_sched['end_time']
+
+        # Default fallback
+        return "00:00", "23:59"
+
+    async def get_week_work_dates(self, employee_id: int, target_date: date) -> List[date]:
+        return [entry['date'] for entry in self._week_entries(employee_id, target_date, WORK_STATUSES)]
+
+    async def get_week_hours(self, employee_id: int, target_date: date) -> Tuple[float, float]:
+        existing_hours = 0
+        existing_hours_today = 0
+        for entry in self._week_entries(employee_id, target_date, WORK_STATUSES):
+            break_minutes = self.role_breaks.get(entry['role_id'], 0)
+            work_hours = schedule_work_hours(entry['start_time'], entry['end_time'], break_minutes)
+            if work_hours is None:
+                continue
+            existing_hours += work_hours
+            if entry['date'] == target_date:
+                existing_hours_today += work_hours
+        return existing_hours, existing_hours_today
+
+    async def get_week_coverage(self, employee_id: int, target_date: date) -> Tuple[int, int]:
+        weekday_coverage = 0
+        weekend_regular_shifts = 0
+        for entry in self._week_entries(employee_id, target_date, WEEKDAY_COVERAGE_STATUSES):
+            if entry['date'].weekday() < 5:
+                weekday_coverage += 1
+            elif entry['status'] in WEEKEND_REGULAR_STATUSES:
+                weekend_regular_shifts += 1
+        return weekday_coverage, weekend_regular_shifts
+
+    def add_schedule(self, row: Dict):
+        """Index a generated row for later checks and keep it for the bulk insert"""
+        self.new_rows.append(row)
+        self._index(row)
+
+    async def write_new_schedules(self) -> int:
+        """Write every generated row in one set-based insert (no commit)"""
+        return await bulk_insert_schedules(self.db, self.new_rows)
+
+
+async def build_leave_schedule_row(
+    ctx: ScheduleContext,
+    department_id: int,
+    employee_id: int,
+    shift,
+    target_date: date,
+    leave_request: Optional[LeaveRequest],
+    comp_off_request: Optional[CompOffRequest]
+) -> Dict:
+    """Schedule row marking an approved leave or comp-off day on a shift"""
+    if comp_off_request:
+        # This is a comp-off earned day (employee worked, earned comp-off)
+        # Get the correct shift time for this employee
+        leave_status = 'comp_off_earned'
+        start_time, end_time = await ctx.get_comp_off_shift_times(employee_id, target_date)
+        leave_notes = f"Comp-Off Earned: {comp_off_request.reason or 'Worked on non-shift day'}"
+    elif leave_request.leave_type == 'comp_off':
+        # This is using comp-off (taking the earned comp-off) - no shift times, full day off
+        leave_status = 'comp_off_taken'
+        start_time = None  # No shift time for comp-off usage
+        end_time = None
+        leave_notes = f"Comp-Off Taken: {leave_request.reason or 'Using earned comp-off'}"
+    elif leave_request.duration_type == 'half_day_morning':
+        leave_status = 'leave_half_morning'
+        # Use shift's start time to 12:00 for morning leave
+        start_time = shift.start_time
+        end_time = "12:00"
+        leave_notes = f"Half Day Leave (Morning) - {leave_request.leave_type}"
+    elif leave_request.duration_type == 'half_day_afternoon':
+        leave_status = 'leave_half_afternoon'
+        # Use 12:00 to shift's end time for afternoon leave
+        start_time = "12:00"
+        end_time = shift.end_time
+        leave_notes = f"Half Day Leave (Afternoon) - {leave_request.leave_type}"
+    else:
+        # Full day leave - use the actual shift times
+        leave_status = 'leave'
+        start_time = shift.start_time
+        end_time = shift.end_time
+        leave_notes = f"Full Day Leave - {leave_request.leave_type}"
+
+    return build_schedule_row(
+        department_id, employee_id, shift.role_id, shift.id, target_date,
+        start_time, end_time, status=leave_status, notes=leave_notes
+    )
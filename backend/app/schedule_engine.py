@@ -0,0 +1,645 @@
+"""
+CP-SAT Schedule Engine
+
+Schedule generation engines working on a ScheduleContext:
+- greedy: day-by-day assignment (generate_greedy)
+- cpsat: feeds ShiftSchedulerV5 (app/scheduler.py) from a
+  PreloadedScheduleContext and turns the solution back into schedule rows
+
+CP-SAT constraints (same rules as the greedy generator):
+- one shift per employee per day, none on days that already have a schedule
+- no shifts on Japanese public holidays
+- max_emp per shift per day (hard), min_emp (soft, reported as warnings)
+- max 5 consecutive working days within the week
+- weekly hours (break time excluded) and daily max hours
+- 5-shifts-per-week rule with holiday awareness
+
+Solves run in a process pool so the CPU-bound search never blocks the
+event loop; payloads and results cross the process boundary as plain dicts.
+A SolverRun tracks the solves of one generation: cancelling it drops the
+ones still queued and stops the running searches through a shared event.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.models import Schedule
+from app.holidays_jp import jp_calendar, is_japanese_holiday, get_japanese_holiday_name
+from app.schedule_context import (
+    ScheduleContext, PreloadedScheduleContext, build_leave_schedule_row, get_week_bounds,
+    max_consecutive_days, schedule_work_hours
+)
+from app.schedule_writer import build_schedule_row
+from app.scheduler import solve_department_schedule
+
+
+_solver_pool: Optional[ProcessPoolExecutor] = None
+_solver_manager = None
+
+
+def get_solver_pool_size() -> int:
+    """Configured pool size, defaulting to one process per core"""
+    return settings.SCHEDULER_PROCESS_POOL_SIZE or os.cpu_count() or 1
+
+
+def get_solver_pool() -> ProcessPoolExecutor:
+    """Shared process pool for CP-SAT solves (created on first use)"""
+    global _solver_pool
+    if _solver_pool is None:
+        # spawn: OR-Tools and the event loop's threads don't survive fork
+        _solver_pool = ProcessPoolExecutor(
+            max_workers=get_solver_pool_size(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _solver_pool
+
+
+def get_solver_manager():
+    """Manager process holding the stop events shared with the pool (created on first use)"""
+    global _solver_manager
+    if _solver_manager is None:
+        _solver_manager = multiprocessing.get_context("spawn").Manager()
+    return _solver_manager
+
+
+def shutdown_solver_pool():
+    """Stop worker processes (application shutdown)"""
+    global _solver_pool, _solver_manager
+    if _solver_pool is not None:
+        _solver_pool.shutdown(wait=False, cancel_futures=True)
+        _solver_pool = None
+    if _solver_manager is not None:
+        _solver_manager.shutdown()
+        _solver_manager = None
+
+
+class SolverRun:
+    """The CP-SAT solves submitted for one generation"""
+
+    def __init__(self):
+        self.futures: List[Future] = []
+        self.stop_event = None  # manager Event, polled by the running searches
+        self.cancelled = False
+
+    async def solve(self, payload: Dict) -> Dict:
+        """Run solve_department_schedule in the process pool without blocking the loop"""
+        if self.cancelled:
+            raise asyncio.CancelledError()
+        if self.stop_event is None:
+            self.stop_event = get_solver_manager().Event()
+        future = get_solver_pool().submit(solve_department_schedule, payload, self.stop_event)
+        self.futures.append(future)
+        return await asyncio.wrap_future(future)
+
+    def cancel(self):
+        """Drop queued solves and stop the running ones (they return within a poll interval)"""
+        if self.cancelled:
+            return
+        self.cancelled = True
+        for future in self.futures:
+            future.cancel()
+        if self.stop_event is not None and any(not future.done() for future in self.futures):
+            self.stop_event.set()
+
+    @property
+    def running(self) -> int:
+        return sum(1 for future in self.futures if future.running())
+
+
+WEEK_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def normalize_schedule_config(shift):
+    """
+    Fill in shift.schedule_config in place before generation.
+    For backward compatibility:
+    - If shift has NO schedule_config or empty, assume ALL days are enabled
+    - If shift has schedule_config, missing/malformed days are disabled
+    """
+    if not shift.schedule_config or not isinstance(shift.schedule_config, dict) or len(shift.schedule_config) == 0:
+        # Old shift without schedule_config - enable all days for backward compatibility
+        shift.schedule_config = {day: {'enabled': True} for day in WEEK_DAYS}
+        return
+    for day in WEEK_DAYS:
+        if day not in shift.schedule_config or not isinstance(shift.schedule_config[day], dict):
+            # Missing day or malformed - fix it
+            shift.schedule_config[day] = {'enabled': False}
+        elif 'enabled' not in shift.schedule_config[day]:
+            # Missing 'enabled' key - add it
+            shift.schedule_config[day]['enabled'] = False
+
+
+def is_shift_enabled_on(shift, day_name: str) -> bool:
+    """True if the shift's schedule_config enables it on day_name ('Monday', ...)"""
+    config = shift.schedule_config
+    if not config or not isinstance(config, dict):
+        return False
+    day_config = config.get(day_name, {})
+    return day_config.get('enabled', False) if isinstance(day_config, dict) else False
+
+
+def shift_total_hours(shift) -> float:
+    """Shift length in hours, breaks included"""
+    return schedule_work_hours(shift.start_time, shift.end_time, 0)
+
+
+async def add_leave_schedules(
+    ctx: PreloadedScheduleContext,
+    department_id: int,
+    shifts: List,
+    employees: List,
+    start_date: date,
+    end_date: date
+) -> int:
+    """
+    Create leave/comp-off schedule rows for approved requests, walking
+    dates/shifts/employees in the same order as the greedy generator.
+    Returns number of rows added.
+    """
+    created = 0
+    current_date = start_date
+    while current_date <= end_date:
+        if is_japanese_holiday(current_date):
+            current_date += timedelta(days=1)
+            continue
+        day_name = current_date.strftime('%A')
+        for shift in shifts:
+            if not is_shift_enabled_on(shift, day_name):
+                continue
+            for emp in employees:
+                if emp.role_id is not None and emp.role_id != shift.role_id:
+                    continue
+                leave_request = await ctx.get_approved_leave(emp.id, current_date)
+                comp_off_request = await ctx.get_approved_comp_off(emp.id, current_date)
+                if not (leave_request or comp_off_request):
+                    continue
+                if await ctx.has_schedule_on(emp.id, current_date):
+                    continue
+                ctx.add_schedule(await build_leave_schedule_row(
+                    ctx, department_id, emp.id, shift, current_date,
+                    leave_request, comp_off_request
+                ))
+                created += 1
+        current_date += timedelta(days=1)
+    return created
+
+
+async def generate_greedy(
+    ctx: ScheduleContext,
+    department_id: int,
+    roles: List,
+    shifts: List,
+    eligible_for_shift: Dict[int, List],
+    start_date: date,
+    end_date: date,
+    feedback: List[str],
+    overtime_warnings: List[Dict],
+    progress=None,
+    scope: Optional[Dict[int, Set[date]]] = None,
+    occupancy: Optional[Dict[Tuple[int, date], int]] = None
+) -> int:
+    """
+    Day-by-day greedy assignment (the default engine). Appends min-staffing
+    warnings to feedback and >9h days to overtime_warnings.
+
+    scope ({employee_id: dates}) limits assignment to those employee-days and
+    occupancy ({(shift_id, date): count}) seeds each shift with the
+    assignments kept from other employees (incremental regeneration).
+    Returns number of rows added.
+    """
+    schedules_created = 0
+    total_days = (end_date - start_date).days + 1
+    scope_dates = set().union(*scope.values()) if scope is not None else None
+
+    # Create schedules
+    current_date = start_date
+    while current_date <= end_date:
+        day_name = current_date.strftime('%A')  # e.g., 'Monday', 'Sunday'
+        if progress:
+            progress.set_phase("assigning", 10 + 80 * (current_date - start_date).days / total_days)
+            await asyncio.sleep(0)  # let status polls and cancellation through
+
+        if scope_dates is not None and current_date not in scope_dates:
+            current_date += timedelta(days=1)
+            continue
+    
+        # ===== SKIP PUBLIC HOLIDAYS - Don't assign shifts on holidays =====
+        if is_japanese_holiday(current_date):
+            holiday_name = get_japanese_holiday_name(current_date)
+            print(f"[DEBUG] Skipping {current_date} ({day_name}) - Public Holiday: {holiday_name}", flush=True)
+            current_date += timedelta(days=1)
+            continue
+
+        for shift in shifts:
+            # Check if shift operates on this day
+            role = next((r for r in roles if r.id == shift.role_id), None)
+        
+            # Determine if this shift should run on this day
+            should_skip = False
+        
+            if shift.schedule_config and isinstance(shift.schedule_config, dict):
+                # Shift has a schedule_config with day configuration
+                day_config = shift.schedule_config.get(day_name, {})
+                is_day_enabled = day_config.get('enabled', False) if isinstance(day_config, dict) else False
+            
+                if not is_day_enabled:
+                    should_skip = True
+                    print(f"[DEBUG] ✗ Shift {shift.id} ({shift.name}) - Day {day_name} is disabled, skipping", flush=True)
+                else:
+                    print(f"[DEBUG] ✓ Shift {shift.id} ({shift.name}) - Day {day_name} is ENABLED, processing", flush=True)
+            else:
+                # No schedule_config or invalid format - skip to prevent unintended assignments
+                should_skip = True
+                print(f"[DEBUG] ✗ Shift {shift.id} ({shift.name}) - No valid schedule_config, skipping {day_name}", flush=True)
+
+            if should_skip:
+                continue
+
+            # Assign employees to this shift on this day
+            # Only consider employees who are eligible for this shift
+            assigned_count = occupancy.get((shift.id, current_date), 0) if occupancy is not None else 0
+        
+            for emp in eligible_for_shift[shift.id]:
+                if scope is not None and current_date not in scope.get(emp.id, ()):
+                    continue
+
+                # Check leave - if employee is on approved leave, mark them as leave (not shift)
+                leave_request = await ctx.get_approved_leave(emp.id, current_date)
+
+                # Also check for approved comp-off requests
+                comp_off_request = await ctx.get_approved_comp_off(emp.id, current_date)
+            
+                if leave_request or comp_off_request:
+                    # Employee is on approved leave or comp-off - create appropriate schedule entry
+                    if not await ctx.has_schedule_on(emp.id, current_date):
+                        leave_row = await build_leave_schedule_row(
+                            ctx, department_id, emp.id, shift, current_date,
+                            leave_request, comp_off_request
+                        )
+                        leave_type_desc = 'comp-off' if comp_off_request else leave_request.leave_type
+                        print(f"[DEBUG] ✓ {emp.first_name} is on approved {leave_type_desc} on {current_date}, creating {leave_row['status']} schedule", flush=True)
+                        ctx.add_schedule(leave_row)
+                        schedules_created += 1
+                    else:
+                        print(f"[DEBUG] ✗ {emp.first_name} already has a schedule entry on {current_date}, skipping leave creation", flush=True)
+                    continue  # Don't assign shift for leave/comp-off day
+            
+                # CRITICAL: Check if employee already has a shift on this day (NO DOUBLE SHIFTS)
+                if await ctx.has_schedule_on(emp.id, current_date):
+                    print(f"[DEBUG] ✗ {emp.first_name} already has a shift on {current_date}, skipping (NO DOUBLE SHIFTS)", flush=True)
+                    continue  # Skip if employee already has a shift today
+            
+                print(f"[DEBUG] Checking {emp.first_name} ({emp.id}) for shift {shift.id} ({shift.name}) on {current_date}", flush=True)
+            
+                # Check 5 consecutive shifts limit
+                # NOTE: Leave days are not counted as "shifts" for the consecutive limit
+                week_dates = await ctx.get_week_work_dates(emp.id, current_date)
+                if current_date not in week_dates:
+                    week_dates.append(current_date)
+            
+                week_dates.sort()
+                max_consecutive = max_consecutive_days(week_dates)
+            
+                if max_consecutive > 5:
+                    print(f"[DEBUG] ✗ {emp.first_name} would have {max_consecutive} consecutive shifts, skipping (MAX 5 consecutive)", flush=True)
+                    continue  # Skip if would exceed 5 consecutive shifts
+
+                # Existing work hours for the week and the day, subtracting break time
+                # NOTE: Leave days don't add to hour count, but they fulfill part of weekly requirement
+                existing_hours, existing_hours_today = await ctx.get_week_hours(emp.id, current_date)
+
+                # Calculate shift hours (total time) and work hours (minus breaks)
+                shift_start = datetime.strptime(shift.start_time, '%H:%M')
+                shift_end = datetime.strptime(shift.end_time, '%H:%M')
+                total_shift_hours = (shift_end - shift_start).total_seconds() / 3600
+
+                # Subtract break time from role
+                break_hours = (role.break_minutes or 0) / 60
+                work_hours = total_shift_hours - break_hours
+
+                # Check both weekly and daily limits using work hours (excluding breaks)
+                daily_max = emp.daily_max_hours or 8
+                print(f"[DEBUG] {emp.first_name}: weekly {existing_hours:.1f}+{work_hours:.1f}<={emp.weekly_hours}, daily {existing_hours_today:.1f}+{work_hours:.1f}<={daily_max}", flush=True)
+
+                # ===== Check for overtime (> 9 hours total in a day) =====
+                daily_total_with_shift = existing_hours_today + total_shift_hours
+                has_overtime = daily_total_with_shift > 9
+            
+                if has_overtime:
+                    overtime_warnings.append({
+                        'employee_id': emp.id,
+                        'employee_name': f"{emp.first_name} {emp.last_name}",
+                        'date': current_date.isoformat(),
+                        'shift_hours': total_shift_hours,
+                        'existing_daily_hours': existing_hours_today,
+                        'total_daily_hours': daily_total_with_shift,
+                        'total_weekly_hours': existing_hours + work_hours,
+                        'message': f"Total {daily_total_with_shift:.1f}h on {current_date} (includes {total_shift_hours}h shift)"
+                    })
+                    print(f"[DEBUG] ⚠️  OVERTIME: {emp.first_name} would work {daily_total_with_shift:.1f} hours on {current_date}", flush=True)
+
+                if (existing_hours + work_hours <= emp.weekly_hours and
+                    existing_hours_today + work_hours <= daily_max):
+                
+                    # ===== NEW: Check 5-shifts-per-week limit with holiday awareness =====
+                    is_valid_shifts, shifts_error = await ctx.validate_weekly_shifts(emp.id, current_date)
+                    if not is_valid_shifts:
+                        print(f"[DEBUG] ✗ {emp.first_name} failed 5-shifts validation on {current_date}: {shifts_error}", flush=True)
+                        continue  # Skip this employee for this shift due to weekly shift limit
+                
+                    # Incremental runs start from the shift's kept assignments
+                    if occupancy is not None and assigned_count >= shift.max_emp:
+                        continue
+
+                    print(f"[DEBUG] ✓ Creating schedule for {emp.first_name} on {current_date}", flush=True)
+                    # Create schedule
+                    ctx.add_schedule(build_schedule_row(
+                        department_id, emp.id, shift.role_id, shift.id, current_date,
+                        shift.start_time, shift.end_time, status="scheduled"
+                    ))
+                    schedules_created += 1
+                    assigned_count += 1
+                
+                    if assigned_count >= shift.max_emp:
+                        break  # Max employees for this shift on this day
+                else:
+                    print(f"[DEBUG] ✗ {emp.first_name} failed hours check on {current_date}", flush=True)
+
+            # Ensure minimum employees are assigned
+            if assigned_count < shift.min_emp:
+                feedback.append(f"Warning: {shift.name} on {current_date} has {assigned_count} employees (min: {shift.min_emp})")
+
+        current_date += timedelta(days=1)
+
+    return schedules_created
+
+
+async def load_previous_assignments(
+    ctx: ScheduleContext,
+    employee_ids: List[int],
+    start_date: date
+) -> Dict[int, Dict[int, int]]:
+    """
+    Work shifts of the 7 days before start_date as
+    {employee_id: {weekday index (Monday=0): shift_id}} - the CP-SAT warm start
+    """
+    result = await ctx.db.execute(
+        select(Schedule.employee_id, Schedule.date, Schedule.shift_id)
+        .filter(
+            Schedule.employee_id.in_(employee_ids),
+            Schedule.date >= start_date - timedelta(days=7),
+            Schedule.date < start_date,
+            Schedule.status == 'scheduled',
+            Schedule.shift_id != None
+        )
+        .order_by(Schedule.date, Schedule.id)
+    )
+    return weekday_hints(result.all())
+
+
+def weekday_hints(assignments) -> Dict[int, Dict[int, int]]:
+    """
+    (employee_id, date, shift_id) in date order ->
+    {employee_id: {weekday index (Monday=0): first shift_id that weekday}}
+    """
+    hints = defaultdict(dict)
+    for employee_id, schedule_date, shift_id in assignments:
+        hints[employee_id].setdefault(schedule_date.weekday(), shift_id)
+    return dict(hints)
+
+
+async def build_cpsat_payload(
+    ctx: PreloadedScheduleContext,
+    roles: List,
+    shifts: List,
+    employees: List,
+    start_date: date,
+    end_date: date,
+    time_limit_seconds: float,
+    num_workers: int,
+    hints: Optional[Dict[int, Dict[int, int]]] = None,
+    max_changes: Optional[int] = None
+) -> Dict:
+    """Plain-dict input for solve_department_schedule (see app/scheduler.py)"""
+    role_breaks = {role.id: role.break_minutes for role in roles}
+    role_shifts = defaultdict(list)
+    for shift in shifts:
+        work_hours = schedule_work_hours(shift.start_time, shift.end_time, role_breaks.get(shift.role_id))
+        role_shifts[shift.role_id].append({
+            'id': shift.id,
+            'name': shift.name,
+            'role_id': shift.role_id,
+            'start_time': shift.start_time,
+            'end_time': shift.end_time,
+            'min_emp': shift.min_emp or 0,
+            'max_emp': shift.max_emp if shift.max_emp is not None else 10,
+            'schedule_config': shift.schedule_config or {},
+            'work_minutes': round(work_hours * 60) if work_hours is not None else None
+        })
+
+    weeks = []
+    week_start, _ = get_week_bounds(start_date)
+    while week_start <= end_date:
+        week_days = [week_start + timedelta(days=i) for i in range(7)]
+        required_shifts = jp_calendar.get_shifts_required_for_week(week_start)
+        week = {
+            'week_dates': [d.isoformat() for d in week_days],
+            'closed_dates': [
+                d.isoformat() for d in week_days
+                if d < start_date or d > end_date or is_japanese_holiday(d)
+            ],
+            'leave_requests': {},
+            'unavailability': {},
+            'existing_work_dates': {},
+            'max_new_shifts': {},
+            'available_minutes': {}
+        }
+        for emp in employees:
+            for d in week_days:
+                key = f"{emp.id}-{d.isoformat()}"
+                if await ctx.get_approved_leave(emp.id, d):
+                    week['leave_requests'][key] = True
+                if await ctx.has_schedule_on(emp.id, d) or d in ctx.unavailable_dates.get(emp.id, ()):
+                    week['unavailability'][key] = True
+            work_dates = await ctx.get_week_work_dates(emp.id, week_start)
+            week['existing_work_dates'][emp.id] = [d.isoformat() for d in work_dates]
+            weekday_coverage, weekend_regular_shifts = await ctx.get_week_coverage(emp.id, week_start)
+            week['max_new_shifts'][emp.id] = max(0, required_shifts - weekday_coverage - weekend_regular_shifts)
+            existing_hours, _ = await ctx.get_week_hours(emp.id, week_start)
+            week['available_minutes'][emp.id] = round(((emp.weekly_hours or 0) - existing_hours) * 60)
+        weeks.append(week)
+        week_start += timedelta(days=7)
+
+    return {
+        'employees': [
+            {
+                'id': emp.id,
+                'name': f"{emp.first_name} {emp.last_name}",
+                'role_id': emp.role_id,
+                'weekly_hours': emp.weekly_hours or 0,
+                'daily_max_hours': emp.daily_max_hours or 8,
+                'shifts_per_week': emp.shifts_per_week if emp.shifts_per_week is not None else 5
+            }
+            for emp in employees
+        ],
+        'roles': [{'id': role.id, 'name': role.name} for role in roles],
+        'role_shifts': dict(role_shifts),
+        'weeks': weeks,
+        'time_limit_seconds': time_limit_seconds,
+        'num_workers': num_workers,
+        'hints': hints or {},
+        'max_changes': max_changes
+    }
+
+
+async def apply_cpsat_result(
+    ctx: PreloadedScheduleContext,
+    department_id: int,
+    shifts: List,
+    employees: List,
+    start_date: date,
+    end_date: date,
+    result: Dict
+) -> Tuple[int, List[str], List[Dict]]:
+    """
+    Add solved assignments (in date order) to the context as 'scheduled'
+    rows. Overtime warnings use the day and week hours already in the
+    context, like generate_greedy.
+    Returns (schedules_created, feedback, overtime_warnings).
+    """
+    shifts_by_id = {shift.id: shift for shift in shifts}
+    employees_by_id = {emp.id: emp for emp in employees}
+    feedback = list(result.get('errors', []))
+    overtime_warnings = []
+    assigned = defaultdict(int)
+    created = 0
+
+    for assignment in result['assignments']:
+        shift = shifts_by_id[assignment['shift_id']]
+        emp = employees_by_id[assignment['employee_id']]
+        target_date = date.fromisoformat(assignment['date'])
+
+        # ===== Check for overtime (> 9 hours total in a day) =====
+        total_shift_hours = shift_total_hours(shift)
+        if total_shift_hours is not None:
+            existing_hours, existing_hours_today = await ctx.get_week_hours(emp.id, target_date)
+            work_hours = total_shift_hours - (ctx.role_breaks.get(shift.role_id) or 0) / 60
+            daily_total_with_shift = existing_hours_today + total_shift_hours
+            if daily_total_with_shift > 9:
+                overtime_warnings.append({
+                    'employee_id': emp.id,
+                    'employee_name': f"{emp.first_name} {emp.last_name}",
+                    'date': target_date.isoformat(),
+                    'shift_hours': total_shift_hours,
+                    'existing_daily_hours': existing_hours_today,
+                    'total_daily_hours': daily_total_with_shift,
+                    'total_weekly_hours': existing_hours + work_hours,
+                    'message': f"Total {daily_total_with_shift:.1f}h on {target_date} (includes {total_shift_hours}h shift)"
+                })
+
+        ctx.add_schedule(build_schedule_row(
+            department_id, emp.id, shift.role_id, shift.id, target_date,
+            shift.start_time, shift.end_time, status="scheduled"
+        ))
+        assigned[(shift.id, target_date)] += 1
+        created += 1
+
+    # Ensure minimum employees are assigned
+    current_date = start_date
+    while current_date <= end_date:
+        if not is_japanese_holiday(current_date):
+            day_name = current_date.strftime('%A')
+            for shift in shifts:
+                if not is_shift_enabled_on(shift, day_name):
+                    continue
+                assigned_count = assigned[(shift.id, current_date)]
+                if assigned_count < shift.min_emp:
+                    feedback.append(f"Warning: {shift.name} on {current_date} has {assigned_count} employees (min: {shift.min_emp})")
+        current_date += timedelta(days=1)
+
+    return created, feedback, overtime_warnings
+
+
+async def generate_with_cpsat(
+    ctx: PreloadedScheduleContext,
+    department_id: int,
+    roles: List,
+    shifts: List,
+    employees: List,
+    start_date: date,
+    end_date: date,
+    time_limit_seconds: float,
+    num_workers: int,
+    progress=None,
+    warm_start: bool = True,
+    max_changes: Optional[int] = None
+) -> Tuple[int, List[str], List[Dict]]:
+    """
+    Leave rows first, then one CP-SAT solve per calendar week in the process
+    pool; rows are added back to the context on the event loop. progress
+    (GenerationProgress) is advanced as weeks finish and holds the SolverRun,
+    so cancelling the job stops the solves; cancelling the calling task does
+    too.
+
+    warm_start hints the first week with the 7 days before start_date and
+    each later week with the solution of the week before it (by weekday and
+    shift), so the weeks are solved one after another. Without warm_start
+    they run concurrently. max_changes caps how many assignments per week may
+    differ from the hints.
+    Returns (schedules_created, feedback, overtime_warnings).
+    """
+    leave_created = await add_leave_schedules(ctx, department_id, shifts, employees, start_date, end_date)
+    hints = None
+    if warm_start:
+        hints = await load_previous_assignments(ctx, [emp.id for emp in employees], start_date)
+        print(f"[DEBUG] CP-SAT warm start from {len(hints)} employees' previous assignments", flush=True)
+    payload = await build_cpsat_payload(
+        ctx, roles, shifts, employees, start_date, end_date, time_limit_seconds, num_workers,
+        hints=hints, max_changes=max_changes
+    )
+
+    result = {'assignments': [], 'feedback': [], 'errors': []}
+    solver_run = SolverRun()
+    if progress:
+        progress.solver_run = solver_run
+
+    def add_week(done: int, week_result: Dict):
+        for key in result:
+            result[key].extend(week_result[key])
+        if progress:
+            progress.set_phase("solving", 10 + 80 * done / len(payload['weeks']))
+
+    try:
+        if warm_start:
+            # Each week starts from the one solved before it
+            for done, week in enumerate(payload['weeks'], start=1):
+                week_result = await solver_run.solve({**payload, 'weeks': [week], 'hints': hints})
+                add_week(done, week_result)
+                hints = weekday_hints(
+                    (a['employee_id'], date.fromisoformat(a['date']), a['shift_id'])
+                    for a in sorted(week_result['assignments'], key=lambda a: a['date'])
+                )
+        else:
+            # Weeks are independent once existing schedules are in the payload
+            week_solves = [
+                solver_run.solve({**payload, 'weeks': [week]})
+                for week in payload['weeks']
+            ]
+            for done, week_solve in enumerate(asyncio.as_completed(week_solves), start=1):
+                add_week(done, await week_solve)
+    except BaseException:
+        solver_run.cancel()
+        raise
+    result['assignments'].sort(key=lambda a: (a['date'], a['employee_id']))
+    created, feedback, overtime_warnings = await apply_cpsat_result(
+        ctx, department_id, shifts, employees, start_date, end_date, result
+    )
+    return leave_created + created, feedback, overtime_warnings
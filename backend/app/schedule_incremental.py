@@ -0,0 +1,234 @@
+"""
+Incremental Schedule Regeneration
+
+Re-solves only the calendar weeks touched by a change (approved leave or
+comp-off, new unavailability) for the employees involved, using the greedy
+engine. Everything else is kept:
+- other employees and other weeks
+- leave / comp-off rows and schedules with check-in records
+- assignments that come out the same (their rows and ids are untouched)
+
+Returns a diff of added, removed and changed assignments.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Schedule, Role, Shift, Employee, CheckInOut
+from app.schedule_context import PreloadedScheduleContext, get_week_bounds
+from app.schedule_engine import generate_greedy, normalize_schedule_config
+from app.schedule_writer import delete_schedules
+
+
+def expand_to_weeks(
+    changes: Dict[int, Iterable[date]],
+    from_date: Optional[date] = None
+) -> Dict[int, Set[date]]:
+    """
+    {employee_id: changed dates} -> {employee_id: every date of the affected
+    Monday-Sunday weeks}, dropping dates before from_date
+    """
+    scope = {}
+    for employee_id, dates in changes.items():
+        week_dates = set()
+        for changed_date in dates:
+            week_start, _ = get_week_bounds(changed_date)
+            week_dates.update(week_start + timedelta(days=i) for i in range(7))
+        if from_date:
+            week_dates = {d for d in week_dates if d >= from_date}
+        if week_dates:
+            scope[employee_id] = week_dates
+    return scope
+
+
+def _diff_entry(employee_id: int, target_date: date, shift_id: Optional[int], status: str) -> Dict:
+    return {
+        'employee_id': employee_id,
+        'date': target_date.isoformat(),
+        'shift_id': shift_id,
+        'status': status
+    }
+
+
+async def regenerate_incremental(
+    db: AsyncSession,
+    department_id: int,
+    changes: Dict[int, Iterable[date]],
+    from_date: Optional[date] = None
+) -> Dict:
+    """
+    Re-solve the affected weeks of the changed employees.
+    Runs in the caller's transaction and does not commit.
+
+    Weeks without any generated work shifts in the department are left
+    alone - there is nothing to repair until the schedule is generated.
+    """
+    scope = expand_to_weeks(changes, from_date)
+    diff = {
+        'employees': [],
+        'start_date': None,
+        'end_date': None,
+        'added': [],
+        'removed': [],
+        'changed': [],
+        'unchanged': 0,
+        'feedback': [],
+        'overtime_warnings': []
+    }
+    if not scope:
+        return diff
+
+    # Only active employees of this department are re-solved
+    employees_result = await db.execute(
+        select(Employee)
+        .filter(
+            Employee.id.in_(list(scope)),
+            Employee.department_id == department_id,
+            Employee.is_active == True
+        )
+        .order_by(Employee.id)
+    )
+    employees = employees_result.scalars().all()
+    scope = {emp.id: scope[emp.id] for emp in employees}
+    if not scope:
+        return diff
+
+    start_date = min(min(dates) for dates in scope.values())
+    end_date = max(max(dates) for dates in scope.values())
+
+    generated_result = await db.execute(
+        select(Schedule.id)
+        .filter(
+            Schedule.department_id == department_id,
+            Schedule.date >= start_date,
+            Schedule.date <= end_date,
+            Schedule.status == 'scheduled'
+        )
+        .limit(1)
+    )
+    if generated_result.scalar_one_or_none() is None:
+        return diff
+
+    roles_result = await db.execute(
+        select(Role).filter(Role.department_id == department_id, Role.is_active == True)
+    )
+    roles = roles_result.scalars().all()
+    shifts_result = await db.execute(
+        select(Shift).filter(Shift.role_id.in_([r.id for r in roles]), Shift.is_active == True)
+    )
+    shifts = shifts_result.scalars().all()
+    for shift in shifts:
+        normalize_schedule_config(shift)
+
+    ctx = await PreloadedScheduleContext.load(db, list(scope), roles, start_date, end_date)
+
+    # Work shifts in scope are up for re-solving unless someone checked in on them
+    candidates = [
+        entry
+        for employee_id, dates in scope.items()
+        for target_date in dates
+        for entry in ctx.schedules_by_employee[employee_id].get(target_date, ())
+        if entry['status'] == 'scheduled'
+    ]
+    checkin_result = await db.execute(
+        select(CheckInOut.schedule_id)
+        .filter(CheckInOut.schedule_id.in_([entry['id'] for entry in candidates]))
+        .distinct()
+    )
+    schedules_with_checkins = set(checkin_result.scalars().all())
+
+    before = defaultdict(list)
+    for entry in candidates:
+        if entry['id'] in schedules_with_checkins:
+            continue
+        ctx.forget_schedule(entry)
+        before[(entry['employee_id'], entry['date'])].append(entry)
+
+    # Staffing each shift keeps from everyone else
+    occupancy_result = await db.execute(
+        select(Schedule.shift_id, Schedule.date, func.count(Schedule.id))
+        .filter(
+            Schedule.department_id == department_id,
+            Schedule.date >= start_date,
+            Schedule.date <= end_date,
+            Schedule.status == 'scheduled'
+        )
+        .group_by(Schedule.shift_id, Schedule.date)
+    )
+    occupancy = defaultdict(int)
+    for shift_id, target_date, count in occupancy_result.all():
+        occupancy[(shift_id, target_date)] = count
+    for entries in before.values():
+        for entry in entries:
+            occupancy[(entry['shift_id'], entry['date'])] -= 1
+
+    # Unavailable days are cleared but not reassigned
+    assign_scope = {
+        employee_id: dates - ctx.unavailable_dates.get(employee_id, set())
+        for employee_id, dates in scope.items()
+    }
+    eligible_for_shift = {
+        shift.id: [emp for emp in employees if emp.role_id is None or emp.role_id == shift.role_id]
+        for shift in shifts
+    }
+    await generate_greedy(
+        ctx, department_id, roles, shifts, eligible_for_shift, start_date, end_date,
+        diff['feedback'], diff['overtime_warnings'],
+        scope=assign_scope, occupancy=occupancy
+    )
+
+    # Compare per employee-day; identical assignments keep their existing rows
+    after = defaultdict(list)
+    new_rows: List[Dict] = []
+    for row in ctx.new_rows:
+        if row['status'] == 'scheduled':
+            after[(row['employee_id'], row['date'])].append(row)
+        else:
+            new_rows.append(row)
+            diff['added'].append(_diff_entry(row['employee_id'], row['date'], row['shift_id'], row['status']))
+
+    removed_ids = []
+    for key in sorted(set(before) | set(after)):
+        employee_id, target_date = key
+        old_entries, new_entries = before.get(key, []), after.get(key, [])
+        old_shifts = sorted(entry['shift_id'] or 0 for entry in old_entries)
+        new_shifts = sorted(row['shift_id'] or 0 for row in new_entries)
+        if old_shifts == new_shifts:
+            diff['unchanged'] += len(old_entries)
+            continue
+
+        removed_ids.extend(entry['id'] for entry in old_entries)
+        new_rows.extend(new_entries)
+        if old_entries and new_entries:
+            diff['changed'].append({
+                'employee_id': employee_id,
+                'date': target_date.isoformat(),
+                'from_shift_ids': [entry['shift_id'] for entry in old_entries],
+                'to_shift_ids': [row['shift_id'] for row in new_entries]
+            })
+        elif new_entries:
+            diff['added'].extend(
+                _diff_entry(employee_id, target_date, row['shift_id'], row['status']) for row in new_entries
+            )
+        else:
+            diff['removed'].extend(
+                _diff_entry(employee_id, target_date, entry['shift_id'], entry['status']) for entry in old_entries
+            )
+
+    await delete_schedules(db, removed_ids)
+    ctx.new_rows = new_rows
+    await ctx.write_new_schedules()
+
+    diff['employees'] = sorted(scope)
+    diff['start_date'] = start_date.isoformat()
+    diff['end_date'] = end_date.isoformat()
+    print(
+        f"[DEBUG] Incremental regeneration {start_date}..{end_date} for employees {diff['employees']}: "
+        f"+{len(diff['added'])} -{len(diff['removed'])} ~{len(diff['changed'])} ={diff['unchanged']}",
+        flush=True
+    )
+    return diff
@@ -0,0 +1,145 @@
+"""
+Background Schedule Generation Jobs
+
+In-process registry of schedule-generation jobs started with
+POST /schedules/jobs. Each job runs as an asyncio task on the worker that
+created it and exposes phase, percent done, the accumulated feedback /
+overtime warnings and the final result for polling.
+
+Jobs live in this process only: poll from the same worker (sticky
+sessions) when running several uvicorn workers.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+# Finished jobs are kept this long for polling
+JOB_RETENTION = timedelta(hours=1)
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class GenerationProgress:
+    """Progress sink passed to run_schedule_generation"""
+
+    def __init__(self):
+        self.phase = "queued"
+        self.percent = 0.0
+        self.feedback: List[str] = []
+        self.overtime_warnings: List[Dict] = []
+        self.solver_run = None  # SolverRun of a CP-SAT generation, stopped on cancel
+
+    def set_phase(self, phase: str, percent: float):
+        self.phase = phase
+        self.percent = round(max(self.percent, min(percent, 100.0)), 1)
+
+
+class ScheduleJob:
+    """One background generation run"""
+
+    def __init__(self, department_id: int, user_id: int, params: Dict):
+        self.id = uuid.uuid4().hex
+        self.department_id = department_id
+        self.user_id = user_id
+        self.params = params
+        self.status = JobStatus.QUEUED
+        self.progress = GenerationProgress()
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    def discard(self):
+        """Release what the job keeps besides itself (called when pruned)"""
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "department_id": self.department_id,
+            "status": self.status,
+            "phase": self.progress.phase,
+            "percent": self.progress.percent,
+            "feedback": list(self.progress.feedback),
+            "overtime_warnings": list(self.progress.overtime_warnings),
+            "solves_running": self.progress.solver_run.running if self.progress.solver_run else 0,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ScheduleJobRegistry:
+    """Holds jobs of this process and runs them as asyncio tasks"""
+
+    def __init__(self):
+        self.jobs: Dict[str, ScheduleJob] = {}
+
+    def start(
+        self,
+        job: ScheduleJob,
+        run: Callable[[GenerationProgress], Awaitable[Dict]]
+    ) -> ScheduleJob:
+        """Register job and start run(progress) in the background"""
+        self.prune()
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: ScheduleJob, run: Callable[[GenerationProgress], Awaitable[Dict]]):
+        job.status = JobStatus.RUNNING
+        try:
+            job.result = await run(job.progress)
+            job.status = JobStatus.COMPLETED
+            job.progress.set_phase("completed", 100)
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+            job.progress.phase = "cancelled"
+        except Exception as e:
+            print(f"Schedule job {job.id} failed: {str(e)}", flush=True)
+            job.status = JobStatus.FAILED
+            job.progress.phase = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+
+    def get(self, job_id: str) -> Optional[ScheduleJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job: ScheduleJob) -> bool:
+        """
+        Request cancellation; False if the job already finished.
+        Queued CP-SAT solves are dropped from the pool and running ones told
+        to stop, so the pool is free again once they return.
+        """
+        if job.is_finished or job.task is None:
+            return False
+        if job.progress.solver_run is not None:
+            job.progress.solver_run.cancel()
+        job.task.cancel()
+        return True
+
+    def prune(self):
+        """Drop finished jobs older than JOB_RETENTION"""
+        cutoff = datetime.utcnow() - JOB_RETENTION
+        for job_id in [j.id for j in self.jobs.values() if j.is_finished and j.finished_at < cutoff]:
+            self.jobs.pop(job_id).discard()
+
+
+# Global instance
+schedule_jobs = ScheduleJobRegistry()
@@ -0,0 +1,121 @@
+"""
+Bulk Schedule Writer
+
+Writes generated schedule rows in one set-based statement inside the
+caller's transaction:
+- PostgreSQL (asyncpg): COPY via copy_records_to_table
+- Other databases: a single executemany INSERT
+
+delete_schedules removes replaced work shifts the same way regeneration
+always has (comp-off requests and attendance keep their rows).
+"""
+
+from datetime import datetime, date
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Attendance, CompOffRequest, Schedule
+
+
+# Column order used for COPY records (id comes from the sequence)
+SCHEDULE_COPY_COLUMNS = (
+    'department_id', 'employee_id', 'role_id', 'shift_id', 'date',
+    'start_time', 'end_time', 'status', 'notes', 'day_priority',
+    'is_overtime', 'created_at', 'updated_at'
+)
+
+
+def build_schedule_row(
+    department_id: int,
+    employee_id: int,
+    role_id: int,
+    shift_id: Optional[int],
+    target_date: date,
+    start_time: Optional[str],
+    end_time: Optional[str],
+    status: str = 'scheduled',
+    notes: Optional[str] = None
+) -> Dict:
+    """Plain dict for one schedules row, with the model's Python-side defaults filled in"""
+    now = datetime.utcnow()
+    return {
+        'department_id': department_id,
+        'employee_id': employee_id,
+        'role_id': role_id,
+        'shift_id': shift_id,
+        'date': target_date,
+        'start_time': start_time,
+        'end_time': end_time,
+        'status': status,
+        'notes': notes,
+        'day_priority': 1,
+        'is_overtime': False,
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+async def bulk_insert_schedules(db: AsyncSession, rows: List[Dict]) -> int:
+    """
+    Insert schedule rows in one statement on the session's connection.
+    Does not commit - the caller owns the transaction.
+    Returns number of rows written.
+    """
+    if not rows:
+        return 0
+
+    # Make sure pending ORM changes (e.g. regenerate deletes) run first
+    await db.flush()
+    conn = await db.connection()
+
+    if conn.dialect.name == 'postgresql' and conn.dialect.driver == 'asyncpg':
+        raw_conn = await conn.get_raw_connection()
+        # COPY bypasses SQLAlchemy types: apply their bind processing here
+        # (start_time / end_time are stored as minutes)
+        processors = [
+            Schedule.__table__.c[col].type.bind_processor(conn.dialect) for col in SCHEDULE_COPY_COLUMNS
+        ]
+        records = [
+            tuple(
+                process(row[col]) if process else row[col]
+                for process, col in zip(processors, SCHEDULE_COPY_COLUMNS)
+            )
+            for row in rows
+        ]
+        await raw_conn.driver_connection.copy_records_to_table(
+            Schedule.__tablename__,
+            records=records,
+            columns=list(SCHEDULE_COPY_COLUMNS)
+        )
+    else:
+        await conn.execute(insert(Schedule.__table__), rows)
+
+    return len(rows)
+
+
+async def delete_schedules(db: AsyncSession, schedule_ids: List[int]) -> int:
+    """
+    Delete schedules by id, first detaching comp-off requests and attendance
+    that reference them. Does not commit. Returns number of ids given.
+    """
+    if not schedule_ids:
+        return 0
+
+    # Nullify in CompOffRequest table (preserve comp-off requests)
+    await db.execute(
+        update(CompOffRequest)
+        .where(CompOffRequest.schedule_id.in_(schedule_ids))
+        .values(schedule_id=None)
+    )
+
+    # Nullify in Attendance table (preserve attendance records but remove schedule reference)
+    await db.execute(
+        update(Attendance)
+        .where(Attendance.schedule_id.in_(schedule_ids))
+        .values(schedule_id=None)
+    )
+
+    await db.execute(delete(Schedule).where(Schedule.id.in_(schedule_ids)))
+    return len(schedule_ids)
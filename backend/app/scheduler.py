@@ -6,6 +6,7 @@ Distributes shifts based on shift type priority and day priority
 
 from ortools.sat.python import cp_model
 from collections import defaultdict
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 import math
@@ -22,13 +23,33 @@ class ShiftSchedulerV5:
     
     def __init__(self, employees: List[Dict], roles: List[Dict], 
                  role_shifts: Dict, leave_requests: Dict, 
-                 unavailability: Dict, week_dates: List[str]):
+                 unavailability: Dict, week_dates: List[str],
+                 closed_dates: Optional[set] = None,
+                 existing_work_dates: Optional[Dict[int, set]] = None,
+                 max_new_shifts: Optional[Dict[int, int]] = None,
+                 available_minutes: Optional[Dict[int, int]] = None,
+                 max_consecutive: int = 5,
+                 time_limit_seconds: float = 90.0,
+                 num_workers: int = 8,
+                 hints: Optional[Dict[int, Dict[int, int]]] = None,
+                 max_changes: Optional[int] = None,
+                 stop_event=None):
         self.employees = employees
         self.roles = roles
         self.role_shifts = role_shifts  # role_id -> [shifts]
         self.leave_requests = leave_requests  # "emp_id-date" -> True
         self.unavailability = unavailability  # "emp_id-date" -> True
         self.week_dates = week_dates
+        self.closed_dates = closed_dates or set()  # holidays / dates outside the range
+        self.existing_work_dates = existing_work_dates or {}  # emp_id -> {date} already worked this week
+        self.max_new_shifts = max_new_shifts or {}  # emp_id -> shifts still allowed this week
+        self.available_minutes = available_minutes or {}  # emp_id -> work minutes left this week
+        self.max_consecutive = max_consecutive
+        self.time_limit_seconds = time_limit_seconds
+        self.num_workers = num_workers
+        self.hints = hints or {}  # emp_id -> {weekday index: shift_id} from the previous period
+        self.max_changes = max_changes  # cap on assignments differing from the hints
+        self.stop_event = stop_event  # Event-like; once set, the search stops
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
         self.feedback = []
@@ -77,6 +98,13 @@ class ShiftSchedulerV5:
     def _is_unavailable(self, employee_id: int, date: str) -> bool:
         """Check if employee is unavailable"""
         return f"{employee_id}-{date}" in self.unavailability
+
+    def _eligible_shifts(self, employee: Dict) -> List[Dict]:
+        """Shifts of the employee's role; employees without a role can take any shift"""
+        role_id = employee.get('role_id')
+        if role_id is None:
+            return [shift for shifts in self.role_shifts.values() for shift in shifts]
+        return self.role_shifts.get(role_id, [])
     
     def generate_schedule(self) -> Tuple[Optional[Dict], Optional[str]]:
         """
@@ -140,18 +168,22 @@ class ShiftSchedulerV5:
                 assignments[emp_id][date] = {}
                 day_name = self.days_of_week[date_idx]
                 
-                if self._is_on_leave(emp_id, date) or self._is_unavailable(emp_id, date):
+                if date in self.closed_dates:
                     continue
-                
-                role_id = emp.get('role_id')
-                if role_id not in self.role_shifts:
+
+                if self._is_on_leave(emp_id, date) or self._is_unavailable(emp_id, date):
                     continue
                 
-                for shift in self.role_shifts[role_id]:
-                    shift_schedule = shift.get('schedule_config', {}).get(day_name, {})
-                    if shift_schedule.get('enabled', False):
-                        var = self.model.NewBoolVar(f'e{emp_id}_d{date}_s{shift["id"]}')
-                        assignments[emp_id][date][shift['id']] = var
+                for shift in self._eligible_shifts(emp):
+                    shift_schedule = (shift.get('schedule_config') or {}).get(day_name, {})
+                    if not shift_schedule.get('enabled', False):
+                        continue
+                    # A single shift may not exceed the employee's daily maximum
+                    if shift.get('work_minutes') is not None and \
+                            shift['work_minutes'] > emp.get('daily_max_hours', 8) * 60:
+                        continue
+                    var = self.model.NewBoolVar(f'e{emp_id}_d{date}_s{shift["id"]}')
+                    assignments[emp_id][date][shift['id']] = var
         
         # Constraint 1: Each employee works exact shifts (minus leaves)
         for emp in self.employees:
@@ -164,14 +196,17 @@ class ShiftSchedulerV5:
             )
             
             target_shifts = max(0, shifts_per_week - leave_days)
+            if emp_id in self.max_new_shifts:
+                target_shifts = max(0, min(target_shifts, self.max_new_shifts[emp_id]))
             
             week_shifts = []
             for date in self.week_dates:
                 for shift_id in assignments[emp_id].get(date, {}):
                     week_shifts.append(assignments[emp_id][date][shift_id])
             
+            # Bounded by the target; the objective fills up to it when coverage allows
             if week_shifts and target_shifts > 0:
-                self.model.Add(sum(week_shifts) == target_shifts)
+                self.model.Add(sum(week_shifts) <= target_shifts)
             elif week_shifts:
                 self.model.Add(sum(week_shifts) == 0)
         
@@ -183,7 +218,71 @@ class ShiftSchedulerV5:
                 if len(day_shifts) > 1:
                     self.model.Add(sum(day_shifts) <= 1)
         
-        # Objective: Maximize coverage
+        # Constraint 3: Max consecutive working days (existing work days included)
+        for emp in self.employees:
+            emp_id = emp['id']
+            worked = self.existing_work_dates.get(emp_id, set())
+            day_terms = []
+            for date in self.week_dates:
+                day_vars = list(assignments[emp_id].get(date, {}).values())
+                day_terms.append(1 if date in worked else sum(day_vars) if day_vars else 0)
+            window = self.max_consecutive + 1
+            for start in range(len(self.week_dates) - window + 1):
+                terms = day_terms[start:start + window]
+                if any(not isinstance(t, int) for t in terms):
+                    self.model.Add(sum(terms) <= self.max_consecutive)
+
+        # Constraint 4: Remaining weekly work minutes (break time excluded)
+        for emp in self.employees:
+            emp_id = emp['id']
+            if emp_id not in self.available_minutes:
+                continue
+            hour_terms = []
+            for date in self.week_dates:
+                for shift_id, var in assignments[emp_id].get(date, {}).items():
+                    shift = self._find_shift(shift_id)
+                    if shift and shift.get('work_minutes') is not None:
+                        hour_terms.append(shift['work_minutes'] * var)
+            if hour_terms:
+                self.model.Add(sum(hour_terms) <= max(0, self.available_minutes[emp_id]))
+
+        # Constraint 5: max_emp per shift per day (hard), min_emp (soft, shortfall penalised)
+        shortfalls = []
+        for date in self.week_dates:
+            for shift in [s for shifts in self.role_shifts.values() for s in shifts]:
+                shift_vars = [
+                    assignments[emp_id][date][shift['id']]
+                    for emp_id in assignments
+                    if shift['id'] in assignments[emp_id].get(date, {})
+                ]
+                if not shift_vars:
+                    continue
+                self.model.Add(sum(shift_vars) <= shift.get('max_emp', 10))
+                min_emp = min(shift.get('min_emp', 1), len(shift_vars))
+                if min_emp > 0:
+                    shortfall = self.model.NewIntVar(0, min_emp, f'short_d{date}_s{shift["id"]}')
+                    self.model.Add(sum(shift_vars) + shortfall >= min_emp)
+                    shortfalls.append(shortfall)
+
+        # Warm start: previous period's assignments (same weekday, same shift) as hints
+        change_terms = []
+        for emp_id, weekday_shifts in self.hints.items():
+            if emp_id not in assignments:
+                continue
+            for date_idx, date in enumerate(self.week_dates):
+                hinted_shift_id = weekday_shifts.get(date_idx)
+                for shift_id, var in assignments[emp_id].get(date, {}).items():
+                    if shift_id == hinted_shift_id:
+                        self.model.AddHint(var, 1)
+                        change_terms.append(1 - var)
+                    else:
+                        self.model.AddHint(var, 0)
+                        change_terms.append(var)
+
+        if self.max_changes is not None and change_terms:
+            self.model.Add(sum(change_terms) <= self.max_changes)
+
+        # Objective: Maximize coverage, meeting min_emp first
         objective_terms = []
         for emp_id in assignments:
             for date in assignments[emp_id]:
@@ -191,14 +290,35 @@ class ShiftSchedulerV5:
                     objective_terms.append(assignments[emp_id][date][shift_id])
         
         if objective_terms:
-            self.model.Maximize(sum(objective_terms))
+            coverage = sum(objective_terms) - 10 * sum(shortfalls)
+            if change_terms:
+                # Fewest changes from the hints breaks ties between equal coverage
+                self.model.Maximize((len(change_terms) + 1) * coverage - sum(change_terms))
+            else:
+                self.model.Maximize(coverage)
         
         # Solve
         self.add_feedback("Solving schedule with OR-Tools CP-SAT...", 'info')
-        self.solver.parameters.max_time_in_seconds = 90.0
-        self.solver.parameters.num_search_workers = 8
+        self.solver.parameters.max_time_in_seconds = self.time_limit_seconds
+        self.solver.parameters.num_search_workers = self.num_workers
         
-        status = self.solver.Solve(self.model)
+        if self.stop_event is not None and self.stop_event.is_set():
+            return None, "Solve cancelled"
+        finished = threading.Event()
+
+        def watch_stop():
+            # Cancellation from the event loop's process: end the search early
+            while not finished.wait(0.25):
+                if self.stop_event.is_set():
+                    self.solver.StopSearch()
+                    return
+
+        if self.stop_event is not None:
+            threading.Thread(target=watch_stop, daemon=True).start()
+        try:
+            status = self.solver.Solve(self.model)
+        finally:
+            finished.set()
         
         if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
             self.add_feedback(
@@ -223,11 +343,7 @@ class ShiftSchedulerV5:
                             schedule[date][emp_id] = []
                         
                         # Find shift details
-                        shift = None
-                        for role_id, shifts in self.role_shifts.items():
-                            shift = next((s for s in shifts if s['id'] == shift_id), None)
-                            if shift:
-                                break
+                        shift = self._find_shift(shift_id)
                         
                         if shift:
                             schedule[date][emp_id].append(shift)
@@ -242,6 +358,89 @@ class ShiftSchedulerV5:
         
         return schedule
     
+    def _find_shift(self, shift_id: int) -> Optional[Dict]:
+        """Look up a shift dict by id"""
+        for role_id, shifts in self.role_shifts.items():
+            shift = next((s for s in shifts if s['id'] == shift_id), None)
+            if shift:
+                return shift
+        return None
+    
     def get_feedback(self) -> List[Dict]:
         """Return all feedback messages"""
         return self.feedback
+
+
+def solve_department_schedule(payload: Dict, stop_event=None) -> Dict:
+    """
+    Solve a department's schedule week by week with ShiftSchedulerV5.
+
+    Input and output are plain dicts (ISO date strings, int ids) so the call
+    can cross a process boundary.
+
+    payload:
+        employees, roles, role_shifts: as for ShiftSchedulerV5
+        weeks: [{week_dates, closed_dates, leave_requests, unavailability,
+                 existing_work_dates, max_new_shifts, available_minutes}]
+        time_limit_seconds, num_workers: solver parameters (per week)
+        hints: {emp_id: {weekday index: shift_id}} warm start (optional)
+        max_changes: cap on assignments differing from hints per week (optional);
+            a week that cannot meet the cap is re-solved without it
+    stop_event: Event shared with the caller (optional); setting it stops the
+        running search and skips the remaining weeks
+
+    Returns: {'assignments': [{'employee_id', 'shift_id', 'date'}],
+              'feedback': [{'message', 'severity'}], 'errors': [str]}
+    """
+    role_shifts = {int(role_id): shifts for role_id, shifts in payload['role_shifts'].items()}
+    assignments = []
+    feedback = []
+    errors = []
+
+    hints = {
+        int(emp_id): {int(weekday): shift_id for weekday, shift_id in weekday_shifts.items()}
+        for emp_id, weekday_shifts in (payload.get('hints') or {}).items()
+    }
+
+    def solve_week(week: Dict, max_changes: Optional[int]):
+        scheduler = ShiftSchedulerV5(
+            employees=payload['employees'],
+            roles=payload['roles'],
+            role_shifts=role_shifts,
+            leave_requests=week.get('leave_requests', {}),
+            unavailability=week.get('unavailability', {}),
+            week_dates=week['week_dates'],
+            closed_dates=set(week.get('closed_dates', [])),
+            existing_work_dates={int(k): set(v) for k, v in week.get('existing_work_dates', {}).items()},
+            max_new_shifts={int(k): v for k, v in week.get('max_new_shifts', {}).items()},
+            available_minutes={int(k): v for k, v in week.get('available_minutes', {}).items()},
+            time_limit_seconds=payload.get('time_limit_seconds', 90.0),
+            num_workers=payload.get('num_workers', 8),
+            hints=hints,
+            max_changes=max_changes,
+            stop_event=stop_event
+        )
+        schedule, error = scheduler.generate_schedule()
+        feedback.extend(scheduler.get_feedback())
+        return schedule, error
+
+    for week in payload['weeks']:
+        if stop_event is not None and stop_event.is_set():
+            errors.append(f"Week {week['week_dates'][0]}: solve cancelled")
+            continue
+        max_changes = payload.get('max_changes')
+        schedule, error = solve_week(week, max_changes)
+        if error and max_changes is not None and not (stop_event is not None and stop_event.is_set()):
+            schedule, error = solve_week(week, None)
+            if not error:
+                # Only the cap made the week infeasible
+                errors.append(f"Week {week['week_dates'][0]}: more than {max_changes} changes from the previous period needed, solved without the cap")
+        if error:
+            errors.append(f"Week {week['week_dates'][0]}: {error}")
+            continue
+        for date, emp_shifts in sorted(schedule.items()):
+            for emp_id, shifts in emp_shifts.items():
+                for shift in shifts:
+                    assignments.append({'employee_id': emp_id, 'shift_id': shift['id'], 'date': date})
+
+    return {'assignments': assignments, 'feedback': feedback, 'errors': errors}
@@ -1,7 +1,18 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict
+from pydantic import AfterValidator, BaseModel, EmailStr, StringConstraints
+from typing import Annotated, Literal, Optional, List, Dict
 from datetime import date, datetime
 from app.models import UserType, LeaveStatus
+from app.time_columns import format_time, normalize_time, parse_time
+
+
+# Times of day: validated and normalized to "HH:MM" (stored as minutes)
+TimeOfDay = Annotated[str, AfterValidator(lambda value: format_time(parse_time(value)))]
+OptionalTimeOfDay = Annotated[Optional[str], AfterValidator(normalize_time)]  # "" -> None
+
+# Device timestamps: a value with an offset ("...+09:00", "...Z") becomes naive server local time
+LocalDateTime = Annotated[
+    datetime, AfterValidator(lambda value: value.astimezone().replace(tzinfo=None) if value.tzinfo else value)
+]
 
 
 # Unavailability schemas
@@ -22,12 +33,29 @@ class UnavailabilityResponse(BaseModel):
         from_attributes = True
 
 
+# Holiday calendar schemas
+class CompanyHolidayCreate(BaseModel):
+    date: date
+    name: str
+
+
+class CalendarHolidayResponse(BaseModel):
+    date: date
+    name: str
+    is_company: bool
+    created_by: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 # Shift schemas (for shift type/shift timing configuration)
 class ShiftCreate(BaseModel):
     role_id: int
     name: str
-    start_time: str  # HH:MM format
-    end_time: str  # HH:MM format
+    start_time: TimeOfDay  # HH:MM format
+    end_time: TimeOfDay  # HH:MM format
     priority: int = 50
     min_emp: int = 1
     max_emp: int = 10
@@ -36,8 +64,8 @@ class ShiftCreate(BaseModel):
 
 class ShiftUpdate(BaseModel):
     name: Optional[str] = None
-    start_time: Optional[str] = None
-    end_time: Optional[str] = None
+    start_time: OptionalTimeOfDay = None
+    end_time: OptionalTimeOfDay = None
     priority: Optional[int] = None
     min_emp: Optional[int] = None
     max_emp: Optional[int] = None
@@ -372,13 +400,64 @@ class CheckInResponse(BaseModel):
         from_attributes = True
 
 
+# Device punch schemas (kiosks / badge readers)
+class PunchDeviceCreate(BaseModel):
+    name: str
+    department_id: Optional[int] = None
+
+
+class PunchDeviceResponse(BaseModel):
+    id: int
+    name: str
+    department_id: Optional[int]
+    is_active: bool
+    created_at: datetime
+    last_seen_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class PunchDeviceCreated(PunchDeviceResponse):
+    api_key: str  # shown once
+
+
+class PunchIn(BaseModel):
+    idempotency_key: Annotated[str, StringConstraints(min_length=1, max_length=64)]
+    employee_code: Annotated[str, StringConstraints(min_length=1, max_length=50)]  # Employee.employee_id
+    type: Literal['in', 'out']
+    timestamp: LocalDateTime  # local time of the punch
+    location: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class PunchBatch(BaseModel):
+    punches: List[PunchIn]
+
+
+class PunchResult(BaseModel):
+    idempotency_key: str
+    status: str  # accepted, rejected, duplicate
+    reason: Optional[str] = None
+    check_in_id: Optional[int] = None
+
+
+class PunchBatchResponse(BaseModel):
+    device_id: int
+    received: int
+    accepted: int
+    rejected: int
+    duplicates: int
+    results: List[PunchResult]
+
+
 # Schedule schemas
 class ScheduleCreate(BaseModel):
     employee_id: int
     role_id: int
     date: date
-    start_time: str
-    end_time: str
+    start_time: OptionalTimeOfDay
+    end_time: OptionalTimeOfDay
     shift_id: Optional[int] = None  # Optional - if None, it's a custom schedule
     notes: Optional[str] = None
 
@@ -387,8 +466,8 @@ class ScheduleUpdate(BaseModel):
     employee_id: Optional[int] = None
     role_id: Optional[int] = None
     date: Optional[str] = None  # Accept string, will be converted
-    start_time: Optional[str] = None
-    end_time: Optional[str] = None
+    start_time: OptionalTimeOfDay = None
+    end_time: OptionalTimeOfDay = None
     shift_id: Optional[int] = None
     status: Optional[str] = None
     notes: Optional[str] = None
@@ -414,6 +493,18 @@ class ScheduleResponse(BaseModel):
         from_attributes = True
 
 
+class ScheduleKey(BaseModel):
+    employee_id: int
+    date: date
+
+
+class ScheduleChanges(BaseModel):
+    cursor: str  # pass back as ?since= on the next sync
+    full: bool  # schedules is the whole range: replace everything
+    keys: List[ScheduleKey]  # changed (employee, date) groups: replace their rows with those in schedules
+    schedules: List[ScheduleResponse]
+
+
 # Dashboard schemas
 class EmployeeDashboard(BaseModel):
     todays_schedule: Optional[ScheduleResponse]
@@ -460,14 +551,14 @@ class NotificationCreate(BaseModel):
 # Attendance schemas
 class AttendanceCreate(BaseModel):
     schedule_id: Optional[int] = None
-    in_time: str  # HH:MM format
-    out_time: Optional[str] = None
+    in_time: TimeOfDay  # HH:MM format
+    out_time: OptionalTimeOfDay = None
     status: str
     notes: Optional[str] = None
 
 
 class AttendanceUpdate(BaseModel):
-    out_time: Optional[str] = None
+    out_time: OptionalTimeOfDay = None
     out_status: Optional[str] = None
     overtime_hours: Optional[float] = None
     notes: Optional[str] = None
@@ -509,6 +600,15 @@ class ScheduleGenerationResponse(BaseModel):
     error: Optional[str] = None
 
 
+class EmployeeScheduleChange(BaseModel):
+    employee_id: int
+    dates: List[date]
+
+
+class IncrementalRegenerationRequest(BaseModel):
+    changes: List[EmployeeScheduleChange]
+
+
 # Shift Request (for employee shift swap requests)
 class ShiftRequestCreate(BaseModel):
     from_employee_id: int
@@ -546,8 +646,8 @@ class OvertimeTrackingResponse(BaseModel):
 
 class OvertimeRequestCreate(BaseModel):
     request_date: date
-    from_time: str
-    to_time: str
+    from_time: TimeOfDay
+    to_time: TimeOfDay
     request_hours: float
     reason: str
 
@@ -0,0 +1,121 @@
+"""
+Tabular Export Writers (CSV / Parquet)
+
+Flat exports of the attendance reports for payroll and BI pipelines. A
+TableExport is a list of (header key, column name) pairs from
+excel_translations.get_headers_translated plus a lazy iterator of typed rows:
+- CSV is encoded row by row while the response streams
+- Parquet is written in columnar record batches of PARQUET_BATCH_ROWS rows,
+  with a typed schema (dates, floats, integers, booleans)
+
+Parquet needs pyarrow, which is optional: without it only CSV and xlsx are
+offered.
+"""
+
+import csv
+import io
+from typing import Iterable, Iterator, List, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export disabled
+    pa = None
+    pq = None
+
+from app.excel_export import STREAM_CHUNK_SIZE
+
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Rows per Parquet record batch / row group
+PARQUET_BATCH_ROWS = 50_000
+
+# Header key -> column type (string unless listed)
+COLUMN_TYPES = {
+    'date': 'date',
+    'total_hrs_assigned': 'float',
+    'total_hrs_worked': 'float',
+    'hours_worked': 'float',
+    'night_hours_calc': 'float',
+    'overtime_hours': 'float',
+    'ot_hours': 'float',
+    'break_time': 'int',
+    'break_minutes': 'int',
+    'comp_off_earned': 'bool',
+    'comp_off_used': 'bool',
+}
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def _arrow_type(column_type: str):
+    return {
+        'date': pa.date32(),
+        'float': pa.float64(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+    }.get(column_type, pa.string())
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class TableExport:
+    """Column names and typed rows of one report"""
+
+    def __init__(self, columns: List[Tuple[str, str]], rows: Iterable[tuple]):
+        self.keys = [key for key, _ in columns]
+        self.names = [name for _, name in columns]
+        self.types = [COLUMN_TYPES.get(key, 'string') for key in self.keys]
+        self.rows = rows
+
+    def iter_csv(self) -> Iterator[bytes]:
+        """Header line then the rows, UTF-8, yielded in ~STREAM_CHUNK_SIZE pieces"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(self.names)
+        for row in self.rows:
+            writer.writerow([_csv_value(value) for value in row])
+            if buffer.tell() >= STREAM_CHUNK_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def save(self, fileobj):
+        """Write the table as Parquet, one record batch per PARQUET_BATCH_ROWS rows"""
+        if pa is None:
+            raise RuntimeError("Parquet export requires pyarrow")
+        schema = pa.schema([
+            pa.field(name, _arrow_type(column_type)) for name, column_type in zip(self.names, self.types)
+        ])
+        with pq.ParquetWriter(fileobj, schema) as writer:
+            batch = []
+            for row in self.rows:
+                batch.append(row)
+                if len(batch) >= PARQUET_BATCH_ROWS:
+                    writer.write_batch(self._record_batch(schema, batch))
+                    batch = []
+            if batch:
+                writer.write_batch(self._record_batch(schema, batch))
+
+    def _record_batch(self, schema, rows: List[tuple]):
+        columns = list(zip(*rows)) if rows else [[] for _ in self.names]
+        return pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        )
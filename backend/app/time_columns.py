@@ -0,0 +1,113 @@
+"""
+Time-of-Day Columns
+
+Shift, schedule, attendance and overtime-request times are stored as
+integer minutes since midnight (MinuteTime, migration 0005) but read and
+written as "HH:MM" strings in Python, so the API, the schemas and the
+application code keep the string format while SQL can do arithmetic on
+the columns.
+
+The SQL helpers below compute durations and overlaps in the database, so
+hour totals can be aggregated there instead of parsing every row:
+- duration_minutes: end - start, wrapping past midnight
+- overlap_minutes: overlap of two (possibly overnight) spans on the same day
+- night_minutes: minutes of a span after the night start, like
+  app.hours.night_minutes without an end hour
+Their operands must be MinuteTime columns or ints; results are plain
+integers (NULL when a time is NULL).
+"""
+
+from typing import Optional
+
+from sqlalchemy import Integer, case, func, literal, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+from app.hours import MINUTES_PER_DAY, NIGHT_START_HOUR
+
+
+def parse_time(value: str) -> int:
+    """
+    "HH:MM" (or "H:MM", "HH:MM:SS") -> minutes since midnight; up to 24:00.
+    Raises ValueError for anything else.
+    """
+    parts = value.strip().split(':')
+    try:
+        if len(parts) not in (2, 3):
+            raise ValueError
+        hours, minutes = int(parts[0]), int(parts[1])
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}' (expected HH:MM)")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time '{value}' (expected 00:00-24:00)")
+    return hours * 60 + minutes
+
+
+def format_time(minutes: int) -> str:
+    """Minutes since midnight -> "HH:MM" """
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def normalize_time(value: Optional[str]) -> Optional[str]:
+    """Validate a time string and return it as "HH:MM" (None and "" stay None)"""
+    if value is None or value == '':
+        return None
+    return format_time(parse_time(value))
+
+
+class MinuteTime(TypeDecorator):
+    """Integer minutes in the database, "HH:MM" strings in Python"""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or value == '':
+            return None
+        if isinstance(value, int):
+            return value
+        if hasattr(value, 'hour'):
+            return value.hour * 60 + value.minute
+        return parse_time(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else format_time(value)
+
+
+def minutes(column):
+    """A MinuteTime column as a plain integer expression"""
+    return type_coerce(column, Integer)
+
+
+def duration_minutes(start, end, equal_is_full_day: bool = False):
+    """
+    SQL minutes from start to end, wrapping past midnight when end is
+    earlier (and when equal with equal_is_full_day, as for a 24-hour shift)
+    """
+    start, end = minutes(start), minutes(end)
+    return case(
+        (end > start, end - start),
+        (end == start, literal(MINUTES_PER_DAY if equal_is_full_day else 0)),
+        else_=end - start + MINUTES_PER_DAY
+    )
+
+
+def _span_end(start, end):
+    return minutes(start) + duration_minutes(start, end)
+
+
+def overlap_minutes(start, end, other_start, other_end):
+    """SQL minutes two spans starting on the same day overlap (0 if they do not)"""
+    return func.greatest(
+        0,
+        func.least(_span_end(start, end), _span_end(other_start, other_end))
+        - func.greatest(minutes(start), minutes(other_start))
+    )
+
+
+def night_minutes(start, end, night_start_hour: int = NIGHT_START_HOUR):
+    """SQL minutes of the span after night_start_hour (up to the next day's)"""
+    night_start = night_start_hour * 60
+    return func.greatest(
+        0,
+        func.least(_span_end(start, end), night_start + MINUTES_PER_DAY)
+        - func.greatest(minutes(start), night_start)
+    )
@@ -112,8 +112,8 @@ async def create_test_employee_simple():
                 if current_date.weekday() >= 5:
                     continue
                 
-                in_time = "09:05"
-                out_time = "17:30"
+                in_time = 9 * 60 + 5  # 09:05, stored as minutes
+                out_time = 17 * 60 + 30  # 17:30
                 worked_hours = 8.25
                 overtime_hours = 0.25 if day_offset % 3 == 0 else 0.0
                 
@@ -7,8 +7,10 @@ Run: python init_db.py
 import asyncio
 from sqlalchemy.ext.asyncio import create_async_engine
 from app.database import DATABASE_URL
-from app.models import Base, User, UserType
+from app.models import Base, CalendarHoliday, User, UserType
+from app.holidays_jp import public_holiday_rows
 from app.auth import get_password_hash
+from app.migrations import stamp_head
 
 async def init_database():
     print("🔄 Connecting to database...")
@@ -19,6 +21,12 @@ async def init_database():
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
 
+        # Public holidays, as migration 0006 seeds them
+        await conn.execute(CalendarHoliday.__table__.insert(), public_holiday_rows())
+
+    # Tables match the latest migration - record that for `alembic upgrade head`
+    await asyncio.to_thread(stamp_head)
+
     print("✅ All tables created!")
 
     # Import session maker
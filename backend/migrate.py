@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Database migration runner
+Applies Alembic revisions under a PostgreSQL advisory lock, so it is safe
+to run from every deploy step / container before starting the API workers.
+
+Run: python migrate.py                     # upgrade to head
+     python migrate.py upgrade <revision>
+     python migrate.py downgrade <revision>
+     python migrate.py current
+"""
+
+import argparse
+import sys
+
+from app.migrations import upgrade, downgrade, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shift Scheduler database migrations")
+    parser.add_argument("action", nargs="?", default="upgrade", choices=["upgrade", "downgrade", "current"])
+    parser.add_argument("revision", nargs="?", default=None, help="target revision (default: head for upgrade)")
+    args = parser.parse_args()
+
+    try:
+        if args.action == "upgrade":
+            upgrade(args.revision or "head")
+        elif args.action == "downgrade":
+            if not args.revision:
+                parser.error("downgrade needs a target revision (e.g. -1 or 0001)")
+            downgrade(args.revision)
+        else:
+            current()
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,10 @@ def main():
         # Run uvicorn with reload for development
         import os
         backend_dir = os.path.dirname(os.path.abspath(__file__))
+
+        # Apply pending migrations first - the server only checks the schema version
+        subprocess.run([sys.executable, "migrate.py"], cwd=backend_dir, check=True)
+
         subprocess.run(
             [
                 sys.executable, "-m", "uvicorn",
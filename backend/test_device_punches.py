@@ -0,0 +1,193 @@
+"""
+Device Punch Ingestion Test
+Posts batches of badge-reader punches through app/punch_ingest.py and
+checks the per-punch results (accepted, each rejection reason, repeated
+keys), the check-ins and attendance rows written (worked hours, break,
+overtime, a shift past midnight), that replaying a batch changes nothing
+and that a department-bound device only sees its department (migration 0007).
+Timestamps sent with an offset are converted to server local time.
+Runs inside a transaction and rolls back
+Run: python test_device_punches.py
+"""
+
+import asyncio
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import hash_device_key
+from app.database import engine
+from app.models import Attendance, CheckInOut, DevicePunch, Employee, PunchDevice
+from app.punch_ingest import ingest_punches
+from app.schemas import PunchIn
+
+
+DAY = date(2025, 6, 2)  # a Monday
+
+SEED_SQL = [
+    "INSERT INTO departments (dept_id, name, is_active) VALUES ('P01', 'Punch Test', true), ('P02', 'Punch Other', true)",
+    "INSERT INTO roles (name, department_id, break_minutes) SELECT 'Punch Role', id, 60 FROM departments WHERE dept_id = 'P01'",
+    """
+    INSERT INTO employees (employee_id, first_name, last_name, email, department_id, role_id, is_active, daily_max_hours, updated_at)
+    SELECT 'PUN' || n, 'Punch', 'Test ' || n, 'punch.' || n || '@test.local',
+           (SELECT id FROM departments WHERE dept_id = 'P01'), (SELECT id FROM roles WHERE name = 'Punch Role'), true, 8, now()
+    FROM generate_series(1, 5) n
+    """,
+    # PUN1, PUN2, PUN5: 09:00-18:00; PUN4: 22:00-06:00; PUN3: no schedule
+    """
+    INSERT INTO schedules (department_id, employee_id, role_id, date, start_time, end_time, status)
+    SELECT e.department_id, e.id, e.role_id, DATE '2025-06-02',
+           CASE WHEN e.employee_id = 'PUN4' THEN 22 * 60 ELSE 9 * 60 END,
+           CASE WHEN e.employee_id = 'PUN4' THEN 6 * 60 ELSE 18 * 60 END, 'scheduled'
+    FROM employees e WHERE e.employee_id IN ('PUN1', 'PUN2', 'PUN4', 'PUN5')
+    """,
+    """
+    INSERT INTO leave_requests (employee_id, start_date, end_date, leave_type, duration_type, status)
+    SELECT id, DATE '2025-06-02', DATE '2025-06-02', 'paid', 'full_day', 'APPROVED' FROM employees WHERE employee_id = 'PUN2'
+    """,
+]
+
+
+def punch(key: str, code: str, kind: str, hour: int, minute: int = 0, day: date = DAY) -> PunchIn:
+    return PunchIn(
+        idempotency_key=key, employee_code=code, type=kind,
+        timestamp=datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute)
+    )
+
+
+FIRST_BATCH = [
+    punch("k1", "PUN1", "in", 8, 55),
+    punch("k2", "PUN1", "out", 19, 0),
+    punch("k3", "PUN2", "in", 9, 0),
+    punch("k4", "PUN3", "in", 9, 0),
+    punch("k5", "NOBODY", "in", 9, 0),
+    punch("k6", "PUN1", "out", 19, 5),
+    punch("k1", "PUN1", "in", 8, 55),  # repeated within the batch
+    punch("k7", "PUN1", "in", 9, 0, day=date.today() + timedelta(days=2)),
+    punch("k9", "PUN4", "out", 6, 10, day=DAY + timedelta(days=1)),  # out before in: applied in time order
+    punch("k8", "PUN4", "in", 22, 5),
+    punch("k10", "PUN5", "in", 9, 20),
+]
+
+EXPECTED = {
+    "k1": ("accepted", None), "k2": ("accepted", None), "k3": ("rejected", "on_leave"),
+    "k4": ("rejected", "no_schedule"), "k5": ("rejected", "unknown_employee"),
+    "k6": ("rejected", "no_active_check_in"), "k7": ("rejected", "future_timestamp"),
+    "k8": ("accepted", None), "k9": ("accepted", None), "k10": ("accepted", None),
+}
+
+
+async def attendance_rows(db: AsyncSession) -> dict:
+    result = await db.execute(
+        select(
+            Employee.employee_id, Attendance.in_time, Attendance.out_time, Attendance.status,
+            Attendance.worked_hours, Attendance.break_minutes, Attendance.overtime_hours
+        ).join(Employee, Employee.id == Attendance.employee_id).filter(Employee.employee_id.like('PUN%'))
+    )
+    return {row[0]: tuple(row[1:]) for row in result.all()}
+
+
+async def test_device_punches():
+    print("\n" + "="*70)
+    print("🧪 TESTING DEVICE PUNCH INGESTION")
+    print("="*70)
+
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            print("\n🌱 Seeding test data (rolled back afterwards)...")
+            for statement in SEED_SQL:
+                await conn.execute(text(statement))
+            db = AsyncSession(bind=conn, expire_on_commit=False)
+            device = PunchDevice(name="Test reader", api_key_hash=hash_device_key("test-key"))
+            db.add(device)
+            await db.flush()
+
+            print("\n📥 First batch...")
+            results = await ingest_punches(db, device, FIRST_BATCH)
+            got = {r['idempotency_key']: (r['status'], r['reason']) for r in results if r is not results[6]}
+            check("Per-punch results", got == EXPECTED, str({k: v for k, v in got.items() if EXPECTED.get(k) != v}))
+            check("Repeated key marked duplicate with the first result",
+                  results[6]['status'] == 'duplicate' and results[6]['check_in_id'] == results[0]['check_in_id'])
+            check("In and out share the check-in", results[0]['check_in_id'] and results[0]['check_in_id'] == results[1]['check_in_id'])
+
+            rows = await attendance_rows(db)
+            # 08:55-19:00 = 10h05, minus the 60 minute break = 9.08h, 1.08h beyond 8h
+            check("Day shift attendance", rows.get("PUN1") == ("08:55", "19:00", "on-time", 9.08, 60, 1.08), str(rows.get("PUN1")))
+            # 22:05-06:10 next day on the check-in day's row
+            check("Shift past midnight", rows.get("PUN4") == ("22:05", "06:10", "slightly-late", 7.08, 60, 0.0), str(rows.get("PUN4")))
+            check("Check-in only", rows.get("PUN5") == ("09:20", None, "late", 0.0, 0, 0.0), str(rows.get("PUN5")))
+            check("Rejected punches write nothing", "PUN2" not in rows and "PUN3" not in rows)
+
+            check_ins = (await db.execute(select(func.count()).select_from(CheckInOut).filter(CheckInOut.date >= DAY))).scalar()
+            check("Three check-ins", check_ins == 3, str(check_ins))
+
+            print("\n🔁 Replaying the batch...")
+            replay = await ingest_punches(db, device, FIRST_BATCH)
+            check("Every punch is a duplicate", all(r['status'] == 'duplicate' for r in replay))
+            check("Stored reasons and check-ins returned", [(r['reason'], r['check_in_id']) for r in replay] == [(r['reason'], r['check_in_id']) for r in results])
+            check("Nothing written again", (await db.execute(select(func.count()).select_from(CheckInOut).filter(CheckInOut.date >= DAY))).scalar() == 3)
+            check("Attendance unchanged", await attendance_rows(db) == rows)
+
+            print("\n🚪 Check-out of an earlier batch's check-in...")
+            later = await ingest_punches(db, device, [punch("k11", "PUN5", "out", 18, 30), punch("k12", "PUN1", "in", 20, 0)])
+            check("Closes the stored check-in", later[0]['status'] == 'accepted' and later[0]['check_in_id'] == results[10]['check_in_id'])
+            check("Closed check-in blocks nothing, open one does", later[1]['status'] == 'accepted')
+            rows = await attendance_rows(db)
+            check("Status from check-in kept, hours filled", rows.get("PUN5") == ("09:20", "18:30", "late", 8.17, 60, 0.17), str(rows.get("PUN5")))
+            check("Second check-in keeps the first check-in time", rows.get("PUN1")[0] == "08:55")
+
+            print("\n🏢 Department-bound device...")
+            other = PunchDevice(
+                name="Other reader", api_key_hash=hash_device_key("other-key"),
+                department_id=(await db.execute(text("SELECT id FROM departments WHERE dept_id = 'P02'"))).scalar()
+            )
+            db.add(other)
+            await db.flush()
+            foreign = await ingest_punches(db, other, [punch("k1", "PUN5", "in", 21, 0)])
+            check("Same key on another device is new", foreign[0]['status'] != 'duplicate')
+            check("Employees of other departments are unknown", foreign[0]['reason'] == 'unknown_employee')
+            receipts = (await db.execute(select(func.count()).select_from(DevicePunch))).scalar()
+            check("One receipt per distinct key and device", receipts == 10 + 2 + 1, str(receipts))
+
+            print("\n🌐 Timestamps with an offset...")
+            local = datetime.combine(DAY, datetime.min.time()) + timedelta(hours=21)
+            offset = PunchIn.model_validate({
+                'idempotency_key': 'k13', 'employee_code': 'PUN1', 'type': 'out',
+                'timestamp': local.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+            })
+            check("Converted to naive local time", offset.timestamp == local and offset.timestamp.tzinfo is None, str(offset.timestamp))
+            future = PunchIn.model_validate({
+                'idempotency_key': 'k14', 'employee_code': 'PUN5', 'type': 'in',
+                'timestamp': (datetime.now() + timedelta(days=2)).astimezone(timezone(timedelta(hours=9))).isoformat()
+            })
+            mixed = await ingest_punches(db, device, [future, offset, punch("k15", "NOBODY", "in", 20, 30)])
+            check("Mixed with naive timestamps in one batch", [(r['status'], r['reason']) for r in mixed] == [
+                ("rejected", "future_timestamp"), ("accepted", None), ("rejected", "unknown_employee")
+            ], str(mixed))
+            await db.close()
+        finally:
+            await trans.rollback()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} device punch checks failed")
+    else:
+        print("✅ Device punches applied once, in order")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_device_punches()) else 1)
@@ -0,0 +1,236 @@
+"""
+Conditional GET Test
+Sends GET /schedules, /employees, /roles, /shifts, /departments,
+/notifications and /calendar/holidays through the app (middleware
+included) with If-None-Match, and checks that an unchanged poll gets a 304
+and a write in the caller's scope gets a 200 with a new ETag. A write in
+another department keeps the 304. ETags of another user, another query
+string, or with a tampered digest are rejected.
+Counters are bumped by committed writes, so this test commits its rows and
+deletes them afterwards
+Run: python test_etags.py
+"""
+
+import asyncio
+import json
+import sys
+from datetime import date
+
+from sqlalchemy import delete, text, update
+
+from app.auth import create_access_token, get_password_hash
+from app.database import async_session_maker, engine
+from app.holidays_jp import jp_calendar
+from app.main import app
+from app.models import Department, Employee, Manager, Notification, Role, Schedule, Shift, User, UserType
+
+
+async def call(path: str, token: str = None, etag: str = None):
+    """(status, headers, body) of a GET sent straight to the ASGI app"""
+    path, _, query = path.partition('?')
+    headers = []
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    if etag:
+        headers.append((b'if-none-match', etag.encode()))
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': headers, 'client': ('127.0.0.1', 5000), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = next(m for m in messages if m['type'] == 'http.response.start')
+    body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+
+async def write(*statements):
+    async with async_session_maker() as db:
+        for statement in statements:
+            await db.execute(statement)
+        await db.commit()
+
+
+async def test_etags():
+    print("\n" + "="*70)
+    print("🧪 TESTING CONDITIONAL GET (ETAG / 304)")
+    print("="*70)
+
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    async with async_session_maker() as db:
+        departments = [Department(dept_id=f'E{n}', name=f'ETag Test {n}', is_active=True) for n in (1, 2)]
+        db.add_all(departments)
+        await db.flush()
+        roles = [Role(name='ETag Role', department_id=d.id) for d in departments]
+        users = [
+            User(username=f'etag_{name}', email=f'etag.{name}@test.local', hashed_password=get_password_hash('x'),
+                 full_name=f'ETag {name}', user_type=user_type, is_active=True)
+            for name, user_type in [('admin', UserType.ADMIN), ('manager', UserType.MANAGER), ('employee', UserType.EMPLOYEE)]
+        ]
+        db.add_all(roles + users)
+        await db.flush()
+        admin, manager, employee_user = users
+        db.add(Manager(manager_id='ETM1', user_id=manager.id, department_id=departments[0].id, is_active=True))
+        employees = [
+            Employee(employee_id=f'ETE{n}', first_name='ETag', last_name=str(n), email=f'etag.{n}@test.local',
+                     department_id=d.id, role_id=r.id, user_id=employee_user.id if n == 1 else None, is_active=True)
+            for n, d, r in [(1, departments[0], roles[0]), (2, departments[1], roles[1])]
+        ]
+        shifts = [Shift(role_id=r.id, name='ETag Shift', start_time='09:00', end_time='18:00') for r in roles]
+        db.add_all(employees + shifts)
+        await db.flush()
+        db.add_all([
+            Schedule(department_id=e.department_id, employee_id=e.id, role_id=e.role_id, date=date(2031, 5, 6),
+                     start_time='09:00', end_time='18:00', status='scheduled')
+            for e in employees
+        ])
+        await db.commit()
+        dept_ids = [d.id for d in departments]
+        user_ids = [u.id for u in users]
+        e1, e2 = employees[0].id, employees[1].id
+        s1, s2 = shifts[0].id, shifts[1].id
+    tokens = {u.username: create_access_token({'sub': u.username}) for u in users}
+    schedules = '/schedules?start_date=2031-05-01&end_date=2031-05-31'
+
+    try:
+        async def poll(path: str, who: str):
+            status, headers, body = await call(path, tokens.get(who))
+            return headers.get('etag'), body
+
+        print("\n🏷️  ETags and 304s...")
+        for path in ['/departments', '/employees', '/roles', '/shifts', schedules, '/notifications']:
+            etag, body = await poll(path, 'etag_admin')
+            status, headers, body_304 = await call(path, tokens['etag_admin'], etag)
+            check(f"{path.split('?')[0]}: unchanged poll gets 304",
+                  bool(etag) and status == 304 and headers.get('etag') == etag and not body_304, f"{status} {etag}")
+        etag, _ = await poll('/calendar/holidays?year=2031&month=5', None)
+        status, _, _ = await call('/calendar/holidays?year=2031&month=5', None, etag)
+        check("/calendar/holidays: public ETag gets 304", status == 304, str(status))
+        status, _, _ = await call('/calendar/holidays?year=2031&month=5', tokens['etag_admin'], etag)
+        check("/calendar/holidays: 304 with a token too", status == 304, str(status))
+
+        print("\n✏️  Writes in and out of scope...")
+        manager_schedules, _ = await poll(schedules, 'etag_manager')
+        employee_schedules, _ = await poll(schedules, 'etag_employee')
+        admin_schedules, _ = await poll(schedules, 'etag_admin')
+        await write(update(Schedule).filter(Schedule.employee_id == e2).values(notes='other department'))
+        check("Manager: write in another department keeps the 304",
+              (await call(schedules, tokens['etag_manager'], manager_schedules))[0] == 304)
+        check("Employee: another employee's write keeps the 304",
+              (await call(schedules, tokens['etag_employee'], employee_schedules))[0] == 304)
+        status, headers, body = await call(schedules, tokens['etag_admin'], admin_schedules)
+        check("Admin: write in any department gets a 200 with a new ETag",
+              status == 200 and headers.get('etag') != admin_schedules and 'other department' in body.decode())
+
+        await write(update(Schedule).filter(Schedule.employee_id == e1).values(notes='mine'))
+        status, headers, body = await call(schedules, tokens['etag_manager'], manager_schedules)
+        check("Manager: write in their department gets a 200", status == 200 and 'mine' in body.decode(), str(status))
+        status, headers, _ = await call(schedules, tokens['etag_employee'], employee_schedules)
+        check("Employee: write to their schedule gets a 200", status == 200, str(status))
+        employee_schedules = headers.get('etag')
+
+        await write(update(Shift).filter(Shift.id == s1).values(end_time=17 * 60))
+        check("Shift change reaches /schedules (shift times fill leave rows)",
+              (await call(schedules, tokens['etag_employee'], employee_schedules))[0] == 200)
+
+        manager_roles, _ = await poll('/roles', 'etag_manager')
+        manager_shifts, _ = await poll('/shifts', 'etag_manager')
+        await write(update(Shift).filter(Shift.id == s2).values(name='Other'))
+        check("/roles and /shifts: other department's shift keeps the 304",
+              (await call('/roles', tokens['etag_manager'], manager_roles))[0] == 304
+              and (await call('/shifts', tokens['etag_manager'], manager_shifts))[0] == 304)
+        await write(update(Shift).filter(Shift.id == s1).values(name='Renamed'))
+        check("/roles and /shifts: own department's shift gets a 200",
+              (await call('/roles', tokens['etag_manager'], manager_roles))[0] == 200
+              and (await call('/shifts', tokens['etag_manager'], manager_shifts))[0] == 200)
+
+        employee_list, _ = await poll('/employees', 'etag_employee')
+        await write(update(Employee).filter(Employee.id == e1).values(phone='000'))
+        check("/employees: change to the employee's own record gets a 200",
+              (await call('/employees', tokens['etag_employee'], employee_list))[0] == 200)
+
+        notifications, _ = await poll('/notifications', 'etag_employee')
+        async with async_session_maker() as db:
+            db.add(Notification(user_id=user_ids[0], title='Other user', message='x', notification_type='test'))
+            await db.commit()
+        check("/notifications: another user's notification keeps the 304",
+              (await call('/notifications', tokens['etag_employee'], notifications))[0] == 304)
+        async with async_session_maker() as db:
+            db.add(Notification(user_id=user_ids[2], title='Mine', message='x', notification_type='test'))
+            await db.commit()
+        status, _, body = await call('/notifications', tokens['etag_employee'], notifications)
+        check("/notifications: own notification gets a 200", status == 200 and 'Mine' in body.decode(), str(status))
+
+        holidays, _ = await poll('/calendar/holidays?year=2031&month=5', None)
+        fingerprint = jp_calendar.fingerprint
+        jp_calendar.fingerprint += 1
+        check("/calendar/holidays: calendar change gets a 200",
+              (await call('/calendar/holidays?year=2031&month=5', None, holidays))[0] == 200)
+        jp_calendar.fingerprint = fingerprint
+
+        print("\n🔐 ETags bound to the user and the request...")
+        admin_departments, _ = await poll('/departments', 'etag_admin')
+        check("Another user's ETag not honoured",
+              (await call('/departments', tokens['etag_manager'], admin_departments))[0] == 200)
+        check("No token: no 304 (401 from the endpoint)",
+              (await call('/departments', None, admin_departments))[0] == 401)
+        check("Another query string not honoured",
+              (await call(schedules.replace('05-31', '05-30'), tokens['etag_employee'], employee_schedules))[0] == 200)
+        version, keys, digest = admin_departments[3:-1].split('.')
+        forged = f'W/"{version}.{keys.replace("departments:all", "notifications:u:1")}.{digest}"'
+        tampered = f'W/"{version}.{keys}.{digest[:-1]}{"0" if digest[-1] != "0" else "1"}"'
+        check("Edited keys rejected", (await call('/departments', tokens['etag_admin'], forged))[0] == 200)
+        check("Tampered digest rejected", (await call('/departments', tokens['etag_admin'], tampered))[0] == 200)
+        check("Malformed If-None-Match ignored", (await call('/departments', tokens['etag_admin'], '"abc", *'))[0] == 200)
+        check("One of several ETags matching gets a 304",
+              (await call('/departments', tokens['etag_admin'], f'W/"1.x.y", {admin_departments}'))[0] == 304)
+        await write(update(User).filter(User.id == user_ids[0]).values(full_name='ETag admin 2'))
+        check("Change to the user's own row gets a 200",
+              (await call('/departments', tokens['etag_admin'], admin_departments))[0] == 200)
+        status, headers, body = await call('/departments', tokens['etag_admin'])
+        check("Cache-Control: private, no-cache", headers.get('cache-control') == 'private, no-cache')
+        check("Body unchanged by the ETag", any(d['id'] == dept_ids[0] for d in json.loads(body)))
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(Notification).filter(Notification.user_id.in_(user_ids)))
+            await db.execute(delete(Schedule).filter(Schedule.employee_id.in_([e1, e2])))
+            await db.execute(text("DELETE FROM schedule_changes WHERE employee_id IN (:a, :b)"), {'a': e1, 'b': e2})
+            await db.execute(delete(Employee).filter(Employee.id.in_([e1, e2])))
+            await db.execute(delete(Shift).filter(Shift.id.in_([s1, s2])))
+            await db.execute(delete(Role).filter(Role.department_id.in_(dept_ids)))
+            await db.execute(delete(Manager).filter(Manager.user_id.in_(user_ids)))
+            await db.execute(delete(User).filter(User.id.in_(user_ids)))
+            await db.execute(text("DELETE FROM export_data_versions WHERE department_id = ANY(:ids)"), {'ids': dept_ids})
+            await db.execute(delete(Department).filter(Department.id.in_(dept_ids)))
+            await db.execute(text(
+                "DELETE FROM resource_versions WHERE scope = ANY(:scopes)"
+            ), {'scopes': [f'd:{d}' for d in dept_ids] + [f'e:{e}' for e in (e1, e2)] + [f'u:{u}' for u in user_ids]})
+            await db.commit()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} conditional GET checks failed")
+    else:
+        print("✅ Unchanged polls answered with 304")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_etags()) else 1)
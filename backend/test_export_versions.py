@@ -0,0 +1,176 @@
+"""
+Export Data Version Test
+Checks that writes to the tables the attendance exports read bump
+export_data_versions for the right department and month (migration 0003),
+and that the export cache key follows the version and the departments,
+roles, shifts and employee assignments the reports read.
+Runs inside a transaction and rolls back
+Run: python test_export_versions.py
+"""
+
+import asyncio
+import sys
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine
+from app.export_cache import etag_matches, export_cache_key
+
+
+SEED_SQL = [
+    "INSERT INTO departments (dept_id, name, is_active) VALUES ('V01', 'Version Test 1', true), ('V02', 'Version Test 2', true)",
+    """
+    INSERT INTO roles (name, department_id, is_active)
+    SELECT 'Version Test Role', d.id, true FROM departments d WHERE d.dept_id LIKE 'V0%'
+    """,
+    """
+    INSERT INTO employees (employee_id, first_name, last_name, email, department_id, is_active, updated_at)
+    SELECT 'VER' || d.dept_id, 'Version', 'Test', 'version.' || d.dept_id || '@test.local', d.id, true, now()
+    FROM departments d WHERE d.dept_id LIKE 'V0%'
+    """,
+]
+
+EMPLOYEE = "(SELECT id FROM employees WHERE employee_id = 'VERV01')"
+OTHER_EMPLOYEE = "(SELECT id FROM employees WHERE employee_id = 'VERV02')"
+DEPARTMENT = "(SELECT id FROM departments WHERE dept_id = 'V01')"
+ROLE = f"(SELECT id FROM roles WHERE department_id = {DEPARTMENT})"
+
+# (description, statement, months of department V01 expected to change)
+WRITES = [
+    (
+        "Attendance insert",
+        f"INSERT INTO attendance (employee_id, date, worked_hours) VALUES ({EMPLOYEE}, DATE '2025-06-10', 8)",
+        ["2025-06"],
+    ),
+    (
+        "Attendance moved to another month",
+        f"UPDATE attendance SET date = DATE '2025-07-01' WHERE employee_id = {EMPLOYEE}",
+        ["2025-06", "2025-07"],
+    ),
+    (
+        "Check-in insert",
+        f"INSERT INTO check_ins (employee_id, date) VALUES ({EMPLOYEE}, DATE '2025-06-11')",
+        ["2025-06"],
+    ),
+    (
+        "Schedule insert",
+        f"INSERT INTO schedules (department_id, employee_id, role_id, date, status) "
+        f"VALUES ({DEPARTMENT}, {EMPLOYEE}, {ROLE}, DATE '2025-06-12', 'scheduled')",
+        ["2025-06"],
+    ),
+    (
+        "Leave request over three months",
+        f"INSERT INTO leave_requests (employee_id, start_date, end_date, leave_type, status) "
+        f"VALUES ({EMPLOYEE}, DATE '2025-06-28', DATE '2025-08-02', 'paid', 'PENDING')",
+        ["2025-06", "2025-07", "2025-08"],
+    ),
+    (
+        "Leave request approved",
+        f"UPDATE leave_requests SET status = 'APPROVED' WHERE employee_id = {EMPLOYEE}",
+        ["2025-06", "2025-07", "2025-08"],
+    ),
+    (
+        "Comp-off request insert",
+        f"INSERT INTO comp_off_requests (employee_id, comp_off_date, status) "
+        f"VALUES ({EMPLOYEE}, DATE '2025-06-20', 'PENDING')",
+        ["2025-06"],
+    ),
+    (
+        "Schedule delete",
+        f"DELETE FROM schedules WHERE employee_id = {EMPLOYEE}",
+        ["2025-06"],
+    ),
+    (
+        "Other department's attendance",
+        f"INSERT INTO attendance (employee_id, date, worked_hours) VALUES ({OTHER_EMPLOYEE}, DATE '2025-06-10', 8)",
+        [],
+    ),
+]
+
+
+async def department_versions(conn) -> dict:
+    result = await conn.execute(text(
+        f"SELECT to_char(period, 'YYYY-MM'), version FROM export_data_versions WHERE department_id = {DEPARTMENT}"
+    ))
+    return dict(result.all())
+
+
+async def test_export_versions():
+    """Run each write and compare the department's month versions before and after"""
+    print("\n" + "="*70)
+    print("🧪 TESTING EXPORT DATA VERSION TRIGGERS")
+    print("="*70)
+
+    failures = 0
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            print("\n🌱 Seeding test data (rolled back afterwards)...")
+            for statement in SEED_SQL:
+                await conn.execute(text(statement))
+            department_id = (await conn.execute(text(f"SELECT {DEPARTMENT}"))).scalar()
+
+            for description, statement, expected in WRITES:
+                before = await department_versions(conn)
+                await conn.execute(text(statement))
+                after = await department_versions(conn)
+                changed = sorted(month for month in after if after[month] != before.get(month))
+                if changed == expected:
+                    print(f"   ✅ {description}: {', '.join(changed) or 'no change'}")
+                else:
+                    failures += 1
+                    print(f"   ❌ {description}: expected {expected}, changed {changed}")
+
+            # The cache key (and ETag) of a month follows its version
+            db = AsyncSession(bind=conn)
+            june = (date(2025, 6, 1), date(2025, 6, 30))
+            key = await export_cache_key(db, "monthly", department_id, *june, language="en")
+            same = await export_cache_key(db, "monthly", department_id, *june, language="en")
+            ja = await export_cache_key(db, "monthly", department_id, *june, language="ja")
+            await conn.execute(text(
+                f"INSERT INTO check_ins (employee_id, date) VALUES ({EMPLOYEE}, DATE '2025-06-15')"
+            ))
+            changed = await export_cache_key(db, "monthly", department_id, *june, language="en")
+
+            # Reference data the reports read changes the key too
+            reference_keys = [changed]
+            for statement in [
+                f"UPDATE departments SET name = 'Version Test 1b' WHERE id = {DEPARTMENT}",
+                f"UPDATE roles SET name = 'Version Test Role b' WHERE id = {ROLE}",
+                f"INSERT INTO shifts (role_id, name, start_time, end_time) VALUES ({ROLE}, 'Version Shift', 540, 1080)",
+                f"UPDATE employees SET department_id = {DEPARTMENT} WHERE id = {OTHER_EMPLOYEE}",
+            ]:
+                await conn.execute(text(statement))
+                reference_keys.append(await export_cache_key(db, "monthly", department_id, *june, language="en"))
+            checks = [
+                ("Same data, same key", key == same),
+                ("Language is part of the key", key != ja),
+                ("Write changes the key", key != changed),
+                ("If-None-Match with the key matches", etag_matches(f'W/"{key}", "other"', f'"{key}"')),
+                ("Stale If-None-Match does not match", not etag_matches(f'"{key}"', f'"{changed}"')),
+                ("Department rename changes the key", reference_keys[1] != reference_keys[0]),
+                ("Role edit changes the key", reference_keys[2] != reference_keys[1]),
+                ("New shift changes the key", reference_keys[3] != reference_keys[2]),
+                ("Employee moving in changes the key", reference_keys[4] != reference_keys[3]),
+            ]
+            for description, ok in checks:
+                print(f"   {'✅' if ok else '❌'} {description}")
+                failures += 0 if ok else 1
+        finally:
+            await trans.rollback()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} export version checks failed")
+    else:
+        print("✅ Export data versions follow every write")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_export_versions()) else 1)
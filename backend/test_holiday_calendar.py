@@ -0,0 +1,142 @@
+"""
+Holiday Calendar Test
+Checks the precomputed calendar of app/holidays_jp.py against day-by-day
+lookups in the holidays library (random ranges, including years outside
+the precomputed ones), that company holidays change lookups and cached
+week info, and that a company holiday stored in calendar_holidays is
+loaded and bumps the export data versions (migration 0006).
+Runs inside a transaction and rolls back
+Run: python test_holiday_calendar.py
+"""
+
+import asyncio
+import random
+import sys
+from datetime import date, timedelta
+
+import holidays as holidays_lib
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine
+from app.holidays_jp import JapaneseCalendar, jp_calendar, load_company_holidays
+from app.models import CalendarHoliday, Department, ExportDataVersion
+
+
+REFERENCE = holidays_lib.Japan()
+
+
+def reference_holidays(start_date: date, end_date: date) -> dict:
+    """Holidays of the range, one library lookup per day"""
+    days = (start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1))
+    return {day: REFERENCE[day] for day in days if day in REFERENCE}
+
+
+def reference_non_working(start_date: date, end_date: date) -> dict:
+    non_working = {}
+    for i in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=i)
+        if day.weekday() >= 5:
+            non_working[day] = day.strftime('%A')
+        elif day in REFERENCE:
+            non_working[day] = REFERENCE[day]
+    return non_working
+
+
+async def test_holiday_calendar():
+    print("\n" + "="*70)
+    print("🧪 TESTING HOLIDAY CALENDAR")
+    print("="*70)
+
+    rnd = random.Random(19)
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    calendar = JapaneseCalendar()
+
+    print("\n📅 Range queries vs day-by-day lookups...")
+    ranges = []
+    for _ in range(300):
+        start = date(1995, 1, 1) + timedelta(days=rnd.randint(0, 70 * 365))
+        ranges.append((start, start + timedelta(days=rnd.choice([0, 1, 6, 30, 400]))))
+    ranges += [(date(2050, 12, 1), date(2051, 2, 1)), (date(1999, 12, 25), date(2000, 1, 15))]
+    mismatches = [r for r in ranges if calendar.get_holidays_in_range(*r) != reference_holidays(*r)]
+    check("get_holidays_in_range", not mismatches, str(mismatches[:3]))
+    mismatches = [r for r in ranges if list(calendar.get_non_working_days_in_range(*r).items()) != list(reference_non_working(*r).items())]
+    check("get_non_working_days_in_range (same order)", not mismatches, str(mismatches[:3]))
+
+    days = [start for start, _ in ranges]
+    check("is_holiday / get_holiday_name", all(
+        calendar.is_holiday(day) == (day in REFERENCE) and calendar.get_holiday_name(day) == REFERENCE.get(day)
+        for day in days + list(REFERENCE.keys())
+    ))
+
+    print("\n🗓️  Week info...")
+    mismatches = []
+    for day in days[:100]:
+        week_start = day - timedelta(days=day.weekday())
+        info = calendar.get_week_info(week_start)
+        weekday_holidays = sum(1 for i in range(5) if week_start + timedelta(days=i) in REFERENCE)
+        if info['weekday_holiday_count'] != weekday_holidays or calendar.get_shifts_required_for_week(week_start) != max(4, 5 - weekday_holidays):
+            mismatches.append(week_start)
+    check("Weekday holidays and required shifts", not mismatches, str(mismatches[:3]))
+    check("Week info is cached", calendar.get_week_info(date(2025, 4, 28)) is calendar.get_week_info(date(2025, 4, 28)))
+
+    print("\n🏢 Company holidays...")
+    week_start = date(2025, 12, 29)
+    before = calendar.get_shifts_required_for_week(week_start)
+    calendar.set_company_holidays({date(2025, 12, 29): "Year end", date(2025, 12, 30): "Year end"})
+    check("Counted as holidays", calendar.is_holiday(date(2025, 12, 30)) and calendar.is_company_holiday(date(2025, 12, 30)))
+    check("Week info rebuilt", calendar.get_week_info(week_start)['weekday_holiday_count'] == 3,
+          str(calendar.get_week_info(week_start)['weekday_holiday_count']))
+    check("Required shifts never below 4", calendar.get_shifts_required_for_week(week_start) == 4 <= before)
+    check("Public holiday keeps its name", calendar.get_holidays_in_range(date(2026, 1, 1), date(2026, 1, 1)) == {date(2026, 1, 1): REFERENCE[date(2026, 1, 1)]})
+    calendar.set_company_holidays({})
+    check("Removed again", not calendar.is_holiday(date(2025, 12, 30)))
+
+    print("\n💾 calendar_holidays table...")
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            db = AsyncSession(bind=conn)
+            public = (await db.execute(
+                select(CalendarHoliday).filter(CalendarHoliday.is_company.is_(False), CalendarHoliday.date >= date(2025, 1, 1), CalendarHoliday.date <= date(2025, 12, 31))
+            )).scalars().all()
+            check("Public holidays seeded", {h.date: h.name for h in public} == reference_holidays(date(2025, 1, 1), date(2025, 12, 31)))
+
+            department = Department(dept_id='H19', name='Holiday Test', is_active=True)
+            db.add(department)
+            await db.flush()
+            version_query = select(ExportDataVersion.version).filter(
+                ExportDataVersion.department_id == department.id,
+                ExportDataVersion.period == date(2031, 12, 1)
+            )
+            before = (await db.execute(version_query)).scalar() or 0
+            db.add(CalendarHoliday(date=date(2031, 12, 30), name="Year end", is_company=True))
+            await db.flush()
+            check("Adding a holiday bumps the export version", ((await db.execute(version_query)).scalar() or 0) == before + 1)
+
+            await load_company_holidays(db)
+            check("Loaded into jp_calendar", jp_calendar.get_holiday_name(date(2031, 12, 30)) == "Year end")
+            await db.close()
+        finally:
+            await trans.rollback()
+            jp_calendar.set_company_holidays({})
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} holiday calendar checks failed")
+    else:
+        print("✅ Holiday calendar matches the holidays library")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_holiday_calendar()) else 1)
@@ -0,0 +1,163 @@
+"""
+Vectorized Hours Test
+Property check of the batched hour computations in app/hours.py against
+the one-row versions: calculate_night_hours, the shift length of the
+reports and the worked-hours / overtime arithmetic of check-out.
+Generates random times (plus edge cases: midnight, equal times, missing
+and malformed values) with a fixed seed; no database needed.
+Run: python test_hours_vectorized.py
+"""
+
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from app.hours import (
+    calculate_night_hours, compute_hours, minutes_array, night_minutes, shift_hours
+)
+
+
+CASES = 5000
+EDGE_TIMES = ["00:00", "23:59", "22:00", "21:59", "12:00", "06:00", None, "", "xx:yy", "7", "08:30:15"]
+
+
+def random_time(rnd: random.Random):
+    if rnd.random() < 0.1:
+        return rnd.choice(EDGE_TIMES)
+    return f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}"
+
+
+def scalar_shift_hours(start_time, end_time):
+    """Shift length as the reports computed it row by row"""
+    if not (start_time and end_time):
+        return None
+    try:
+        start_h, start_m = map(int, start_time.split(':'))
+        end_h, end_m = map(int, end_time.split(':'))
+    except ValueError:
+        return None
+    start_decimal = start_h + start_m / 60
+    end_decimal = end_h + end_m / 60
+    return end_decimal - start_decimal if end_decimal > start_decimal else 24 - start_decimal + end_decimal
+
+
+def scalar_check_out(check_in_time, check_out_time, role_break, daily_max_hours):
+    """Worked hours, break and overtime as check-out computed them row by row"""
+    total_minutes = (check_out_time - check_in_time).total_seconds() / 60
+    break_minutes = role_break if total_minutes >= role_break else 0
+    worked_hours = round(max(0, total_minutes - break_minutes) / 60, 2)
+    overtime = round(worked_hours - daily_max_hours, 2) if worked_hours > daily_max_hours else 0.0
+    return worked_hours, break_minutes, overtime
+
+
+def brute_force_night(start_time, end_time, night_start_hour, night_end_hour):
+    """Night minutes by walking the span minute by minute"""
+    start = minutes_array([start_time])[0]
+    end = minutes_array([end_time])[0]
+    if np.isnan(start) or np.isnan(end):
+        return 0
+    if end < start:
+        end += 24 * 60
+    night = 0
+    for minute in range(int(start), int(end)):
+        hour = (minute // 60) % 24
+        if night_start_hour < night_end_hour:
+            night += night_start_hour <= hour < night_end_hour
+        else:
+            night += hour >= night_start_hour or hour < night_end_hour
+    return night
+
+
+def test_hours_vectorized():
+    print("\n" + "="*70)
+    print("🧪 TESTING VECTORIZED HOUR COMPUTATIONS")
+    print("="*70)
+
+    rnd = random.Random(17)
+    failures = 0
+
+    def check(description: str, mismatches: list):
+        nonlocal failures
+        print(f"   {'✅' if not mismatches else '❌'} {description}"
+              f"{'' if not mismatches else f': {len(mismatches)} mismatches, e.g. {mismatches[:3]}'}")
+        failures += 1 if mismatches else 0
+
+    in_times = [random_time(rnd) for _ in range(CASES)]
+    out_times = [random_time(rnd) for _ in range(CASES)]
+    in_minutes = minutes_array(in_times)
+    out_minutes = minutes_array(out_times)
+
+    print("\n🌙 Night hours vs calculate_night_hours...")
+    for night_start_hour in (22, 0, 18):
+        batched = night_minutes(in_minutes, out_minutes, night_start_hour=night_start_hour) / 60
+        check(f"Night from {night_start_hour:02d}:00", [
+            (a, b, batched[i]) for i, (a, b) in enumerate(zip(in_times, out_times))
+            if abs(calculate_night_hours(a, b, night_start_hour=night_start_hour) - batched[i]) > 1e-9
+        ])
+
+    print("\n🌗 Night window with an end hour vs minute-by-minute count...")
+    sample = list(zip(in_times, out_times))[:400]
+    for night_start_hour, night_end_hour in ((22, 5), (0, 6), (20, 23)):
+        batched = night_minutes(
+            minutes_array(a for a, _ in sample), minutes_array(b for _, b in sample),
+            night_start_hour=night_start_hour, night_end_hour=night_end_hour
+        )
+        check(f"Night {night_start_hour:02d}:00-{night_end_hour:02d}:00", [
+            (a, b, batched[i]) for i, (a, b) in enumerate(sample)
+            if batched[i] != brute_force_night(a, b, night_start_hour, night_end_hour)
+        ])
+
+    print("\n🕘 Shift length vs the report's scalar version...")
+    batched = shift_hours(in_minutes, out_minutes)
+    mismatches = []
+    for i, (a, b) in enumerate(zip(in_times, out_times)):
+        expected = scalar_shift_hours(a, b)
+        if expected is None:
+            continue  # malformed strings: the scalar version gave up, the batch may parse them
+        if abs(expected - batched[i]) > 1e-9:
+            mismatches.append((a, b, expected, batched[i]))
+    check("Shift hours (overnight and equal times wrap)", mismatches)
+
+    print("\n🚪 Check-out worked hours, break and overtime vs the scalar version...")
+    today = date(2025, 11, 20)
+    check_ins, check_outs, breaks, maxima = [], [], [], []
+    for _ in range(CASES):
+        check_in = datetime.combine(today, datetime.min.time()) + timedelta(
+            minutes=rnd.randint(-6 * 60, 23 * 60), seconds=rnd.randint(0, 59)
+        )
+        duration = rnd.choice([0, 15, 45, 60, rnd.randint(1, 16 * 60), rnd.randint(16 * 60, 30 * 60)])
+        check_ins.append(check_in)
+        check_outs.append(check_in + timedelta(minutes=duration, seconds=rnd.randint(0, 59)))
+        breaks.append(rnd.choice([0, 30, 45, 60, 90]))
+        maxima.append(rnd.choice([8, 9, 10]))
+    hours = compute_hours(
+        minutes_array(check_ins, day=today), minutes_array(check_outs, day=today),
+        break_minutes=np.array(breaks), daily_max_hours=np.array(maxima)
+    )
+    mismatches = []
+    for i in range(CASES):
+        worked, break_minutes, overtime = scalar_check_out(check_ins[i], check_outs[i], breaks[i], maxima[i])
+        got = (round(hours.worked_hours[i], 2), int(hours.break_minutes[i]), round(hours.overtime_hours[i], 2))
+        if abs(got[0] - worked) > 0.011 or got[1] != break_minutes or abs(got[2] - overtime) > 0.011:
+            mismatches.append((check_ins[i], check_outs[i], (worked, break_minutes, overtime), got))
+    check("Worked / break / overtime (check-outs past midnight do not wrap)", mismatches)
+
+    print("\n❔ Missing times...")
+    empty = compute_hours(minutes_array([None, "09:00"]), minutes_array(["18:00", None]), break_minutes=60)
+    check("NaN worked hours and zero night hours", [] if (
+        np.isnan(empty.worked_hours).all() and (empty.night_hours == 0).all()
+    ) else [empty])
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} hour checks failed")
+    else:
+        print("✅ Batched hours match the scalar computations")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_hours_vectorized() else 1)
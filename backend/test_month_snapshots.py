@@ -0,0 +1,164 @@
+"""
+Attendance Month Snapshot Test
+Closes a month and checks that the snapshots match the attendance rows,
+that the attendance summary reads the same numbers from them, that a late
+correction makes the snapshot stale (summary falls back to the rows) and
+that reopening deletes it (migration 0004).
+Runs inside a transaction and rolls back
+Run: python test_month_snapshots.py
+"""
+
+import asyncio
+import sys
+from datetime import date
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.attendance_snapshots import (
+    attendance_period_stats, close_month, fresh_closes, reopen_month
+)
+from app.database import engine
+from app.models import Department, DepartmentMonthSnapshot, Employee, EmployeeMonthSnapshot
+
+
+SEED_SQL = [
+    "INSERT INTO departments (dept_id, name, is_active) VALUES ('S01', 'Snapshot Test', true)",
+    """
+    INSERT INTO employees (employee_id, first_name, last_name, email, department_id, is_active, updated_at)
+    SELECT 'SNP' || n, 'Snapshot', 'Test ' || n, 'snapshot.' || n || '@test.local',
+           (SELECT id FROM departments WHERE dept_id = 'S01'), true, now()
+    FROM generate_series(1, 5) n
+    """,
+    # Two months of weekdays; every fourth day late, one row without hours
+    """
+    INSERT INTO attendance (employee_id, date, in_time, out_time, status, worked_hours, overtime_hours, break_minutes)
+    SELECT e.id, d::date, 9 * 60, 23 * 60,  -- 09:00-23:00 as minutes
+           CASE WHEN extract(day FROM d)::int % 4 = 0 THEN 'late' ELSE 'onTime' END,
+           CASE WHEN d = DATE '2025-05-07' AND e.employee_id = 'SNP1' THEN NULL ELSE 8 END, 0.5, 60
+    FROM employees e CROSS JOIN generate_series(DATE '2025-05-01', DATE '2025-06-30', interval '1 day') d
+    WHERE e.employee_id LIKE 'SNP%' AND extract(isodow FROM d) < 6
+    """,
+    """
+    INSERT INTO leave_requests (employee_id, start_date, end_date, leave_type, duration_type, status)
+    SELECT id, DATE '2025-05-29', DATE '2025-06-03', 'paid', 'full_day', 'APPROVED'
+    FROM employees WHERE employee_id = 'SNP2'
+    """,
+]
+
+MAY = (date(2025, 5, 1), date(2025, 5, 31))
+RANGE = (date(2025, 5, 1), date(2025, 6, 30))
+IN_DEPARTMENT = Employee.department_id == select(Department.id).filter(Department.dept_id == 'S01').scalar_subquery()
+
+
+async def live_stats(db: AsyncSession) -> dict:
+    """The summary numbers straight from the attendance rows"""
+    result = await db.execute(text(f"""
+        SELECT a.employee_id, count(*), coalesce(sum(a.worked_hours), 0), coalesce(sum(a.overtime_hours), 0),
+               count(*) FILTER (WHERE a.status = 'onTime'), count(*) FILTER (WHERE a.status = 'late')
+        FROM attendance a JOIN employees e ON e.id = a.employee_id
+        WHERE e.employee_id LIKE 'SNP%' AND a.date BETWEEN DATE '{RANGE[0]}' AND DATE '{RANGE[1]}'
+        GROUP BY a.employee_id
+    """))
+    return {row[0]: (row[1], round(row[2], 2), round(row[3], 2), row[4], row[5]) for row in result.all()}
+
+
+async def summary_stats(db: AsyncSession) -> dict:
+    stats = await attendance_period_stats(db, *RANGE, IN_DEPARTMENT)
+    return {
+        employee_id: (
+            row["records"], round(row["worked_hours"], 2), round(row["overtime_hours"], 2),
+            row["on_time_count"], row["late_count"]
+        )
+        for employee_id, row in stats.items()
+    }
+
+
+async def test_month_snapshots():
+    """Close May, compare, correct, reopen"""
+    print("\n" + "="*70)
+    print("🧪 TESTING ATTENDANCE MONTH SNAPSHOTS")
+    print("="*70)
+
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            print("\n🌱 Seeding test data (rolled back afterwards)...")
+            for statement in SEED_SQL:
+                await conn.execute(text(statement))
+            db = AsyncSession(bind=conn)
+            department = (await db.execute(select(Department).filter(Department.dept_id == 'S01'))).scalar_one()
+
+            expected = await live_stats(db)
+            check("Summary without snapshots matches the rows", await summary_stats(db) == expected)
+
+            print("\n📦 Closing May...")
+            closed = await close_month(db, department, 2025, 5, closed_by=None)
+            totals = (await db.execute(
+                select(DepartmentMonthSnapshot).filter(DepartmentMonthSnapshot.department_id == department.id)
+            )).scalar_one()
+            may_rows = (await db.execute(text(f"""
+                SELECT count(*), coalesce(sum(worked_hours) FILTER (WHERE worked_hours > 0), 0), count(*) FILTER (WHERE status = 'late')
+                FROM attendance a JOIN employees e ON e.id = a.employee_id
+                WHERE e.employee_id LIKE 'SNP%' AND a.date BETWEEN DATE '{MAY[0]}' AND DATE '{MAY[1]}'
+            """))).one()
+            check("Five employee snapshots", closed["employees"] == 5, str(closed["employees"]))
+            check(
+                "Department totals match the May rows",
+                (totals.records, round(totals.worked_hours, 2), totals.late_count) == (may_rows[0], round(may_rows[1], 2), may_rows[2]),
+                f"{(totals.records, totals.worked_hours, totals.late_count)} != {tuple(may_rows)}"
+            )
+            check("Night hours counted (shifts end 23:00)", totals.night_hours == totals.records, str(totals.night_hours))
+            check("Leave days within May only (29th-31st, weekend included)", totals.paid_leave_days == 3, str(totals.paid_leave_days))
+
+            fresh = (await db.execute(fresh_closes(*RANGE))).all()
+            check("May snapshot is current", len(fresh) == 1)
+            check("Summary over May (snapshot) and June (rows) matches", await summary_stats(db) == expected)
+            partial = (await db.execute(fresh_closes(date(2025, 5, 2), date(2025, 6, 30)))).all()
+            check("Range starting mid-May does not use the May snapshot", partial == [])
+
+            print("\n✏️  Late correction in May...")
+            await conn.execute(text("""
+                UPDATE attendance SET worked_hours = 11 WHERE date = DATE '2025-05-02'
+                AND employee_id = (SELECT id FROM employees WHERE employee_id = 'SNP3')
+            """))
+            expected = await live_stats(db)
+            check("Correction makes the snapshot stale", (await db.execute(fresh_closes(*RANGE))).all() == [])
+            check("Summary falls back to the rows", await summary_stats(db) == expected)
+
+            await close_month(db, department, 2025, 5, closed_by=None)
+            check("Closing again makes it current", len((await db.execute(fresh_closes(*RANGE))).all()) == 1)
+            check("Summary with the new snapshot matches", await summary_stats(db) == expected)
+
+            print("\n🔓 Reopening May...")
+            check("Reopen reports the close", await reopen_month(db, department.id, 2025, 5))
+            remaining = (await db.execute(
+                select(func.count()).select_from(EmployeeMonthSnapshot)
+                .filter(EmployeeMonthSnapshot.department_id == department.id)
+            )).scalar()
+            check("Snapshots deleted with the close", remaining == 0, str(remaining))
+            check("Second reopen is a no-op", not await reopen_month(db, department.id, 2025, 5))
+            await db.close()
+        finally:
+            await trans.rollback()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} month snapshot checks failed")
+    else:
+        print("✅ Month snapshots match the attendance rows")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_month_snapshots()) else 1)
@@ -0,0 +1,164 @@
+"""
+Notification Stream Test
+Runs app/notification_stream.py against the database: a committed
+notification reaches the user's open stream through LISTEN/NOTIFY, a
+rolled-back one and other users' ones do not, and a stream opened with a
+cursor first replays what it missed. Also checks that only a short-lived
+stream token opens a stream from the query string, and that it is refused
+anywhere else.
+NOTIFY is only delivered on commit, so this test commits its rows and
+deletes them afterwards
+Run: python test_notification_stream.py
+"""
+
+import asyncio
+import json
+import sys
+
+from datetime import timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete
+
+from app.auth import (
+    STREAM_TOKEN_SCOPE, create_access_token, create_stream_token, get_password_hash, get_stream_user, principal_from_token
+)
+from app.database import async_session_maker, engine
+from app.models import Notification, User, UserType
+from app.notification_stream import listen_for_notifications, notification_events, notification_hub, notify_created
+
+
+HEARTBEAT = 0.2
+
+
+async def add_notification(user_id: int, title: str, commit: bool = True) -> int:
+    async with async_session_maker() as db:
+        notification = Notification(user_id=user_id, title=title, message=title, notification_type='message', is_read=False)
+        db.add(notification)
+        await db.flush()
+        await notify_created(db, notification)
+        if commit:
+            await db.commit()
+        else:
+            await db.rollback()
+        return notification.id
+
+
+async def next_events(stream, count: int, frames: int = 25) -> list:
+    """The next `count` non-keepalive events (stops after `frames` frames)"""
+    events = []
+    for _ in range(frames):
+        frame = await stream.__anext__()
+        if frame.startswith(":") or frame.startswith("retry:"):
+            continue
+        fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+        events.append((fields['event'], int(fields['id']), json.loads(fields['data'])))
+        if len(events) == count:
+            break
+    return events
+
+
+async def test_notification_stream():
+    print("\n" + "="*70)
+    print("🧪 TESTING NOTIFICATION STREAM")
+    print("="*70)
+
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    async with async_session_maker() as db:
+        users = [
+            User(username=f'stream_test_{n}', email=f'stream.{n}@test.local', hashed_password=get_password_hash('x'),
+                 full_name='Stream Test', user_type=UserType.EMPLOYEE, is_active=True)
+            for n in (1, 2)
+        ]
+        db.add_all(users)
+        await db.commit()
+        user_id, other_id = users[0].id, users[1].id
+
+    listener = asyncio.create_task(listen_for_notifications(engine))
+    stream = None
+    try:
+        print("\n🎟️  Stream tokens...")
+        access_token = create_access_token({'sub': 'stream_test_1'})
+        stream_token = create_stream_token('stream_test_1')
+        expired_token = create_access_token({'sub': 'stream_test_1', 'scope': STREAM_TOKEN_SCOPE}, timedelta(seconds=-1))
+        user = await get_stream_user(authorization=None, stream_token=stream_token)
+        check("Stream token opens the stream", user.id == user_id)
+        user = await get_stream_user(authorization=f"Bearer {access_token}", stream_token=None)
+        check("Bearer header still accepted", user.id == user_id)
+        for description, kwargs in [
+            ("Access token refused in the query string", {'authorization': None, 'stream_token': access_token}),
+            ("Expired stream token refused", {'authorization': None, 'stream_token': expired_token}),
+            ("Stream token refused as a bearer token", {'authorization': f"Bearer {stream_token}", 'stream_token': None}),
+        ]:
+            try:
+                await get_stream_user(**kwargs)
+                check(description, False)
+            except HTTPException as e:
+                check(description, e.status_code == 401, str(e.status_code))
+        async with async_session_maker() as db:
+            try:
+                await principal_from_token(stream_token, db)
+                check("Stream token is no API credential", False)
+            except HTTPException as e:
+                check("Stream token is no API credential", e.status_code == 401, str(e.status_code))
+
+        print("\n📡 Live stream...")
+        stream = notification_events(user_id, None, async_session_maker, HEARTBEAT, 60)
+        ready = await next_events(stream, 1)
+        check("Starts with a ready event at the latest id", ready == [('ready', 0, {})], str(ready))
+        await asyncio.sleep(0.3)  # listener connected
+
+        first = await add_notification(user_id, "First")
+        await add_notification(user_id, "Rolled back", commit=False)
+        await add_notification(other_id, "Someone else")
+        second = await add_notification(user_id, "Second")
+        events = await next_events(stream, 2)
+        check("Committed notifications pushed in order", [(e[1], e[2]['title']) for e in events] == [(first, "First"), (second, "Second")], str(events))
+        check("Event carries the notification", events[0][2]['user_id'] == user_id and events[0][2]['is_read'] is False)
+        check("Nothing else pushed", await next_events(stream, 1, frames=5) == [])
+        await stream.aclose()
+        check("Closed stream unsubscribed", notification_hub.stream_count == 0)
+
+        print("\n🔁 Resume after a disconnect...")
+        missed = [await add_notification(user_id, f"Missed {n}") for n in range(3)]
+        stream = notification_events(user_id, second, async_session_maker, HEARTBEAT, 60)
+        events = await next_events(stream, 3)
+        check("Missed notifications replayed", [e[1] for e in events] == missed, str(events))
+        live = await add_notification(user_id, "Live again")
+        events = await next_events(stream, 1)
+        check("Then continues live", [e[1] for e in events] == [live], str(events))
+        await stream.aclose()
+
+        print("\n⏱️  Stream lifetime...")
+        stream = notification_events(user_id, live, async_session_maker, HEARTBEAT, 0.5)
+        frames = [frame async for frame in stream]
+        check("Ends after max_seconds with keepalives", frames[0].startswith("retry:") and all(f == ": keepalive\n\n" for f in frames[1:]) and len(frames) > 1)
+        stream = None
+    finally:
+        if stream is not None:
+            await stream.aclose()
+        listener.cancel()
+        async with async_session_maker() as db:
+            await db.execute(delete(Notification).filter(Notification.user_id.in_([user_id, other_id])))
+            await db.execute(delete(User).filter(User.id.in_([user_id, other_id])))
+            await db.commit()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} notification stream checks failed")
+    else:
+        print("✅ Notifications pushed once, after commit")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_notification_stream()) else 1)
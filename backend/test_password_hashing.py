@@ -0,0 +1,168 @@
+"""
+Password Hashing Pool Test
+Logs in through the /token handler with password hashing in the thread
+pool (app/password_hashing.py). Checks that the event loop keeps running
+while logins hash, compared with hashing inline, and that no pooled
+connection is held while a hash waits. Checks that a hash with old Argon2
+parameters is rewritten at login, and that a saturated pool answers 503
+with Retry-After. Also checks the latency histograms.
+Run: python test_password_hashing.py
+"""
+
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy import delete, select
+
+from app.database import async_session_maker, engine
+from app.main import login
+from app.models import User, UserType
+from app.password_hashing import LatencyHistogram, PasswordHasher, login_latency, password_hasher, pwd_context
+
+PASSWORD = 'hash-test-password'
+
+
+async def try_login(username: str, password: str = PASSWORD):
+    async with async_session_maker() as db:
+        return await login(form_data=SimpleNamespace(username=username, password=password), db=db)
+
+
+async def max_loop_lag(work) -> float:
+    """Longest gap (seconds) between 5 ms ticks of the event loop while work runs"""
+    lag, running = 0.0, True
+
+    async def ticker():
+        nonlocal lag
+        last = time.perf_counter()
+        while running:
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            lag = max(lag, now - last - 0.005)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    try:
+        await work()
+    finally:
+        running = False
+        await task
+    return lag
+
+
+async def test_password_hashing():
+    print("\n" + "="*70)
+    print("🧪 TESTING PASSWORD HASHING POOL")
+    print("="*70)
+
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    old_context = CryptContext(schemes=["argon2"], argon2__rounds=2, argon2__memory_cost=8192, argon2__parallelism=1)
+    async with async_session_maker() as db:
+        users = [
+            User(username=f'hash_test_{n}', email=f'hash.{n}@test.local', full_name=f'Hash Test {n}',
+                 hashed_password=await password_hasher.hash(PASSWORD) if n else old_context.hash(PASSWORD),
+                 user_type=UserType.EMPLOYEE, is_active=True)
+            for n in range(4)
+        ]
+        db.add_all(users)
+        await db.commit()
+        user_ids = [u.id for u in users]
+
+    try:
+        print("\n🔑 Logins...")
+        response = await try_login('hash_test_1')
+        check("Valid password gets a token", bool(response['access_token']))
+        for description, username, password in [
+            ("Wrong password gets 401", 'hash_test_1', 'wrong'),
+            ("Unknown user gets 401", 'hash_test_nobody', PASSWORD),
+        ]:
+            try:
+                await try_login(username, password)
+                check(description, False)
+            except HTTPException as e:
+                check(description, e.status_code == 401, str(e.status_code))
+
+        check("Old parameters need an upgrade", pwd_context.needs_update(old_context.hash(PASSWORD)))
+        await try_login('hash_test_0')
+        async with async_session_maker() as db:
+            stored = (await db.execute(select(User.hashed_password).filter(User.id == user_ids[0]))).scalar_one()
+        check("Login rewrites the hash with the current parameters",
+              not pwd_context.needs_update(stored) and pwd_context.verify(PASSWORD, stored), stored[:32])
+        await try_login('hash_test_0')
+
+        print("\n⏱️  Event loop while hashing...")
+        usernames = [f'hash_test_{n}' for n in range(1, 4)]
+        async with async_session_maker() as db:
+            hashes = (await db.execute(select(User.hashed_password).filter(User.id.in_(user_ids[1:])))).scalars().all()
+
+        async def inline():
+            for hashed in hashes:
+                pwd_context.verify(PASSWORD, hashed)
+
+        async def pooled():
+            await asyncio.gather(*(try_login(username) for username in usernames))
+
+        inline_lag = await max_loop_lag(inline)
+        pooled_lag = await max_loop_lag(pooled)
+        check("Loop keeps running during pooled logins", pooled_lag < inline_lag / 2,
+              f"pooled {pooled_lag * 1000:.0f} ms, inline {inline_lag * 1000:.0f} ms")
+        print(f"      longest loop stall: inline {inline_lag * 1000:.0f} ms, pooled {pooled_lag * 1000:.0f} ms")
+
+        login_task = asyncio.create_task(try_login('hash_test_1'))
+        while password_hasher.pending == 0 and not login_task.done():
+            await asyncio.sleep(0.001)
+        checked_out = engine.pool.checkedout()
+        await login_task
+        check("No pooled connection held while the hash runs", checked_out == 0, str(checked_out))
+
+        print("\n🚦 Admission limit...")
+        hasher = PasswordHasher(threads=1, max_pending=2)
+        outcomes = await asyncio.gather(
+            *(hasher.verify(PASSWORD, hashes[0]) for _ in range(5)), return_exceptions=True
+        )
+        busy = [o for o in outcomes if isinstance(o, HTTPException)]
+        check("Hashes beyond max_pending refused", len(busy) == 3 and hasher.rejected == 3, str(outcomes))
+        check("503 with Retry-After", all(e.status_code == 503 and int(e.headers['Retry-After']) >= 1 for e in busy))
+        check("Admitted hashes still verify", [o for o in outcomes if not isinstance(o, Exception)] == [(True, None)] * 2)
+        check("Nothing left pending", hasher.pending == 0)
+        hasher.shutdown()
+
+        print("\n📊 Histograms...")
+        snapshot = login_latency.snapshot()
+        check("Every login timed, failures included", snapshot['count'] == 9, str(snapshot['count']))
+        check("Bucket counts are cumulative", snapshot['buckets']['le_+Inf'] == snapshot['count']
+              and list(snapshot['buckets'].values()) == sorted(snapshot['buckets'].values()))
+        check("Hash time recorded", password_hasher.hash_time.count >= 9 and password_hasher.hash_time.snapshot()['p50_ms'])
+        histogram = LatencyHistogram()
+        for ms in [5, 20, 20, 80, 3000]:
+            histogram.observe(ms / 1000)
+        check("Quantiles from bucket bounds", (histogram.quantile_ms(0.5), histogram.quantile_ms(0.95)) == (25.0, 5000.0))
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(User).filter(User.id.in_(user_ids)))
+            await db.commit()
+
+    password_hasher.shutdown()
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} password hashing checks failed")
+    else:
+        print("✅ Password hashing off the event loop")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_password_hashing()) else 1)
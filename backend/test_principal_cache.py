@@ -0,0 +1,204 @@
+"""
+Principal Cache Test
+Resolves tokens through get_current_principal (app/principals.py,
+migration 0010) and counts the SQL statements each request sends. After
+the first request, the user, the manager department and the employee id
+come from the cache with no queries. Writes to users, managers and
+employees committed by another session reach the listener and drop the
+entries: a deactivated user is refused, and a moved manager gets the new
+department. Also checks the LRU bound, the TTL, loads that race with an
+invalidation, and that nothing is cached while the listener is down.
+Invalidations are sent on commit, so this test commits its rows and
+deletes them afterwards
+Run: python test_principal_cache.py
+"""
+
+import asyncio
+import sys
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import delete, event, text, update
+
+from app.auth import create_access_token, get_current_principal, get_password_hash, get_principal
+from app.database import async_session_maker, engine
+from app.main import get_user_department, get_user_employee_id
+from app.models import Department, Employee, Manager, Role, User, UserType
+from app.principals import Principal, PrincipalCache, listen_for_principal_changes, principal_cache
+
+
+statements = []
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+async def authenticate(username: str):
+    """(principal, SQL statements sent) for one request, as FastAPI resolves it"""
+    statements.clear()
+    async with async_session_maker() as db:
+        principal = await get_principal(await get_current_principal(create_access_token({'sub': username}), db))
+        department_id = await get_user_department(principal.user, db)
+        employee_id = await get_user_employee_id(principal.user, db)
+    return principal, department_id, employee_id, len(statements)
+
+
+async def write(*statements_to_run):
+    async with async_session_maker() as db:
+        for statement in statements_to_run:
+            await db.execute(statement)
+        await db.commit()
+
+
+async def until(condition, seconds: float = 3.0) -> bool:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.02)
+    return condition()
+
+
+async def test_principal_cache():
+    print("\n" + "="*70)
+    print("🧪 TESTING PRINCIPAL CACHE")
+    print("="*70)
+
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    async with async_session_maker() as db:
+        departments = [Department(dept_id=f'P{n}', name=f'Principal Test {n}', is_active=True) for n in (1, 2)]
+        db.add_all(departments)
+        await db.flush()
+        role = Role(name='Principal Role', department_id=departments[0].id)
+        users = [
+            User(username=f'principal_{name}', email=f'principal.{name}@test.local', hashed_password=get_password_hash('x'),
+                 full_name=f'Principal {name}', user_type=user_type, is_active=True)
+            for name, user_type in [('manager', UserType.MANAGER), ('employee', UserType.EMPLOYEE)]
+        ]
+        db.add_all([role] + users)
+        await db.flush()
+        db.add(Manager(manager_id='PRM1', user_id=users[0].id, department_id=departments[0].id, is_active=True))
+        employee = Employee(employee_id='PRE1', first_name='Principal', last_name='Employee', email='principal.e1@test.local',
+                            department_id=departments[0].id, role_id=role.id, user_id=users[1].id, is_active=True)
+        db.add(employee)
+        await db.commit()
+        dept_ids = [d.id for d in departments]
+        user_ids = [u.id for u in users]
+        employee_id, role_id = employee.id, role.id
+
+    listener = None
+    try:
+        print("\n🔌 Without the listener...")
+        _, _, _, first = await authenticate('principal_manager')
+        _, _, _, second = await authenticate('principal_manager')
+        check("Every request queries while the listener is down", first >= 1 and second == first, f"{first}, {second}")
+        listener = asyncio.create_task(listen_for_principal_changes(engine))
+        check("Cache used once the listener is connected", await until(lambda: principal_cache.listening))
+
+        print("\n📦 Cached principals...")
+        principal, department_id, _, queries = await authenticate('principal_manager')
+        check("Miss: user and department in one query", queries == 1, str(queries))
+        check("Manager department", principal.department_id == dept_ids[0] == department_id)
+        principal, department_id, _, queries = await authenticate('principal_manager')
+        check("Hit: no queries for auth or department", queries == 0, str(queries))
+
+        principal, department_id, cached_employee_id, queries = await authenticate('principal_employee')
+        check("Employee: department and employee id", (principal.department_id, principal.employee_id) == (dept_ids[0], employee_id)
+              and (department_id, cached_employee_id) == (dept_ids[0], employee_id))
+        _, _, _, queries = await authenticate('principal_employee')
+        check("Employee hit: no queries", queries == 0, str(queries))
+
+        print("\n🔄 Invalidation on commit...")
+        await write(update(Manager).filter(Manager.user_id == user_ids[0]).values(department_id=dept_ids[1]))
+        check("Manager row change drops the entry", await until(lambda: principal_cache.for_user(user_ids[0]) is None))
+        principal, department_id, _, _ = await authenticate('principal_manager')
+        check("Moved manager gets the new department", principal.department_id == department_id == dept_ids[1])
+
+        await write(update(Employee).filter(Employee.id == employee_id).values(user_id=None))
+        check("Unlinking the employee drops the entry", await until(lambda: principal_cache.for_user(user_ids[1]) is None))
+        principal, _, cached_employee_id, _ = await authenticate('principal_employee')
+        check("Unlinked employee user has no employee id", principal.employee_id is None and cached_employee_id is None)
+
+        await authenticate('principal_manager')
+        async with async_session_maker() as db:
+            await db.execute(update(User).filter(User.id == user_ids[0]).values(is_active=False))
+            await asyncio.sleep(0.2)
+            check("Uncommitted change: entry still cached", principal_cache.for_user(user_ids[0]) is not None)
+            await db.commit()
+        check("Deactivation drops the entry", await until(lambda: principal_cache.for_user(user_ids[0]) is None))
+        try:
+            await authenticate('principal_manager')
+            check("Deactivated user refused", False)
+        except HTTPException as e:
+            check("Deactivated user refused", e.status_code == 400, str(e.status_code))
+
+        await authenticate('principal_employee')
+        async with async_session_maker() as db:
+            await db.execute(text("SELECT pg_notify('principal_changes', '*')"))
+            await db.commit()
+        check("'*' clears the whole cache", await until(lambda: len(principal_cache) == 0))
+
+        try:
+            await authenticate('principal_nobody')
+            check("Unknown user gets 401", False)
+        except HTTPException as e:
+            check("Unknown user gets 401", e.status_code == 401)
+
+        print("\n🧮 LRU, TTL and racing loads...")
+        cache = PrincipalCache(max_entries=2, ttl_seconds=60)
+        cache.listening = True
+        principals = {n: Principal(user=User(id=n, username=f'u{n}'), department_id=None, employee_id=None) for n in (1, 2, 3)}
+        for n in (1, 2):
+            cache.put(f'u{n}', principals[n], cache.generation)
+        cache.get('u1')
+        cache.put('u3', principals[3], cache.generation)
+        check("Least recently used entry evicted", cache.get('u2') is None and cache.get('u1') and cache.get('u3'))
+        generation = cache.generation
+        cache.invalidate([99])
+        cache.put('u2', principals[2], generation)
+        check("Load that started before an invalidation not stored", cache.get('u2') is None)
+        expiring = PrincipalCache(max_entries=2, ttl_seconds=0.05)
+        expiring.listening = True
+        expiring.put('u1', principals[1], expiring.generation)
+        await asyncio.sleep(0.1)
+        check("Entry expires after the TTL", expiring.get('u1') is None and expiring.for_user(1) is None)
+    finally:
+        if listener:
+            listener.cancel()
+            try:
+                await listener
+            except asyncio.CancelledError:
+                pass
+        async with async_session_maker() as db:
+            await db.execute(delete(Employee).filter(Employee.id == employee_id))
+            await db.execute(delete(Manager).filter(Manager.user_id.in_(user_ids)))
+            await db.execute(delete(User).filter(User.id.in_(user_ids)))
+            await db.execute(delete(Role).filter(Role.id == role_id))
+            await db.execute(text("DELETE FROM export_data_versions WHERE department_id = ANY(:ids)"), {'ids': dept_ids})
+            await db.execute(delete(Department).filter(Department.id.in_(dept_ids)))
+            await db.execute(text(
+                "DELETE FROM resource_versions WHERE scope = ANY(:scopes)"
+            ), {'scopes': [f'd:{d}' for d in dept_ids] + [f'u:{u}' for u in user_ids]})
+            await db.commit()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} principal cache checks failed")
+    else:
+        print("✅ Auth served from the principal cache")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_principal_cache()) else 1)
@@ -0,0 +1,184 @@
+"""
+Query Index Test
+Checks that the hot query shapes use the composite/partial indexes from
+migration 0002 (alembic/versions/0002_hot_path_indexes.py)
+Seeds a year of data inside a transaction, runs EXPLAIN and rolls back
+Run: python test_query_indexes.py
+"""
+
+import asyncio
+import json
+import sys
+
+from sqlalchemy import text
+
+from app.database import engine
+
+
+SEED_SQL = [
+    # 10 departments, one role each, 40 employees per department
+    """
+    INSERT INTO departments (dept_id, name, is_active)
+    SELECT 'Z' || LPAD(g::text, 2, '0'), 'Index Test ' || g, true
+    FROM generate_series(1, 10) g
+    """,
+    """
+    INSERT INTO roles (name, department_id, is_active)
+    SELECT 'Index Test Role', d.id, true FROM departments d WHERE d.dept_id LIKE 'Z%'
+    """,
+    """
+    INSERT INTO employees (employee_id, first_name, last_name, email, department_id, role_id, is_active)
+    SELECT 'IDX' || LPAD(g::text, 5, '0'), 'Index', 'Test ' || g, 'idx-test-' || g || '@example.invalid',
+           d.id, r.id, true
+    FROM generate_series(1, 400) g
+    JOIN departments d ON d.dept_id = 'Z' || LPAD((1 + g % 10)::text, 2, '0')
+    JOIN roles r ON r.department_id = d.id
+    """,
+    # One schedule, check-in and attendance per employee per day for a year
+    """
+    INSERT INTO schedules (department_id, employee_id, role_id, date, start_time, end_time, status)
+    SELECT e.department_id, e.id, e.role_id, DATE '2025-01-01' + g, 9 * 60, 17 * 60,
+           CASE WHEN g % 7 = 0 THEN 'leave' ELSE 'scheduled' END
+    FROM employees e CROSS JOIN generate_series(0, 364) g
+    WHERE e.employee_id LIKE 'IDX%'
+    """,
+    """
+    INSERT INTO check_ins (employee_id, schedule_id, date, check_in_status)
+    SELECT s.employee_id, CASE WHEN s.id % 50 = 0 THEN s.id END, s.date, 'onTime'
+    FROM schedules s JOIN employees e ON e.id = s.employee_id
+    WHERE e.employee_id LIKE 'IDX%'
+    """,
+    """
+    INSERT INTO attendance (employee_id, schedule_id, date, in_time, status)
+    SELECT s.employee_id, CASE WHEN s.id % 50 = 0 THEN s.id END, s.date, 9 * 60, 'onTime'
+    FROM schedules s JOIN employees e ON e.id = s.employee_id
+    WHERE e.employee_id LIKE 'IDX%'
+    """,
+    """
+    INSERT INTO leave_requests (employee_id, start_date, end_date, leave_type, status)
+    SELECT e.id, DATE '2025-01-01' + g * 30, DATE '2025-01-01' + g * 30 + 1, 'paid',
+           (CASE WHEN g % 3 = 0 THEN 'PENDING' ELSE 'APPROVED' END)::leavestatus
+    FROM employees e CROSS JOIN generate_series(0, 11) g
+    WHERE e.employee_id LIKE 'IDX%'
+    """,
+    """
+    INSERT INTO unavailability (employee_id, date, reason)
+    SELECT e.id, DATE '2025-01-01' + g * 14, 'personal'
+    FROM employees e CROSS JOIN generate_series(0, 25) g
+    WHERE e.employee_id LIKE 'IDX%'
+    """,
+    """
+    INSERT INTO comp_off_requests (employee_id, comp_off_date, status)
+    SELECT e.id, DATE '2025-01-05' + g * 28, 'APPROVED'::leavestatus
+    FROM employees e CROSS JOIN generate_series(0, 12) g
+    WHERE e.employee_id LIKE 'IDX%'
+    """,
+    "ANALYZE schedules, check_ins, attendance, leave_requests, unavailability, comp_off_requests",
+]
+
+EMPLOYEE = "(SELECT id FROM employees WHERE employee_id = 'IDX00123')"
+DEPARTMENT = "(SELECT id FROM departments WHERE dept_id = 'Z04')"
+
+# (description, query, expected index)
+QUERY_SHAPES = [
+    (
+        "Schedule by employee and day",
+        f"SELECT * FROM schedules WHERE employee_id = {EMPLOYEE} AND date = DATE '2025-06-02'",
+        "ix_schedules_employee_date",
+    ),
+    (
+        "Schedules of an employee's week",
+        f"SELECT * FROM schedules WHERE employee_id = {EMPLOYEE} "
+        "AND date BETWEEN DATE '2025-06-02' AND DATE '2025-06-08'",
+        "ix_schedules_employee_date",
+    ),
+    (
+        "Department work shifts in a date range",
+        f"SELECT * FROM schedules WHERE department_id = {DEPARTMENT} "
+        "AND date BETWEEN DATE '2025-06-01' AND DATE '2025-06-30' AND status = 'scheduled'",
+        "ix_schedules_department_date_status",
+    ),
+    (
+        "Attendance by employee and day",
+        f"SELECT * FROM attendance WHERE employee_id = {EMPLOYEE} AND date = DATE '2025-06-02'",
+        "uq_attendance_employee_date",
+    ),
+    (
+        "Check-in by employee and day",
+        f"SELECT * FROM check_ins WHERE employee_id = {EMPLOYEE} AND date = DATE '2025-06-02'",
+        "ix_check_ins_employee_date",
+    ),
+    (
+        "Schedules with check-ins (regeneration)",
+        "SELECT DISTINCT schedule_id FROM check_ins WHERE schedule_id IS NOT NULL",
+        "ix_check_ins_schedule_id",
+    ),
+    (
+        "Approved leave overlapping a range",
+        f"SELECT * FROM leave_requests WHERE employee_id = {EMPLOYEE} AND status = 'APPROVED' "
+        "AND start_date <= DATE '2025-06-30' AND end_date >= DATE '2025-06-01'",
+        "ix_leave_requests_employee_status_dates",
+    ),
+    (
+        "Unavailability in a range",
+        f"SELECT * FROM unavailability WHERE employee_id = {EMPLOYEE} "
+        "AND date BETWEEN DATE '2025-06-01' AND DATE '2025-06-30'",
+        "ix_unavailability_employee_date",
+    ),
+    (
+        "Comp-off by employee and day",
+        f"SELECT * FROM comp_off_requests WHERE employee_id = {EMPLOYEE} AND comp_off_date = DATE '2025-06-01'",
+        "ix_comp_off_requests_employee_date",
+    ),
+]
+
+
+def plan_indexes(node: dict) -> set:
+    """Index names used anywhere in an EXPLAIN (FORMAT JSON) plan"""
+    found = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        found |= plan_indexes(child)
+    return found
+
+
+async def test_query_indexes():
+    """EXPLAIN every hot query shape and check the expected index is used"""
+    print("\n" + "="*70)
+    print("🧪 TESTING INDEX USAGE OF HOT QUERY SHAPES")
+    print("="*70)
+
+    failures = 0
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            print("\n🌱 Seeding test data (rolled back afterwards)...")
+            for statement in SEED_SQL:
+                await conn.execute(text(statement))
+
+            for description, query, expected_index in QUERY_SHAPES:
+                result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {query}"))
+                plan = result.scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                used = plan_indexes(plan[0]["Plan"])
+                if expected_index in used:
+                    print(f"   ✅ {description}: {expected_index}")
+                else:
+                    failures += 1
+                    print(f"   ❌ {description}: expected {expected_index}, plan used {sorted(used) or 'no index'}")
+        finally:
+            await trans.rollback()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} of {len(QUERY_SHAPES)} query shapes did not use their index")
+    else:
+        print(f"✅ All {len(QUERY_SHAPES)} query shapes use their index")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_query_indexes()) else 1)
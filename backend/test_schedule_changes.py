@@ -0,0 +1,197 @@
+"""
+Schedule Delta Sync Test
+Drives GET /schedules/changes (app/schedule_changes.py, migration 0008)
+through inserts, COPY inserts, updates that move a row to another day,
+deletes and a transaction that commits after a sync has started. A
+client state built only from deltas must match a full response every
+time. Also checks the employee scope, the date range, and stale and
+invalid cursors.
+The cursor is a transaction position, so this test commits its rows and
+deletes them afterwards
+Run: python test_schedule_changes.py
+"""
+
+import asyncio
+import sys
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select, text, update
+
+from app.auth import get_password_hash
+from app.database import async_session_maker, engine
+from app.main import get_schedule_changes
+from app.models import Department, Employee, Role, Schedule, ScheduleChange, User, UserType
+from app.schedule_writer import build_schedule_row, bulk_insert_schedules
+
+
+START = date(2031, 3, 3)
+END = START + timedelta(days=13)
+ADMIN = User(id=0, username='sync_admin', user_type=UserType.ADMIN, is_active=True)
+
+
+async def changes(user: User, since=None, start_date=START, end_date=END) -> dict:
+    async with async_session_maker() as db:
+        response = await get_schedule_changes(since=since, start_date=start_date, end_date=end_date, current_user=user, db=db)
+    response['schedules'] = [(s.id, s.employee_id, s.date, s.status, s.start_time) for s in response['schedules']]
+    response['keys'] = {(k['employee_id'], k['date']) for k in response['keys']}
+    return response
+
+
+def apply(state: set, response: dict) -> set:
+    """What a client does with a delta: replace the rows of every changed group"""
+    if response['full']:
+        return set(response['schedules'])
+    kept = {row for row in state if (row[1], row[2]) not in response['keys']}
+    return kept | set(response['schedules'])
+
+
+async def write(*statements):
+    async with async_session_maker() as db:
+        for statement in statements:
+            await db.execute(statement)
+        await db.commit()
+
+
+async def test_schedule_changes():
+    print("\n" + "="*70)
+    print("🧪 TESTING SCHEDULE DELTA SYNC")
+    print("="*70)
+
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    async with async_session_maker() as db:
+        department = Department(dept_id='S22', name='Sync Test', is_active=True)
+        db.add(department)
+        await db.flush()
+        role = Role(name='Sync Role', department_id=department.id)
+        user = User(username='sync_employee', email='sync.employee@test.local', hashed_password=get_password_hash('x'),
+                    full_name='Sync Test', user_type=UserType.EMPLOYEE, is_active=True)
+        db.add_all([role, user])
+        await db.flush()
+        employees = [
+            Employee(employee_id=f'SYN{n}', first_name='Sync', last_name=str(n), email=f'sync.{n}@test.local',
+                     department_id=department.id, role_id=role.id, user_id=user.id if n == 1 else None, is_active=True)
+            for n in (1, 2)
+        ]
+        db.add_all(employees)
+        await db.flush()
+        rows = [
+            Schedule(department_id=department.id, employee_id=employee.id, role_id=role.id,
+                     date=START + timedelta(days=i), start_time='09:00', end_time='18:00', status='scheduled')
+            for employee in employees for i in range(5)
+        ]
+        db.add_all(rows)
+        await db.commit()
+        dept_id, role_id = department.id, role.id
+        e1, e2 = employees[0].id, employees[1].id
+        ids = [row.id for row in rows]
+
+    try:
+        print("\n📦 Full sync...")
+        first = await changes(ADMIN)
+        check("Full response without a cursor", first['full'] and len(first['schedules']) == 10, str(len(first['schedules'])))
+        state, cursor = apply(set(), first), first['cursor']
+        idle = await changes(ADMIN, cursor)
+        check("Nothing changed: no groups, no rows", not idle['full'] and not idle['keys'] and not idle['schedules'])
+
+        async def sync(description: str, expected_keys=None):
+            nonlocal state, cursor
+            delta = await changes(ADMIN, cursor)
+            state, cursor = apply(state, delta), delta['cursor']
+            full = set((await changes(ADMIN))['schedules'])
+            check(description, state == full and (expected_keys is None or expected_keys <= delta['keys']),
+                  f"keys {sorted(delta['keys'])}, missing {full - state}, extra {state - full}")
+            return delta
+
+        print("\n✏️  Changes...")
+        await write(update(Schedule).filter(Schedule.id == ids[0]).values(start_time=10 * 60))
+        delta = await sync("Update", {(e1, START)})
+        check("Only the changed group sent", delta['keys'] == {(e1, START)} and len(delta['schedules']) == 1)
+
+        await write(update(Schedule).filter(Schedule.id == ids[1]).values(date=START + timedelta(days=7)))
+        await sync("Row moved to another day clears the old group", {(e1, START + timedelta(days=1)), (e1, START + timedelta(days=7))})
+
+        await write(delete(Schedule).filter(Schedule.id == ids[6]))
+        await sync("Delete (tombstone)", {(e2, START + timedelta(days=1))})
+
+        # A leave row hidden behind the scheduled row shows once the shift goes
+        await write(Schedule.__table__.insert().values(
+            department_id=dept_id, employee_id=e2, role_id=role_id, date=START + timedelta(days=2),
+            start_time=0, end_time=23 * 60 + 59, status='leave'
+        ))
+        await sync("Hidden leave row")
+        await write(delete(Schedule).filter(Schedule.id == ids[7]))
+        delta = await sync("Leave row shown after the shift is deleted", {(e2, START + timedelta(days=2))})
+        check("Group sent with its remaining row", [row[3] for row in delta['schedules']] == ['leave'])
+
+        async with async_session_maker() as db:
+            await bulk_insert_schedules(db, [
+                build_schedule_row(dept_id, e2, role_id, None, START + timedelta(days=10 + i), '09:00', '18:00') for i in range(3)
+            ])
+            await db.commit()
+        await sync("COPY inserts", {(e2, START + timedelta(days=10))})
+
+        print("\n⏳ Transaction committing after a sync started...")
+        async with async_session_maker() as late:
+            await late.execute(Schedule.__table__.insert().values(
+                department_id=dept_id, employee_id=e1, role_id=role_id, date=START + timedelta(days=12),
+                start_time=9 * 60, end_time=18 * 60, status='scheduled'
+            ))
+            await sync("Sync while the write is uncommitted")
+            await late.commit()
+        delta = await sync("Late commit not skipped", {(e1, START + timedelta(days=12))})
+
+        print("\n🔐 Scope, range and cursors...")
+        admin_view = set((await changes(ADMIN))['schedules'])
+        async with async_session_maker() as db:
+            me = (await db.execute(select(User).filter(User.username == 'sync_employee'))).scalar_one()
+        mine = await changes(me)
+        check("Employee sees only their rows", mine['full'] and {row[1] for row in mine['schedules']} == {e1})
+        await write(update(Schedule).filter(Schedule.employee_id == e2).values(notes='changed'))
+        delta = await changes(me, mine['cursor'])
+        check("Other employees' changes not sent", not delta['keys'] and not delta['schedules'], str(delta['keys']))
+
+        cursor = (await changes(ADMIN, start_date=START, end_date=START + timedelta(days=6)))['cursor']
+        await write(update(Schedule).filter(Schedule.date == START + timedelta(days=10)).values(notes='outside'))
+        delta = await changes(ADMIN, cursor, start_date=START, end_date=START + timedelta(days=6))
+        check("Changes outside the range not sent", not delta['keys'])
+
+        xmin = int(cursor.split('.')[0])
+        stale = await changes(ADMIN, f"{xmin}.{int(cursor.split('.')[1]) - 80 * 3600}")
+        check("Cursor older than the retention gets a full response", stale['full'] and set(stale['schedules']) == admin_view)
+        try:
+            await changes(ADMIN, "not-a-cursor")
+            check("Invalid cursor rejected", False)
+        except HTTPException as e:
+            check("Invalid cursor rejected", e.status_code == 400)
+    finally:
+        async with async_session_maker() as db:
+            employee_ids = [e1, e2]
+            await db.execute(delete(Schedule).filter(Schedule.employee_id.in_(employee_ids)))
+            await db.execute(delete(ScheduleChange).filter(ScheduleChange.employee_id.in_(employee_ids)))
+            await db.execute(delete(Employee).filter(Employee.id.in_(employee_ids)))
+            await db.execute(delete(Role).filter(Role.id == role_id))
+            await db.execute(delete(User).filter(User.username == 'sync_employee'))
+            await db.execute(text("DELETE FROM export_data_versions WHERE department_id = :id"), {'id': dept_id})
+            await db.execute(delete(Department).filter(Department.id == dept_id))
+            await db.commit()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} schedule delta sync checks failed")
+    else:
+        print("✅ Deltas rebuild the full schedule")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_schedule_changes()) else 1)
@@ -0,0 +1,149 @@
+"""
+Time Column Test
+Checks the integer-minute time columns (migration 0005): "HH:MM" strings
+round-trip through the database, the SQL duration / overlap / night
+expressions of app/time_columns.py agree with app/hours.py on random
+times, and malformed times are rejected at the schema boundary.
+Runs inside a transaction and rolls back
+Run: python test_time_columns.py
+"""
+
+import asyncio
+import random
+import sys
+from datetime import date
+
+import numpy as np
+from pydantic import ValidationError
+from sqlalchemy import column, select, text, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine
+from app.hours import night_minutes as night_minutes_array, span_minutes
+from app.models import Attendance, Department, Employee
+from app.schemas import AttendanceCreate, ScheduleCreate, ShiftCreate
+from app.time_columns import (
+    MinuteTime, duration_minutes, night_minutes, overlap_minutes
+)
+
+
+CASES = 2000
+
+
+def brute_force_overlap(start, end, other_start, other_end):
+    """Overlap of two same-day spans, minute by minute"""
+    def span(a, b):
+        return set(range(a, a + ((b - a) % 1440 if b != a else 0)))
+    return len(span(start, end) & span(other_start, other_end))
+
+
+async def test_time_columns():
+    print("\n" + "="*70)
+    print("🧪 TESTING INTEGER-MINUTE TIME COLUMNS")
+    print("="*70)
+
+    rnd = random.Random(18)
+    failures = 0
+
+    def check(description: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"   {'✅' if ok else '❌'} {description}{f': {detail}' if detail and not ok else ''}")
+        failures += 0 if ok else 1
+
+    print("\n🛡️  Schema boundary...")
+    check("H:MM normalized", ShiftCreate(role_id=1, name="x", start_time="9:05", end_time="24:00").start_time == "09:05")
+    check("Empty optional time is None", ScheduleCreate(
+        employee_id=1, role_id=1, date=date(2025, 1, 1), start_time="", end_time="18:00"
+    ).start_time is None)
+    for bad in ("25:00", "9", "ab:cd", "24:30", "12:60"):
+        try:
+            AttendanceCreate(in_time=bad, status="onTime")
+            check(f"'{bad}' rejected", False, "accepted")
+        except ValidationError:
+            check(f"'{bad}' rejected", True)
+
+    starts = [rnd.randint(0, 1439) for _ in range(CASES)]
+    ends = [rnd.randint(0, 1440) if rnd.random() > 0.05 else starts[i] for i in range(CASES)]
+    other_starts = [rnd.randint(0, 1439) for _ in range(CASES)]
+    other_ends = [rnd.randint(0, 1439) for _ in range(CASES)]
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            db = AsyncSession(bind=conn)
+
+            print("\n💾 Round trip through the database...")
+            department = Department(dept_id="T18", name="Time Column Test")
+            db.add(department)
+            await db.flush()
+            employee = Employee(
+                employee_id="TMC1", first_name="Time", last_name="Column", email="time.column@test.local",
+                department_id=department.id
+            )
+            db.add(employee)
+            await db.flush()
+            db.add(Attendance(employee_id=employee.id, date=date(2025, 5, 1), in_time="9:05", out_time="24:00", status="onTime"))
+            await db.flush()
+            stored = (await conn.execute(text(
+                "SELECT in_time, out_time FROM attendance WHERE employee_id = :id"
+            ), {"id": employee.id})).one()
+            check("Stored as minutes", tuple(stored) == (545, 1440), str(tuple(stored)))
+            db.expunge_all()
+            loaded = (await db.execute(select(Attendance).filter(Attendance.employee_id == employee.id))).scalar_one()
+            check("Read back as HH:MM", (loaded.in_time, loaded.out_time) == ("09:05", "24:00"),
+                  str((loaded.in_time, loaded.out_time)))
+
+            print("\n🧮 SQL expressions vs app/hours.py...")
+            spans = values(
+                column("s", MinuteTime), column("e", MinuteTime),
+                column("os", MinuteTime), column("oe", MinuteTime), name="spans"
+            ).data(list(zip(starts, ends, other_starts, other_ends)))
+            rows = (await conn.execute(select(
+                duration_minutes(spans.c.s, spans.c.e),
+                duration_minutes(spans.c.s, spans.c.e, equal_is_full_day=True),
+                overlap_minutes(spans.c.s, spans.c.e, spans.c.os, spans.c.oe),
+                night_minutes(spans.c.s, spans.c.e),
+                night_minutes(spans.c.s, spans.c.e, night_start_hour=0)
+            ))).all()
+            durations, full_days, overlaps, nights, midnights = (np.array(col) for col in zip(*rows))
+            start_array, end_array = np.array(starts, dtype=float), np.array(ends, dtype=float)
+
+            check("Duration (equal times: zero)",
+                  (durations == span_minutes(start_array, end_array)).all())
+            check("Duration (equal times: full day)",
+                  (full_days == span_minutes(start_array, end_array, equal_is_full_day=True)).all())
+            check("Night minutes from 22:00",
+                  (nights == night_minutes_array(start_array, end_array, night_start_hour=22)).all())
+            check("Night minutes from 00:00",
+                  (midnights == night_minutes_array(start_array, end_array, night_start_hour=0)).all())
+            mismatches = [
+                (starts[i], ends[i], other_starts[i], other_ends[i], overlaps[i])
+                for i in range(0, CASES, 10)
+                if overlaps[i] != brute_force_overlap(starts[i], ends[i], other_starts[i], other_ends[i])
+            ]
+            check("Overlap vs minute-by-minute count", not mismatches, str(mismatches[:3]))
+
+            db.add(Attendance(employee_id=employee.id, date=date(2025, 5, 2), in_time="09:00", status="onTime"))
+            await db.flush()
+            nulls = (await db.execute(
+                select(duration_minutes(Attendance.in_time, Attendance.out_time))
+                .filter(Attendance.employee_id == employee.id, Attendance.date == date(2025, 5, 2))
+            )).scalar()
+            check("NULL time gives NULL duration", nulls is None, str(nulls))
+            await db.close()
+        finally:
+            await trans.rollback()
+
+    await engine.dispose()
+
+    print("\n" + "="*70)
+    if failures:
+        print(f"❌ {failures} time column checks failed")
+    else:
+        print("✅ Time columns round-trip and SQL hours match")
+    print("="*70 + "\n")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_time_columns()) else 1)
@@ -1,14 +1,13 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import { Calendar, Clock, CheckCircle, AlertCircle, RefreshCw } from 'lucide-react';
 import Card from './common/Card';
 import Button from './common/Button';
 import Modal from './common/Modal';
 import ScheduleCalendar from './ScheduleCalendar';
-import { getSchedules, recordAttendance } from '../services/api';
+import { recordAttendance } from '../services/api';
+import { useScheduleSync } from '../utils/scheduleSync';
 
 const EmployeeScheduleView = ({ employeeId }) => {
-  const [schedules, setSchedules] = useState([]);
-  const [loading, setLoading] = useState(false);
   const [weekStart, setWeekStart] = useState(
     new Date(Date.now() - 3 * 24 * 60 * 60 * 1000).toISOString().split('T')[0]
   );
@@ -19,25 +18,9 @@ const EmployeeScheduleView = ({ employeeId }) => {
   const [selectedSchedule, setSelectedSchedule] = useState(null);
   const [checkInTime, setCheckInTime] = useState('');
 
-  useEffect(() => {
-    loadSchedules();
-    // Refresh schedules every 30 seconds to catch manager updates
-    const interval = setInterval(loadSchedules, 30000);
-    return () => clearInterval(interval);
-  }, [weekStart, weekEnd]);
-
-  const loadSchedules = async () => {
-    setLoading(true);
-    try {
-      const response = await getSchedules(weekStart, weekEnd);
-      const filteredSchedules = response.data.filter(s => s.employee_id === employeeId);
-      setSchedules(filteredSchedules);
-    } catch (error) {
-      console.error('Failed to load schedules:', error);
-    } finally {
-      setLoading(false);
-    }
-  };
+  // Polls only the changes every 30 seconds to catch manager updates
+  const { schedules: weekSchedules, loading, refresh: loadSchedules } = useScheduleSync(weekStart, weekEnd);
+  const schedules = weekSchedules.filter(s => s.employee_id === employeeId);
 
   const handleCheckIn = async () => {
     if (!checkInTime) {
@@ -5,7 +5,8 @@ import {
   getNotifications,
   markNotificationRead,
   markAllNotificationsRead,
-  deleteNotification
+  deleteNotification,
+  openNotificationStream
 } from '../../services/api';
 import { formatDistanceToNow } from 'date-fns';
 import { ja } from 'date-fns/locale';
@@ -13,15 +14,60 @@ import { ja } from 'date-fns/locale';
 const NotificationBell = () => {
   const { t, language } = useLanguage();
   const [notifications, setNotifications] = useState([]);
-  const [unreadCount, setUnreadCount] = useState(0);
   const [showDropdown, setShowDropdown] = useState(false);
   const [loading, setLoading] = useState(true);
   const dropdownRef = useRef(null);
+  const unreadCount = notifications.filter(n => !n.is_read).length;
 
   useEffect(() => {
-    loadNotifications();
-    const interval = setInterval(loadNotifications, 5000); // Refresh every 5 seconds for faster updates
-    return () => clearInterval(interval);
+    // Load the list once, then receive new notifications over the push channel
+    let source = null;
+    let retryTimer = null;
+    let cancelled = false;
+    let lastId;
+
+    const open = async () => {
+      try {
+        source = await openNotificationStream(lastId);
+      } catch (error) {
+        retryTimer = setTimeout(open, 30000);
+        return;
+      }
+      if (cancelled) {
+        source.close();
+        return;
+      }
+      source.addEventListener('ready', (event) => {
+        if (event.lastEventId) lastId = Number(event.lastEventId);
+      });
+      source.addEventListener('notification', (event) => {
+        const notification = JSON.parse(event.data);
+        lastId = Math.max(lastId || 0, notification.id);
+        setNotifications((current) => (
+          current.some(n => n.id === notification.id) ? current : [notification, ...current]
+        ));
+      });
+      source.onerror = () => {
+        // The stream token has expired by now: reopen with a new one, resuming after lastId
+        source.close();
+        source = null;
+        retryTimer = setTimeout(open, 3000);
+      };
+    };
+
+    const connect = async () => {
+      const loaded = await loadNotifications();
+      if (cancelled) return;
+      lastId = loaded ? loaded.reduce((max, n) => Math.max(max, n.id), 0) : undefined;
+      open();
+    };
+
+    connect();
+    return () => {
+      cancelled = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
   }, []);
 
   useEffect(() => {
@@ -39,9 +85,10 @@ const NotificationBell = () => {
     try {
       const response = await getNotifications();
       setNotifications(response.data);
-      setUnreadCount(response.data.filter(n => !n.is_read).length);
+      return response.data;
     } catch (error) {
       console.error('Failed to load notifications:', error);
+      return null;
     } finally {
       setLoading(false);
     }
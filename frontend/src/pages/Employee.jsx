@@ -11,10 +11,10 @@ import CheckInOut from '../components/CheckInOut';
 import OvertimeRequest from '../components/OvertimeRequest';
 import CompOffManagement from '../components/CompOffManagement';
 import { useLanguage } from '../context/LanguageContext';
+import { useScheduleSync } from '../utils/scheduleSync';
 import api, {
   listLeaveRequests,
   listEmployees,
-  getSchedules,
   getAttendance,
   checkIn,
   checkOut,
@@ -34,26 +34,24 @@ import {
 const EmployeeDashboardHome = ({ user }) => {
   const { t } = useLanguage();
   const navigate = useNavigate();
-  const [todaySchedule, setTodaySchedule] = useState(null);
+  const today = format(new Date(), 'yyyy-MM-dd');
+  // Today's schedule is kept current by delta sync (only changes are transferred)
+  const { schedules: todaySchedules, loading: scheduleLoading, refresh: refreshSchedule } = useScheduleSync(today, today);
+  const todaySchedule = todaySchedules[0] || null;
   const [loading, setLoading] = useState(true);
   const [leaveStats, setLeaveStats] = useState(null);
   const monthKeys = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december'];
 
   useEffect(() => {
-    loadData();
-    // Auto-refresh dashboard data every 30 seconds to catch schedule updates
-    const interval = setInterval(loadData, 30000);
+    loadStats();
+    // Auto-refresh leave statistics every 30 seconds
+    const interval = setInterval(loadStats, 30000);
     return () => clearInterval(interval);
   }, []);
 
-  const loadData = async () => {
+  const loadStats = async () => {
     try {
-      const today = format(new Date(), 'yyyy-MM-dd');
-      const [schedulesRes, statsRes] = await Promise.all([
-        getSchedules(today, today),
-        getLeaveStatistics()
-      ]);
-      setTodaySchedule(schedulesRes.data[0] || null);
+      const statsRes = await getLeaveStatistics();
       setLeaveStats(statsRes.data);
     } catch (error) {
       console.error('Failed to load dashboard data:', error);
@@ -62,7 +60,12 @@ const EmployeeDashboardHome = ({ user }) => {
     }
   };
 
-  if (loading) {
+  const loadData = () => {
+    refreshSchedule();
+    loadStats();
+  };
+
+  if (loading || scheduleLoading) {
     return (
       <div className="flex items-center justify-center h-64">
         <div className="text-xl text-gray-500">{t('loading')}</div>
@@ -176,34 +179,16 @@ const EmployeeDashboardHome = ({ user }) => {
 
 const EmployeeCheckIn = ({ user }) => {
   const { t } = useLanguage();
-  const [todaySchedule, setTodaySchedule] = useState(null);
+  const today = format(new Date(), 'yyyy-MM-dd');
+  const { schedules: todaySchedules, loading } = useScheduleSync(today, today);
+  const todaySchedule = todaySchedules[0] || null;
   const [checkedIn, setCheckedIn] = useState(false);
   const [checkInTime, setCheckInTime] = useState(null);
   const [location, setLocation] = useState('Office');
   const [notes, setNotes] = useState('');
   const [message, setMessage] = useState({ type: '', text: '' });
-  const [loading, setLoading] = useState(true);
   const monthKeys = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december'];
 
-  useEffect(() => {
-    loadSchedule();
-    // Auto-refresh schedule every 30 seconds to catch manager updates
-    const interval = setInterval(loadSchedule, 30000);
-    return () => clearInterval(interval);
-  }, []);
-
-  const loadSchedule = async () => {
-    try {
-      const today = format(new Date(), 'yyyy-MM-dd');
-      const response = await getSchedules(today, today);
-      setTodaySchedule(response.data[0] || null);
-    } catch (error) {
-      console.error('Failed to load schedule:', error);
-    } finally {
-      setLoading(false);
-    }
-  };
-
   const handleCheckIn = async () => {
     setMessage({ type: '', text: '' });
     try {
@@ -380,31 +365,14 @@ const EmployeeCheckIn = ({ user }) => {
 
 const EmployeeSchedule = () => {
   const { t, language } = useLanguage();
-  const [schedules, setSchedules] = useState([]);
   const [currentMonth, setCurrentMonth] = useState(new Date());
-  const [loading, setLoading] = useState(true);
+  // Polls only the changes of the month every 30 seconds to catch manager updates
+  const { schedules, loading, refresh: loadSchedules } = useScheduleSync(
+    format(startOfMonth(currentMonth), 'yyyy-MM-dd'),
+    format(endOfMonth(currentMonth), 'yyyy-MM-dd')
+  );
   const monthKeys = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december'];
 
-  useEffect(() => {
-    loadSchedules();
-    // Auto-refresh schedule every 30 seconds to catch manager updates
-    const interval = setInterval(loadSchedules, 30000);
-    return () => clearInterval(interval);
-  }, [currentMonth]);
-
-  const loadSchedules = async () => {
-    try {
-      const start = format(startOfMonth(currentMonth), 'yyyy-MM-dd');
-      const end = format(endOfMonth(currentMonth), 'yyyy-MM-dd');
-      const response = await getSchedules(start, end);
-      setSchedules(response.data);
-    } catch (error) {
-      console.error('Failed to load schedules:', error);
-    } finally {
-      setLoading(false);
-    }
-  };
-
   if (loading) return <div className="p-6">{t('loading')}</div>;
 
   return (
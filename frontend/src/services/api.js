@@ -184,6 +184,14 @@ export const getSchedules = (startDate, endDate) => {
   if (endDate) params.append('end_date', endDate);
   return api.get(`/schedules?${params.toString()}`);
 };
+// Delta sync: pass the cursor of the previous response as since (see utils/scheduleSync.js)
+export const getScheduleChanges = (startDate, endDate, since) => {
+  const params = new URLSearchParams();
+  if (startDate) params.append('start_date', startDate);
+  if (endDate) params.append('end_date', endDate);
+  if (since) params.append('since', since);
+  return api.get(`/schedules/changes?${params.toString()}`);
+};
 export const createSchedule = (scheduleData) => api.post('/schedules', scheduleData);
 export const updateSchedule = (id, scheduleData) => api.put(`/schedules/${id}`, scheduleData);
 export const deleteSchedule = (id) => api.delete(`/schedules/${id}`);
@@ -270,4 +278,15 @@ export const markAllNotificationsRead = () => api.post('/notifications/mark-all-
 export const deleteNotification = (notificationId) =>
   api.delete(`/notifications/${notificationId}`);
 
+// Server-sent events with new notifications. EventSource cannot send headers,
+// so each connection first fetches a short-lived stream token for the query
+// string (never the access token). Reconnect with a new token after an error.
+export const openNotificationStream = async (after) => {
+  const { data } = await api.post('/notifications/stream-token');
+  const params = new URLSearchParams();
+  params.append('stream_token', data.stream_token);
+  if (after !== undefined && after !== null) params.append('after', after);
+  return new EventSource(`${API_URL}/notifications/stream?${params.toString()}`);
+};
+
 export default api;
@@ -0,0 +1,58 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+import { getScheduleChanges } from '../services/api';
+
+const groupKey = (schedule) => `${schedule.employee_id}|${schedule.date}`;
+
+// Same order as GET /schedules: by date, then status
+const compareSchedules = (a, b) =>
+  a.date.localeCompare(b.date) || a.status.localeCompare(b.status) || a.id - b.id;
+
+// Apply a /schedules/changes response: a full response replaces the list,
+// otherwise every changed (employee, date) group is replaced by its rows
+export const applyScheduleChanges = (current, data) => {
+  if (data.full) return [...data.schedules].sort(compareSchedules);
+  if (data.keys.length === 0) return current;
+  const changed = new Set(data.keys.map(groupKey));
+  return [...current.filter(s => !changed.has(groupKey(s))), ...data.schedules].sort(compareSchedules);
+};
+
+// Schedules of a date range kept up to date by polling /schedules/changes:
+// the first request loads the range, later ones only transfer what changed
+export const useScheduleSync = (startDate, endDate, intervalMs = 30000) => {
+  const [schedules, setSchedules] = useState([]);
+  const [loading, setLoading] = useState(true);
+  const syncRef = useRef(() => {});
+
+  useEffect(() => {
+    let cursor = null;
+    let cancelled = false;
+    let inFlight = false;
+
+    const sync = async () => {
+      if (inFlight) return;
+      inFlight = true;
+      try {
+        const response = await getScheduleChanges(startDate, endDate, cursor);
+        if (cancelled) return;
+        cursor = response.data.cursor;
+        setSchedules((current) => applyScheduleChanges(current, response.data));
+      } catch (error) {
+        console.error('Failed to sync schedules:', error);
+      } finally {
+        inFlight = false;
+        if (!cancelled) setLoading(false);
+      }
+    };
+
+    syncRef.current = sync;
+    sync();
+    const interval = setInterval(sync, intervalMs);
+    return () => {
+      cancelled = true;
+      clearInterval(interval);
+    };
+  }, [startDate, endDate, intervalMs]);
+
+  const refresh = useCallback(() => syncRef.current(), []);
+  return { schedules, loading, refresh };
+};